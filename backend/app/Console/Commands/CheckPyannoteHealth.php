@@ -12,6 +12,7 @@ class CheckPyannoteHealth extends Command
      */
     protected $signature = 'pyannote:health
                             {--refresh : Force a fresh check instead of using cache}
+                            {--deep : Load the pipeline and run a short inference}
                             {--json : Output as JSON}';
 
     /**
@@ -26,12 +27,13 @@ public function handle(PyannoteHealthService $healthService): int
     {
         $refresh = $this->option('refresh');
         $json = $this->option('json');
+        $deep = $this->option('deep');
 
         $this->info('Checking Pyannote health status...');
 
         $status = $refresh
-            ? $healthService->refresh()
-            : $healthService->check();
+            ? $healthService->refresh($deep)
+            : $healthService->check(false, $deep);
 
         if ($json) {
             $this->line(json_encode($status, JSON_PRETTY_PRINT));
@@ -94,7 +96,12 @@ public function handle(PyannoteHealthService $healthService): int
         }
 
         $this->newLine();
-        $this->line('Checked at: ' . ($status['checked_at'] ?? 'unknown'));
+        $this->line(sprintf(
+            'Checked at: %s (%s check, %s ms)',
+            $status['checked_at'] ?? 'unknown',
+            $status['tier'] ?? 'fast',
+            $status['duration_ms'] ?? '?'
+        ));
 
         return $status['available'] ? Command::SUCCESS : Command::FAILURE;
     }
@@ -2,6 +2,7 @@
 
 namespace App\Console\Commands;
 
+use App\Services\DiarizationService;
 use Illuminate\Console\Command;
 use Illuminate\Support\Facades\Log;
 use Illuminate\Support\Facades\Storage;
@@ -13,6 +14,7 @@
  * - Les fichiers de diarisation temporaires (JSON, WAV)
  * - Les chunks d'enregistrement non finalisés après 24h
  * - Les fichiers audio temporaires
+ * - Les formes d'onde décodées (.16k.npy) laissées à côté des enregistrements
  */
 class CleanupTempFiles extends Command
 {
@@ -43,6 +45,9 @@ public function handle(): int
         // 3. Nettoyer les sessions d'enregistrement abandonnées
         $this->cleanupAbandonedSessions($minAgeTimestamp, $dryRun);
 
+        // 4. Nettoyer les formes d'onde décodées
+        $this->cleanupDecodedWaveforms($minAgeTimestamp, $dryRun);
+
         // Résumé
         $this->newLine();
         $this->info(sprintf(
@@ -79,6 +84,7 @@ private function cleanupTempDirectory(int $minAgeTimestamp, bool $dryRun): void
 
         $patterns = [
             'diarization_*.json',   // Résultats de diarisation
+            'segments_*.json',      // Segments client transmis à Whisper
             'client_audio_*.wav',   // Audio client extrait
             '*.tmp',                // Fichiers temporaires génériques
         ];
@@ -161,6 +167,35 @@ private function cleanupAbandonedSessions(int $minAgeTimestamp, bool $dryRun): v
         }
     }
 
+    /**
+     * Nettoie les formes d'onde décodées par les scripts Python (<audio>.16k.npy)
+     *
+     * Elles évitent de redécoder un enregistrement entre diarisation, extraction
+     * et transcription (et lors d'un retry) ; au-delà de l'âge minimum, elles ne
+     * servent plus et occupent ~3,8 Mo par minute d'audio.
+     */
+    private function cleanupDecodedWaveforms(int $minAgeTimestamp, bool $dryRun): void
+    {
+        $this->info('📁 Nettoyage des formes d\'onde décodées...');
+
+        foreach ([storage_path('app/temp'), storage_path('app/recordings'), storage_path('app/public')] as $directory) {
+            if (!is_dir($directory)) {
+                continue;
+            }
+
+            $files = new \RecursiveIteratorIterator(
+                new \RecursiveDirectoryIterator($directory, \RecursiveDirectoryIterator::SKIP_DOTS)
+            );
+
+            foreach ($files as $file) {
+                if (str_ends_with($file->getFilename(), DiarizationService::WAVEFORM_SUFFIX)
+                    && $file->getMTime() < $minAgeTimestamp) {
+                    $this->deleteFile($file->getPathname(), $dryRun);
+                }
+            }
+        }
+    }
+
     /**
      * Supprime un fichier
      */
@@ -3,6 +3,7 @@
 namespace App\Console\Commands;
 
 use App\Services\DiarizationMonitoringService;
+use App\Services\InferenceSchedulerService;
 use Illuminate\Console\Command;
 
 class DiarizationStats extends Command
@@ -12,6 +13,7 @@ class DiarizationStats extends Command
      */
     protected $signature = 'diarization:stats
                             {--days=7 : Number of days to analyze}
+                            {--metrics-hours=24 : Window of the Python inference metrics (hours)}
                             {--json : Output as JSON}';
 
     /**
@@ -22,7 +24,7 @@ class DiarizationStats extends Command
     /**
      * Execute the console command.
      */
-    public function handle(DiarizationMonitoringService $monitoringService): int
+    public function handle(DiarizationMonitoringService $monitoringService, InferenceSchedulerService $scheduler): int
     {
         $days = (int) $this->option('days');
         $json = $this->option('json');
@@ -30,12 +32,17 @@ public function handle(DiarizationMonitoringService $monitoringService): int
         $stats = $monitoringService->getStats($days);
         $healthSummary = $monitoringService->getHealthSummary();
         $recentFailures = $monitoringService->getRecentFailures(5);
+        $schedulerStatus = $scheduler->isEnabled() ? $scheduler->status() : null;
+        $metricsHours = (int) $this->option('metrics-hours');
+        $inferenceMetrics = $monitoringService->getInferenceMetrics($metricsHours);
 
         if ($json) {
             $this->line(json_encode([
                 'stats' => $stats,
                 'health_summary' => $healthSummary,
                 'recent_failures' => $recentFailures,
+                'scheduler' => $schedulerStatus,
+                'inference_metrics' => $inferenceMetrics,
             ], JSON_PRETTY_PRINT));
             return Command::SUCCESS;
         }
@@ -89,6 +96,90 @@ public function handle(DiarizationMonitoringService $monitoringService): int
             ]
         );
 
+        // Stage profile
+        if (!empty($stats['stages']['breakdown'])) {
+            $this->newLine();
+            $this->info("Time per stage ({$stats['stages']['profiled_runs']} profiled runs):");
+            $this->table(
+                ['Stage', 'Avg wall (s)', 'Avg CPU (s)', 'Max RSS (MB)', 'Bottleneck'],
+                array_map(fn($s) => [
+                    $s['stage'],
+                    $s['avg_wall_seconds'],
+                    $s['avg_cpu_seconds'],
+                    $s['max_peak_rss_mb'],
+                    $s['bottleneck_count'],
+                ], $stats['stages']['breakdown'])
+            );
+
+            $this->line('  Slowest recordings:');
+            foreach ($stats['stages']['slowest'] as $run) {
+                $this->line(sprintf(
+                    '  #%d (audio record %s, %ss audio) - %ss, bottleneck: %s',
+                    $run['id'],
+                    $run['audio_record_id'] ?? '-',
+                    $run['audio_duration_seconds'] ?? '?',
+                    $run['total_wall_seconds'] ?? '?',
+                    $run['bottleneck'] ?? '-'
+                ));
+            }
+        }
+
+        // Scheduler
+        if ($schedulerStatus !== null) {
+            $budget = $schedulerStatus['budget'];
+            $this->newLine();
+            $this->info(sprintf(
+                'Scheduler: %d running, %d waiting (%d/%d threads, %d/%d MB reserved)',
+                count($schedulerStatus['running']),
+                count($schedulerStatus['waiting']),
+                $schedulerStatus['threads_in_use'],
+                $budget['cores'],
+                $schedulerStatus['memory_reserved_mb'],
+                $budget['memory_mb']
+            ));
+
+            if (!empty($schedulerStatus['stats'])) {
+                $this->table(
+                    ['Job kind', 'Running', 'Waiting', 'Started', 'Avg wait (s)', 'Max wait (s)', 'Timeouts'],
+                    array_map(fn($kind, $s) => [
+                        $kind,
+                        $schedulerStatus['counts'][$kind]['running'] ?? 0,
+                        $schedulerStatus['counts'][$kind]['waiting'] ?? 0,
+                        $s['started'],
+                        $s['avg_wait_seconds'],
+                        $s['max_wait_seconds'],
+                        $s['timeouts'],
+                    ], array_keys($schedulerStatus['stats']), $schedulerStatus['stats'])
+                );
+            }
+        }
+
+        // Python inference metrics
+        if (!empty($inferenceMetrics)) {
+            $this->newLine();
+            $this->info("Python inference metrics (last {$metricsHours}h):");
+            $this->table(
+                ['Script', 'Model', 'Jobs', 'Failures', 'Cache hits', 'RTF p50/p95/p99', 'Load p50 (s)', 'RSS p95 (MB)', 'Threads'],
+                array_map(fn($m) => [
+                    $m['script'],
+                    $m['model'],
+                    $m['jobs'],
+                    $m['failures'],
+                    $m['cache_hits'],
+                    isset($m['metrics']['real_time_factor'])
+                        ? implode(' / ', [
+                            $m['metrics']['real_time_factor']['p50'],
+                            $m['metrics']['real_time_factor']['p95'],
+                            $m['metrics']['real_time_factor']['p99'],
+                        ])
+                        : '-',
+                    $m['metrics']['model_load_seconds']['p50'] ?? '-',
+                    $m['metrics']['peak_rss_mb']['p95'] ?? '-',
+                    $m['threads'],
+                ], $inferenceMetrics)
+            );
+        }
+
         // Top Errors
         if (!empty($stats['top_errors'])) {
             $this->newLine();
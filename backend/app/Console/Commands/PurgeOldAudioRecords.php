@@ -4,6 +4,7 @@
 
 use App\Models\AudioRecord;
 use App\Models\DiarizationLog;
+use App\Services\DiarizationService;
 use Illuminate\Console\Command;
 use Illuminate\Support\Facades\Log;
 use Illuminate\Support\Facades\Storage;
@@ -104,7 +105,17 @@ public function handle(): int
      */
     private function processRecord(AudioRecord $record, bool $dryRun, bool $includeTranscriptions): void
     {
-        // 1. Supprimer le fichier audio
+        // 1. Supprimer la forme d'onde décodée conservée à côté de l'audio (scripts/audio_io.py)
+        $waveformPath = $record->path ? $record->path . DiarizationService::WAVEFORM_SUFFIX : null;
+        if ($waveformPath && Storage::disk('public')->exists($waveformPath)) {
+            $this->freedBytes += Storage::disk('public')->size($waveformPath);
+
+            if (!$dryRun) {
+                Storage::disk('public')->delete($waveformPath);
+            }
+        }
+
+        // 2. Supprimer le fichier audio
         if ($record->path && Storage::disk('public')->exists($record->path)) {
             $size = Storage::disk('public')->size($record->path);
 
@@ -121,12 +132,12 @@ private function processRecord(AudioRecord $record, bool $dryRun, bool $includeT
             $this->freedBytes += $size;
         }
 
-        // 2. Supprimer les logs de diarisation si demandé
+        // 3. Supprimer les logs de diarisation si demandé
         if ($includeTranscriptions && !$dryRun) {
             DiarizationLog::where('audio_record_id', $record->id)->delete();
         }
 
-        // 3. Supprimer complètement l'enregistrement si demandé
+        // 4. Supprimer complètement l'enregistrement si demandé
         if ($includeTranscriptions) {
             if (!$dryRun) {
                 $record->delete();
@@ -48,10 +48,11 @@ public function audioSystem(): JsonResponse
     public function pyannote(Request $request): JsonResponse
     {
         $forceRefresh = $request->boolean('refresh', false);
+        $deep = $request->boolean('deep', false);
 
         $status = $forceRefresh
-            ? $this->pyannoteHealth->refresh()
-            : $this->pyannoteHealth->check();
+            ? $this->pyannoteHealth->refresh($deep)
+            : $this->pyannoteHealth->check(false, $deep);
 
         return response()->json([
             'available' => $status['available'],
@@ -0,0 +1,47 @@
+<?php
+
+namespace App\Jobs;
+
+use App\Services\DiarizationService;
+use Illuminate\Bus\Queueable;
+use Illuminate\Contracts\Queue\ShouldQueue;
+use Illuminate\Foundation\Bus\Dispatchable;
+use Illuminate\Queue\InteractsWithQueue;
+use Illuminate\Queue\SerializesModels;
+use Illuminate\Support\Facades\Log;
+use Illuminate\Support\Facades\Storage;
+
+/**
+ * Traitement incrémental des chunks d'un enregistrement long
+ *
+ * Diarise et transcrit les chunks arrivés depuis le dernier passage pendant
+ * que l'enregistrement continue. La finalisation n'a plus qu'à traiter le
+ * dernier chunk et assembler les résultats.
+ */
+class ProcessRecordingChunk implements ShouldQueue
+{
+    use Dispatchable, InteractsWithQueue, Queueable, SerializesModels;
+
+    /**
+     * Pas de nouvelle tentative : le chunk sera repris au prochain passage ou à la finalisation
+     */
+    public $tries = 1;
+
+    /**
+     * Temps max d'exécution (un chunk de 10 min)
+     */
+    public $timeout = 900;
+
+    public function __construct(protected string $sessionId)
+    {
+    }
+
+    public function handle(DiarizationService $diarizationService): void
+    {
+        $sessionDir = Storage::path("recordings/{$this->sessionId}");
+
+        if (!$diarizationService->advanceStreamingSession($sessionDir)) {
+            Log::warning("⚠️ [RECORDING] Chunks de la session {$this->sessionId} non traités, reprise à la finalisation");
+        }
+    }
+}
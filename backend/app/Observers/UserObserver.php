@@ -0,0 +1,33 @@
+<?php
+
+namespace App\Observers;
+
+use App\Models\User;
+use App\Services\DiarizationService;
+use Illuminate\Support\Facades\Log;
+
+/**
+ * Observer pour le modèle User
+ *
+ * Supprime l'empreinte vocale du courtier (donnée biométrique, scripts/voiceprints.py)
+ * à la suppression de son compte (RGPD, droit à l'effacement)
+ */
+class UserObserver
+{
+    public function __construct(
+        private readonly DiarizationService $diarizationService
+    ) {
+    }
+
+    /**
+     * Handle the User "deleted" event.
+     */
+    public function deleted(User $user): void
+    {
+        Log::info('[USER OBSERVER] Suppression de l\'empreinte vocale', [
+            'user_id' => $user->id
+        ]);
+
+        $this->diarizationService->forgetVoiceprint($user->id);
+    }
+}
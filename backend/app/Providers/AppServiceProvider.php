@@ -3,7 +3,9 @@
 namespace App\Providers;
 
 use App\Models\Client;
+use App\Models\User;
 use App\Observers\ClientObserver;
+use App\Observers\UserObserver;
 use Illuminate\Cache\RateLimiting\Limit;
 use Illuminate\Http\Request;
 use Illuminate\Support\Facades\RateLimiter;
@@ -34,6 +36,7 @@ public function boot(): void
     protected function registerObservers(): void
     {
         Client::observe(ClientObserver::class);
+        User::observe(UserObserver::class);
     }
 
     /**
@@ -4,6 +4,7 @@
 
 use App\Services\DiarizationMonitoringService;
 use App\Services\DiarizationService;
+use App\Services\InferenceSchedulerService;
 use App\Services\PyannoteHealthService;
 use Illuminate\Support\Facades\Log;
 use Illuminate\Support\ServiceProvider;
@@ -18,11 +19,13 @@ public function register(): void
         // Enregistrer les services comme singletons
         $this->app->singleton(PyannoteHealthService::class);
         $this->app->singleton(DiarizationMonitoringService::class);
+        $this->app->singleton(InferenceSchedulerService::class);
 
-        // Injecter le monitoring dans le service de diarisation
+        // Injecter le monitoring et l'ordonnanceur dans le service de diarisation
         $this->app->singleton(DiarizationService::class, function ($app) {
             return new DiarizationService(
-                $app->make(DiarizationMonitoringService::class)
+                $app->make(DiarizationMonitoringService::class),
+                $app->make(InferenceSchedulerService::class)
             );
         });
     }
@@ -175,7 +175,76 @@ public function getStats(int $days = 7): array
                 'avg_speakers_detected' => round($totals->avg_speakers ?? 0, 1)
             ],
             'daily' => $dailyStats,
-            'top_errors' => $topErrors
+            'top_errors' => $topErrors,
+            'stages' => $this->getStageBreakdown($startDate)
+        ];
+    }
+
+    /**
+     * Agrège les profils par étape (clé "profile" du JSON de diarize_audio.py)
+     *
+     * Indique pour chaque étape le temps moyen, et combien de fois elle a été
+     * le goulot d'étranglement, ainsi que les enregistrements les plus lents.
+     */
+    public function getStageBreakdown(\DateTimeInterface $since, int $limit = 500): array
+    {
+        $logs = DiarizationLog::withoutGlobalScopes()
+            ->where('created_at', '>=', $since)
+            ->where('status', 'success')
+            ->orderByDesc('created_at')
+            ->limit($limit)
+            ->get(['id', 'audio_record_id', 'duration_ms', 'audio_duration_seconds', 'raw_output']);
+
+        $stages = [];
+        $slowest = [];
+
+        foreach ($logs as $log) {
+            $profile = $log->raw_output['profile'] ?? null;
+            if (empty($profile['stages'])) {
+                continue;
+            }
+
+            foreach ($profile['stages'] as $stage) {
+                $name = $stage['name'];
+                $stages[$name] ??= ['runs' => 0, 'wall_seconds' => 0.0, 'cpu_seconds' => 0.0, 'peak_rss_mb' => 0.0, 'bottleneck_count' => 0];
+                $stages[$name]['runs']++;
+                $stages[$name]['wall_seconds'] += $stage['wall_seconds'];
+                $stages[$name]['cpu_seconds'] += $stage['cpu_seconds'];
+                $stages[$name]['peak_rss_mb'] = max($stages[$name]['peak_rss_mb'], $stage['peak_rss_mb']);
+            }
+
+            $bottleneck = $profile['bottleneck'] ?? null;
+            if ($bottleneck !== null && isset($stages[$bottleneck])) {
+                $stages[$bottleneck]['bottleneck_count']++;
+            }
+
+            $slowest[] = [
+                'id' => $log->id,
+                'audio_record_id' => $log->audio_record_id,
+                'audio_duration_seconds' => $log->audio_duration_seconds,
+                'total_wall_seconds' => $profile['total_wall_seconds'] ?? null,
+                'bottleneck' => $bottleneck,
+            ];
+        }
+
+        $breakdown = [];
+        foreach ($stages as $name => $stage) {
+            $breakdown[] = [
+                'stage' => $name,
+                'runs' => $stage['runs'],
+                'avg_wall_seconds' => round($stage['wall_seconds'] / $stage['runs'], 2),
+                'avg_cpu_seconds' => round($stage['cpu_seconds'] / $stage['runs'], 2),
+                'max_peak_rss_mb' => round($stage['peak_rss_mb'], 1),
+                'bottleneck_count' => $stage['bottleneck_count'],
+            ];
+        }
+
+        usort($slowest, fn ($a, $b) => ($b['total_wall_seconds'] ?? 0) <=> ($a['total_wall_seconds'] ?? 0));
+
+        return [
+            'profiled_runs' => count($slowest),
+            'breakdown' => $breakdown,
+            'slowest' => array_slice($slowest, 0, 5),
         ];
     }
 
@@ -275,4 +344,33 @@ public function getHealthSummary(): array
             'checked_at' => now()->toISOString()
         ];
     }
+
+    /**
+     * Métriques mesurées par les scripts Python eux-mêmes (scripts/metrics_store.py)
+     *
+     * Quantiles p50/p95/p99 du facteur temps réel, du chargement du modèle et du pic
+     * de RSS par script et par modèle, sur une fenêtre glissante.
+     *
+     * @return array|null null si la base de métriques est illisible
+     */
+    public function getInferenceMetrics(int $hours = 24): ?array
+    {
+        $output = [];
+        $returnCode = 0;
+        exec(sprintf(
+            'python3 %s summary --hours %d 2>/dev/null',
+            escapeshellarg(base_path('scripts/metrics_store.py')),
+            $hours
+        ), $output, $returnCode);
+
+        $metrics = json_decode(implode("\n", $output), true);
+
+        if ($returnCode !== 0 || !is_array($metrics)) {
+            Log::warning('[DIARIZATION] Métriques d\'inférence indisponibles', ['return_code' => $returnCode]);
+
+            return null;
+        }
+
+        return $metrics['models'];
+    }
 }
@@ -14,11 +14,21 @@
  */
 class DiarizationService
 {
+    /**
+     * Suffixe de la forme d'onde décodée conservée à côté d'un enregistrement (scripts/audio_io.py)
+     */
+    public const WAVEFORM_SUFFIX = '.16k.npy';
+
     private ?DiarizationMonitoringService $monitoringService = null;
 
-    public function __construct(?DiarizationMonitoringService $monitoringService = null)
-    {
+    private InferenceSchedulerService $scheduler;
+
+    public function __construct(
+        ?DiarizationMonitoringService $monitoringService = null,
+        ?InferenceSchedulerService $scheduler = null
+    ) {
         $this->monitoringService = $monitoringService ?? app(DiarizationMonitoringService::class);
+        $this->scheduler = $scheduler ?? app(InferenceSchedulerService::class);
     }
 
     /**
@@ -38,6 +48,12 @@ public function isAvailable(): bool
             return $available;
         }
 
+        // Un serveur pyannote prêt implique que la diarisation est disponible
+        $serverStatus = $this->serverStatus();
+        if ($serverStatus !== null && ($serverStatus['ready'] ?? false)) {
+            return $available = true;
+        }
+
         // Vérifier si Python et pyannote sont disponibles
         exec('python3 -c "import pyannote.audio" 2>&1', $output, $returnCode);
         $available = ($returnCode === 0);
@@ -63,7 +79,7 @@ public function diarizeWithMonitoring(string $audioPath, array $context = []): a
         $startTime = microtime(true);
         $fileSize = file_exists($audioPath) ? filesize($audioPath) : null;
 
-        $result = $this->diarize($audioPath);
+        $result = $this->diarize($audioPath, $context['user_id'] ?? null);
 
         $durationMs = (int) ((microtime(true) - $startTime) * 1000);
 
@@ -119,7 +135,13 @@ public function updateAudioRecordWithDiarization(AudioRecord $audioRecord, array
         ]);
     }
 
-    public function diarize(string $audioPath): array
+    /**
+     * Diarise un enregistrement et identifie le courtier
+     *
+     * @param int|null $advisorId Utilisateur (courtier) de l'enregistrement: son empreinte
+     *                            vocale identifie le courtier et est enrichie à chaque passage
+     */
+    public function diarize(string $audioPath, ?int $advisorId = null): array
     {
         // Vérifier si pyannote est disponible
         if (!$this->isAvailable()) {
@@ -156,87 +178,50 @@ public function diarize(string $audioPath): array
                 mkdir($tempDir, 0755, true);
             }
 
-            // Construire la commande Python
-            $scriptPath = base_path('scripts/diarize_audio.py');
-
-            // SECURITE: Ne pas passer le token dans la ligne de commande (visible dans ps aux)
-            // Utiliser proc_open avec le paramètre env pour passer les variables d'environnement
-            $command = sprintf(
-                'python3 %s %s %s',
-                escapeshellarg($scriptPath),
-                escapeshellarg($audioPath),
-                escapeshellarg($outputJson)
-            );
-
-            Log::info('[DIARIZATION] Commande', ['command' => $command]);
+            // Exécuter la diarisation avec timeout. Le script reçoit une deadline un peu
+            // avant le timeout: il allège la segmentation ou écrit un résultat partiel
+            $timeout = (int) config('services.pyannote.timeout', 300);
+            $deadline = time() + max(1, $timeout - (int) config('services.pyannote.deadline_margin', 15));
+            $progressFile = preg_replace('/\.json$/', '.progress.ndjson', $outputJson);
 
-            // Préparer l'environnement sécurisé (token non visible dans ps aux)
-            $hfToken = config('services.huggingface.token') ?: env('HUGGINGFACE_TOKEN');
-            $processEnv = array_merge($_ENV, $_SERVER, [
-                'HUGGINGFACE_TOKEN' => $hfToken ?? '',
-                'HOME' => $_SERVER['HOME'] ?? '/tmp',
-                'PATH' => $_SERVER['PATH'] ?? '/usr/local/bin:/usr/bin:/bin',
-            ]);
-            // Nettoyer les variables qui ne sont pas des strings
-            $processEnv = array_filter($processEnv, fn($v) => is_string($v));
-
-            // Exécuter la diarisation avec timeout (5 minutes max)
-            $timeout = 300; // 5 minutes
-            $descriptors = [
-                0 => ['pipe', 'r'],
-                1 => ['pipe', 'w'],
-                2 => ['pipe', 'w']
-            ];
+            // Utiliser le serveur pyannote s'il tourne (pipeline déjà chargé)
+            $serverResponse = $this->diarizeViaServer($audioPath, $outputJson, $timeout, $advisorId, $deadline, $progressFile);
 
-            // SECURITE: Passer l'environnement via le 5ème paramètre de proc_open
-            $process = proc_open($command, $descriptors, $pipes, null, $processEnv);
+            if ($serverResponse !== null) {
+                $timedOut = $serverResponse['timed_out'] ?? false;
+                $output = array_filter([$serverResponse['error'] ?? null]);
+                $returnCode = ($serverResponse['success'] ?? false) ? 0 : 1;
+            } else {
+                $process = $this->runDiarizationScript(
+                    'diarize_audio.py',
+                    [
+                        $audioPath, $outputJson, ...$this->advisorArguments($advisorId),
+                        '--deadline', (string) $deadline, '--progress', $progressFile,
+                    ],
+                    $timeout
+                );
 
-            if (!is_resource($process)) {
-                throw new \Exception('Impossible de démarrer le processus de diarisation');
+                $timedOut = $process['timed_out'];
+                $output = $process['output'];
+                $returnCode = $process['return_code'];
             }
 
-            // Fermer stdin
-            fclose($pipes[0]);
-
-            // Lire stdout et stderr avec timeout
-            stream_set_blocking($pipes[1], false);
-            stream_set_blocking($pipes[2], false);
-
-            $output = [];
-            $startTime = time();
-
-            while (true) {
-                $status = proc_get_status($process);
-
-                if (!$status['running']) {
-                    break;
-                }
-
-                if ((time() - $startTime) > $timeout) {
-                    proc_terminate($process, 9);
-                    fclose($pipes[1]);
-                    fclose($pipes[2]);
-                    proc_close($process);
-
-                    Log::error('[DIARIZATION] Timeout dépassé', ['timeout' => $timeout]);
-                    return [
-                        'success' => false,
-                        'client_segments' => [],
-                        'error' => "Timeout de diarisation dépassé ({$timeout}s)"
-                    ];
-                }
+            $lastProgress = $this->lastProgressEvent($progressFile);
+            @unlink($progressFile);
 
-                usleep(100000); // 100ms
+            if ($timedOut && !file_exists($outputJson)) {
+                Log::error('[DIARIZATION] Timeout dépassé', [
+                    'timeout' => $timeout,
+                    'via_server' => $serverResponse !== null,
+                    'last_progress' => $lastProgress
+                ]);
+                return [
+                    'success' => false,
+                    'client_segments' => [],
+                    'error' => "Timeout de diarisation dépassé ({$timeout}s)"
+                ];
             }
 
-            $stdout = stream_get_contents($pipes[1]);
-            $stderr = stream_get_contents($pipes[2]);
-            $output = array_filter(explode("\n", $stdout . $stderr));
-
-            fclose($pipes[1]);
-            fclose($pipes[2]);
-            $returnCode = proc_close($process);
-
             // Lire les résultats
             if (!file_exists($outputJson)) {
                 Log::error('[DIARIZATION] Fichier de résultats non créé', [
@@ -258,17 +243,38 @@ public function diarize(string $audioPath): array
 
             if (!$result['success']) {
                 Log::error('[DIARIZATION] Échec de la diarisation', [
-                    'error' => $result['error'] ?? 'Erreur inconnue'
+                    'error' => $result['error'] ?? 'Erreur inconnue',
+                    'last_progress' => $lastProgress
                 ]);
 
                 return $result;
             }
 
+            if ($result['partial'] ?? false) {
+                // Deadline atteinte: régions de parole sans locuteur, toutes considérées comme client
+                Log::warning('⏱️ [DIARIZATION] Résultat partiel (deadline atteinte)', [
+                    'stage' => $result['partial_stage'] ?? null,
+                    'client_segments' => count($result['client_segments']),
+                    'client_duration' => $result['stats']['client_duration'] ?? 0,
+                    'last_progress' => $lastProgress
+                ]);
+
+                return $result;
+            }
+
+            if (isset($result['degraded'])) {
+                Log::warning('⏱️ [DIARIZATION] Segmentation allégée pour tenir la deadline', $result['degraded']);
+            }
+
             Log::info('✅ [DIARIZATION] Diarisation réussie', [
                 'total_speakers' => $result['total_speakers'] ?? 'N/A',
                 'client_segments' => count($result['client_segments']),
                 'client_duration' => $result['stats']['client_duration'] ?? 0,
-                'courtier_duration' => $result['stats']['courtier_duration'] ?? 0
+                'courtier_duration' => $result['stats']['courtier_duration'] ?? 0,
+                'courtier_source' => $result['courtier_source'] ?? 'heuristic',
+                'windows' => $result['windows']['count'] ?? null,
+                'precheck' => $result['precheck']['path'] ?? null,
+                'precheck_confidence' => $result['precheck']['confidence'] ?? null,
             ]);
 
             return $result;
@@ -287,6 +293,384 @@ public function diarize(string $audioPath): array
         }
     }
 
+    /**
+     * Diarise et transcrit en une seule passe (transcribe_speakers.py)
+     *
+     * L'audio est décodé une fois, diarisé puis transcrit par Whisper sur le
+     * fichier complet ; chaque segment est attribué à son locuteur. Évite
+     * l'extraction ffmpeg de l'audio client et les fichiers intermédiaires.
+     *
+     * @param int|null $advisorId Utilisateur (courtier) de l'enregistrement
+     * @return array{success: bool, client_text?: string, segments?: array, error?: string}
+     */
+    public function diarizeAndTranscribe(string $audioPath, ?int $advisorId = null): array
+    {
+        if (!$this->isAvailable()) {
+            return [
+                'success' => false,
+                'client_segments' => [],
+                'error' => 'Pyannote non disponible',
+                'fallback' => true
+            ];
+        }
+
+        if (!file_exists($audioPath)) {
+            Log::error('[DIARIZATION] Fichier audio introuvable', ['path' => $audioPath]);
+            return [
+                'success' => false,
+                'client_segments' => [],
+                'error' => 'Fichier audio introuvable'
+            ];
+        }
+
+        try {
+            $tempDir = storage_path('app/temp');
+            if (!is_dir($tempDir)) {
+                mkdir($tempDir, 0755, true);
+            }
+
+            $outputJson = $tempDir . '/diarization_' . bin2hex(random_bytes(8)) . '.json';
+            $timeout = (int) config('services.pyannote.speaker_transcript_timeout', 900);
+
+            // Modèle auto: choisi par le script sur le temps restant après la diarisation
+            $model = env('WHISPER_MODEL', 'base');
+            $deadline = $model === 'auto'
+                ? ['--deadline', (string) (time() + max(1, $timeout - (int) config('services.pyannote.deadline_margin', 15)))]
+                : [];
+
+            $process = $this->runDiarizationScript(
+                'transcribe_speakers.py',
+                [$audioPath, $outputJson, $model, ...$this->advisorArguments($advisorId), ...$deadline],
+                $timeout
+            );
+
+            if ($process['timed_out']) {
+                Log::error('[DIARIZATION] Timeout transcription par locuteur', ['timeout' => $timeout]);
+                return [
+                    'success' => false,
+                    'client_segments' => [],
+                    'error' => "Timeout de transcription par locuteur dépassé ({$timeout}s)"
+                ];
+            }
+
+            if (!file_exists($outputJson)) {
+                return [
+                    'success' => false,
+                    'client_segments' => [],
+                    'error' => 'Échec de la transcription par locuteur: ' . implode("\n", $process['output'])
+                ];
+            }
+
+            $result = json_decode(file_get_contents($outputJson), true);
+            @unlink($outputJson);
+
+            if ($result['success'] ?? false) {
+                Log::info('✅ [DIARIZATION] Transcription par locuteur réussie', [
+                    'total_speakers' => $result['total_speakers'] ?? 'N/A',
+                    'segments' => count($result['segments'] ?? []),
+                    'client_chars' => strlen($result['client_text'] ?? ''),
+                    'courtier_source' => $result['courtier_source'] ?? 'heuristic',
+                    'windows' => $result['windows']['count'] ?? null,
+                    'precheck' => $result['precheck']['path'] ?? null,
+                    'precheck_confidence' => $result['precheck']['confidence'] ?? null,
+                ]);
+            }
+
+            return $result;
+
+        } catch (\Exception $e) {
+            Log::error('[DIARIZATION] Exception transcription par locuteur', [
+                'error' => $e->getMessage()
+            ]);
+
+            return [
+                'success' => false,
+                'client_segments' => [],
+                'error' => $e->getMessage()
+            ];
+        }
+    }
+
+    /**
+     * Traite les chunks d'une session d'enregistrement arrivés depuis le dernier appel
+     *
+     * Chaque chunk est diarisé et transcrit une seule fois ; l'état (locuteurs,
+     * contexte Whisper, segments) est conservé dans le dossier de la session.
+     */
+    public function advanceStreamingSession(string $sessionDir): bool
+    {
+        if (!is_dir($sessionDir)) {
+            return false;
+        }
+
+        $timeout = (int) config('services.pyannote.speaker_transcript_timeout', 900);
+        $process = $this->runDiarizationScript('stream_session.py', ['advance', $sessionDir], $timeout);
+
+        if ($process['timed_out'] || $process['return_code'] !== 0) {
+            Log::warning('[DIARIZATION] Échec du traitement incrémental', [
+                'session_dir' => $sessionDir,
+                'timed_out' => $process['timed_out'],
+                'output' => implode("\n", $process['output'])
+            ]);
+            return false;
+        }
+
+        return true;
+    }
+
+    /**
+     * Termine une session incrémentale: traite le dernier chunk et assemble le résultat
+     *
+     * @return array Même format que diarizeAndTranscribe()
+     */
+    public function finalizeStreamingSession(string $sessionDir, int $totalChunks): array
+    {
+        if (!is_dir($sessionDir)) {
+            return ['success' => false, 'client_segments' => [], 'error' => 'Dossier de session introuvable'];
+        }
+
+        $outputJson = storage_path('app/temp/diarization_' . bin2hex(random_bytes(8)) . '.json');
+        $tempDir = dirname($outputJson);
+        if (!is_dir($tempDir)) {
+            mkdir($tempDir, 0755, true);
+        }
+
+        $timeout = (int) config('services.pyannote.speaker_transcript_timeout', 900);
+        $process = $this->runDiarizationScript(
+            'stream_session.py',
+            ['finalize', $sessionDir, $outputJson, '--total-chunks', (string) $totalChunks],
+            $timeout
+        );
+
+        if ($process['timed_out'] || !file_exists($outputJson)) {
+            return [
+                'success' => false,
+                'client_segments' => [],
+                'error' => $process['timed_out']
+                    ? "Timeout de finalisation incrémentale dépassé ({$timeout}s)"
+                    : 'Échec de la finalisation incrémentale: ' . implode("\n", $process['output'])
+            ];
+        }
+
+        $result = json_decode(file_get_contents($outputJson), true);
+        @unlink($outputJson);
+
+        return $result ?? ['success' => false, 'client_segments' => [], 'error' => 'Résultat illisible'];
+    }
+
+    /**
+     * Exécute un script Python du dossier scripts/ dans un nouveau processus
+     *
+     * @param string $script Nom du script (ex: diarize_audio.py)
+     * @param array $arguments Arguments positionnels
+     * @return array{timed_out: bool, output: array, return_code: int}
+     */
+    private function runDiarizationScript(string $script, array $arguments, int $timeout): array
+    {
+        // Construire la commande Python (derrière l'ordonnanceur: créneau CPU/RAM, threads du job)
+        // SECURITE: Ne pas passer le token dans la ligne de commande (visible dans ps aux)
+        // Utiliser proc_open avec le paramètre env pour passer les variables d'environnement
+        $command = $this->scheduler->command($script, $arguments, null, $timeout);
+
+        Log::info('[DIARIZATION] Commande', ['command' => $command]);
+
+        // Préparer l'environnement sécurisé (token non visible dans ps aux)
+        $hfToken = config('services.huggingface.token') ?: env('HUGGINGFACE_TOKEN');
+        $processEnv = array_merge($_ENV, $_SERVER, [
+            'HUGGINGFACE_TOKEN' => $hfToken ?? '',
+            'HOME' => $_SERVER['HOME'] ?? '/tmp',
+            'PATH' => $_SERVER['PATH'] ?? '/usr/local/bin:/usr/bin:/bin',
+        ]);
+        // Nettoyer les variables qui ne sont pas des strings
+        $processEnv = array_filter($processEnv, fn($v) => is_string($v));
+
+        $descriptors = [
+            0 => ['pipe', 'r'],
+            1 => ['pipe', 'w'],
+            2 => ['pipe', 'w']
+        ];
+
+        // SECURITE: Passer l'environnement via le 5ème paramètre de proc_open
+        $process = proc_open($command, $descriptors, $pipes, null, $processEnv);
+
+        if (!is_resource($process)) {
+            throw new \Exception('Impossible de démarrer le processus de diarisation');
+        }
+
+        // Fermer stdin
+        fclose($pipes[0]);
+
+        // Lire stdout et stderr avec timeout
+        stream_set_blocking($pipes[1], false);
+        stream_set_blocking($pipes[2], false);
+
+        $startTime = time();
+
+        while (true) {
+            $status = proc_get_status($process);
+
+            if (!$status['running']) {
+                break;
+            }
+
+            if ((time() - $startTime) > $timeout) {
+                proc_terminate($process, 9);
+                fclose($pipes[1]);
+                fclose($pipes[2]);
+                proc_close($process);
+
+                return ['timed_out' => true, 'output' => [], 'return_code' => -1];
+            }
+
+            usleep(100000); // 100ms
+        }
+
+        $stdout = stream_get_contents($pipes[1]);
+        $stderr = stream_get_contents($pipes[2]);
+        $output = array_filter(explode("\n", $stdout . $stderr));
+
+        fclose($pipes[1]);
+        fclose($pipes[2]);
+        $returnCode = proc_close($process);
+
+        return ['timed_out' => false, 'output' => $output, 'return_code' => $returnCode];
+    }
+
+    /**
+     * Dernier événement de progression NDJSON écrit par diarize_audio.py (--progress)
+     */
+    private function lastProgressEvent(string $progressFile): ?array
+    {
+        if (!is_file($progressFile)) {
+            return null;
+        }
+
+        $lines = file($progressFile, FILE_IGNORE_NEW_LINES | FILE_SKIP_EMPTY_LINES) ?: [];
+
+        return $lines ? json_decode(end($lines), true) : null;
+    }
+
+    /**
+     * Arguments identifiant le courtier attendu (empreinte vocale)
+     */
+    private function advisorArguments(?int $advisorId): array
+    {
+        return $advisorId !== null ? ['--advisor-id', (string) $advisorId] : [];
+    }
+
+    /**
+     * Diarise via le serveur pyannote persistant (diarize_audio.py --serve)
+     *
+     * @return array|null Réponse du serveur, ou null si aucun serveur prêt
+     */
+    private function diarizeViaServer(
+        string $audioPath,
+        string $outputJson,
+        int $timeout,
+        ?int $advisorId = null,
+        ?int $deadline = null,
+        ?string $progressFile = null
+    ): ?array
+    {
+        $status = $this->serverStatus();
+
+        if ($status === null || !($status['ready'] ?? false)) {
+            return null;
+        }
+
+        Log::info('[DIARIZATION] Envoi au serveur pyannote', [
+            'queue_depth' => $status['queue_depth'] ?? 0,
+            'busy' => $status['busy'] ?? false,
+        ]);
+
+        return $this->sendServerRequest([
+            'cmd' => 'diarize',
+            'audio_file' => realpath($audioPath) ?: $audioPath,
+            'output_json' => $outputJson,
+            'deadline' => $deadline ?? time() + $timeout,
+            'progress_file' => $progressFile,
+            'advisor_id' => $advisorId !== null ? (string) $advisorId : null,
+        ], $timeout);
+    }
+
+    /**
+     * Statut du serveur pyannote (prêt, profondeur de file, jobs traités)
+     *
+     * @return array|null null si aucun serveur n'écoute
+     */
+    public function serverStatus(): ?array
+    {
+        return $this->sendServerRequest(['cmd' => 'status'], 2);
+    }
+
+    /**
+     * Supprime l'empreinte vocale d'un utilisateur (droit à l'effacement)
+     *
+     * @return bool false si la suppression a échoué (l'absence d'empreinte n'est pas une erreur)
+     */
+    public function forgetVoiceprint(int $userId): bool
+    {
+        $output = [];
+        $returnCode = 0;
+        exec(sprintf(
+            'python3 %s forget %d 2>/dev/null',
+            escapeshellarg(base_path('scripts/voiceprints.py')),
+            $userId
+        ), $output, $returnCode);
+
+        $result = json_decode(implode("\n", $output), true);
+
+        if (!is_array($result) || !($result['success'] ?? false)) {
+            Log::error('[DIARIZATION] Suppression de l\'empreinte vocale impossible', [
+                'user_id' => $userId,
+                'return_code' => $returnCode,
+            ]);
+
+            return false;
+        }
+
+        Log::info('[DIARIZATION] Empreinte vocale supprimée', [
+            'user_id' => $userId,
+            'deleted' => $result['deleted'] ?? false,
+        ]);
+
+        return true;
+    }
+
+    /**
+     * Envoie une requête JSON au serveur pyannote et lit la réponse
+     */
+    private function sendServerRequest(array $request, int $timeout): ?array
+    {
+        $socketPath = config('services.pyannote.server_socket');
+
+        if (empty($socketPath) || !file_exists($socketPath)) {
+            return null;
+        }
+
+        $connection = @stream_socket_client('unix://' . $socketPath, $errno, $errstr, 2);
+
+        if (!$connection) {
+            return null;
+        }
+
+        stream_set_timeout($connection, $timeout);
+        fwrite($connection, json_encode($request) . "\n");
+        $line = fgets($connection);
+        $meta = stream_get_meta_data($connection);
+        fclose($connection);
+
+        if ($meta['timed_out']) {
+            return ['success' => false, 'timed_out' => true];
+        }
+
+        if ($line === false) {
+            return null;
+        }
+
+        return json_decode($line, true);
+    }
+
     /**
      * Extrait les segments audio du client depuis un fichier audio
      *
@@ -319,8 +703,8 @@ public function extractClientAudio(string $audioPath, array $segments): ?string
             $filterComplexStr = implode(';', $filterComplex);
 
             $command = sprintf(
-                'ffmpeg -i %s -filter_complex %s -map "[out]" %s 2>&1',
-                escapeshellarg($audioPath),
+                'ffmpeg %s -filter_complex %s -map "[out]" %s 2>&1',
+                $this->ffmpegInput($audioPath),
                 escapeshellarg($filterComplexStr),
                 escapeshellarg($outputPath)
             );
@@ -351,12 +735,70 @@ public function extractClientAudio(string $audioPath, array $segments): ?string
     }
 
     /**
-     * Nettoie les fichiers temporaires
+     * Entrée ffmpeg: la forme d'onde déjà décodée par les scripts Python si elle existe
+     *
+     * Le fichier <audio>.16k.npy (scripts/audio_io.py) contient des échantillons
+     * float32 little-endian mono à 16 kHz après l'en-tête .npy: ffmpeg le lit en
+     * brut sans redécoder l'enregistrement d'origine.
+     */
+    private function ffmpegInput(string $audioPath): string
+    {
+        $waveformPath = $audioPath . self::WAVEFORM_SUFFIX;
+
+        if (is_file($waveformPath) && filemtime($waveformPath) >= filemtime($audioPath)) {
+            $headerLength = $this->npyHeaderLength($waveformPath);
+
+            if ($headerLength !== null) {
+                return sprintf(
+                    '-f f32le -ar 16000 -ac 1 -skip_initial_bytes %d -i %s',
+                    $headerLength,
+                    escapeshellarg($waveformPath)
+                );
+            }
+        }
+
+        return '-i ' . escapeshellarg($audioPath);
+    }
+
+    /**
+     * Taille de l'en-tête d'un fichier .npy float32 little-endian, ou null si le format diffère
+     */
+    private function npyHeaderLength(string $path): ?int
+    {
+        $handle = @fopen($path, 'rb');
+        if ($handle === false) {
+            return null;
+        }
+
+        $prefix = fread($handle, 12);
+        if (strlen($prefix) < 12 || substr($prefix, 0, 6) !== "\x93NUMPY") {
+            fclose($handle);
+            return null;
+        }
+
+        // Version 1: longueur sur 2 octets, versions 2 et 3: sur 4 octets
+        $major = ord($prefix[6]);
+        $length = $major === 1
+            ? 10 + unpack('v', substr($prefix, 8, 2))[1]
+            : 12 + unpack('V', substr($prefix, 8, 4))[1];
+        $header = fread($handle, $length - strlen($prefix));
+        fclose($handle);
+
+        if (strpos($prefix . $header, "'<f4'") === false || strpos($header, "'fortran_order': False") === false) {
+            return null;
+        }
+
+        return $length;
+    }
+
+    /**
+     * Nettoie les fichiers temporaires (et la forme d'onde décodée associée)
      */
     public function cleanup(string $audioPath): void
     {
         if (file_exists($audioPath) && strpos($audioPath, '/temp/') !== false) {
             @unlink($audioPath);
+            @unlink($audioPath . self::WAVEFORM_SUFFIX);
             Log::info('🗑️ [DIARIZATION] Fichier temporaire supprimé', ['path' => $audioPath]);
         }
     }
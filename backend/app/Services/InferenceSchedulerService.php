@@ -0,0 +1,108 @@
+<?php
+
+namespace App\Services;
+
+use Illuminate\Support\Facades\Log;
+
+/**
+ * Ordonnancement des scripts d'inférence Python (scripts/job_scheduler.py)
+ *
+ * Les scripts sont lancés derrière un wrapper qui attend un créneau dans le
+ * budget de cœurs et de RAM de l'hôte, fixe le nombre de threads du job et
+ * limite le nombre de jobs simultanés par modèle.
+ */
+class InferenceSchedulerService
+{
+    public function isEnabled(): bool
+    {
+        return (bool) config('services.scheduler.enabled', true);
+    }
+
+    /**
+     * Type de job (et modèle) utilisé pour le plafond de concurrence et l'estimation RAM
+     */
+    public function kindFor(string $script, ?string $model = null): string
+    {
+        $model ??= env('WHISPER_MODEL', 'base');
+
+        return match ($script) {
+            'diarize_audio.py' => 'diarization',
+            'transcribe_speakers.py' => "speaker_transcript:{$model}",
+            'stream_session.py' => "stream:{$model}",
+            'whisper_transcribe.py' => "whisper:{$model}",
+            default => pathinfo($script, PATHINFO_FILENAME),
+        };
+    }
+
+    /**
+     * Construit la commande shell d'un script Python, précédée du wrapper d'ordonnancement
+     *
+     * L'attente d'un créneau compte dans le timeout de l'appelant: elle est bornée sous ce
+     * timeout (maxWait) pour qu'une file trop longue sorte en code 75 « Aucun créneau libre »
+     * au lieu d'être tuée comme un timeout d'inférence.
+     *
+     * @param string $script Nom du script (ex: diarize_audio.py)
+     * @param array $arguments Arguments positionnels
+     * @param int|null $timeout Timeout (s) appliqué par l'appelant au processus complet
+     */
+    public function command(string $script, array $arguments, ?string $model = null, ?int $timeout = null): string
+    {
+        $command = 'python3 ' . implode(' ', array_map('escapeshellarg', [base_path('scripts/' . $script), ...$arguments]));
+
+        if (!$this->isEnabled()) {
+            return $command;
+        }
+
+        $maxWait = $this->maxWait($timeout);
+
+        return sprintf(
+            'python3 %s run %s%s -- %s',
+            escapeshellarg(base_path('scripts/job_scheduler.py')),
+            $maxWait !== null ? '--max-wait ' . $maxWait . ' ' : '',
+            escapeshellarg($this->kindFor($script, $model)),
+            $command
+        );
+    }
+
+    /**
+     * Attente max dans la file pour un processus limité à $timeout secondes
+     *
+     * Part services.scheduler.max_wait_share du timeout, plafonnée par SCHEDULER_MAX_WAIT
+     * s'il est défini: le reste du timeout est garanti à l'inférence.
+     *
+     * @return int|null null = attente de SCHEDULER_MAX_WAIT (pas de timeout côté appelant)
+     */
+    public function maxWait(?int $timeout): ?int
+    {
+        if ($timeout === null || $timeout <= 0) {
+            return null;
+        }
+
+        $maxWait = max(1, (int) floor($timeout * (float) config('services.scheduler.max_wait_share', 0.5)));
+        $configured = (int) config('services.scheduler.max_wait', 0);
+
+        return $configured > 0 ? min($configured, $maxWait) : $maxWait;
+    }
+
+    /**
+     * Jobs en cours / en attente et temps d'attente par type de job
+     *
+     * @return array|null null si l'état de l'ordonnanceur est illisible
+     */
+    public function status(): ?array
+    {
+        $output = [];
+        $returnCode = 0;
+        exec('python3 ' . escapeshellarg(base_path('scripts/job_scheduler.py')) . ' status 2>/dev/null', $output, $returnCode);
+
+        $status = json_decode(implode("\n", $output), true);
+
+        if ($returnCode !== 0 || !is_array($status)) {
+            Log::warning('[SCHEDULER] Statut indisponible', ['return_code' => $returnCode]);
+
+            return null;
+        }
+
+        return $status;
+    }
+}
@@ -10,36 +10,57 @@
  *
  * Permet de vérifier la disponibilité du système de diarisation
  * et de mettre en cache le résultat pour éviter des vérifications répétées
+ *
+ * Deux niveaux:
+ * - rapide (défaut): paquets installés, modèles en cache disque, token,
+ *   sans importer torch (moins d'une seconde)
+ * - approfondi: chargement du pipeline et courte inférence; le script ne le
+ *   recalcule que si le cache des modèles ou les paquets ont changé
  */
 class PyannoteHealthService
 {
     private const CACHE_KEY = 'pyannote_health_status';
+    private const DEEP_CACHE_KEY = 'pyannote_health_status_deep';
     private const CACHE_TTL = 3600; // 1 heure
 
+    private const FAST_TIMEOUT = 10;
+    private const DEEP_TIMEOUT = 300;
+
     /**
      * Vérifie si pyannote est disponible et fonctionnel
      *
      * @param bool $forceRefresh Forcer une nouvelle vérification
-     * @return array{available: bool, checks: array, errors: array, warnings: array}
+     * @param bool $deep Charger le pipeline et lancer une courte inférence
+     * @return array{available: bool, tier: string, checks: array, errors: array, warnings: array}
      */
-    public function check(bool $forceRefresh = false): array
+    public function check(bool $forceRefresh = false, bool $deep = false): array
     {
+        $cacheKey = $deep ? self::DEEP_CACHE_KEY : self::CACHE_KEY;
+
         // Retourner le cache si disponible et non forcé
-        if (!$forceRefresh && Cache::has(self::CACHE_KEY)) {
-            return Cache::get(self::CACHE_KEY);
+        if (!$forceRefresh && Cache::has($cacheKey)) {
+            return Cache::get($cacheKey);
         }
 
-        Log::info('[PYANNOTE HEALTH] Vérification de la disponibilité de pyannote...');
+        Log::info('[PYANNOTE HEALTH] Vérification de la disponibilité de pyannote...', [
+            'tier' => $deep ? 'deep' : 'fast'
+        ]);
 
-        $result = $this->runHealthCheck();
+        $result = $this->runHealthCheck($deep);
 
         // Mettre en cache le résultat
-        Cache::put(self::CACHE_KEY, $result, self::CACHE_TTL);
+        Cache::put($cacheKey, $result, self::CACHE_TTL);
+        if ($deep) {
+            // Le niveau approfondi inclut les vérifications rapides
+            Cache::put(self::CACHE_KEY, $result, self::CACHE_TTL);
+        }
 
         // Logger le résultat
         if ($result['available']) {
             Log::info('[PYANNOTE HEALTH] ✅ Pyannote disponible et fonctionnel', [
-                'checks' => array_map(fn($c) => $c['status'], $result['checks'])
+                'checks' => array_map(fn($c) => $c['status'], $result['checks']),
+                'inference_ms' => $result['checks']['inference']['inference_ms'] ?? null,
+                'duration_ms' => $result['duration_ms'] ?? null
             ]);
         } else {
             Log::warning('[PYANNOTE HEALTH] ⚠️ Pyannote non disponible', [
@@ -60,19 +81,27 @@ public function isAvailable(): bool
         return $status['available'];
     }
 
+    /**
+     * Vérification approfondie (chargement du pipeline + inférence)
+     */
+    public function deepCheck(bool $forceRefresh = false): array
+    {
+        return $this->check($forceRefresh, true);
+    }
+
     /**
      * Efface le cache et force une nouvelle vérification
      */
-    public function refresh(): array
+    public function refresh(bool $deep = false): array
     {
-        Cache::forget(self::CACHE_KEY);
-        return $this->check(true);
+        Cache::forget($deep ? self::DEEP_CACHE_KEY : self::CACHE_KEY);
+        return $this->check(true, $deep);
     }
 
     /**
      * Exécute le script Python de health check
      */
-    private function runHealthCheck(): array
+    private function runHealthCheck(bool $deep = false): array
     {
         $scriptPath = base_path('scripts/check_pyannote.py');
 
@@ -88,8 +117,9 @@ private function runHealthCheck(): array
 
         // SECURITE: Ne pas passer le token dans la ligne de commande (visible dans ps aux)
         $command = sprintf(
-            'python3 %s',
-            escapeshellarg($scriptPath)
+            'python3 %s%s',
+            escapeshellarg($scriptPath),
+            $deep ? ' --deep' : ''
         );
 
         // Préparer l'environnement sécurisé (token non visible dans ps aux)
@@ -102,7 +132,7 @@ private function runHealthCheck(): array
         // Nettoyer les variables qui ne sont pas des strings
         $processEnv = array_filter($processEnv, fn($v) => is_string($v));
 
-        // Exécuter avec timeout de 30 secondes
+        // Exécuter avec timeout (le niveau approfondi charge le modèle)
         $descriptors = [
             0 => ['pipe', 'r'],
             1 => ['pipe', 'w'],
@@ -124,13 +154,12 @@ private function runHealthCheck(): array
 
         fclose($pipes[0]);
 
-        // Timeout de 30 secondes
         stream_set_blocking($pipes[1], false);
         stream_set_blocking($pipes[2], false);
 
         $output = '';
         $startTime = time();
-        $timeout = 30;
+        $timeout = $deep ? self::DEEP_TIMEOUT : self::FAST_TIMEOUT;
 
         while (true) {
             $status = proc_get_status($process);
@@ -148,7 +177,7 @@ private function runHealthCheck(): array
                 return [
                     'available' => false,
                     'checks' => [],
-                    'errors' => ['Health check timeout (30s)'],
+                    'errors' => ["Health check timeout ({$timeout}s)"],
                     'warnings' => [],
                     'checked_at' => now()->toISOString()
                 ];
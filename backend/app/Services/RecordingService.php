@@ -3,6 +3,7 @@
 namespace App\Services;
 
 use App\Jobs\ProcessAudioRecording;
+use App\Jobs\ProcessRecordingChunk;
 use App\Models\AudioRecord;
 use App\Models\RecordingSession;
 use Illuminate\Http\UploadedFile;
@@ -66,6 +67,11 @@ public function storeChunk(
             'total_chunks' => max($session->total_chunks, $partIndex + 1),
         ]);
 
+        // Traitement incrémental: diariser/transcrire le chunk pendant l'enregistrement
+        if (config('services.pyannote.streaming', false)) {
+            ProcessRecordingChunk::dispatch($sessionId);
+        }
+
         return $session;
     }
 
@@ -93,45 +99,26 @@ public function finalizeRecording(string $sessionId, int $userId): RecordingSess
 
             Log::info("📂 [RECORDING] {$session->total_chunks} chunks trouvés");
 
-            // Étape 1: Concaténer tous les chunks en un seul fichier audio
-            Log::info("🔗 [RECORDING] Concaténation des chunks...");
-            $concatenatedAudio = $this->concatenateChunks($chunks, $sessionId);
-
-            // Étape 2: Diarisation pour identifier courtier/client
-            Log::info("🎙️ [RECORDING] Diarisation pour séparer courtier/client...");
-            $diarizationResult = $this->diarizationService->diarize($concatenatedAudio);
-
-            $finalTranscription = '';
+            // Mode incrémental: les chunks ont déjà été traités à leur arrivée,
+            // il ne reste que le dernier à traiter puis l'assemblage
+            $finalTranscription = $this->transcribeFromStream($sessionId, $session->total_chunks);
 
-            if ($diarizationResult['success'] && !empty($diarizationResult['client_segments'])) {
-                // Diarisation réussie - ne transcrire que les segments du client
-                Log::info("✅ [RECORDING] Diarisation réussie - {$diarizationResult['stats']['client_num_segments']} segments client détectés");
+            if ($finalTranscription === null) {
+                // Étape 1: Concaténer tous les chunks en un seul fichier audio
+                Log::info("🔗 [RECORDING] Concaténation des chunks...");
+                $concatenatedAudio = $this->concatenateChunks($chunks, $sessionId);
 
-                // Extraire l'audio du client uniquement
-                $clientAudioPath = $this->diarizationService->extractClientAudio(
-                    $concatenatedAudio,
-                    $diarizationResult['client_segments']
-                );
+                // Étape 2: Diarisation + transcription en une seule passe (sans extraction ffmpeg)
+                $finalTranscription = $this->transcribeBySpeaker($concatenatedAudio, $session->user_id);
 
-                if ($clientAudioPath) {
-                    // Transcrire uniquement l'audio du client
-                    Log::info("🧠 [RECORDING] Transcription des segments client...");
-                    $finalTranscription = $this->transcribeChunk($clientAudioPath);
-
-                    // Nettoyer le fichier audio client temporaire
-                    $this->diarizationService->cleanup($clientAudioPath);
-                } else {
-                    Log::warning("⚠️ [RECORDING] Impossible d'extraire l'audio client, transcription complète");
-                    $finalTranscription = $this->transcribeChunk($concatenatedAudio);
+                if ($finalTranscription === null) {
+                    // Étape 2 (fallback): diarisation, extraction de l'audio client puis transcription
+                    $finalTranscription = $this->transcribeClientAudio($concatenatedAudio, $session->user_id);
                 }
-            } else {
-                // Diarisation échouée - transcrire tout l'audio (comportement par défaut)
-                Log::warning("⚠️ [RECORDING] Diarisation échouée, transcription de tout l'audio");
-                $finalTranscription = $this->transcribeChunk($concatenatedAudio);
-            }
 
-            // Nettoyer le fichier audio concaténé
-            $this->diarizationService->cleanup($concatenatedAudio);
+                // Nettoyer le fichier audio concaténé
+                $this->diarizationService->cleanup($concatenatedAudio);
+            }
 
             Log::info("🎉 [RECORDING] Transcription finale : " . strlen($finalTranscription) . " caractères");
 
@@ -196,6 +183,117 @@ private function getChunksInOrder(string $sessionId, int $totalChunks): array
         return $chunks;
     }
 
+    /**
+     * Termine le traitement incrémental de la session (dernier chunk + assemblage)
+     *
+     * @return string|null null si le mode incrémental est désactivé ou a échoué
+     */
+    private function transcribeFromStream(string $sessionId, int $totalChunks): ?string
+    {
+        if (!config('services.pyannote.streaming', false)) {
+            return null;
+        }
+
+        Log::info("🧩 [RECORDING] Assemblage des chunks traités en continu...");
+        $result = $this->diarizationService->finalizeStreamingSession(
+            Storage::path("recordings/{$sessionId}"),
+            $totalChunks
+        );
+
+        if (!($result['success'] ?? false) || trim($result['client_text'] ?? '') === '') {
+            Log::warning("⚠️ [RECORDING] Traitement incrémental indisponible, retour au flux complet", [
+                'error' => $result['error'] ?? null
+            ]);
+            return null;
+        }
+
+        Log::info("✅ [RECORDING] Traitement incrémental terminé - {$result['chunks_processed']} chunks");
+
+        return $result['client_text'];
+    }
+
+    /**
+     * Transcrit les segments du client en une seule passe locale
+     *
+     * L'audio est décodé une fois, diarisé et transcrit par Whisper sur le fichier
+     * complet ; seul le texte attribué au(x) client(s) est conservé.
+     *
+     * Opt-in (DIARIZATION_SPEAKER_TRANSCRIPT=true) : par défaut, le flux existant
+     * (audio client puis API OpenAI) reste utilisé.
+     *
+     * @return string|null null si la passe combinée est désactivée ou a échoué
+     */
+    private function transcribeBySpeaker(string $audioPath, ?int $advisorId = null): ?string
+    {
+        if (!config('services.pyannote.speaker_transcript', false)) {
+            return null;
+        }
+
+        Log::info("🎙️ [RECORDING] Diarisation + transcription par locuteur...");
+        $result = $this->diarizationService->diarizeAndTranscribe($audioPath, $advisorId);
+
+        if (!($result['success'] ?? false) || trim($result['client_text'] ?? '') === '') {
+            Log::warning("⚠️ [RECORDING] Transcription par locuteur indisponible, retour au flux classique", [
+                'error' => $result['error'] ?? null
+            ]);
+            return null;
+        }
+
+        Log::info("✅ [RECORDING] Transcription par locuteur réussie - " . count($result['segments']) . " segments");
+
+        return $result['client_text'];
+    }
+
+    /**
+     * Diarise, extrait l'audio du client avec ffmpeg puis le transcrit
+     */
+    private function transcribeClientAudio(string $concatenatedAudio, ?int $advisorId = null): string
+    {
+        Log::info("🎙️ [RECORDING] Diarisation pour séparer courtier/client...");
+        $diarizationResult = $this->diarizationService->diarize($concatenatedAudio, $advisorId);
+
+        if ($diarizationResult['success'] && !empty($diarizationResult['client_segments'])) {
+            // Diarisation réussie - ne transcrire que les segments du client
+            Log::info("✅ [RECORDING] Diarisation réussie - {$diarizationResult['stats']['client_num_segments']} segments client détectés");
+
+            // Décoder les segments du client par lots, sans extraire leur audio
+            if (config('services.whisper.segment_batch', true)) {
+                $finalTranscription = app(TranscriptionService::class)
+                    ->transcribeSegments($concatenatedAudio, $diarizationResult['client_segments']);
+
+                if ($finalTranscription !== null) {
+                    return $finalTranscription;
+                }
+
+                Log::warning("⚠️ [RECORDING] Transcription par segments indisponible, extraction de l'audio client");
+            }
+
+            // Extraire l'audio du client uniquement
+            $clientAudioPath = $this->diarizationService->extractClientAudio(
+                $concatenatedAudio,
+                $diarizationResult['client_segments']
+            );
+
+            if ($clientAudioPath) {
+                // Transcrire uniquement l'audio du client
+                Log::info("🧠 [RECORDING] Transcription des segments client...");
+                $finalTranscription = $this->transcribeChunk($clientAudioPath);
+
+                // Nettoyer le fichier audio client temporaire
+                $this->diarizationService->cleanup($clientAudioPath);
+
+                return $finalTranscription;
+            }
+
+            Log::warning("⚠️ [RECORDING] Impossible d'extraire l'audio client, transcription complète");
+            return $this->transcribeChunk($concatenatedAudio);
+        }
+
+        // Diarisation échouée - transcrire tout l'audio (comportement par défaut)
+        Log::warning("⚠️ [RECORDING] Diarisation échouée, transcription de tout l'audio");
+        return $this->transcribeChunk($concatenatedAudio);
+    }
+
     /**
      * Transcrit un chunk via Whisper API OpenAI
      */
@@ -22,6 +22,61 @@ public function transcribe(string $audioPath): ?string
         return $transcription;
     }
 
+    /**
+     * Transcrit uniquement les segments donnés (client_segments de la diarisation)
+     *
+     * Les segments sont décodés par lots par whisper_transcribe.py --segments, sans
+     * extraire ni réencoder l'audio du client.
+     *
+     * @param array $segments [{start, end, speaker}]
+     * @return string|null null si la transcription locale a échoué
+     */
+    public function transcribeSegments(string $audioPath, array $segments): ?string
+    {
+        $segmentsPath = storage_path('app/temp/segments_' . bin2hex(random_bytes(8)) . '.json');
+
+        try {
+            if (! is_dir(dirname($segmentsPath))) {
+                mkdir(dirname($segmentsPath), 0755, true);
+            }
+            file_put_contents($segmentsPath, json_encode(['client_segments' => array_values($segments)]));
+
+            $model = env('WHISPER_MODEL', 'base');
+            $command = app(InferenceSchedulerService::class)->command(
+                'whisper_transcribe.py',
+                [$audioPath, $model, '--segments', $segmentsPath, '--batch-size', (string) config('services.whisper.batch_size', 8), ...$this->deadlineArguments($model)],
+                $model,
+                (int) config('services.whisper.timeout', 300)
+            ) . ' 2>/dev/null';
+
+            $output = [];
+            $returnCode = 0;
+            exec($command, $output, $returnCode);
+
+            $result = json_decode(implode("\n", $output), true);
+
+            if ($returnCode !== 0 || ! is_array($result) || isset($result['error'])) {
+                throw new \Exception($result['error'] ?? 'Sortie invalide du script (code '.$returnCode.')');
+            }
+
+            Log::info('📝 Transcription Whisper locale par segments', [
+                'segments' => count($result['segments'] ?? []),
+                'batch' => $result['batch'] ?? null,
+                'real_time_factor' => $result['real_time_factor'] ?? null,
+                'decode_stats' => $result['decode_stats'] ?? null,
+            ]);
+
+            return $result['text'] ?? '';
+
+        } catch (\Throwable $e) {
+            Log::error('[Whisper Local] Segments: '.$e->getMessage());
+
+            return null;
+        } finally {
+            @unlink($segmentsPath);
+        }
+    }
+
     private function transcribeLocal(string $audioPath): ?string
     {
         try {
@@ -41,15 +96,12 @@ private function transcribeLocal(string $audioPath): ?string
 
             // Modèle à utiliser (tiny, base, small, medium, large)
             // base = bon compromis vitesse/qualité pour un POC
+            // auto = plus grand modèle qui termine avant WHISPER_TIMEOUT (mesures de l'hôte)
             $model = env('WHISPER_MODEL', 'base');
 
-            // Exécuter le script Python avec timeout de 5 minutes
-            $command = sprintf(
-                'python3 %s %s %s 2>&1',
-                escapeshellarg($scriptPath),
-                escapeshellarg($audioPath),
-                escapeshellarg($model)
-            );
+            // Exécuter le script Python derrière l'ordonnanceur (créneau CPU/RAM, threads du job)
+            $command = app(InferenceSchedulerService::class)
+                ->command('whisper_transcribe.py', [$audioPath, $model, ...$this->deadlineArguments($model)], $model, (int) config('services.whisper.timeout', 300)) . ' 2>&1';
 
             Log::info('🎤 Transcription Whisper locale', [
                 'command' => $command,
@@ -64,7 +116,8 @@ private function transcribeLocal(string $audioPath): ?string
                 throw new \Exception('Erreur lors de l\'exécution du script Python : '.implode("\n", $output));
             }
 
-            $result = json_decode(implode("\n", $output), true);
+            // Le JSON est la dernière ligne: les avertissements sur stderr (modèle inconnu) la précèdent
+            $result = json_decode(implode("\n", $output), true) ?? json_decode((string) end($output), true);
 
             if (isset($result['error'])) {
                 throw new \Exception($result['error']);
@@ -77,8 +130,23 @@ private function transcribeLocal(string $audioPath): ?string
                 'text' => $transcription,
                 'language' => $result['language'] ?? 'unknown',
                 'probability' => $result['language_probability'] ?? 0,
+                'engine' => $result['engine'] ?? null,
+                'real_time_factor' => $result['real_time_factor'] ?? null,
+                'bottleneck' => $result['profile']['bottleneck'] ?? null,
+                'decode_stats' => $result['decode_stats'] ?? null,
             ]);
 
+            if (isset($result['adaptive'])) {
+                Log::info('🎚️ Modèle Whisper adaptatif', [
+                    'model' => $result['adaptive']['model'],
+                    'decoding' => $result['adaptive']['preset'],
+                    'estimated_seconds' => $result['adaptive']['estimated_seconds'] ?? null,
+                    'available_seconds' => $result['adaptive']['available_seconds'],
+                    'rtf_source' => $result['adaptive']['rtf_source'] ?? null,
+                    'fits' => $result['adaptive']['fits'],
+                ]);
+            }
+
             return $transcription;
 
         } catch (\Throwable $e) {
@@ -88,6 +156,18 @@ private function transcribeLocal(string $audioPath): ?string
         }
     }
 
+    /**
+     * Deadline du modèle adaptatif (horodatage), calculée avant l'attente de l'ordonnanceur
+     */
+    private function deadlineArguments(string $model): array
+    {
+        if ($model !== 'auto') {
+            return [];
+        }
+
+        return ['--deadline', (string) (time() + (int) config('services.whisper.timeout', 300))];
+    }
+
     private function transcribeOpenAI(string $audioPath): ?string
     {
         try {
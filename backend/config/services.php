@@ -46,6 +46,32 @@
     'pyannote' => [
         'check_on_boot' => env('PYANNOTE_CHECK_ON_BOOT', false),
         'model' => env('PYANNOTE_MODEL', 'pyannote/speaker-diarization-3.1'),
+        'server_socket' => env('PYANNOTE_SERVER_SOCKET', '/tmp/pyannote_server.sock'),
+        'timeout' => env('DIARIZATION_TIMEOUT', 300),
+        'deadline_margin' => env('DIARIZATION_DEADLINE_MARGIN', 15),
+        // Opt-in : diarisation + Whisper local en une passe (transcribe_speakers.py) au lieu
+        // de l'extraction de l'audio client puis de l'API OpenAI
+        'speaker_transcript' => env('DIARIZATION_SPEAKER_TRANSCRIPT', false),
+        'speaker_transcript_timeout' => env('DIARIZATION_SPEAKER_TRANSCRIPT_TIMEOUT', 900),
+        'streaming' => env('DIARIZATION_STREAMING', false),
+    ],
+
+    // Transcription locale des segments client par lots (whisper_transcribe.py --segments)
+    'whisper' => [
+        'segment_batch' => env('WHISPER_SEGMENT_BATCH', true),
+        'batch_size' => env('WHISPER_BATCH_SIZE', 8),
+        // Modèle adaptatif (WHISPER_MODEL=auto): temps accordé à une transcription
+        'timeout' => env('WHISPER_TIMEOUT', 300),
+    ],
+
+    // Ordonnanceur local des scripts d'inférence (scripts/job_scheduler.py)
+    'scheduler' => [
+        'enabled' => env('INFERENCE_SCHEDULER', true),
+        // Attente max dans la file (s, 0 = part du timeout seulement) et part du timeout
+        // de l'appelant qu'elle peut consommer: au-delà, le job sort en code 75 (file pleine)
+        // au lieu d'être tué comme un timeout d'inférence
+        'max_wait' => env('SCHEDULER_MAX_WAIT', 0),
+        'max_wait_share' => env('SCHEDULER_MAX_WAIT_SHARE', 0.5),
     ],
 
 ];
@@ -34,7 +34,8 @@
     ->description('Supprime les fichiers audio de plus de 30 jours (RGPD)');
 
 // Vérification de la santé de Pyannote - toutes les heures
-Schedule::command('pyannote:health --refresh')
+// (l'inférence de test n'est relancée que si les modèles ou les paquets ont changé)
+Schedule::command('pyannote:health --refresh --deep')
     ->hourly()
     ->withoutOverlapping()
     ->description('Vérifie la disponibilité du système de diarisation');
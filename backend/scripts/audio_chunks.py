@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Découpage des enregistrements longs sur les silences et recollage des transcriptions
+
+Un appel Whisper sur un rendez-vous de 90 minutes est séquentiel. Pour répartir
+le travail sur plusieurs processus, l'audio est coupé en chunks d'environ
+`chunk_seconds`, chaque coupure étant placée dans le passage le plus silencieux
+autour de la cible (pas de mot coupé en deux). Les transcriptions des chunks
+sont ensuite recollées dans l'ordre, timestamps décalés, en supprimant les
+mots répétés de part et d'autre d'une coupure.
+"""
+
+import re
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+
+# Fenêtre (s) autour de la cible dans laquelle chercher le silence
+SEARCH_WINDOW_SECONDS = 15.0
+# Trames d'énergie et lissage utilisés pour trouver le silence
+FRAME_SECONDS = 0.03
+SMOOTH_SECONDS = 0.5
+
+# Nombre maximum de mots comparés de part et d'autre d'une coupure
+MAX_BOUNDARY_WORDS = 8
+# En dessous de ce nombre, une répétition est considérée comme naturelle ("oui oui")
+MIN_REPEATED_WORDS = 2
+
+
+def plan_chunks(waveform, chunk_seconds: float, sample_rate: int = SAMPLE_RATE) -> list:
+    """
+    Calcule les bornes des chunks, coupées sur les silences
+
+    Returns:
+        list: [(start, end)] en échantillons, contigus et couvrant tout l'audio
+    """
+    total = len(waveform)
+    target = int(chunk_seconds * sample_rate)
+    if total <= target * 1.5:
+        return [(0, total)]
+
+    frame = int(FRAME_SECONDS * sample_rate)
+    num_frames = total // frame
+    frames = np.asarray(waveform[:num_frames * frame], dtype=np.float32).reshape(num_frames, frame)
+    energy = np.mean(frames ** 2, axis=1)
+
+    # Lissage: on cherche un passage silencieux, pas une trame isolée
+    width = max(1, int(SMOOTH_SECONDS / FRAME_SECONDS))
+    energy = np.convolve(energy, np.ones(width) / width, mode='same')
+
+    window = int(SEARCH_WINDOW_SECONDS / FRAME_SECONDS)
+    bounds = []
+    start = 0
+
+    while total - start > target * 1.5:
+        center = (start + target) // frame
+        low, high = max(center - window, start // frame + 1), min(center + window, num_frames - 1)
+        cut = (low + int(np.argmin(energy[low:high]))) * frame if high > low else center * frame
+        bounds.append((start, cut))
+        start = cut
+
+    bounds.append((start, total))
+    return bounds
+
+
+def _normalize(word: str) -> str:
+    return re.sub(r'[^\w]', '', word.lower())
+
+
+def drop_repeated_words(previous_text: str, text: str) -> str:
+    """
+    Retire du début de `text` les mots qui répètent la fin de `previous_text`
+
+    Whisper reprend parfois en début de chunk les derniers mots du chunk
+    précédent (mot à cheval sur la coupure, ou texte halluciné dans le silence).
+    """
+    previous = [_normalize(w) for w in previous_text.split()[-MAX_BOUNDARY_WORDS:]]
+    words = text.split()
+    head = [_normalize(w) for w in words[:MAX_BOUNDARY_WORDS]]
+
+    for size in range(min(len(previous), len(head)), MIN_REPEATED_WORDS - 1, -1):
+        if previous[-size:] == head[:size] and all(head[:size]):
+            rest = ' '.join(words[size:])
+            return f" {rest}" if rest else ''
+    return text
+
+
+def stitch_chunks(chunk_results: list, sample_rate: int = SAMPLE_RATE) -> dict:
+    """
+    Recolle les transcriptions des chunks dans l'ordre
+
+    Args:
+        chunk_results: [{"start": échantillon de début, "text", "segments"}] triés par start
+
+    Returns:
+        dict: {"text", "segments"} avec les timestamps de l'audio complet
+    """
+    segments = []
+    previous_text = ''
+    last_end = 0.0
+
+    for chunk in chunk_results:
+        offset = chunk['start'] / sample_rate
+        first = True
+
+        for segment in chunk['segments']:
+            text = segment['text']
+            if first and previous_text:
+                text = drop_repeated_words(previous_text, text)
+                if segment.get('words') and text != segment['text']:
+                    dropped = len(segment['text'].split()) - len(text.split())
+                    segment = {**segment, 'words': segment['words'][dropped:]}
+            first = False
+
+            if not text.strip():
+                continue
+
+            start = max(segment['start'] + offset, last_end)
+            end = max(segment['end'] + offset, start)
+            shifted = {**segment, 'start': start, 'end': end, 'text': text}
+            if segment.get('words'):
+                shifted['words'] = [
+                    {**word, 'start': word['start'] + offset, 'end': word['end'] + offset}
+                    for word in segment['words']
+                ]
+
+            segments.append(shifted)
+            previous_text = f"{previous_text} {text}"[-500:]
+            last_end = end
+
+    return {
+        'text': ''.join(segment['text'] for segment in segments),
+        'segments': segments
+    }
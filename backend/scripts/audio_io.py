@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Décodage audio partagé par les scripts de transcription et de diarisation
+
+L'audio est décodé une seule fois en 16 kHz mono float32 (format attendu par
+Whisper et pyannote), puis la même forme d'onde est passée aux deux modèles.
+
+La forme d'onde décodée est conservée à côté de l'enregistrement
+(<enregistrement>.16k.npy) et relue par mmap: les autres scripts, les retries
+et l'extraction ffmpeg de l'audio client ne redécodent pas le fichier
+d'origine. Ce fichier .npy peut aussi être passé directement aux scripts à la
+place de l'enregistrement. Il est supprimé avec les fichiers temporaires
+(audio:cleanup-temp) et l'audio d'origine (audio:purge-old).
+
+La sortie de ffmpeg est écrite par blocs directement dans ce fichier: la
+mémoire résidente ne grandit pas avec la durée de l'enregistrement. Sans
+cache possible (dossier en lecture seule, WAVEFORM_CACHE=0), le fichier est
+créé dans le dossier temporaire et supprimé après usage.
+
+Configuration (variables d'environnement):
+    WAVEFORM_CACHE=0            ni lecture ni écriture du fichier .16k.npy (benchmark)
+"""
+
+import os
+import struct
+import subprocess
+import tempfile
+import weakref
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+WAVEFORM_SUFFIX = '.16k.npy'
+SCRATCH_PREFIX = 'crm-ai-waveform-'
+
+# Échantillons convertis à la fois pendant le décodage (~65 s à 16 kHz)
+DECODE_BLOCK_SAMPLES = 1 << 20
+# En-tête .npy de taille fixe: réécrit en place une fois la longueur connue
+NPY_HEADER_BYTES = 128
+
+# Copie à l'écriture: pages partagées avec le cache disque tant que personne ne les modifie,
+# une écriture en place (torch) reste privée au processus et ne touche pas au fichier
+MMAP_MODE = 'c'
+
+
+def waveform_cache_enabled() -> bool:
+    return os.getenv('WAVEFORM_CACHE', '1') != '0'
+
+
+def waveform_cache_path(audio_path: str) -> str:
+    """Chemin de la forme d'onde décodée d'un enregistrement"""
+    return audio_path if audio_path.endswith(WAVEFORM_SUFFIX) else audio_path + WAVEFORM_SUFFIX
+
+
+def cached_waveform(audio_path: str):
+    """Forme d'onde décodée (mmap), ou None si absente ou plus ancienne que l'enregistrement"""
+    path = waveform_cache_path(audio_path)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(audio_path):
+            return None
+        return np.load(path, mmap_mode=MMAP_MODE)
+    except (OSError, ValueError):
+        return None
+
+
+def decode_to_file(audio_path: str, path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Décode un enregistrement directement dans un fichier .npy (fichier temporaire puis rename)
+
+    La sortie de ffmpeg est convertie par blocs de DECODE_BLOCK_SAMPLES et écrite
+    au fur et à mesure: la mémoire du processus ne dépend pas de la durée.
+
+    Returns:
+        La forme d'onde relue par mmap
+
+    Raises:
+        OSError: dossier non accessible en écriture (ou disque plein)
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_npy_header(0))
+            length = 0
+            for block in _decoded_blocks(audio_path, sample_rate):
+                block.tofile(f)
+                length += len(block)
+            # Longueur connue seulement à la fin: en-tête de taille fixe réécrit en place
+            f.seek(0)
+            f.write(_npy_header(length))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return np.load(path, mmap_mode=MMAP_MODE)
+
+
+def scratch_waveform(audio_path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Forme d'onde décodée dans un fichier temporaire (pas de cache à côté de l'enregistrement)
+
+    Le fichier est supprimé quand la forme d'onde (et toutes ses vues) n'est plus
+    référencée, ou à la sortie du processus.
+    """
+    fd, path = tempfile.mkstemp(prefix=SCRATCH_PREFIX, suffix=WAVEFORM_SUFFIX)
+    os.close(fd)
+    try:
+        waveform = decode_to_file(audio_path, path, sample_rate)
+    except BaseException:
+        _unlink(path)
+        raise
+    weakref.finalize(waveform, _unlink, path)
+    return waveform
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def load_audio(audio_path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Forme d'onde mono float32 d'un enregistrement
+
+    Accepte un enregistrement ou une forme d'onde .npy déjà décodée (16 kHz).
+    Relit la forme d'onde décodée (mmap, sans copie) si elle existe, sinon
+    décode via ffmpeg et la conserve à côté de l'enregistrement. Sans cache
+    (désactivé ou dossier en lecture seule), la forme d'onde est décodée dans
+    un fichier temporaire: elle est toujours projetée (mmap), jamais chargée
+    entière en mémoire.
+
+    Returns:
+        np.ndarray: échantillons normalisés dans [-1, 1]
+    """
+    if audio_path.endswith('.npy'):
+        return np.load(audio_path, mmap_mode=MMAP_MODE)
+
+    if sample_rate != SAMPLE_RATE:
+        return decode_audio(audio_path, sample_rate)
+
+    if waveform_cache_enabled():
+        waveform = cached_waveform(audio_path)
+        if waveform is not None:
+            return waveform
+        try:
+            return decode_to_file(audio_path, waveform_cache_path(audio_path), sample_rate)
+        except OSError:
+            pass
+
+    return scratch_waveform(audio_path, sample_rate)
+
+
+def read_samples(waveform: np.ndarray, first: int, last: int) -> np.ndarray:
+    """
+    Copie des échantillons [first, last)
+
+    Une forme d'onde projetée (np.memmap) est lue dans le fichier: les pages des
+    blocs précédents ne restent pas dans la mémoire résidente du processus.
+    """
+    first, last = max(0, first), min(max(0, last), len(waveform))
+    if isinstance(waveform, np.memmap):
+        with open(waveform.filename, 'rb') as f:
+            f.seek(waveform.offset + first * waveform.itemsize)
+            return np.fromfile(f, dtype=waveform.dtype, count=max(0, last - first))
+    return np.array(waveform[first:last])
+
+
+def decode_audio(audio_path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Décode un fichier audio en mono float32 via ffmpeg (en mémoire)
+
+    Returns:
+        np.ndarray: échantillons normalisés dans [-1, 1]
+    """
+    blocks = list(_decoded_blocks(audio_path, sample_rate))
+    return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+
+
+def _decoded_blocks(audio_path: str, sample_rate: int):
+    """Échantillons float32 décodés par ffmpeg, par blocs de DECODE_BLOCK_SAMPLES"""
+    command = [
+        'ffmpeg', '-nostdin', '-threads', '0',
+        '-i', audio_path,
+        '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(sample_rate),
+        '-'
+    ]
+
+    # stderr dans un fichier: un pipe plein bloquerait ffmpeg pendant la lecture de stdout
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            while True:
+                data = process.stdout.read(DECODE_BLOCK_SAMPLES * 2)
+                if not data:
+                    break
+                block = np.frombuffer(data[:len(data) // 2 * 2], np.int16).astype(np.float32)
+                block /= 32768.0
+                yield block
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"Échec du décodage audio: {stderr.read().decode(errors='ignore')}")
+
+
+def _npy_header(length: int) -> bytes:
+    """En-tête .npy (version 1.0) d'un vecteur float32, de taille fixe NPY_HEADER_BYTES"""
+    header = repr({'descr': np.dtype(np.float32).str, 'fortran_order': False, 'shape': (length,)})
+    # Préfixe magique + version (8 octets) et longueur de l'en-tête (2 octets)
+    size = NPY_HEADER_BYTES - 10
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', size) + (header.ljust(size - 1) + '\n').encode('latin1')
+
+
+def pyannote_input(waveform: np.ndarray, sample_rate: int = SAMPLE_RATE) -> dict:
+    """Prépare une forme d'onde déjà décodée pour un pipeline pyannote"""
+    import torch
+
+    return {
+        'waveform': torch.from_numpy(np.ascontiguousarray(waveform)).unsqueeze(0),
+        'sample_rate': sample_rate
+    }
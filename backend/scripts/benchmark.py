@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Benchmark hors ligne de whisper_transcribe.py et diarize_audio.py
+
+Génère des enregistrements synthétiques déterministes (2 ou 3 locuteurs, voix
+harmoniques modulées, tours de parole et silences tirés d'une graine fixe),
+sans accès réseau ni enregistrement client. Chaque script est lancé comme en
+production (nouveau processus) pour chaque combinaison durée / locuteurs /
+modèle / nombre de threads.
+
+Mesures par cas:
+    - cold : premier lancement (import et chargement du modèle compris)
+    - warm : médiane des lancements suivants, et temps d'inférence seul
+             (hors import et chargement, d'après la clé "profile")
+    - real-time factor, pic mémoire du processus (os.wait4), nombre de segments
+
+Les résultats sont écrits en JSON et CSV, et comparés à une référence
+(--baseline): une régression au-delà de la tolérance fait échouer la commande.
+
+Usage:
+    python3 benchmark.py [--minutes 1,10,60,120] [--speakers 2,3] [--whisper-models base,small]
+                         [--threads 1,4] [--repeat 3] [--baseline bench/baseline.json]
+    python3 benchmark.py --minutes 1 --save-baseline bench/baseline.json
+"""
+
+import sys
+import os
+import csv
+import json
+import wave
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from whisper_engines import DEFAULT_ENGINE
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Fréquence fondamentale (Hz) de chaque locuteur synthétique
+SPEAKER_PITCHES = [110.0, 185.0, 240.0]
+
+# Métriques comparées à la référence (plus bas = meilleur)
+COMPARED_METRICS = ['warm_real_time_factor', 'peak_rss_mb']
+
+CSV_FIELDS = [
+    'script', 'model', 'engine', 'minutes', 'speakers', 'threads', 'audio_duration',
+    'cold_wall_seconds', 'warm_wall_seconds', 'warm_inference_seconds',
+    'cold_real_time_factor', 'warm_real_time_factor', 'peak_rss_mb', 'segments', 'error'
+]
+
+
+def _speech_turn(rng: np.random.Generator, pitch: float, duration: float) -> np.ndarray:
+    """Voix synthétique: harmoniques d'une fondamentale qui varie, modulées au rythme des syllabes"""
+    t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    vibrato = 1 + 0.03 * np.sin(2 * np.pi * rng.uniform(3, 6) * t)
+    phase = 2 * np.pi * pitch * np.cumsum(vibrato) / SAMPLE_RATE
+
+    signal = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = 0.5 * (1 + np.sin(2 * np.pi * rng.uniform(3.5, 5.5) * t)) ** 2
+    return (0.25 * signal * syllables).astype(np.float32)
+
+
+def generate_recording(path: str, minutes: float, speakers: int, seed: int = 0) -> list:
+    """
+    Écrit un WAV 16 kHz mono déterministe et retourne les tours de référence
+
+    L'audio est écrit tour par tour: la mémoire reste constante même pour
+    120 minutes.
+    """
+    rng = np.random.default_rng(seed * 100 + speakers * 10 + int(minutes))
+    chooser = random.Random(seed)
+    total = minutes * 60
+    turns = []
+    position = 0.0
+    speaker = 0
+
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+
+        while position < total:
+            duration = min(float(rng.uniform(0.8, 8.0)), total - position)
+            turn = _speech_turn(rng, SPEAKER_PITCHES[speaker], duration)
+            noise = rng.normal(0, 0.003, len(turn)).astype(np.float32)
+            out.writeframes((np.clip(turn + noise, -1, 1) * 32767).astype(np.int16).tobytes())
+            turns.append({'start': round(position, 3), 'end': round(position + duration, 3), 'speaker': f'SPK_{speaker}'})
+            position += duration
+
+            pause = min(float(rng.uniform(0.2, 1.5)), max(total - position, 0))
+            silence = rng.normal(0, 0.003, int(pause * SAMPLE_RATE)).astype(np.float32)
+            out.writeframes((silence * 32767).astype(np.int16).tobytes())
+            position += pause
+
+            speaker = chooser.choice([s for s in range(speakers) if s != speaker])
+
+    return turns
+
+
+def ensure_recording(directory: str, minutes: float, speakers: int, seed: int) -> str:
+    """Chemin de l'enregistrement synthétique (généré une seule fois)"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"synthetic_{speakers}spk_{minutes:g}min_seed{seed}.wav")
+    if not os.path.exists(path):
+        print(f"🎛️ Génération de {os.path.basename(path)}...", file=sys.stderr)
+        turns = generate_recording(path, minutes, speakers, seed)
+        with open(path + '.turns.json', 'w', encoding='utf-8') as f:
+            json.dump(turns, f)
+    return path
+
+
+def run_process(command: list, env: dict) -> dict:
+    """
+    Lance une commande et mesure son temps réel et son pic mémoire
+
+    os.wait4 retourne l'usage des ressources du processus lui-même (et non
+    de l'ensemble des enfants comme RUSAGE_CHILDREN).
+    """
+    with tempfile.TemporaryFile() as stdout:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, stdout=stdout, stderr=subprocess.DEVNULL, env=env)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        stdout.seek(0)
+        output = stdout.read().decode('utf-8', errors='replace')
+
+    return {
+        'returncode': process.returncode,
+        'wall_seconds': wall,
+        'cpu_seconds': usage.ru_utime + usage.ru_stime,
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'stdout': output
+    }
+
+
+def _load_seconds(profile: dict) -> float:
+    return sum(s['wall_seconds'] for s in profile.get('stages', []) if s['name'] in ('import', 'model_load'))
+
+
+def run_case(case: dict, audio_path: str, repeat: int) -> dict:
+    """Lance `repeat` fois un script sur un enregistrement et agrège les mesures"""
+    env = {
+        **os.environ,
+        'OMP_NUM_THREADS': str(case['threads']),
+        'MKL_NUM_THREADS': str(case['threads']),
+        'INFERENCE_CACHE': '0',
+        'WAVEFORM_CACHE': '0',
+        # Les mesures du benchmark ne doivent pas fausser les quantiles de production
+        'METRICS': '0'
+    }
+    runs = []
+
+    with tempfile.TemporaryDirectory(prefix='bench_') as tmp:
+        for _ in range(repeat):
+            if case['script'] == 'whisper':
+                command = [sys.executable, os.path.join(SCRIPTS_DIR, 'whisper_transcribe.py'), audio_path,
+                           case['model'], '--no-worker', '--engine', case['engine']]
+                run = run_process(command, env)
+                result = _parse_json(run['stdout'])
+            else:
+                output_json = os.path.join(tmp, 'diarization.json')
+                command = [sys.executable, os.path.join(SCRIPTS_DIR, 'diarize_audio.py'), audio_path, output_json]
+                run = run_process(command, env)
+                result = _read_json(output_json)
+
+            run['result'] = result
+            runs.append(run)
+            if run['returncode'] != 0 or 'error' in result:
+                break
+
+    first, last = runs[0], runs[-1]
+    error = last['result'].get('error') or (f"code retour {last['returncode']}" if last['returncode'] else None)
+    duration = case['minutes'] * 60
+
+    warm_runs = runs[1:] or runs
+    warm_wall = statistics.median(r['wall_seconds'] for r in warm_runs)
+    warm_inference = statistics.median(
+        r['wall_seconds'] - _load_seconds(r['result'].get('profile', {})) for r in warm_runs
+    )
+
+    return {
+        **case,
+        'audio_duration': duration,
+        'cold_wall_seconds': round(first['wall_seconds'], 2),
+        'warm_wall_seconds': round(warm_wall, 2),
+        'warm_inference_seconds': round(warm_inference, 2),
+        'cold_real_time_factor': round(first['wall_seconds'] / duration, 4),
+        'warm_real_time_factor': round(warm_inference / duration, 4),
+        'peak_rss_mb': max(r['peak_rss_mb'] for r in runs),
+        'segments': _segment_count(case['script'], last['result']),
+        'profile': last['result'].get('profile'),
+        'error': error
+    }
+
+
+def _parse_json(text: str) -> dict:
+    try:
+        return json.loads(text.strip().splitlines()[-1])
+    except (IndexError, json.JSONDecodeError):
+        return {'error': 'Sortie JSON illisible'}
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {'error': 'Fichier de résultat absent ou illisible'}
+
+
+def _segment_count(script: str, result: dict):
+    if script == 'diarization':
+        return result.get('stats', {}).get('merged_num_segments')
+    if 'segments' in result:
+        return len(result['segments'])
+    return len(result.get('text', '').split()) or None
+
+
+def case_key(result: dict) -> str:
+    return '|'.join(str(result[k]) for k in ('script', 'model', 'engine', 'minutes', 'speakers', 'threads'))
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """Liste des régressions par rapport à la référence (métrique > référence x (1 + tolérance))"""
+    reference = {case_key(r): r for r in baseline.get('results', [])}
+    regressions = []
+
+    for result in results:
+        previous = reference.get(case_key(result))
+        if previous is None or result['error']:
+            continue
+        for metric in COMPARED_METRICS:
+            before, after = previous.get(metric), result.get(metric)
+            if before and after and after > before * (1 + tolerance):
+                regressions.append({
+                    'case': case_key(result),
+                    'metric': metric,
+                    'baseline': before,
+                    'current': after,
+                    'change': round(after / before - 1, 3)
+                })
+    return regressions
+
+
+def environment() -> dict:
+    """Contexte de la mesure (pour ne comparer que des runs comparables)"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPTS_DIR,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        'hostname': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+
+def _csv_list(value: str, cast=str) -> list:
+    return [cast(v.strip()) for v in value.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne Whisper / pyannote")
+    parser.add_argument('--minutes', default='1,10,60,120', help='Durées des enregistrements (minutes)')
+    parser.add_argument('--speakers', default='2,3', help='Nombres de locuteurs')
+    parser.add_argument('--scripts', default='whisper,diarization', help='Scripts mesurés')
+    parser.add_argument('--whisper-models', default=os.getenv('WHISPER_MODEL', 'base'), help='Modèles Whisper')
+    parser.add_argument('--engines', default=DEFAULT_ENGINE, help='Moteurs Whisper')
+    parser.add_argument('--threads', default=str(os.cpu_count() or 1), help='Nombres de threads')
+    parser.add_argument('--repeat', type=int, default=2, help='Lancements par cas (le premier est le cold start)')
+    parser.add_argument('--seed', type=int, default=0, help='Graine des enregistrements synthétiques')
+    parser.add_argument('--audio-dir', default=os.path.join(tempfile.gettempdir(), 'crm-ai-bench'),
+                        help='Dossier des enregistrements synthétiques (réutilisés)')
+    parser.add_argument('--output-dir', default='bench_results', help='Dossier des rapports JSON / CSV')
+    parser.add_argument('--baseline', help='Référence JSON à comparer')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Dégradation tolérée (0.15 = +15%%)')
+    parser.add_argument('--save-baseline', metavar='FICHIER', help='Enregistrer ce run comme référence')
+    args = parser.parse_args()
+
+    cases = []
+    for script in _csv_list(args.scripts):
+        variants = (
+            [(model, engine) for model in _csv_list(args.whisper_models) for engine in _csv_list(args.engines)]
+            if script == 'whisper' else [('pyannote/speaker-diarization-3.1', 'pyannote')]
+        )
+        for minutes in _csv_list(args.minutes, float):
+            for speakers in _csv_list(args.speakers, int):
+                for model, engine in variants:
+                    for threads in _csv_list(args.threads, int):
+                        cases.append({'script': script, 'model': model, 'engine': engine,
+                                      'minutes': minutes, 'speakers': speakers, 'threads': threads})
+
+    results = []
+    for i, case in enumerate(cases, 1):
+        audio_path = ensure_recording(args.audio_dir, case['minutes'], case['speakers'], args.seed)
+        print(f"⏱️ [{i}/{len(cases)}] {case_key(case)}", file=sys.stderr)
+        result = run_case(case, audio_path, max(1, args.repeat))
+        results.append(result)
+        print(
+            f"   cold {result['cold_wall_seconds']}s, warm RTF {result['warm_real_time_factor']}, "
+            f"{result['peak_rss_mb']} Mo" + (f" ❌ {result['error']}" if result['error'] else ''),
+            file=sys.stderr
+        )
+
+    report = {'environment': environment(), 'results': results}
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stamp = time.strftime('%Y%m%d_%H%M%S')
+    json_path = os.path.join(args.output_dir, f'benchmark_{stamp}.json')
+    csv_path = os.path.join(args.output_dir, f'benchmark_{stamp}.csv')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['baseline'] = {'path': args.baseline, 'environment': baseline.get('environment')}
+        report['regressions'] = compare(results, baseline, args.tolerance)
+
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"📄 Rapports: {json_path}, {csv_path}", file=sys.stderr)
+
+    regressions = report.get('regressions', [])
+    for regression in regressions:
+        print(
+            f"⚠️ Régression {regression['case']} {regression['metric']}: "
+            f"{regression['baseline']} → {regression['current']} (+{regression['change'] * 100:.0f}%)",
+            file=sys.stderr
+        )
+
+    failed = any(r['error'] for r in results)
+    sys.exit(1 if regressions or failed else 0)
+
+
+if __name__ == '__main__':
+    main()
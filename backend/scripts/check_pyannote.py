@@ -2,76 +2,198 @@
 """
 Script de health-check pour pyannote
 
-Vérifie que:
-1. Python et les dépendances sont installées
-2. Le modèle pyannote est téléchargé et accessible
-3. Le token HuggingFace est valide (si configuré)
+Deux niveaux de vérification:
+
+Rapide (défaut, < 1 s, sans importer torch ni pyannote):
+1. Les paquets torch / pyannote.audio / huggingface_hub sont installés (métadonnées)
+2. Le pipeline et ses modèles (segmentation, embedding) sont dans le bundle local
+   (init_pyannote.py --bundle) ou dans le cache HuggingFace
+3. Le token HuggingFace est configuré
+
+Approfondi (--deep):
+4. Charge réellement le pipeline et diarise quelques secondes de signal synthétique
+   (temps de chargement et latence d'inférence)
+
+Le résultat approfondi est mis en cache avec une empreinte du cache des modèles
+(fichiers, tailles, dates) et des versions des paquets: il n'est recalculé que
+si l'un d'eux a changé.
 
 Usage:
-    python3 check_pyannote.py
+    python3 check_pyannote.py [--deep] [--force]
 
 Retourne un JSON avec le statut
+
+Configuration (variables d'environnement):
+    PYANNOTE_HEALTH_CACHE       fichier du résultat approfondi
+                                (défaut: ~/.cache/crm-ai/pyannote_health.json)
 """
 
 import sys
 import json
 import os
+import re
+import glob
+import time
+import hashlib
+import argparse
+import importlib.metadata
 
-def check_health():
-    result = {
-        'available': False,
-        'python_version': sys.version,
-        'checks': {
-            'torch': {'status': 'pending', 'message': ''},
-            'pyannote': {'status': 'pending', 'message': ''},
-            'model': {'status': 'pending', 'message': ''},
-            'huggingface_token': {'status': 'pending', 'message': ''},
-        },
-        'errors': [],
-        'warnings': []
-    }
+from model_bundle import current_bundle
+
+PIPELINE_NAME = "pyannote/speaker-diarization-3.1"
+PACKAGES = ['torch', 'pyannote.audio', 'huggingface_hub']
+
+DEFAULT_HEALTH_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'crm-ai', 'pyannote_health.json')
+
+# Signal de test du niveau approfondi (secondes)
+PROBE_SECONDS = 5.0
 
-    # Check 1: PyTorch
+# Modèles référencés par config.yaml du pipeline (ex: "segmentation: pyannote/segmentation-3.0")
+MODEL_REFERENCE = re.compile(r'^\s*(segmentation|embedding)\s*:\s*["\']?([\w.-]+/[\w.-]+)', re.MULTILINE)
+
+
+def hub_cache_dir() -> str:
+    """Dossier du cache HuggingFace utilisé par pyannote"""
+    for variable in ('PYANNOTE_CACHE', 'HF_HUB_CACHE', 'HUGGINGFACE_HUB_CACHE'):
+        if os.getenv(variable):
+            return os.getenv(variable)
+    hf_home = os.getenv('HF_HOME') or os.path.join(
+        os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'huggingface'
+    )
+    return os.path.join(hf_home, 'hub')
+
+
+def huggingface_token() -> str:
+    """Token HuggingFace: variable d'environnement ou token enregistré par `huggingface-cli login`"""
+    token = os.getenv('HUGGINGFACE_TOKEN') or os.getenv('HF_TOKEN')
+    if token:
+        return token
+    hf_home = os.getenv('HF_HOME') or os.path.join(os.path.expanduser('~'), '.cache', 'huggingface')
     try:
-        import torch
-        result['checks']['torch'] = {
-            'status': 'ok',
-            'message': f'PyTorch {torch.__version__} installed',
-            'cuda_available': torch.cuda.is_available(),
-            'device': 'cuda' if torch.cuda.is_available() else 'cpu'
-        }
-    except ImportError as e:
-        result['checks']['torch'] = {
-            'status': 'error',
-            'message': f'PyTorch not installed: {str(e)}'
-        }
-        result['errors'].append('PyTorch is required but not installed')
-        print(json.dumps(result, indent=2))
-        return result
+        with open(os.path.join(hf_home, 'token'), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
 
-    # Check 2: pyannote.audio
+def repo_cache_dir(repo_id: str) -> str:
+    return os.path.join(hub_cache_dir(), 'models--' + repo_id.replace('/', '--'))
+
+
+def cached_snapshot(repo_id: str) -> str:
+    """Dossier du snapshot en cache d'un dépôt (révision main de préférence), ou None"""
+    repo_dir = repo_cache_dir(repo_id)
     try:
-        import pyannote.audio
-        result['checks']['pyannote'] = {
-            'status': 'ok',
-            'message': f'pyannote.audio installed'
+        with open(os.path.join(repo_dir, 'refs', 'main'), encoding='utf-8') as f:
+            snapshot = os.path.join(repo_dir, 'snapshots', f.read().strip())
+        if os.path.isdir(snapshot):
+            return snapshot
+    except OSError:
+        pass
+
+    snapshots = sorted(glob.glob(os.path.join(repo_dir, 'snapshots', '*')), key=os.path.getmtime)
+    return snapshots[-1] if snapshots else None
+
+
+def model_files(snapshot: str) -> list:
+    """Fichiers présents (liens résolus) d'un snapshot"""
+    files = []
+    for root, _, names in os.walk(snapshot):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                files.append(path)
+    return files
+
+
+def check_packages(result: dict) -> bool:
+    """Versions installées, lues dans les métadonnées (aucun import)"""
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+
+    for name, package in (('torch', 'torch'), ('pyannote', 'pyannote.audio')):
+        if versions[package]:
+            result['checks'][name] = {'status': 'ok', 'message': f'{package} {versions[package]} installed'}
+        else:
+            result['checks'][name] = {'status': 'error', 'message': f'{package} not installed'}
+            result['errors'].append(f'{package} is required but not installed')
+
+    result['versions'] = versions
+    return all(versions[package] for package in ('torch', 'pyannote.audio'))
+
+
+def check_model(result: dict, token: str) -> list:
+    """Pipeline et modèles dépendants présents dans le cache local; retourne les snapshots trouvés"""
+    bundle = current_bundle()
+    if bundle:
+        with open(os.path.join(bundle, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        missing = [spec['file'] for spec in manifest['models'].values()
+                   if not os.path.isfile(os.path.join(bundle, spec['file']))]
+        if not missing:
+            result['checks']['model'] = {
+                'status': 'ok',
+                'message': f"Model bundle {manifest['revision'][:12]} (offline)",
+                'bundle': bundle
+            }
+            return [bundle]
+        result['warnings'].append(f"Incomplete model bundle {bundle}: {', '.join(missing)}")
+
+    snapshot = cached_snapshot(PIPELINE_NAME)
+    config_path = os.path.join(snapshot, 'config.yaml') if snapshot else None
+
+    if not config_path or not os.path.isfile(config_path):
+        hint = 'run init_pyannote.py --download-model' if token else 'set HUGGINGFACE_TOKEN then run init_pyannote.py'
+        result['checks']['model'] = {
+            'status': 'error' if not token else 'warning',
+            'message': f'Model not cached locally ({hint})',
+            'cache_dir': hub_cache_dir()
         }
-    except ImportError as e:
-        result['checks']['pyannote'] = {
-            'status': 'error',
-            'message': f'pyannote.audio not installed: {str(e)}'
+        if token:
+            result['warnings'].append('pyannote model not cached - it will be downloaded on first use')
+        else:
+            result['errors'].append('pyannote model not cached and no HUGGINGFACE_TOKEN to download it')
+        return []
+
+    with open(config_path, encoding='utf-8') as f:
+        dependencies = sorted({repo for _, repo in MODEL_REFERENCE.findall(f.read())})
+
+    snapshots = [snapshot]
+    missing = []
+    for repo_id in dependencies:
+        dependency = cached_snapshot(repo_id)
+        if dependency and any(not path.endswith(('.md', '.gitattributes')) for path in model_files(dependency)):
+            snapshots.append(dependency)
+        else:
+            missing.append(repo_id)
+
+    if missing:
+        result['checks']['model'] = {
+            'status': 'warning' if token else 'error',
+            'message': f"Pipeline cached but missing models: {', '.join(missing)}",
+            'config_path': config_path
+        }
+        (result['warnings'] if token else result['errors']).append(f"Missing cached models: {', '.join(missing)}")
+    else:
+        result['checks']['model'] = {
+            'status': 'ok',
+            'message': 'Model cached locally',
+            'config_path': config_path,
+            'dependencies': dependencies
         }
-        result['errors'].append('pyannote.audio is required but not installed')
-        print(json.dumps(result, indent=2))
-        return result
+    return snapshots
 
-    # Check 3: HuggingFace Token
-    hf_token = os.getenv('HUGGINGFACE_TOKEN')
-    if hf_token:
+
+def check_token(result: dict, token: str) -> None:
+    if token:
         result['checks']['huggingface_token'] = {
             'status': 'ok',
             'message': 'Token configured',
-            'token_prefix': hf_token[:10] + '...' if len(hf_token) > 10 else '***'
+            'token_prefix': token[:10] + '...' if len(token) > 10 else '***'
         }
     else:
         result['checks']['huggingface_token'] = {
@@ -80,71 +202,113 @@ def check_health():
         }
         result['warnings'].append('HUGGINGFACE_TOKEN not set - diarization may fail on first use')
 
-    # Check 4: Model availability (without loading it fully)
-    try:
-        from pyannote.audio import Pipeline
-        from huggingface_hub import hf_hub_download
-        from huggingface_hub.utils import HfHubHTTPError
 
-        # Try to check if model config exists (lightweight check)
+def fingerprint(snapshots: list, versions: dict) -> str:
+    """Empreinte du cache des modèles (chemins, tailles, dates) et des versions des paquets"""
+    digest = hashlib.sha256(json.dumps(versions, sort_keys=True).encode('utf-8'))
+    for snapshot in snapshots:
+        for path in sorted(model_files(snapshot)):
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, hub_cache_dir())}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def run_inference_probe() -> dict:
+    """Charge le pipeline et diarise un court signal synthétique"""
+    import numpy as np
+
+    from audio_io import SAMPLE_RATE, pyannote_input
+    from diarize_audio import load_pipeline
+    from profiling import StageProfiler
+
+    profiler = StageProfiler()
+    pipeline = load_pipeline(profiler)
+    load_seconds = profiler.report()['total_wall_seconds']
+
+    # Bruit faible modulé en amplitude: de quoi traverser segmentation, embeddings et clustering
+    rng = np.random.default_rng(0)
+    t = np.arange(int(PROBE_SECONDS * SAMPLE_RATE)) / SAMPLE_RATE
+    waveform = (0.1 * rng.standard_normal(len(t)) * (0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t))).astype(np.float32)
+
+    started = time.perf_counter()
+    diarization = pipeline(pyannote_input(waveform))
+    inference_ms = (time.perf_counter() - started) * 1000
+
+    import torch
+
+    return {
+        'status': 'ok',
+        'message': f'Pipeline loaded in {load_seconds:.1f}s, {PROBE_SECONDS:.0f}s probe diarized in {inference_ms:.0f}ms',
+        'load_seconds': round(load_seconds, 3),
+        'inference_ms': round(inference_ms, 1),
+        'probe_seconds': PROBE_SECONDS,
+        'num_speakers': len(diarization.labels()),
+        'device': 'cuda' if torch.cuda.is_available() else 'cpu',
+        'peak_rss_mb': profiler.report()['peak_rss_mb']
+    }
+
+
+def check_inference(result: dict, snapshots: list, force: bool = False) -> None:
+    """Niveau approfondi, mis en cache tant que l'empreinte du cache des modèles est inchangée"""
+    cache_path = os.getenv('PYANNOTE_HEALTH_CACHE') or DEFAULT_HEALTH_CACHE
+    current = fingerprint(snapshots, result['versions'])
+
+    if not force:
         try:
-            config_path = hf_hub_download(
-                repo_id="pyannote/speaker-diarization-3.1",
-                filename="config.yaml",
-                token=hf_token,
-                local_files_only=True  # Only check local cache first
-            )
-            result['checks']['model'] = {
-                'status': 'ok',
-                'message': 'Model cached locally',
-                'config_path': config_path
-            }
-        except Exception:
-            # Model not cached locally, try remote check
-            try:
-                config_path = hf_hub_download(
-                    repo_id="pyannote/speaker-diarization-3.1",
-                    filename="config.yaml",
-                    token=hf_token,
-                    local_files_only=False
-                )
-                result['checks']['model'] = {
-                    'status': 'ok',
-                    'message': 'Model accessible (downloaded config)',
-                    'config_path': config_path
-                }
-            except HfHubHTTPError as e:
-                if '401' in str(e) or 'Unauthorized' in str(e):
-                    result['checks']['model'] = {
-                        'status': 'error',
-                        'message': 'Model requires authentication - check HUGGINGFACE_TOKEN'
-                    }
-                    result['errors'].append('HuggingFace authentication failed')
-                elif '403' in str(e) or 'Forbidden' in str(e):
-                    result['checks']['model'] = {
-                        'status': 'error',
-                        'message': 'Model license not accepted - visit https://huggingface.co/pyannote/speaker-diarization-3.1'
-                    }
-                    result['errors'].append('pyannote model license not accepted on HuggingFace')
-                else:
-                    result['checks']['model'] = {
-                        'status': 'error',
-                        'message': f'Model access error: {str(e)}'
-                    }
-                    result['errors'].append(f'Cannot access model: {str(e)}')
-            except Exception as e:
-                result['checks']['model'] = {
-                    'status': 'warning',
-                    'message': f'Could not verify model: {str(e)}'
-                }
-                result['warnings'].append('Model status unknown - may work on first use')
+            with open(cache_path, encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('fingerprint') == current:
+                result['checks']['inference'] = {**cached['check'], 'cached': True, 'checked_at': cached['checked_at']}
+                return
+        except (OSError, json.JSONDecodeError, KeyError):
+            pass
 
+    try:
+        check = run_inference_probe()
     except Exception as e:
-        result['checks']['model'] = {
-            'status': 'error',
-            'message': f'Error checking model: {str(e)}'
-        }
-        result['errors'].append(f'Model check failed: {str(e)}')
+        result['checks']['inference'] = {'status': 'error', 'message': f'Pipeline inference failed: {e}', 'cached': False}
+        result['errors'].append(f'Pipeline inference failed: {e}')
+        return
+
+    result['checks']['inference'] = {**check, 'cached': False}
+
+    # Seul un succès est mis en cache: un échec (mémoire, réseau) est revérifié au prochain appel
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': current, 'check': check, 'checked_at': time.strftime('%Y-%m-%dT%H:%M:%S%z')}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def check_health(deep: bool = False, force: bool = False):
+    started = time.perf_counter()
+    result = {
+        'available': False,
+        'tier': 'deep' if deep else 'fast',
+        'python_version': sys.version,
+        'checks': {
+            'torch': {'status': 'pending', 'message': ''},
+            'pyannote': {'status': 'pending', 'message': ''},
+            'model': {'status': 'pending', 'message': ''},
+            'huggingface_token': {'status': 'pending', 'message': ''},
+        },
+        'errors': [],
+        'warnings': []
+    }
+
+    token = huggingface_token()
+    check_token(result, token)
+
+    if check_packages(result):
+        snapshots = check_model(result, token)
+
+        if deep and not result['errors']:
+            check_inference(result, snapshots, force)
+    else:
+        result['checks']['model'] = {'status': 'error', 'message': 'Skipped: missing packages'}
 
     # Final status
     all_ok = all(
@@ -152,11 +316,19 @@ def check_health():
         for check in result['checks'].values()
     )
     result['available'] = all_ok and len(result['errors']) == 0
+    result['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
 
     return result
 
 
 if __name__ == '__main__':
-    result = check_health()
+    parser = argparse.ArgumentParser(description='Health-check de pyannote')
+    parser.add_argument('--deep', action='store_true',
+                        help='Charger le pipeline et lancer une courte inférence (résultat mis en cache)')
+    parser.add_argument('--force', action='store_true',
+                        help="Ignorer le cache du niveau approfondi")
+    args = parser.parse_args()
+
+    result = check_health(deep=args.deep, force=args.force)
     print(json.dumps(result, indent=2))
     sys.exit(0 if result['available'] else 1)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Bornes du décodage Whisper: repli en température limité et arrêt des emballements
+
+Sur un audio bruité, transcribe() d'openai-whisper peut redécoder une même
+fenêtre de 30 s à chaque température du repli (0.0 → 1.0, six passes), ou
+boucler sur une phrase répétée jusqu'à la limite de tokens de la fenêtre. Le
+temps de décodage d'un enregistrement peut alors être multiplié.
+
+Trois bornes:
+    - le repli s'arrête après WHISPER_MAX_FALLBACKS températures supplémentaires
+    - pendant le décodage (filtre de logits ajouté au DecodingTask), une passe
+      est terminée dès que la fin du texte répète un même bloc de tokens, ou
+      que le texte déjà décodé devient trop compressible (ratio gzip, comme le
+      contrôle a posteriori de Whisper): le token de fin est forcé
+    - WHISPER_MAX_WINDOW_TOKENS limite les tokens d'une fenêtre (sample_len)
+
+Pendant transcribe(), une passe interrompue est marquée au-dessus du seuil de
+compression: la fenêtre est redécodée à la température suivante, dans la
+limite du repli (à la dernière température, le texte tronqué est gardé).
+
+Compteurs par enregistrement (clé "decode_stats" du résultat): fenêtres,
+replis, passes interrompues, tokens décodés. faster-whisper ne permet pas
+d'interrompre une passe: seuls le repli, la limite de tokens et les compteurs
+de replis et de tokens s'y appliquent.
+
+Configuration (variables d'environnement):
+    WHISPER_MAX_FALLBACKS           températures essayées après 0 (défaut: 2, soit 0.0, 0.2, 0.4; Whisper: 5)
+    WHISPER_REPEAT_LIMIT            répétitions consécutives d'un bloc qui arrêtent la passe (défaut: 4)
+    WHISPER_COMPRESSION_RATIO       ratio de compression maximal du texte (défaut: 2.4, seuil de Whisper)
+    WHISPER_MAX_WINDOW_TOKENS       tokens maximum par fenêtre (défaut: vide, limite du modèle: 224)
+"""
+
+import os
+import zlib
+
+MAX_FALLBACKS = int(os.getenv('WHISPER_MAX_FALLBACKS', '2'))
+REPEAT_LIMIT = int(os.getenv('WHISPER_REPEAT_LIMIT', '4'))
+COMPRESSION_RATIO_THRESHOLD = float(os.getenv('WHISPER_COMPRESSION_RATIO', '2.4'))
+MAX_WINDOW_TOKENS = int(os.getenv('WHISPER_MAX_WINDOW_TOKENS') or 0) or None
+
+# Températures du repli d'openai-whisper
+TEMPERATURE_STEP = 0.2
+MAX_TEMPERATURE = 1.0
+
+# Blocs répétés recherchés: jusqu'à 16 tokens, sur au moins 12 tokens au total
+# (une interjection répétée deux ou trois fois reste du texte normal)
+MAX_REPEAT_PERIOD = 16
+MIN_REPEAT_TOKENS = 12
+
+# Ratio de compression recalculé tous les 32 tokens (le texte court est peu compressible)
+COMPRESSION_CHECK_TOKENS = 32
+
+
+def fallback_temperatures(max_fallbacks: int = None) -> tuple:
+    """Températures essayées pour une fenêtre: 0 puis au plus `max_fallbacks` replis"""
+    max_fallbacks = MAX_FALLBACKS if max_fallbacks is None else max_fallbacks
+    steps = int(round(MAX_TEMPERATURE / TEMPERATURE_STEP))
+    return tuple(round(step * TEMPERATURE_STEP, 1) for step in range(min(max_fallbacks, steps) + 1))
+
+
+def guard_params() -> dict:
+    """Bornes du décodage (clé du cache: elles peuvent changer le texte)"""
+    return {
+        'temperatures': list(fallback_temperatures()),
+        'repeat_limit': REPEAT_LIMIT,
+        'compression_ratio': COMPRESSION_RATIO_THRESHOLD,
+        'max_window_tokens': MAX_WINDOW_TOKENS
+    }
+
+
+def compression_ratio(text: str) -> float:
+    data = text.encode('utf-8')
+    return len(data) / len(zlib.compress(data)) if data else 0.0
+
+
+def repeated_tail(tokens: list) -> bool:
+    """La fin de `tokens` répète-t-elle un même bloc au moins REPEAT_LIMIT fois?"""
+    for period in range(1, MAX_REPEAT_PERIOD + 1):
+        repeats = max(REPEAT_LIMIT, -(-MIN_REPEAT_TOKENS // period))
+        span = period * repeats
+        if len(tokens) < span:
+            break
+        tail = tokens[-span:]
+        if tail == tail[:period] * repeats:
+            return True
+    return False
+
+
+class DecodeStats:
+    """Compteurs de décodage d'un enregistrement"""
+
+    def __init__(self):
+        self.windows = 0
+        self.fallbacks = 0
+        self.aborted = 0
+        self.tokens = 0
+        # Faux si un rapport ne sait pas compter les passes interrompues (faster-whisper)
+        self.abort_supported = True
+
+    def add_pass(self, temperature: float, results: list, aborted: int = 0) -> None:
+        """Une passe de décodage (une ou plusieurs fenêtres) à une température"""
+        if temperature > 0:
+            self.fallbacks += len(results)
+        else:
+            self.windows += len(results)
+        self.aborted += aborted
+        self.tokens += sum(len(result.tokens) for result in results)
+
+    def merge(self, report: dict) -> None:
+        """Ajoute les compteurs d'un autre rapport (chunk, segment)"""
+        if not report:
+            return
+        self.windows += report.get('windows') or 0
+        self.fallbacks += report.get('fallbacks') or 0
+        if report.get('windows_aborted') is None:
+            self.abort_supported = False
+        self.aborted += report.get('windows_aborted') or 0
+        self.tokens += report.get('tokens_decoded') or 0
+
+    def report(self) -> dict:
+        return {
+            'windows': self.windows,
+            'fallbacks': self.fallbacks,
+            'windows_aborted': self.aborted if self.abort_supported else None,
+            'tokens_decoded': self.tokens,
+            'max_fallbacks': MAX_FALLBACKS
+        }
+
+
+class RunawayFilter:
+    """
+    Filtre de logits (interface LogitFilter d'openai-whisper) qui termine une
+    passe qui s'emballe en forçant le token de fin
+
+    Les lignes du lot sont les candidats (beam search, best_of) de chaque
+    fenêtre: `aborted` contient les fenêtres dont au moins un candidat a été
+    arrêté.
+    """
+
+    def __init__(self, tokenizer, sample_begin: int, n_group: int):
+        self.tokenizer = tokenizer
+        self.sample_begin = sample_begin
+        self.n_group = n_group
+        self.aborted = set()
+
+    def _runaway(self, tokens: list) -> bool:
+        # Tokens de texte seulement: les timestamps diffèrent d'une répétition à l'autre
+        text_tokens = [token for token in tokens if token < self.tokenizer.eot]
+        if repeated_tail(text_tokens):
+            return True
+        if len(text_tokens) >= COMPRESSION_CHECK_TOKENS and len(text_tokens) % COMPRESSION_CHECK_TOKENS == 0:
+            return compression_ratio(self.tokenizer.decode(text_tokens)) > COMPRESSION_RATIO_THRESHOLD
+        return False
+
+    def apply(self, logits, tokens) -> None:
+        eot = self.tokenizer.eot
+        for row, sequence in enumerate(tokens[:, self.sample_begin:].tolist()):
+            # Candidat déjà terminé: le décodeur glouton continue d'ajouter le token de fin
+            if not sequence or sequence[-1] == eot or not self._runaway(sequence):
+                continue
+            logits[row, :] = float('-inf')
+            logits[row, eot] = 0.0
+            self.aborted.add(row // self.n_group)
+
+
+def guarded_decode(model, mel, options, stats: DecodeStats, retry_aborted: bool = False):
+    """
+    Équivalent de whisper.decode() avec le filtre anti-emballement et la limite de tokens
+
+    Remplace model.decode pendant transcribe(): chaque passe (fenêtre ou lot,
+    à une température) est comptée dans `stats`. Avec `retry_aborted`, le ratio
+    de compression des fenêtres interrompues est relevé au-dessus du seuil pour
+    déclencher le repli de transcribe().
+    """
+    import dataclasses
+    import torch
+    from whisper.decoding import DecodingTask
+
+    single = mel.ndim == 2
+    if single:
+        mel = mel.unsqueeze(0)
+    if MAX_WINDOW_TOKENS and options.sample_len is None:
+        options = dataclasses.replace(options, sample_len=MAX_WINDOW_TOKENS)
+
+    task = DecodingTask(model, options)
+    guard = RunawayFilter(task.tokenizer, task.sample_begin, task.n_group)
+    task.logit_filters.append(guard)
+    with torch.no_grad():
+        results = task.run(mel)
+
+    stats.add_pass(options.temperature, results, len(guard.aborted))
+    if retry_aborted:
+        results = [
+            dataclasses.replace(result, compression_ratio=max(result.compression_ratio,
+                                                              COMPRESSION_RATIO_THRESHOLD + 0.01))
+            if index in guard.aborted else result
+            for index, result in enumerate(results)
+        ]
+    return results[0] if single else results
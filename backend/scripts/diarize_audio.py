@@ -4,51 +4,155 @@ Script de diarisation audio pour identifier et séparer courtier/client
 
 Utilise pyannote.audio pour:
 1. Identifier les différents locuteurs dans l'enregistrement
-2. Détecter automatiquement qui est le courtier (celui qui parle le plus souvent)
+2. Détecter automatiquement qui est le courtier: par son empreinte vocale si elle
+   est connue (voiceprints.py, --advisor-id), sinon celui qui parle le plus souvent
 3. Extraire uniquement les segments du client
 4. Retourner les timestamps et segments pour transcription
 
 Usage:
-    python3 diarize_audio.py <audio_file> <output_json>
+    python3 diarize_audio.py <audio_file> <output_json> [--advisor-id ID] [--profile-trace fichier.prof]
+                             [--deadline EPOCH] [--progress progression.ndjson]
+    python3 diarize_audio.py --serve [--socket /tmp/pyannote_server.sock]
+    python3 diarize_audio.py --check-precision int8 <audio_file> <rapport_json>
+
+Le mode --serve charge le pipeline une seule fois et diarise les fichiers
+reçus sur un socket Unix (même fichier JSON de sortie qu'en mode CLI).
+
+Le mode --check-precision diarise le fichier en pleine précision puis en
+précision réduite (DIARIZATION_PRECISION, voir quantization.py) et compare
+durées, attribution des locuteurs et séparation courtier/client.
+
+Avec --deadline, la diarisation s'adapte au temps restant (voir progress.py):
+fenêtres de segmentation plus espacées si l'estimation dépasse la deadline,
+puis, si elle est atteinte quand même, un résultat partiel ("partial": true)
+avec les régions de parole détectées, toutes considérées comme client.
+--progress écrit la progression en NDJSON (étape et pourcentage).
+
+Les enregistrements longs (DIARIZATION_WINDOW_THRESHOLD) sont diarisés par
+fenêtres glissantes à mémoire bornée, puis les locuteurs sont rapprochés entre
+fenêtres par leurs embeddings (voir windowed_diarization.py).
+
+Avant le pipeline, quelques fenêtres de parole échantillonnées sont comparées
+(voir speaker_precheck.py): une seule voix donne directement le résultat en
+mode locuteur unique. La clé "precheck" indique le chemin suivi.
 """
 
 import sys
 import json
 import os
+import argparse
+import queue
+import signal
+import socket
+import threading
+import time
 from pathlib import Path
-import torch
 
-# Patch torch.load pour forcer weights_only=False (nécessaire pour pyannote avec PyTorch 2.6+)
-# Les modèles pyannote sont des sources de confiance (HuggingFace officiel)
-_original_torch_load = torch.load
-def _patched_torch_load(*args, **kwargs):
-    kwargs['weights_only'] = False
-    return _original_torch_load(*args, **kwargs)
-torch.load = _patched_torch_load
-
-from pyannote.audio import Pipeline
+from audio_io import SAMPLE_RATE, load_audio, pyannote_input, read_samples
+from inference_cache import cached_inference
+from metrics_store import record_job
+from model_bundle import current_bundle, load_bundle
+from profiling import TRACE_KINDS, StageProfiler, trace
+from progress import DeadlineExceeded, ProgressTracker, progress_stream, record_rtf
+from quantization import (
+    DEFAULT_PRECISION, MIN_ROLE_AGREEMENT, PRECISIONS, apply_precision, role_agreement, speaker_agreement
+)
+from segment_table import DEFAULT_MERGE_GAP, DEFAULT_MIN_SEGMENT, SegmentTable
+from speaker_precheck import precheck_enabled, precheck_params, single_speaker_precheck, single_speaker_turns
+from speaker_registry import speaker_durations
+from voiceprints import ENROLL_MARGIN, VoiceprintStore, speaker_hints, store_version, voiceprints_enabled
+from windowed_diarization import (
+    WindowedDiarization, plan_windows, use_windows, window_hints, windowed_params
+)
 
 # Désactiver les warnings
 import warnings
 warnings.filterwarnings('ignore')
 
+PIPELINE_NAME = "pyannote/speaker-diarization-3.1"
+
+# Version du format de résultat: à incrémenter si build_result change (invalide le cache)
+RESULT_VERSION = 4
+
+
+def _import_pyannote():
+    """
+    Importe torch et pyannote uniquement quand un pipeline est nécessaire
+
+    Un résultat trouvé en cache est ainsi retourné sans importer torch.
+    """
+    import torch
+
+    # Patch torch.load pour forcer weights_only=False (nécessaire pour pyannote avec PyTorch 2.6+)
+    # Les modèles pyannote sont des sources de confiance (HuggingFace officiel)
+    if not getattr(torch.load, '_pyannote_patched', False):
+        _original_torch_load = torch.load
+        def _patched_torch_load(*args, **kwargs):
+            kwargs['weights_only'] = False
+            return _original_torch_load(*args, **kwargs)
+        _patched_torch_load._pyannote_patched = True
+        torch.load = _patched_torch_load
+
+    from pyannote.audio import Pipeline
+    return torch, Pipeline
+
+
+def diarization_params(advisor_id=None, speakers=None):
+    """Paramètres qui influencent le résultat de diarisation (clé du cache)"""
+    return {
+        'pipeline': PIPELINE_NAME,
+        'result_version': RESULT_VERSION,
+        'merge_gap': DEFAULT_MERGE_GAP,
+        'min_segment': DEFAULT_MIN_SEGMENT,
+        'precision': DEFAULT_PRECISION,
+        'advisor_id': advisor_id if voiceprints_enabled() else None,
+        # Un résultat en cache saute l'identification et l'enregistrement de l'empreinte:
+        # toute modification des empreintes invalide le résultat
+        'voiceprints': store_version() if voiceprints_enabled() else None,
+        'speakers': speakers or {},
+        'windows': windowed_params(),
+        'precheck': precheck_params()
+    }
+
+
+def load_pipeline(profiler=None, precision=None):
+    """
+    Charge le pipeline de diarisation pyannote
+
+    Depuis le bundle local s'il existe (init_pyannote.py --bundle: poids mappés,
+    aucun accès au hub), sinon depuis le cache HuggingFace.
 
-def load_pipeline():
-    """Charge le pipeline de diarisation pyannote"""
+    Args:
+        precision: fp32, int8 ou bf16 (défaut: DIARIZATION_PRECISION)
+    """
+    profiler = profiler or StageProfiler()
     try:
-        # Token HuggingFace requis (peut être défini dans .env)
-        hf_token = os.getenv('HUGGINGFACE_TOKEN')
-
-        if hf_token:
-            pipeline = Pipeline.from_pretrained(
-                "pyannote/speaker-diarization-3.1",
-                use_auth_token=hf_token
-            )
-        else:
-            # Essayer sans token (peut fonctionner si déjà téléchargé)
-            pipeline = Pipeline.from_pretrained(
-                "pyannote/speaker-diarization-3.1"
-            )
+        with profiler.stage('import'):
+            torch, Pipeline = _import_pyannote()
+        profiler.begin('model_load')
+
+        pipeline = None
+        bundle = current_bundle()
+        if bundle:
+            try:
+                pipeline = load_bundle(bundle)
+            except Exception as e:
+                print(f"⚠️ Bundle {bundle} inutilisable ({e}), chargement depuis HuggingFace", file=sys.stderr)
+
+        if pipeline is None:
+            # Token HuggingFace requis (peut être défini dans .env)
+            hf_token = os.getenv('HUGGINGFACE_TOKEN')
+
+            if hf_token:
+                pipeline = Pipeline.from_pretrained(
+                    PIPELINE_NAME,
+                    use_auth_token=hf_token
+                )
+            else:
+                # Essayer sans token (peut fonctionner si déjà téléchargé)
+                pipeline = Pipeline.from_pretrained(
+                    PIPELINE_NAME
+                )
 
         # Utiliser CPU par défaut (pas de GPU dans le container)
         if torch.cuda.is_available():
@@ -56,6 +160,12 @@ def load_pipeline():
         else:
             pipeline.to(torch.device("cpu"))
 
+        if (precision or DEFAULT_PRECISION) != 'fp32':
+            profiler.begin('quantize')
+            applied = apply_precision(pipeline, precision)
+            print(f"⚙️ Modèles pyannote en précision {applied}", file=sys.stderr)
+
+        profiler.end()
         return pipeline
     except Exception as e:
         print(f"Erreur lors du chargement du pipeline: {e}", file=sys.stderr)
@@ -64,35 +174,23 @@ def load_pipeline():
         raise
 
 
-def analyze_speakers(diarization):
+def analyze_speakers(table, courtier=None):
     """
     Analyse les locuteurs pour identifier le courtier et le client
 
-    Le courtier est identifié comme celui qui:
+    Le courtier est celui reconnu par son empreinte vocale (`courtier`), sinon
+    celui qui:
     - Parle le plus souvent (plus de tours de parole)
     - A des segments plus courts en moyenne (questions)
 
     Si un seul locuteur est détecté, on considère que c'est le client
     (enregistrement solo ou diarisation imparfaite)
-    """
-    speaker_stats = {}
-
-    for turn, _, speaker in diarization.itertracks(yield_label=True):
-        if speaker not in speaker_stats:
-            speaker_stats[speaker] = {
-                'total_duration': 0.0,
-                'num_segments': 0,
-                'segments': []
-            }
 
-        duration = turn.end - turn.start
-        speaker_stats[speaker]['total_duration'] += duration
-        speaker_stats[speaker]['num_segments'] += 1
-        speaker_stats[speaker]['segments'].append({
-            'start': turn.start,
-            'end': turn.end,
-            'duration': duration
-        })
+    Args:
+        table: SegmentTable (tours déjà fusionnés)
+        courtier: label du cluster reconnu par empreinte vocale, ou None
+    """
+    speaker_stats = table.speaker_stats()
 
     # Cas spécial: aucun locuteur détecté
     if not speaker_stats:
@@ -104,10 +202,6 @@ def analyze_speakers(diarization):
             'single_speaker': True
         }
 
-    # Calculer les métriques
-    for speaker, stats in speaker_stats.items():
-        stats['avg_segment_duration'] = stats['total_duration'] / stats['num_segments']
-
     # Cas spécial: un seul locuteur détecté
     if len(speaker_stats) == 1:
         single_speaker = list(speaker_stats.keys())[0]
@@ -119,12 +213,15 @@ def analyze_speakers(diarization):
             'single_speaker': True
         }
 
-    # Identifier le courtier: celui avec le plus de tours de parole
-    # (pose des questions fréquentes, parle plus souvent)
-    courtier_speaker = max(
-        speaker_stats.keys(),
-        key=lambda s: speaker_stats[s]['num_segments']
-    )
+    if courtier in speaker_stats:
+        courtier_speaker = courtier
+    else:
+        # Identifier le courtier: celui avec le plus de tours de parole
+        # (pose des questions fréquentes, parle plus souvent)
+        courtier_speaker = max(
+            speaker_stats.keys(),
+            key=lambda s: speaker_stats[s]['num_segments']
+        )
 
     # Le client est l'autre locuteur principal
     client_speakers = [s for s in speaker_stats.keys() if s != courtier_speaker]
@@ -137,108 +234,741 @@ def analyze_speakers(diarization):
     }
 
 
-def extract_client_segments(diarization, speaker_analysis):
+def extract_client_segments(table, speaker_analysis):
     """Extrait uniquement les segments du client"""
-    client_segments = []
     courtier_speaker = speaker_analysis['courtier']
 
     # Cas spécial: un seul locuteur ou aucun courtier identifié
     # On prend TOUS les segments (considérés comme client)
     if speaker_analysis.get('single_speaker', False) or courtier_speaker is None:
-        for turn, _, speaker in diarization.itertracks(yield_label=True):
-            client_segments.append({
-                'start': float(turn.start),
-                'end': float(turn.end),
-                'duration': float(turn.end - turn.start),
-                'speaker': speaker
-            })
-        return client_segments
-
-    # Cas normal: filtrer pour ne garder que les segments du client
-    for turn, _, speaker in diarization.itertracks(yield_label=True):
-        # Ne garder que les segments qui ne sont PAS du courtier
-        if speaker != courtier_speaker:
-            client_segments.append({
-                'start': float(turn.start),
-                'end': float(turn.end),
-                'duration': float(turn.end - turn.start),
-                'speaker': speaker
-            })
-
-    return client_segments
+        return table.to_segments()
+
+    # Cas normal: ne garder que les segments qui ne sont PAS du courtier
+    return table.to_segments(exclude_speaker=courtier_speaker)
+
+
+def diarize_file(pipeline, audio_file, profiler=None, advisor_id=None, speakers=None, tracker=None):
+    """
+    Diarise un fichier avec un pipeline déjà chargé
+
+    Args:
+        audio_file: chemin du fichier ou forme d'onde déjà décodée (audio_io.pyannote_input)
+        profiler: StageProfiler recevant le temps de chaque étape
+        advisor_id: utilisateur (courtier) attendu dans l'enregistrement
+        speakers: bornes explicites {num_speakers, min_speakers, max_speakers}
+        tracker: ProgressTracker (deadline et événements de progression)
+
+    Returns:
+        dict: résultat au format du fichier JSON de sortie
+    """
+    profiler = profiler or StageProfiler()
+
+    if not isinstance(audio_file, str):
+        return run_diarization(pipeline, audio_file, profiler, advisor_id, speakers, tracker)[1]
+
+    with profiler.stage('audio_decode'):
+        waveform = load_audio(audio_file)
+    return diarize_waveform(pipeline, waveform, profiler, advisor_id, speakers, tracker)[1]
+
+
+def diarize_waveform(pipeline, waveform, profiler, advisor_id=None, speakers=None, tracker=None):
+    """
+    Diarise une forme d'onde décodée (audio_io.load_audio)
+
+    Pré-vérification locuteur unique, puis pipeline complet ou fenêtres
+    glissantes selon la durée.
+
+    Returns:
+        tuple: (SegmentTable des tours de parole ou None si résultat partiel, résultat JSON)
+    """
+    duration = round(len(waveform) / SAMPLE_RATE, 2)
+
+    precheck = None
+    if precheck_enabled():
+        try:
+            with profiler.stage('precheck'):
+                precheck, regions = single_speaker_precheck(pipeline, waveform, speakers)
+        except Exception as e:
+            # La pré-vérification n'est qu'un raccourci: le pipeline complet reste possible
+            print(f"⚠️ Pré-vérification locuteur unique impossible ({e})", file=sys.stderr)
+            precheck, regions = {'path': 'full', 'confidence': None, 'reason': 'error'}, []
+        if tracker is not None:
+            tracker.emit('precheck', **precheck)
+        if precheck['path'] == 'single_speaker':
+            print(f"🎯 Une seule voix détectée (similarité min {precheck['confidence']} sur "
+                  f"{precheck['windows']} fenêtres): pipeline complet ignoré")
+            with profiler.stage('speaker_analysis'):
+                table = SegmentTable.from_turns(single_speaker_turns(regions))
+                result = build_table_result(table)
+            if tracker is not None:
+                tracker.emit('done', percent=100.0, degraded=False)
+            return table, {**result, 'precheck': precheck, 'audio_duration': duration}
+
+    if use_windows(duration):
+        table, result = run_windowed_diarization(pipeline, waveform, profiler, advisor_id, speakers, tracker)
+    else:
+        table, result = run_diarization(pipeline, pyannote_input(waveform), profiler, advisor_id, speakers, tracker)
+    if precheck is not None:
+        result['precheck'] = precheck
+    result['audio_duration'] = duration
+    return table, result
+
+
+def run_diarization(pipeline, audio_input, profiler, advisor_id=None, speakers=None, tracker=None):
+    """
+    Diarise une forme d'onde et identifie le courtier
+
+    Avec les empreintes vocales activées, le pipeline retourne aussi
+    l'embedding de chaque cluster: le cluster du courtier est reconnu par son
+    empreinte, qui est ensuite mise à jour avec cet enregistrement.
+
+    Avec une deadline (tracker), la segmentation est allégée si nécessaire et
+    une deadline atteinte produit un résultat partiel (table None).
+
+    Returns:
+        tuple: (SegmentTable des tours de parole, résultat JSON)
+    """
+    tracker = tracker or ProgressTracker(profiler=profiler)
+    tracker.profiler = profiler
+    store = VoiceprintStore() if voiceprints_enabled() else None
+    hints = speaker_hints(store, advisor_id, speakers)
+
+    duration = audio_input['waveform'].shape[-1] / audio_input['sample_rate']
+    default_step = pipeline._segmentation.step
+    degraded = tracker.plan(pipeline, duration)
+    if degraded:
+        print(f"⏱️ Deadline proche: pas de segmentation {degraded['default_segmentation_step']} → "
+              f"{degraded['segmentation_step']} (fenêtre)")
+
+    # Faire la diarisation (le hook découpe segmentation / embeddings / clustering)
+    print("🔍 Analyse des locuteurs...")
+    started = time.time()
+    try:
+        with profiler.stage('segmentation'):
+            output = pipeline(audio_input, hook=tracker.hook, return_embeddings=store is not None, **hints)
+    except DeadlineExceeded as e:
+        print(f"⏱️ {e}: résultat partiel")
+        result = partial_result(tracker, e.stage, degraded)
+        tracker.emit('partial', stage=e.stage, num_segments=len(result['client_segments']))
+        return None, result
+    finally:
+        # Le pipeline est réutilisé (serveur): toujours revenir au pas par défaut
+        pipeline._segmentation.step = default_step
+    diarization, embeddings = output if store is not None else (output, None)
+
+    # Facteur temps réel ramené au pas par défaut (le coût est inverse au pas)
+    if duration > 0:
+        scale = degraded['segmentation_step'] / degraded['default_segmentation_step'] if degraded else 1.0
+        record_rtf((time.time() - started) * scale / duration)
+
+    with profiler.stage('speaker_analysis'):
+        table = SegmentTable.from_annotation(diarization)
+        result = identify_courtier(table, diarization.labels(), embeddings,
+                                   diarization.label_duration, store, advisor_id)
+
+    if degraded:
+        result['degraded'] = degraded
+    tracker.emit('done', percent=100.0, degraded=bool(degraded))
+    return table, result
+
+
+def diarize_chunk(pipeline, audio_file):
+    """
+    Tours de parole et embeddings des locuteurs d'un chunk (stream_session.py)
+
+    Les locuteurs ne sont pas encore identifiés: stream_session.py les rattache
+    à ceux des chunks précédents.
+
+    Returns:
+        dict sérialisable en JSON {success, duration, turns: [[start, end, label]],
+        labels, embeddings (lignes NaN si trop peu de parole), durations}
+    """
+    import numpy as np
+
+    waveform = load_audio(audio_file)
+    diarization, embeddings = pipeline(pyannote_input(waveform), return_embeddings=True)
+    labels = diarization.labels()
+    return {
+        'success': True,
+        'duration': len(waveform) / SAMPLE_RATE,
+        'turns': [[float(turn.start), float(turn.end), speaker]
+                  for turn, _, speaker in diarization.itertracks(yield_label=True)],
+        'labels': labels,
+        'embeddings': np.asarray(embeddings, dtype=np.float64).reshape(len(labels), -1).tolist(),
+        'durations': speaker_durations(diarization, labels)
+    }
+
+
+def run_windowed_diarization(pipeline, waveform, profiler, advisor_id=None, speakers=None, tracker=None):
+    """
+    Diarise un enregistrement long par fenêtres glissantes (windowed_diarization.py)
+
+    Les locuteurs de chaque fenêtre sont rattachés aux locuteurs globaux par
+    leurs embeddings: courtier et clients restent les mêmes sur tout le fichier.
+    Chaque fenêtre ne reçoit qu'un nombre maximal de locuteurs: le nombre
+    imposé est appliqué aux locuteurs globaux, après rattachement.
+    Une deadline atteinte garde les fenêtres déjà diarisées (résultat partiel).
+
+    Returns:
+        tuple: (SegmentTable des tours de parole ou None, résultat JSON avec la clé "windows")
+    """
+    tracker = tracker or ProgressTracker(profiler=profiler)
+    tracker.profiler = profiler
+    store = VoiceprintStore() if voiceprints_enabled() else None
+    hints = speaker_hints(store, advisor_id, speakers)
+
+    duration = len(waveform) / SAMPLE_RATE
+    windows = plan_windows(duration)
+    accumulator = WindowedDiarization()
+    default_step = pipeline._segmentation.step
+    degraded = tracker.plan(pipeline, duration)
+    print(f"🪟 Enregistrement long ({duration / 60:.0f} min): {len(windows)} fenêtres "
+          f"de {windows[0][1] - windows[0][0]:.0f}s")
+
+    started = time.time()
+    try:
+        for number, window in enumerate(windows, 1):
+            start, end = window[:2]
+            tracker.emit('window', index=number, total=len(windows), start=round(start, 2), end=round(end, 2))
+            print(f"🔍 Fenêtre {number}/{len(windows)} ({start:.0f}s → {end:.0f}s)...")
+            chunk = read_samples(waveform, int(start * SAMPLE_RATE), int(end * SAMPLE_RATE))
+            with profiler.stage('segmentation'):
+                diarization, embeddings = pipeline(pyannote_input(chunk), hook=tracker.hook,
+                                                   return_embeddings=True, **window_hints(hints))
+            accumulator.add(diarization, embeddings, window)
+    except DeadlineExceeded as e:
+        # Aucune fenêtre terminée: régions de parole de la première fenêtre (qui commence à 0)
+        if not accumulator.turns:
+            print(f"⏱️ {e}: résultat partiel")
+            result = partial_result(tracker, e.stage, degraded)
+            tracker.emit('partial', stage=e.stage, num_segments=len(result['client_segments']))
+            return None, result
+        partial_stage = f"window {accumulator.windows + 1}/{len(windows)}"
+        print(f"⏱️ {e}: résultat partiel sur {accumulator.windows}/{len(windows)} fenêtres")
+    else:
+        partial_stage = None
+        if duration > 0:
+            scale = degraded['segmentation_step'] / degraded['default_segmentation_step'] if degraded else 1.0
+            record_rtf((time.time() - started) * scale / duration)
+    finally:
+        pipeline._segmentation.step = default_step
+
+    with profiler.stage('speaker_analysis'):
+        limit = hints.get('num_speakers') or hints.get('max_speakers')
+        if limit:
+            accumulator.limit_speakers(limit)
+        table = accumulator.table()
+        stats = table.speaker_stats()
+        result = identify_courtier(table, table.labels, accumulator.embeddings(table.labels),
+                                   lambda label: stats[label]['total_duration'], store, advisor_id)
+
+    result['windows'] = accumulator.report(windows)
+    if degraded:
+        result['degraded'] = degraded
+    if partial_stage:
+        result.update({'partial': True, 'partial_stage': partial_stage})
+        tracker.emit('partial', stage=partial_stage, num_segments=len(result['client_segments']))
+    else:
+        tracker.emit('done', percent=100.0, degraded=bool(degraded))
+    return table, result
+
+
+def identify_courtier(table, labels, embeddings, label_duration, store, advisor_id=None):
+    """
+    Identifie le courtier (empreinte vocale ou heuristique) et construit le résultat
+
+    Args:
+        table: SegmentTable des tours de parole
+        labels: labels des locuteurs, dans l'ordre des lignes de `embeddings`
+        label_duration: durée de parole d'un label (pondère l'empreinte)
+    """
+    advisor = store.identify(labels, embeddings, advisor_id) if store is not None else None
+    result = build_table_result(table, advisor)
+
+    courtier = result['courtier_speaker']
+    if store is None or advisor_id is None or courtier not in labels:
+        return result
+
+    # L'empreinte n'apprend que d'un courtier connu: reconnu par sa voix, ou désigné
+    # sans ambiguïté par l'heuristique quand il n'a pas encore d'empreinte confirmée
+    # (empreinte provisoire, confirmée après plusieurs enregistrements concordants)
+    embedding = embeddings[labels.index(courtier)]
+    if advisor is not None:
+        enrolled = store.enroll(advisor_id, embedding, label_duration(courtier))
+    elif not store.has(advisor_id) and heuristic_margin(table, courtier) >= ENROLL_MARGIN:
+        enrolled = store.propose(advisor_id, embedding, label_duration(courtier))
+    else:
+        enrolled = False
+
+    if enrolled:
+        store.save()
+    result['voiceprint']['enrolled'] = enrolled
+    result['voiceprint']['confirmed'] = store.has(advisor_id)
+
+    return result
+
+
+def heuristic_margin(table, courtier) -> float:
+    """Avance du courtier désigné par l'heuristique: part des tours de parole moins celle du suivant"""
+    stats = table.coalesce().speaker_stats()
+    counts = sorted((info['num_segments'] for label, info in stats.items() if label != courtier), reverse=True)
+    total = sum(info['num_segments'] for info in stats.values())
+    if courtier not in stats or not total:
+        return 0.0
+    return (stats[courtier]['num_segments'] - (counts[0] if counts else 0)) / total
+
+
+def build_result(diarization, advisor=None):
+    """
+    Construit le résultat JSON à partir de l'annotation pyannote
+
+    Args:
+        advisor: cluster reconnu par empreinte vocale {label, advisor_id, similarity}, ou None
+    """
+    # Un seul parcours de l'annotation
+    return build_table_result(SegmentTable.from_annotation(diarization), advisor)
+
+
+def build_table_result(table, advisor=None):
+    """Construit le résultat JSON à partir des tours de parole (SegmentTable)"""
+    # Fusion des tours fragmentés
+    merged = table.coalesce()
+    print(f"🧩 Segments: {len(table)} tours → {len(merged)} après fusion")
+
+    # Analyser les locuteurs
+    print("👥 Identification courtier/client...")
+    speaker_analysis = analyze_speakers(merged, advisor['label'] if advisor else None)
+    from_voiceprint = advisor is not None and speaker_analysis['courtier'] == advisor['label']
+
+    # Extraire les segments du client
+    print("✂️ Extraction des segments client...")
+    client_segments = extract_client_segments(merged, speaker_analysis)
+
+    # Statistiques
+    total_speakers = len(speaker_analysis['stats'])
+    total_client_duration = sum(seg['duration'] for seg in client_segments)
+    is_single_speaker = speaker_analysis.get('single_speaker', False)
+
+    # Calculs différents selon le mode
+    if is_single_speaker or speaker_analysis['courtier'] is None:
+        total_courtier_duration = 0
+        courtier_num_segments = 0
+        print(f"\n📊 Résultats (mode locuteur unique):")
+        print(f"   - Locuteurs détectés: {total_speakers}")
+        print(f"   - Mode: Tout l'audio considéré comme client")
+        print(f"   - Segments extraits: {len(client_segments)} ({total_client_duration:.1f}s)")
+    else:
+        total_courtier_duration = speaker_analysis['stats'][speaker_analysis['courtier']]['total_duration']
+        courtier_num_segments = speaker_analysis['stats'][speaker_analysis['courtier']]['num_segments']
+        print(f"\n📊 Résultats:")
+        print(f"   - Locuteurs détectés: {total_speakers}")
+        print(f"   - Courtier: {speaker_analysis['courtier']} ({courtier_num_segments} segments, {total_courtier_duration:.1f}s)"
+              f"{' [empreinte vocale]' if from_voiceprint else ''}")
+        print(f"   - Client(s): {', '.join(speaker_analysis['clients'])}")
+        print(f"   - Segments client extraits: {len(client_segments)} ({total_client_duration:.1f}s)")
+
+    return {
+        'success': True,
+        'total_speakers': total_speakers,
+        'courtier_speaker': speaker_analysis['courtier'],
+        'client_speakers': speaker_analysis['clients'],
+        'client_segments': client_segments,
+        'single_speaker_mode': is_single_speaker,
+        'partial': False,
+        'courtier_source': 'voiceprint' if from_voiceprint else 'heuristic',
+        'voiceprint': {
+            'advisor_id': advisor['advisor_id'] if advisor else None,
+            'similarity': advisor['similarity'] if advisor else None,
+            'enrolled': False,
+            'confirmed': advisor is not None
+        },
+        'stats': {
+            'courtier_duration': total_courtier_duration,
+            'client_duration': total_client_duration,
+            'courtier_num_segments': courtier_num_segments,
+            'client_num_segments': len(client_segments),
+            'raw_num_turns': len(table),
+            'merged_num_segments': len(merged)
+        }
+    }
+
+
+def partial_result(tracker, stage, degraded=None):
+    """
+    Résultat d'une diarisation interrompue par la deadline
+
+    Les locuteurs ne sont pas connus: les régions de parole détectées par la
+    segmentation sont toutes considérées comme client (comme en mode locuteur
+    unique). Sans segmentation terminée, le résultat est un échec.
+    """
+    client_segments = tracker.speech_segments()
+    if not client_segments:
+        return {**error_result(f"Deadline atteinte pendant l'étape {stage}, aucune région de parole"),
+                'partial': True, 'partial_stage': stage}
+
+    total_client_duration = sum(seg['duration'] for seg in client_segments)
+    print(f"\n📊 Résultat partiel (deadline pendant {stage}):")
+    print(f"   - Segments de parole: {len(client_segments)} ({total_client_duration:.1f}s), tous considérés comme client")
+
+    return {
+        'success': True,
+        'total_speakers': None,
+        'courtier_speaker': None,
+        'client_speakers': [],
+        'client_segments': client_segments,
+        'single_speaker_mode': True,
+        'partial': True,
+        'partial_stage': stage,
+        **({'degraded': degraded} if degraded else {}),
+        'courtier_source': None,
+        'voiceprint': {'advisor_id': None, 'similarity': None, 'enrolled': False, 'confirmed': False},
+        'stats': {
+            'courtier_duration': 0,
+            'client_duration': total_client_duration,
+            'courtier_num_segments': 0,
+            'client_num_segments': len(client_segments),
+            'raw_num_turns': len(client_segments),
+            'merged_num_segments': len(client_segments)
+        }
+    }
+
+
+def write_result(output_json, result):
+    """Sauvegarde le résultat (succès ou erreur) dans le fichier JSON"""
+    with open(output_json, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+def write_profiled_result(output_json, result, profiler, mode='cli'):
+    """
+    Sauvegarde le résultat avec son profil d'exécution (clé "profile")
+
+    L'étape output_write mesure la sérialisation du résultat. Le profil est
+    ensuite sérialisé seul puis ajouté en dernière clé: le document complet
+    (identique à json.dumps) est écrit en une fois. Les métriques du job sont
+    ensuite enregistrées (metrics_store.py).
+    """
+    profiled = {key: value for key, value in result.items() if key != 'profile'}
+    with profiler.stage('output_write'):
+        body = json.dumps(profiled, indent=2, ensure_ascii=False)
+
+    profiled['profile'] = profiler.report()
+    tail = json.dumps({'profile': profiled['profile']}, indent=2, ensure_ascii=False)
+    # "{...\n}" + "{\n  "profile": ...}" → "{...,\n  "profile": ...}"
+    document = f"{body[:-2]},\n{tail[2:]}" if body != '{}' else tail
+    with open(output_json, 'w', encoding='utf-8') as f:
+        f.write(document)
+    record_job('diarization', profiled, mode, diarization_model())
+
+
+def diarization_model():
+    """Modèle des métriques: pipeline et précision"""
+    return f"{PIPELINE_NAME}:{DEFAULT_PRECISION}"
+
+
+def error_result(error):
+    """Construit le résultat JSON d'un échec"""
+    return {
+        'success': False,
+        'error': str(error),
+        'client_segments': []
+    }
+
+
+class DiarizationServer:
+    """
+    Serveur de diarisation gardant le pipeline pyannote en mémoire
+
+    Un thread unique exécute les diarisations dans l'ordre d'arrivée (le
+    pipeline n'est pas thread-safe), les connexions sont servies en parallèle
+    pour pouvoir répondre aux requêtes de statut pendant une diarisation.
+
+    Protocole (une ligne JSON par requête / réponse sur le socket Unix):
+        {"cmd": "status"}
+        {"cmd": "diarize", "audio_file": "...", "output_json": "...", "deadline": <timestamp>,
+         "progress_file": "..."}
+        {"cmd": "diarize_chunk", "audio_file": "..."}    (réponse: tours et embeddings, voir diarize_chunk)
+
+    La deadline sert aussi pendant la diarisation (dégradation, résultat partiel).
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.pipeline = None
+        self.ready = False
+        self.load_error = None
+        self.jobs = queue.Queue()
+        self.busy = False
+        self.processed = 0
+        self.failed = 0
+        self.started_at = time.time()
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'error': self.load_error,
+            'queue_depth': self.jobs.qsize(),
+            'busy': self.busy,
+            'processed': self.processed,
+            'failed': self.failed,
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'pid': os.getpid()
+        }
+
+    def _run_jobs(self):
+        """Thread d'inférence: charge le pipeline puis traite la file"""
+        try:
+            print("📦 Chargement du modèle pyannote...")
+            self.pipeline = load_pipeline()
+            self.ready = True
+            print("✅ Pipeline pyannote prêt")
+        except Exception as e:
+            self.load_error = str(e)
+
+        while True:
+            job = self.jobs.get()
+            self.busy = True
+            try:
+                job['response'] = self._process(job['request'])
+            finally:
+                self.busy = False
+                job['done'].set()
+
+    def _process(self, request):
+        if request.get('cmd') == 'diarize_chunk':
+            return self._process_chunk(request)
+
+        audio_file = request.get('audio_file')
+        output_json = request.get('output_json')
+
+        if not audio_file or not output_json:
+            return {'success': False, 'error': 'Requête invalide: audio_file et output_json requis'}
+
+        # Le client a abandonné pendant l'attente dans la file
+        deadline = request.get('deadline')
+        if deadline and time.time() > deadline:
+            self.failed += 1
+            return {'success': False, 'error': 'Deadline dépassée avant le traitement'}
+
+        profiler = StageProfiler()
+        try:
+            if self.pipeline is None:
+                raise RuntimeError(f"Pipeline non chargé: {self.load_error}")
+            if not os.path.exists(audio_file):
+                raise FileNotFoundError(f"Fichier audio introuvable: {audio_file}")
+
+            print(f"🎙️ Diarisation de: {audio_file}")
+            advisor_id = request.get('advisor_id')
+            with progress_stream(request.get('progress_file')) as stream:
+                tracker = ProgressTracker(deadline, stream)
+                result = cached_inference(
+                    'diarization', audio_file, diarization_params(advisor_id),
+                    lambda: diarize_file(self.pipeline, audio_file, profiler, advisor_id, tracker=tracker)
+                )
+            self.processed += 1
+        except Exception as e:
+            print(f"\n❌ Erreur: {str(e)}", file=sys.stderr)
+            result = error_result(e)
+            self.failed += 1
+
+        write_profiled_result(output_json, result, profiler, mode='server')
+        return {'success': result['success'], 'output_json': output_json, 'error': result.get('error')}
+
+    def _process_chunk(self, request):
+        """Chunk d'une session incrémentale: la réponse contient le résultat (pas de fichier de sortie)"""
+        audio_file = request.get('audio_file')
+        try:
+            if self.pipeline is None:
+                raise RuntimeError(f"Pipeline non chargé: {self.load_error}")
+            if not audio_file or not os.path.exists(audio_file):
+                raise FileNotFoundError(f"Fichier audio introuvable: {audio_file}")
+
+            print(f"🧩 Chunk de session: {audio_file}")
+            result = diarize_chunk(self.pipeline, audio_file)
+            self.processed += 1
+            return result
+        except Exception as e:
+            print(f"\n❌ Erreur: {str(e)}", file=sys.stderr)
+            self.failed += 1
+            return {'success': False, 'error': str(e)}
+
+    def _handle_connection(self, conn):
+        with conn, conn.makefile('rwb') as stream:
+            for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    response = {'success': False, 'error': f'JSON invalide: {e}'}
+                else:
+                    if request.get('cmd') in ('diarize', 'diarize_chunk'):
+                        job = {'request': request, 'done': threading.Event(), 'response': None}
+                        self.jobs.put(job)
+                        job['done'].wait()
+                        response = job['response']
+                    else:
+                        response = self.status()
+                stream.write((json.dumps(response, ensure_ascii=False) + '\n').encode('utf-8'))
+                stream.flush()
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        server.listen(64)
+
+        # Le socket répond au statut pendant le chargement du modèle
+        threading.Thread(target=self._run_jobs, daemon=True).start()
+        print(f"🎧 Serveur de diarisation en écoute sur {self.socket_path}")
+
+        def shutdown(signum, frame):
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            sys.exit(0)
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+
+def check_precision(audio_file: str, precision: str) -> dict:
+    """
+    Diarise le même audio en pleine précision puis en `precision` et compare les résultats
+
+    La précision réduite est acceptée si la séparation courtier/client est
+    quasiment identique (MIN_ROLE_AGREEMENT de la parole) et si le courtier
+    désigné est le même locuteur.
+    """
+    waveform = load_audio(audio_file)
+    duration = len(waveform) / SAMPLE_RATE
+
+    runs = {}
+    for mode in ('fp32', precision):
+        print(f"🔬 Diarisation en {mode}...")
+        profiler = StageProfiler()
+        pipeline = load_pipeline(profiler, precision=mode)
+        with profiler.stage('segmentation'):
+            diarization = pipeline(pyannote_input(waveform), hook=profiler.pyannote_hook)
+        table = SegmentTable.from_annotation(diarization).coalesce()
+        report = profiler.report()
+        runs[mode] = {
+            'table': table,
+            'courtier': analyze_speakers(table)['courtier'],
+            'inference_seconds': sum(
+                stage['wall_seconds'] for stage in report['stages']
+                if stage['name'] in ('segmentation', 'embedding', 'clustering')
+            ),
+            'profile': report
+        }
+
+    reference, candidate = runs['fp32'], runs[precision]
+    speakers = speaker_agreement(reference['table'], candidate['table'], duration)
+    roles = role_agreement(reference['table'], reference['courtier'],
+                           candidate['table'], candidate['courtier'], duration)
+    same_courtier = speakers['speaker_mapping'].get(candidate['courtier']) == reference['courtier']
+
+    return {
+        'success': True,
+        'precision': precision,
+        'duration': duration,
+        'runs': {
+            mode: {
+                'inference_seconds': round(run['inference_seconds'], 3),
+                'num_speakers': len(run['table'].labels),
+                'num_segments': len(run['table']),
+                'courtier': run['courtier'],
+                'profile': run['profile']
+            }
+            for mode, run in runs.items()
+        },
+        'speedup': round(reference['inference_seconds'] / candidate['inference_seconds'], 2)
+        if candidate['inference_seconds'] > 0 else None,
+        **speakers,
+        'role_agreement': roles,
+        'same_courtier': same_courtier,
+        'accepted': same_courtier and roles >= MIN_ROLE_AGREEMENT
+    }
 
 
 def main():
-    if len(sys.argv) < 3:
+    parser = argparse.ArgumentParser(description="Diarisation courtier/client avec pyannote")
+    parser.add_argument('audio_file', nargs='?')
+    parser.add_argument('output_json', nargs='?')
+    parser.add_argument('--serve', action='store_true', help='Lancer le serveur de diarisation')
+    parser.add_argument('--socket', default=os.getenv('PYANNOTE_SERVER_SOCKET', '/tmp/pyannote_server.sock'),
+                        help='Chemin du socket Unix du serveur')
+    parser.add_argument('--profile-trace', metavar='FICHIER',
+                        help='Écrire une trace détaillée (cProfile .prof ou trace Chrome torch)')
+    parser.add_argument('--profile-trace-kind', choices=TRACE_KINDS, default='cprofile',
+                        help='Type de trace écrite par --profile-trace')
+    parser.add_argument('--advisor-id',
+                        help="Utilisateur (courtier) attendu: son empreinte vocale identifie le courtier")
+    for hint in ('num_speakers', 'min_speakers', 'max_speakers'):
+        parser.add_argument(f"--{hint.replace('_', '-')}", dest=hint, type=int,
+                            help='Borne du nombre de locuteurs passée au pipeline')
+    parser.add_argument('--deadline', type=float, metavar='EPOCH',
+                        help='Horodatage à ne pas dépasser: dégradation puis résultat partiel')
+    parser.add_argument('--progress', metavar='FICHIER',
+                        help='Écrire les événements de progression (NDJSON) dans ce fichier')
+    parser.add_argument('--check-precision', choices=[p for p in PRECISIONS if p != 'fp32'],
+                        help='Comparer la précision réduite à la pleine précision sur ce fichier')
+    args = parser.parse_args()
+
+    if args.serve:
+        # Logs du serveur visibles immédiatement (stdout redirigé vers un fichier)
+        sys.stdout.reconfigure(line_buffering=True)
+        DiarizationServer(args.socket).serve_forever()
+        return
+
+    if not args.audio_file or not args.output_json:
         print("Usage: python3 diarize_audio.py <audio_file> <output_json>", file=sys.stderr)
         sys.exit(1)
 
-    audio_file = sys.argv[1]
-    output_json = sys.argv[2]
+    audio_file = args.audio_file
+    output_json = args.output_json
 
     if not os.path.exists(audio_file):
         print(f"Erreur: Fichier audio introuvable: {audio_file}", file=sys.stderr)
         sys.exit(1)
 
+    if args.check_precision:
+        report = check_precision(audio_file, args.check_precision)
+        write_result(output_json, report)
+        print(f"\n{'✅' if report['accepted'] else '❌'} {args.check_precision}: accélération x{report['speedup']}, "
+              f"locuteurs {report['speaker_agreement']:.1%}, courtier/client {report['role_agreement']:.1%}")
+        sys.exit(0 if report['accepted'] else 1)
+
     print(f"🎙️ Diarisation de: {audio_file}")
 
-    try:
-        # Charger le pipeline
+    profiler = StageProfiler()
+    speakers = {hint: getattr(args, hint) for hint in ('num_speakers', 'min_speakers', 'max_speakers')
+                if getattr(args, hint) is not None}
+
+    def run_pipeline():
+        # Charger le pipeline (uniquement si le résultat n'est pas en cache)
         print("📦 Chargement du modèle pyannote...")
-        pipeline = load_pipeline()
-
-        # Faire la diarisation
-        print("🔍 Analyse des locuteurs...")
-        diarization = pipeline(audio_file)
-
-        # Analyser les locuteurs
-        print("👥 Identification courtier/client...")
-        speaker_analysis = analyze_speakers(diarization)
-
-        # Extraire les segments du client
-        print("✂️ Extraction des segments client...")
-        client_segments = extract_client_segments(diarization, speaker_analysis)
-
-        # Statistiques
-        total_speakers = len(speaker_analysis['stats'])
-        total_client_duration = sum(seg['duration'] for seg in client_segments)
-        is_single_speaker = speaker_analysis.get('single_speaker', False)
-
-        # Calculs différents selon le mode
-        if is_single_speaker or speaker_analysis['courtier'] is None:
-            total_courtier_duration = 0
-            courtier_num_segments = 0
-            print(f"\n📊 Résultats (mode locuteur unique):")
-            print(f"   - Locuteurs détectés: {total_speakers}")
-            print(f"   - Mode: Tout l'audio considéré comme client")
-            print(f"   - Segments extraits: {len(client_segments)} ({total_client_duration:.1f}s)")
-        else:
-            total_courtier_duration = speaker_analysis['stats'][speaker_analysis['courtier']]['total_duration']
-            courtier_num_segments = speaker_analysis['stats'][speaker_analysis['courtier']]['num_segments']
-            print(f"\n📊 Résultats:")
-            print(f"   - Locuteurs détectés: {total_speakers}")
-            print(f"   - Courtier: {speaker_analysis['courtier']} ({courtier_num_segments} segments, {total_courtier_duration:.1f}s)")
-            print(f"   - Client(s): {', '.join(speaker_analysis['clients'])}")
-            print(f"   - Segments client extraits: {len(client_segments)} ({total_client_duration:.1f}s)")
+        pipeline = load_pipeline(profiler)
+        return diarize_file(pipeline, audio_file, profiler, args.advisor_id, speakers, tracker)
 
-        # Sauvegarder le résultat
-        result = {
-            'success': True,
-            'total_speakers': total_speakers,
-            'courtier_speaker': speaker_analysis['courtier'],
-            'client_speakers': speaker_analysis['clients'],
-            'client_segments': client_segments,
-            'single_speaker_mode': is_single_speaker,
-            'stats': {
-                'courtier_duration': total_courtier_duration,
-                'client_duration': total_client_duration,
-                'courtier_num_segments': courtier_num_segments,
-                'client_num_segments': len(client_segments)
-            }
-        }
+    try:
+        with trace(args.profile_trace, args.profile_trace_kind), progress_stream(args.progress) as stream:
+            tracker = ProgressTracker(args.deadline, stream)
+            result = cached_inference('diarization', audio_file, diarization_params(args.advisor_id, speakers),
+                                      run_pipeline)
 
-        with open(output_json, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
+        if result.get('cache', {}).get('hit'):
+            print("⚡ Résultat trouvé en cache")
+
+        # Sauvegarder le résultat
+        write_profiled_result(output_json, result, profiler)
 
         print(f"\n✅ Résultats sauvegardés dans: {output_json}")
 
@@ -246,14 +976,8 @@ def main():
         print(f"\n❌ Erreur: {str(e)}", file=sys.stderr)
 
         # Sauvegarder l'erreur
-        error_result = {
-            'success': False,
-            'error': str(e),
-            'client_segments': []
-        }
-
-        with open(output_json, 'w', encoding='utf-8') as f:
-            json.dump(error_result, f, indent=2, ensure_ascii=False)
+        write_result(output_json, error_result(e))
+        record_job('diarization', error_result(e), 'cli', diarization_model())
 
         sys.exit(1)
 
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Cache de résultats d'inférence adressé par contenu
+
+La clé combine le hash du contenu audio et les paramètres d'inférence
+(modèle, langue, version du pipeline...). Un retry de job, une relance manuelle
+ou un doublon d'upload retrouve ainsi le résultat sans refaire l'inférence.
+
+Ce module n'utilise que la bibliothèque standard: un cache hit répond en
+quelques millisecondes sans importer torch.
+
+Configuration (variables d'environnement):
+    INFERENCE_CACHE=0           désactive le cache
+    INFERENCE_CACHE_DIR         dossier du cache (défaut: ~/.cache/crm-ai/inference)
+    INFERENCE_CACHE_MAX_MB      taille maximale avant éviction LRU (défaut: 512)
+"""
+
+import os
+import json
+import fcntl
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'crm-ai', 'inference')
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Après éviction, le cache redescend à ce ratio de la taille maximale
+EVICTION_TARGET_RATIO = 0.9
+
+
+def audio_hash(audio_path: str) -> str:
+    """Hash SHA-256 du contenu du fichier audio"""
+    digest = hashlib.sha256()
+    with open(audio_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(kind: str, audio_path: str, params: dict) -> str:
+    """Clé de cache: type d'inférence + contenu audio + paramètres"""
+    payload = json.dumps({'kind': kind, 'audio': audio_hash(audio_path), 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class InferenceCache:
+    """Cache disque borné en taille, éviction LRU, écritures atomiques"""
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        self.directory = directory or os.getenv('INFERENCE_CACHE_DIR') or DEFAULT_DIR
+        self.max_bytes = max_bytes or int(os.getenv('INFERENCE_CACHE_MAX_MB', '512')) * 1024 * 1024
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    @contextmanager
+    def _locked(self):
+        """Verrou global du cache (compteurs et éviction), partagé entre workers"""
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get(self, key: str):
+        """Retourne le résultat en cache, ou None"""
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = json.load(f)
+            # La date de modification sert d'horodatage LRU
+            os.utime(path)
+        except (OSError, json.JSONDecodeError):
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        return value
+
+    def put(self, key: str, value: dict) -> None:
+        """Écrit le résultat de façon atomique (fichier temporaire puis rename)"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self._evict()
+
+    def _evict(self) -> None:
+        """Supprime les entrées les moins récemment utilisées au-delà de la taille max"""
+        with self._locked():
+            entries = []
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if not name.endswith('.json') or root == self.directory:
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_bytes:
+                return
+
+            target = self.max_bytes * EVICTION_TARGET_RATIO
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+    def _count(self, counter: str) -> None:
+        with self._locked():
+            stats = self.stats()
+            stats[counter] = stats.get(counter, 0) + 1
+            with open(os.path.join(self.directory, 'stats.json'), 'w', encoding='utf-8') as f:
+                json.dump(stats, f)
+
+    def stats(self) -> dict:
+        """Compteurs cumulés de hits / misses"""
+        try:
+            with open(os.path.join(self.directory, 'stats.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {'hits': 0, 'misses': 0}
+
+
+def cache_enabled() -> bool:
+    return os.getenv('INFERENCE_CACHE', '1') != '0'
+
+
+def cached_inference(kind: str, audio_path: str, params: dict, compute):
+    """
+    Retourne le résultat en cache ou exécute `compute()` et le met en cache
+
+    Les résultats en erreur, partiels ou dégradés (deadline) ne sont pas mis
+    en cache: une relance sans contrainte de temps refait l'inférence. Le résultat retourné
+    contient une clé "cache" avec l'état du cache pour ce fichier.
+    """
+    if not cache_enabled() or not isinstance(audio_path, str) or not os.path.isfile(audio_path):
+        return compute()
+
+    try:
+        cache = InferenceCache()
+        key = cache_key(kind, audio_path, params)
+        cached = cache.get(key)
+    except OSError:
+        return compute()
+
+    if cached is not None:
+        return {**cached, 'cache': {'hit': True, 'key': key, **cache.stats()}}
+
+    result = compute()
+
+    if 'error' not in result and result.get('success', True) and not result.get('partial') \
+            and not result.get('degraded'):
+        try:
+            cache.put(key, result)
+        except OSError:
+            pass
+
+    return {**result, 'cache': {'hit': False, 'key': key, **cache.stats()}}
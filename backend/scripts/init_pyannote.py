@@ -6,18 +6,22 @@ Ce script:
 1. Vérifie si pyannote est installé
 2. L'installe si nécessaire
 3. Pré-télécharge le modèle de diarisation pour éviter le délai au premier enregistrement
+4. Exporte optionnellement un bundle local figé (voir model_bundle.py)
 
 Usage:
-    python3 init_pyannote.py [--install] [--download-model]
+    python3 init_pyannote.py [--install] [--download-model] [--bundle]
 
     --install        : Installe pyannote-audio si manquant
     --download-model : Télécharge le modèle de diarisation
+    --bundle         : Télécharge le modèle puis l'exporte en bundle local (safetensors, chargement
+                       hors ligne et mappé en mémoire), utilisé ensuite par load_pipeline()
 
     Sans arguments   : Vérifie l'installation et télécharge le modèle si token disponible
 """
 
 import sys
 import os
+import time
 import subprocess
 
 def check_pyannote_installed():
@@ -54,13 +58,13 @@ def install_pyannote():
         return False
 
 def download_model():
-    """Pré-télécharge le modèle de diarisation"""
+    """Pré-télécharge le modèle de diarisation et retourne le pipeline chargé (None en cas d'échec)"""
     hf_token = os.getenv('HUGGINGFACE_TOKEN')
 
     if not hf_token:
         print("⚠️ HUGGINGFACE_TOKEN non défini - impossible de télécharger le modèle")
         print("   Définissez la variable d'environnement et réexécutez ce script")
-        return False
+        return None
 
     print("📥 Téléchargement du modèle de diarisation...")
     print("   (Cela peut prendre plusieurs minutes la première fois)")
@@ -78,10 +82,12 @@ def download_model():
 
         from pyannote.audio import Pipeline
 
+        started = time.perf_counter()
         pipeline = Pipeline.from_pretrained(
             "pyannote/speaker-diarization-3.1",
             use_auth_token=hf_token
         )
+        load_seconds = time.perf_counter() - started
 
         # Restaurer torch.load original
         torch.load = original_load
@@ -89,14 +95,43 @@ def download_model():
         # Configurer pour CPU
         pipeline.to(torch.device("cpu"))
 
-        print("✅ Modèle de diarisation téléchargé et prêt")
-        return True
+        print(f"✅ Modèle de diarisation téléchargé et prêt (chargé en {load_seconds:.2f}s)")
+        return pipeline
 
     except Exception as e:
         print(f"❌ Erreur lors du téléchargement du modèle: {e}")
         print("\n💡 Assurez-vous d'avoir:")
         print("   1. Accepté la licence sur https://huggingface.co/pyannote/speaker-diarization-3.1")
         print("   2. Un token HuggingFace valide")
+        return None
+
+def build_bundle(pipeline):
+    """Exporte le pipeline téléchargé en bundle local puis vérifie qu'il se recharge"""
+    print("📦 Export du bundle local du pipeline...")
+
+    try:
+        from huggingface_hub import hf_hub_download
+        from model_bundle import export_bundle, load_bundle
+
+        config_path = hf_hub_download(
+            repo_id="pyannote/speaker-diarization-3.1",
+            filename="config.yaml",
+            local_files_only=True
+        )
+        # Le snapshot HuggingFace est nommé d'après sa révision: le bundle est figé sur celle-ci
+        revision = os.path.basename(os.path.dirname(config_path))
+        directory = export_bundle(pipeline, config_path, revision)
+
+        started = time.perf_counter()
+        load_bundle(directory)
+        bundle_seconds = time.perf_counter() - started
+
+        print(f"✅ Bundle {revision[:12]} exporté dans {directory}")
+        print(f"   Chargement depuis le bundle: {bundle_seconds:.2f}s")
+        return True
+
+    except Exception as e:
+        print(f"❌ Erreur lors de l'export du bundle: {e}")
         return False
 
 def check_system():
@@ -151,9 +186,12 @@ def main():
                 sys.exit(1)
 
     # Téléchargement du modèle si demandé
-    if '--download-model' in args or len(args) == 0:
+    if '--download-model' in args or '--bundle' in args or len(args) == 0:
         if check_pyannote_installed():
-            download_model()
+            pipeline = download_model()
+
+            if '--bundle' in args and (pipeline is None or not build_bundle(pipeline)):
+                sys.exit(1)
 
     print("\n✅ Initialisation terminée")
 
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Ordonnanceur local des jobs d'inférence (budget de cœurs et de RAM de l'hôte)
+
+Chaque worker de queue Laravel lance un script Python qui, par défaut, laisse
+torch utiliser tous les cœurs: avec plusieurs workers sur la même machine, les
+processus se disputent le CPU et ralentissent tous ensemble. Ce wrapper se
+place devant les scripts:
+
+    python3 job_scheduler.py run <type>[:<modèle>] -- python3 diarize_audio.py audio.webm out.json
+
+Il attend qu'un créneau soit libre (les jobs en attente dorment au lieu de
+concurrencer les jobs en cours), fixe le nombre de threads intra-op du job
+(OMP_NUM_THREADS...) puis remplace son processus par la commande (exec): le
+créneau est libéré automatiquement à la fin du processus, même en cas de crash.
+
+Un job démarre si:
+    - le nombre de jobs en cours du même type/modèle est sous SCHEDULER_MAX_PER_MODEL
+    - les threads des jobs en cours + les siens tiennent dans SCHEDULER_CORES
+    - la RAM estimée des jobs en cours + la sienne tient dans SCHEDULER_MEMORY_MB
+    - aucun job du même type n'attend depuis plus longtemps (FIFO par type)
+Un job peut dépasser la tête de la file (job en attente le plus ancien, tous
+types confondus) s'il tient dans le budget restant, tant que la tête attend
+depuis moins de SCHEDULER_AGING_SECONDS: au-delà, le créneau est réservé à la
+tête et plus aucun job ne la dépasse, pour qu'un flux de petits jobs ne puisse
+pas affamer un gros job. Quand rien ne tourne, seule la tête démarre (même
+hors budget).
+
+    python3 job_scheduler.py run --max-wait 150 diarization -- ...   # abandon après 150 s d'attente
+    python3 job_scheduler.py status     # jobs en cours / en attente, temps d'attente (JSON)
+
+Configuration (variables d'environnement):
+    INFERENCE_SCHEDULER=0       désactive l'ordonnanceur (exec immédiat)
+    SCHEDULER_DIR               dossier d'état partagé (défaut: /tmp/crm-ai-scheduler)
+    SCHEDULER_CORES             cœurs alloués aux jobs (défaut: tous)
+    SCHEDULER_MEMORY_MB         RAM allouée aux jobs (défaut: 80 % de la RAM totale)
+    SCHEDULER_THREADS_PER_JOB   threads intra-op par job (défaut: min(4, cœurs))
+    SCHEDULER_MAX_PER_MODEL     jobs simultanés par type/modèle (défaut: 2)
+    SCHEDULER_MAX_WAIT          attente max en secondes avant abandon (défaut: 0 = illimité, --max-wait prioritaire)
+    SCHEDULER_AGING_SECONDS     attente de la tête de file au-delà de laquelle plus aucun job ne la dépasse (défaut: 60)
+"""
+
+import sys
+import os
+import json
+import time
+import fcntl
+import argparse
+from contextlib import contextmanager
+
+DEFAULT_DIR = '/tmp/crm-ai-scheduler'
+POLL_SECONDS = 0.5
+
+# RAM estimée d'un job (Mo) par type, et par modèle Whisper
+KIND_MEMORY_MB = {
+    'diarization': 2000,
+    'speaker_transcript': 2000,
+    'stream': 2000,
+    'whisper': 0
+}
+WHISPER_MEMORY_MB = {
+    'tiny': 400, 'base': 600, 'small': 1300, 'medium': 3200,
+    'large': 6500, 'large-v2': 6500, 'large-v3': 6500
+}
+# Modèle adaptatif (model_selection.py): réserver la mémoire du plus grand candidat
+WHISPER_MEMORY_MB['auto'] = max(
+    WHISPER_MEMORY_MB.get(model.strip(), 0)
+    for model in os.getenv('WHISPER_ADAPTIVE_MODELS', 'tiny,base,small,medium').split(',')
+)
+
+# Variables lues par torch, CTranslate2 et les BLAS pour dimensionner leurs pools de threads
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'SCHEDULER_JOB_THREADS']
+
+
+def scheduler_enabled() -> bool:
+    return os.getenv('INFERENCE_SCHEDULER', '1') != '0'
+
+
+def _total_memory_mb() -> int:
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return 8192
+
+
+class Budget:
+    """Ressources de l'hôte allouées aux jobs d'inférence"""
+
+    def __init__(self):
+        self.cores = int(os.getenv('SCHEDULER_CORES') or os.cpu_count() or 1)
+        self.memory_mb = int(os.getenv('SCHEDULER_MEMORY_MB') or _total_memory_mb() * 0.8)
+        self.threads_per_job = int(os.getenv('SCHEDULER_THREADS_PER_JOB') or min(4, self.cores))
+        self.max_per_model = int(os.getenv('SCHEDULER_MAX_PER_MODEL', '2'))
+        self.aging_seconds = float(os.getenv('SCHEDULER_AGING_SECONDS', '60'))
+
+    def to_dict(self) -> dict:
+        return {
+            'cores': self.cores,
+            'memory_mb': self.memory_mb,
+            'threads_per_job': self.threads_per_job,
+            'max_per_model': self.max_per_model,
+            'aging_seconds': self.aging_seconds
+        }
+
+
+def estimate_memory_mb(kind: str) -> int:
+    """RAM estimée d'un job "type[:modèle]" """
+    job_type, _, model = kind.partition(':')
+    return KIND_MEMORY_MB.get(job_type, 2000) + WHISPER_MEMORY_MB.get(model, 0)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Scheduler:
+    """État partagé (running / waiting / stats) dans un fichier JSON protégé par flock"""
+
+    def __init__(self, directory: str = None, budget: Budget = None):
+        self.directory = directory or os.getenv('SCHEDULER_DIR') or DEFAULT_DIR
+        self.budget = budget or Budget()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @contextmanager
+    def _state(self):
+        """Lecture-modification-écriture de l'état sous verrou exclusif"""
+        path = os.path.join(self.directory, 'state.json')
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        state = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    state = {'running': [], 'waiting': [], 'stats': {}}
+
+                # Les jobs dont le processus a disparu libèrent leur créneau
+                state['running'] = [job for job in state['running'] if _alive(job['pid'])]
+                state['waiting'] = [job for job in state['waiting'] if _alive(job['pid'])]
+
+                yield state
+
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _fits(self, state: dict, job: dict) -> bool:
+        running = state['running']
+        head = state['waiting'][0]
+
+        if head['pid'] == job['pid']:
+            if not running:
+                return True
+        else:
+            # Tout est libre: la tête de file démarre en premier
+            if not running:
+                return False
+
+            earlier = next(j for j in state['waiting'] if j['kind'] == job['kind'])
+            if earlier['pid'] != job['pid']:
+                return False
+
+            # Réservation: la tête attend depuis trop longtemps, plus aucun job ne la dépasse
+            if time.time() - head['enqueued_at'] > self.budget.aging_seconds:
+                return False
+
+        return (
+            sum(1 for j in running if j['kind'] == job['kind']) < self.budget.max_per_model
+            and sum(j['threads'] for j in running) + job['threads'] <= self.budget.cores
+            and sum(j['memory_mb'] for j in running) + job['memory_mb'] <= self.budget.memory_mb
+        )
+
+    def acquire(self, kind: str, threads: int = None, memory_mb: int = None, max_wait: float = 0) -> dict:
+        """
+        Attend un créneau pour le processus courant
+
+        Raises:
+            TimeoutError: si max_wait est dépassé
+        """
+        job = {
+            'pid': os.getpid(),
+            'kind': kind,
+            'threads': max(1, min(threads or self.budget.threads_per_job, self.budget.cores)),
+            'memory_mb': memory_mb or estimate_memory_mb(kind),
+            'enqueued_at': time.time()
+        }
+
+        with self._state() as state:
+            state['waiting'].append(job)
+
+        while True:
+            with self._state() as state:
+                waited = time.time() - job['enqueued_at']
+                stats = state['stats'].setdefault(
+                    kind, {'started': 0, 'timeouts': 0, 'total_wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+                )
+
+                if self._fits(state, job):
+                    state['waiting'] = [j for j in state['waiting'] if j['pid'] != job['pid']]
+                    job['started_at'] = time.time()
+                    state['running'].append(job)
+                    stats['started'] += 1
+                    stats['total_wait_seconds'] = round(stats['total_wait_seconds'] + waited, 3)
+                    stats['max_wait_seconds'] = round(max(stats['max_wait_seconds'], waited), 3)
+                    return job
+
+                timed_out = max_wait and waited > max_wait
+                if timed_out:
+                    state['waiting'] = [j for j in state['waiting'] if j['pid'] != job['pid']]
+                    stats['timeouts'] += 1
+
+            # Levée hors du bloc: l'état (job retiré de la file) doit être sauvegardé
+            if timed_out:
+                raise TimeoutError(f"Aucun créneau libre pour {kind} après {waited:.0f}s")
+
+            time.sleep(POLL_SECONDS)
+
+    def status(self) -> dict:
+        """Jobs en cours / en attente et temps d'attente cumulés, par type"""
+        now = time.time()
+        with self._state() as state:
+            counts = {}
+            for name in ('running', 'waiting'):
+                for job in state[name]:
+                    counts.setdefault(job['kind'], {'running': 0, 'waiting': 0})[name] += 1
+
+            stats = {
+                kind: {
+                    **values,
+                    'avg_wait_seconds': round(values['total_wait_seconds'] / values['started'], 2)
+                    if values['started'] else 0.0
+                }
+                for kind, values in state['stats'].items()
+            }
+
+            return {
+                'budget': self.budget.to_dict(),
+                'running': [
+                    {'pid': j['pid'], 'kind': j['kind'], 'threads': j['threads'], 'memory_mb': j['memory_mb'],
+                     'running_seconds': round(now - j['started_at'], 1)}
+                    for j in state['running']
+                ],
+                'waiting': [
+                    {'pid': j['pid'], 'kind': j['kind'], 'waiting_seconds': round(now - j['enqueued_at'], 1)}
+                    for j in state['waiting']
+                ],
+                'threads_in_use': sum(j['threads'] for j in state['running']),
+                'memory_reserved_mb': sum(j['memory_mb'] for j in state['running']),
+                'counts': counts,
+                'stats': stats
+            }
+
+
+def run(kind: str, command: list, threads: int = None, memory_mb: int = None, max_wait: float = None) -> None:
+    """
+    Attend un créneau puis exécute la commande à la place du processus courant
+
+    max_wait (défaut: SCHEDULER_MAX_WAIT) doit rester sous le timeout de l'appelant,
+    pour qu'une longue attente sorte en code 75 et non en timeout d'inférence.
+    """
+    if max_wait is None:
+        max_wait = float(os.getenv('SCHEDULER_MAX_WAIT', '0'))
+
+    if scheduler_enabled():
+        try:
+            job = Scheduler().acquire(kind, threads, memory_mb, max_wait)
+            for variable in THREAD_VARIABLES:
+                os.environ[variable] = str(job['threads'])
+        except TimeoutError as e:
+            print(json.dumps({'success': False, 'error': str(e)}))
+            sys.exit(75)
+        except OSError:
+            # État partagé inaccessible: le job passe sans ordonnancement (rien sur la sortie,
+            # qui est parsée par l'appelant)
+            pass
+
+    # Même PID après exec: le créneau reste réservé jusqu'à la fin de la commande
+    os.execvp(command[0], command)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ordonnanceur local des jobs d'inférence")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Attendre un créneau puis lancer la commande')
+    run_parser.add_argument('kind', help='Type de job, éventuellement suivi du modèle (ex: whisper:small)')
+    run_parser.add_argument('--threads', type=int, help='Threads intra-op (défaut: SCHEDULER_THREADS_PER_JOB)')
+    run_parser.add_argument('--memory-mb', type=int, help='RAM estimée du job (défaut: selon le type/modèle)')
+    run_parser.add_argument('--max-wait', type=float, help='Attente max en secondes (défaut: SCHEDULER_MAX_WAIT)')
+    run_parser.add_argument('job', nargs=argparse.REMAINDER, help='Commande à exécuter (après --)')
+
+    subparsers.add_parser('status', help='Afficher les jobs en cours et en attente (JSON)')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        print(json.dumps(Scheduler().status(), ensure_ascii=False))
+        return
+
+    command = args.job[1:] if args.job[:1] == ['--'] else args.job
+    if not command:
+        parser.error('commande manquante après --')
+
+    run(args.kind, command, args.threads, args.memory_mb, args.max_wait)
+
+
+if __name__ == '__main__':
+    main()
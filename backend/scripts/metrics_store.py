@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Métriques de performance des scripts d'inférence (une ligne par job)
+
+Laravel ne voit de la diarisation et de la transcription que le succès et la
+durée mesurée de l'extérieur. Chaque job Python (CLI, worker Whisper, serveur
+pyannote, mode batch) ajoute ici ses propres mesures: modèle, durée audio,
+facteur temps réel, chargement du modèle, cache, pic de RSS, threads.
+
+Stockage: SQLite en mode WAL (plusieurs processus écrivent en même temps),
+lignes plus anciennes que METRICS_RETENTION_DAYS supprimées à l'écriture.
+
+Après chaque job, les quantiles p50/p95/p99 de la fenêtre glissante
+(METRICS_WINDOW_HOURS) sont exportés au format texte Prometheus (summary) dans
+METRICS_PROM_PATH, lisible par le textfile collector de node_exporter:
+une dérive des performances se détecte sans profiler en production.
+
+Utilisation:
+    python3 metrics_store.py summary [--hours 24]     quantiles par script et modèle (JSON)
+    python3 metrics_store.py export [--output f.prom]  réécrit le fichier Prometheus
+
+Configuration (variables d'environnement):
+    METRICS=0                   désactive l'enregistrement
+    METRICS_DB                  base SQLite (défaut: ~/.cache/crm-ai/metrics.sqlite3)
+    METRICS_PROM_PATH           fichier Prometheus (défaut: ~/.cache/crm-ai/metrics.prom)
+    METRICS_WINDOW_HOURS        fenêtre des quantiles exportés (défaut: 24)
+    METRICS_RETENTION_DAYS      durée de conservation des lignes (défaut: 30)
+"""
+
+import sys
+import os
+import json
+import time
+import sqlite3
+import argparse
+from contextlib import closing
+
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'crm-ai')
+DEFAULT_DB = os.path.join(CACHE_DIR, 'metrics.sqlite3')
+DEFAULT_PROM_PATH = os.path.join(CACHE_DIR, 'metrics.prom')
+WINDOW_HOURS = float(os.getenv('METRICS_WINDOW_HOURS', '24'))
+RETENTION_DAYS = float(os.getenv('METRICS_RETENTION_DAYS', '30'))
+
+QUANTILES = [0.5, 0.95, 0.99]
+
+# Mesures exportées en summary Prometheus: colonne → (nom de la métrique, description)
+SUMMARIES = {
+    'real_time_factor': ('crm_ai_inference_real_time_factor', "Secondes de calcul par seconde d'audio"),
+    'processing_seconds': ('crm_ai_inference_processing_seconds', "Durée d'inférence hors chargement du modèle"),
+    'model_load_seconds': ('crm_ai_inference_model_load_seconds', 'Durée de chargement du modèle (jobs à froid)'),
+    'audio_seconds': ('crm_ai_inference_audio_seconds', "Durée de l'audio traité"),
+    'peak_rss_mb': ('crm_ai_inference_peak_rss_mb', 'Pic de mémoire résidente du processus pendant le job (Mo)')
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    script TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    model TEXT,
+    success INTEGER NOT NULL,
+    cache_hit INTEGER NOT NULL,
+    audio_seconds REAL,
+    processing_seconds REAL,
+    real_time_factor REAL,
+    model_load_seconds REAL,
+    peak_rss_mb REAL,
+    threads INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+"""
+
+
+def metrics_enabled() -> bool:
+    return os.getenv('METRICS', '1') != '0'
+
+
+def db_path() -> str:
+    return os.getenv('METRICS_DB') or DEFAULT_DB
+
+
+def prom_path() -> str:
+    return os.getenv('METRICS_PROM_PATH') or DEFAULT_PROM_PATH
+
+
+def connect(path: str = None) -> sqlite3.Connection:
+    """Connexion à la base (créée au besoin), en WAL avec attente des verrous d'écriture"""
+    path = path or db_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    connection = sqlite3.connect(path, timeout=10)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def job_threads() -> int:
+    """Threads alloués au job (ordonnanceur, OpenMP, sinon toute la machine)"""
+    return int(os.getenv('SCHEDULER_JOB_THREADS') or os.getenv('OMP_NUM_THREADS') or os.cpu_count() or 1)
+
+
+def _stage_seconds(profile: dict, *names) -> float:
+    seconds = [stage['wall_seconds'] for stage in profile.get('stages', []) if stage['name'] in names]
+    return round(sum(seconds), 3) if seconds else None
+
+
+def job_metrics(script: str, result: dict, mode: str, model: str = None) -> dict:
+    """
+    Ligne de métriques d'un job d'après son résultat JSON
+
+    Les résultats Whisper portent leur durée audio et leur facteur temps réel;
+    pour la diarisation, ils sont déduits du profil (hors import et chargement).
+    Un pic de RSS qui couvre toute la vie d'un worker ou d'un serveur (pas de
+    remise à zéro par job, voir profiling.py) n'est pas enregistré.
+    """
+    profile = result.get('profile') or {}
+    cache_hit = bool((result.get('cache') or {}).get('hit'))
+    audio_seconds = result.get('audio_duration')
+    processing_seconds = result.get('processing_seconds')
+    load_seconds = _stage_seconds(profile, 'model_load')
+
+    if processing_seconds is None and profile and not cache_hit:
+        processing_seconds = max(0.0, profile.get('total_wall_seconds', 0.0)
+                                 - (_stage_seconds(profile, 'import', 'model_load') or 0.0))
+    peak_rss = profile.get('peak_rss_mb', result.get('peak_rss_mb'))
+    if profile.get('peak_rss_scope') == 'process' and mode != 'cli':
+        peak_rss = None
+
+    rtf = result.get('real_time_factor')
+    if rtf is None and processing_seconds is not None and audio_seconds:
+        rtf = processing_seconds / audio_seconds
+
+    return {
+        'created_at': time.time(),
+        'script': script,
+        'mode': mode,
+        'model': model or result.get('model'),
+        'success': int('error' not in result and result.get('success', True) is not False),
+        'cache_hit': int(cache_hit),
+        'audio_seconds': audio_seconds,
+        # Un résultat en cache n'a rien calculé: ses mesures décriraient le job d'origine
+        'processing_seconds': None if cache_hit else processing_seconds,
+        'real_time_factor': None if cache_hit or rtf is None else round(rtf, 4),
+        'model_load_seconds': load_seconds,
+        'peak_rss_mb': peak_rss,
+        'threads': job_threads()
+    }
+
+
+def record_job(script: str, result: dict, mode: str = 'cli', model: str = None) -> None:
+    """
+    Ajoute les métriques d'un job et réexporte le fichier Prometheus
+
+    Les métriques ne font jamais échouer le job: toute erreur est ignorée
+    (signalée sur stderr).
+    """
+    if not metrics_enabled():
+        return
+    try:
+        row = job_metrics(script, result, mode, model)
+        with closing(connect()) as connection, connection:
+            connection.execute(
+                f"INSERT INTO jobs ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                list(row.values())
+            )
+            connection.execute('DELETE FROM jobs WHERE created_at < ?',
+                               (time.time() - RETENTION_DAYS * 86400,))
+        export_prometheus(prom_path())
+    except (sqlite3.Error, OSError, ValueError, TypeError) as e:
+        print(f"⚠️ Métriques non enregistrées: {e}", file=sys.stderr)
+
+
+def load_window(hours: float = None, path: str = None) -> list:
+    """Jobs de la fenêtre glissante, en dicts"""
+    since = time.time() - (hours or WINDOW_HOURS) * 3600
+    with closing(connect(path)) as connection:
+        connection.row_factory = sqlite3.Row
+        rows = connection.execute('SELECT * FROM jobs WHERE created_at >= ? ORDER BY created_at', (since,))
+        return [dict(row) for row in rows]
+
+
+def summarize(jobs: list) -> list:
+    """Quantiles et compteurs par (script, modèle)"""
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job['script'], job['model'] or 'unknown'), []).append(job)
+
+    summary = []
+    for (script, model), group in sorted(groups.items()):
+        entry = {
+            'script': script,
+            'model': model,
+            'jobs': len(group),
+            'failures': sum(1 for job in group if not job['success']),
+            'cache_hits': sum(job['cache_hit'] for job in group),
+            'threads': max(job['threads'] or 0 for job in group),
+            'metrics': {}
+        }
+        for column in SUMMARIES:
+            values = np.array([job[column] for job in group if job[column] is not None], dtype=np.float64)
+            if len(values):
+                entry['metrics'][column] = {
+                    'count': len(values),
+                    'sum': round(float(values.sum()), 4),
+                    **{f"p{int(q * 100)}": round(float(np.quantile(values, q)), 4) for q in QUANTILES}
+                }
+        summary.append(entry)
+    return summary
+
+
+def _labels(**labels) -> str:
+    """Labels Prometheus, valeurs échappées (antislash, guillemets)"""
+    escaped = {key: str(value).replace('\\', '\\\\').replace('"', '\\"') for key, value in labels.items()}
+    return ','.join(f'{key}="{value}"' for key, value in escaped.items())
+
+
+def prometheus_text(summary: list, hours: float = None) -> str:
+    """Summary Prometheus par mesure, plus compteurs de jobs, d'échecs et de hits du cache"""
+    hours = hours or WINDOW_HOURS
+    lines = []
+    for column, (name, description) in SUMMARIES.items():
+        lines += [f"# HELP {name} {description} (fenêtre de {hours:g} h)", f"# TYPE {name} summary"]
+        for entry in summary:
+            stats = entry['metrics'].get(column)
+            if stats is None:
+                continue
+            labels = {'script': entry['script'], 'model': entry['model']}
+            for q in QUANTILES:
+                lines.append(f"{name}{{{_labels(**labels, quantile=q)}}} {stats[f'p{int(q * 100)}']}")
+            lines.append(f"{name}_sum{{{_labels(**labels)}}} {stats['sum']}")
+            lines.append(f"{name}_count{{{_labels(**labels)}}} {stats['count']}")
+
+    gauges = {
+        'jobs': ('crm_ai_inference_jobs', 'Jobs terminés'),
+        'failures': ('crm_ai_inference_failures', 'Jobs en échec'),
+        'cache_hits': ('crm_ai_inference_cache_hits', 'Résultats servis par le cache'),
+        'threads': ('crm_ai_inference_threads', 'Threads alloués (maximum)')
+    }
+    for key, (name, description) in gauges.items():
+        lines += [f"# HELP {name} {description} (fenêtre de {hours:g} h)", f"# TYPE {name} gauge"]
+        lines += [f"{name}{{{_labels(script=entry['script'], model=entry['model'])}}} {entry[key]}"
+                  for entry in summary]
+    return '\n'.join(lines) + '\n'
+
+
+def export_prometheus(path: str, hours: float = None) -> None:
+    """Réécrit le fichier Prometheus de façon atomique (le collector ne lit jamais un fichier partiel)"""
+    text = prometheus_text(summarize(load_window(hours)), hours)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Métriques de performance des scripts d'inférence")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    summary_parser = subparsers.add_parser('summary', help='Quantiles par script et modèle (JSON)')
+    summary_parser.add_argument('--hours', type=float, default=WINDOW_HOURS, help='Fenêtre glissante (heures)')
+    export_parser = subparsers.add_parser('export', help='Réécrire le fichier Prometheus')
+    export_parser.add_argument('--output', default=prom_path(), help='Fichier .prom')
+    export_parser.add_argument('--hours', type=float, default=WINDOW_HOURS, help='Fenêtre glissante (heures)')
+    args = parser.parse_args()
+
+    if args.command == 'summary':
+        print(json.dumps({'window_hours': args.hours, 'models': summarize(load_window(args.hours))}, indent=2))
+        return
+
+    export_prometheus(args.output, args.hours)
+    print(json.dumps({'success': True, 'output': args.output}))
+
+
+if __name__ == '__main__':
+    main()
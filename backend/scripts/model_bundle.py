@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Bundle local et figé du pipeline de diarisation (chargement à froid rapide, hors ligne)
+
+`Pipeline.from_pretrained` résout les révisions sur le hub, vérifie le token
+puis désérialise (pickle) les checkpoints complets à chaque démarrage. Le
+bundle exporte une fois pour toutes:
+
+    <PYANNOTE_BUNDLE_DIR>/
+        <révision>/
+            config.yaml             configuration du pipeline (copie du hub)
+            manifest.json           classes, hyperparamètres et spécifications des modèles
+            segmentation.safetensors
+            embedding.safetensors
+        current -> <révision>       bundle utilisé par load_pipeline()
+
+Les poids sont au format safetensors (en-tête JSON + données brutes alignées)
+et sont chargés par mmap privé (copy-on-write): aucune désérialisation, et les
+processus d'un même hôte partagent les pages du fichier via le cache disque.
+
+Configuration (variables d'environnement):
+    PYANNOTE_BUNDLE=0           ignore le bundle (chargement depuis le hub)
+    PYANNOTE_BUNDLE_DIR         dossier des bundles (défaut: ~/.cache/crm-ai/pyannote-bundle)
+"""
+
+import os
+import json
+import time
+import struct
+import shutil
+import importlib
+import importlib.metadata
+
+BUNDLE_FORMAT = 1
+DEFAULT_BUNDLE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'crm-ai', 'pyannote-bundle')
+
+# Types safetensors -> noms des dtypes torch
+SAFETENSORS_DTYPES = {
+    'F64': 'float64', 'F32': 'float32', 'F16': 'float16', 'BF16': 'bfloat16',
+    'I64': 'int64', 'I32': 'int32', 'I16': 'int16', 'I8': 'int8', 'U8': 'uint8', 'BOOL': 'bool'
+}
+
+# Modèles du pipeline exportés: rôle -> accès au modèle torch dans le pipeline
+PIPELINE_MODELS = {
+    'segmentation': lambda pipeline: pipeline._segmentation.model,
+    'embedding': lambda pipeline: getattr(pipeline._embedding, 'model_', None)
+}
+
+
+def bundle_root() -> str:
+    return os.getenv('PYANNOTE_BUNDLE_DIR') or DEFAULT_BUNDLE_DIR
+
+
+def current_bundle() -> str:
+    """Dossier du bundle actif, ou None (bundle absent ou désactivé)"""
+    if os.getenv('PYANNOTE_BUNDLE', '1') == '0':
+        return None
+    path = os.path.realpath(os.path.join(bundle_root(), 'current'))
+    return path if os.path.isfile(os.path.join(path, 'manifest.json')) else None
+
+
+def save_safetensors(tensors: dict, path: str, metadata: dict = None) -> None:
+    """
+    Écrit des tenseurs au format safetensors
+
+    Les tenseurs sont rangés par taille d'élément décroissante: chaque tenseur
+    reste aligné sur sa taille d'élément, ce qui permet de le lire directement
+    dans le fichier mappé.
+    """
+    import torch
+
+    names = {getattr(torch, name): code for code, name in SAFETENSORS_DTYPES.items()}
+    header, blobs, offset = {}, [], 0
+    for name in sorted(tensors, key=lambda n: (-tensors[n].element_size(), n)):
+        tensor = tensors[name].detach().cpu().contiguous()
+        data = tensor.reshape(-1).view(torch.uint8).numpy().tobytes()
+        header[name] = {
+            'dtype': names[tensor.dtype],
+            'shape': list(tensor.shape),
+            'data_offsets': [offset, offset + len(data)]
+        }
+        blobs.append(data)
+        offset += len(data)
+
+    if metadata:
+        header['__metadata__'] = {key: str(value) for key, value in metadata.items()}
+
+    # En-tête complété par des espaces: les données commencent sur 8 octets
+    raw_header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    raw_header += b' ' * (-len(raw_header) % 8)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack('<Q', len(raw_header)))
+        f.write(raw_header)
+        for data in blobs:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_safetensors(path: str) -> dict:
+    """
+    Lit un fichier safetensors sans copie: les tenseurs pointent dans un mmap
+    privé du fichier (pages partagées entre processus tant qu'elles ne sont pas écrites)
+    """
+    import torch
+
+    with open(path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    header.pop('__metadata__', None)
+
+    size = os.path.getsize(path)
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=size)
+    raw = torch.empty(0, dtype=torch.uint8).set_(storage, 0, (size,), (1,))
+
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        begin, end = info['data_offsets']
+        dtype = getattr(torch, SAFETENSORS_DTYPES[info['dtype']])
+        tensors[name] = raw[data_start + begin:data_start + end].view(dtype).reshape(info['shape'])
+    return tensors
+
+
+def _specifications_to_dict(specifications) -> list:
+    items = specifications if isinstance(specifications, tuple) else (specifications,)
+    return [
+        {
+            'problem': spec.problem.name,
+            'resolution': spec.resolution.name,
+            'duration': spec.duration,
+            'min_duration': spec.min_duration,
+            'warm_up': list(spec.warm_up) if spec.warm_up is not None else None,
+            'classes': spec.classes,
+            'powerset_max_classes': spec.powerset_max_classes,
+            'permutation_invariant': spec.permutation_invariant
+        }
+        for spec in items
+    ]
+
+
+def _specifications_from_dict(items: list):
+    from pyannote.audio.core.task import Problem, Resolution, Specifications
+
+    specifications = tuple(
+        Specifications(**{
+            **item,
+            'problem': Problem[item['problem']],
+            'resolution': Resolution[item['resolution']],
+            'warm_up': tuple(item['warm_up']) if item['warm_up'] is not None else None
+        })
+        for item in items
+    )
+    return specifications[0] if len(specifications) == 1 else specifications
+
+
+def _class_path(obj) -> str:
+    return f"{type(obj).__module__}.{type(obj).__qualname__}"
+
+
+def _import_class(path: str):
+    module_name, class_name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def export_bundle(pipeline, config_path: str, revision: str, root: str = None) -> str:
+    """
+    Exporte un pipeline chargé depuis le hub dans <root>/<revision> et l'active (lien `current`)
+
+    Args:
+        pipeline: pipeline SpeakerDiarization chargé par Pipeline.from_pretrained
+        config_path: config.yaml du snapshot HuggingFace
+        revision: révision du snapshot (nom du dossier du bundle)
+    """
+    import torch
+
+    root = root or bundle_root()
+    directory = os.path.join(root, revision)
+    tmp_directory = f"{directory}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    models = {}
+    for role, accessor in PIPELINE_MODELS.items():
+        model = accessor(pipeline)
+        if not isinstance(model, torch.nn.Module) or not hasattr(model, 'specifications'):
+            raise ValueError(f"Modèle '{role}' non exportable ({type(model).__name__})")
+
+        save_safetensors(model.state_dict(), os.path.join(tmp_directory, f'{role}.safetensors'),
+                         {'role': role, 'revision': revision})
+        models[role] = {
+            'file': f'{role}.safetensors',
+            'class': _class_path(model),
+            'hparams': json.loads(json.dumps(dict(model.hparams), default=str)),
+            'specifications': _specifications_to_dict(model.specifications)
+        }
+
+    shutil.copyfile(config_path, os.path.join(tmp_directory, 'config.yaml'))
+    with open(os.path.join(tmp_directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': BUNDLE_FORMAT,
+            'revision': revision,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'torch': torch.__version__,
+            'pyannote.audio': importlib.metadata.version('pyannote.audio'),
+            'models': models
+        }, f, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+
+    # Bascule atomique du bundle actif
+    link = os.path.join(root, 'current')
+    tmp_link = f"{link}.{os.getpid()}.tmp"
+    os.symlink(revision, tmp_link)
+    os.replace(tmp_link, link)
+    return directory
+
+
+def _load_model(directory: str, spec: dict):
+    """Reconstruit un modèle pyannote et branche ses poids sur le fichier mappé"""
+    model = _import_class(spec['class'])(**spec['hparams'])
+    # Couches dépendant de la tâche (classifieur, activation), comme au chargement d'un checkpoint
+    model.specifications = _specifications_from_dict(spec['specifications'])
+    model.setup()
+
+    state = load_safetensors(os.path.join(directory, spec['file']))
+    try:
+        # assign=True: les paramètres deviennent les tenseurs mappés (aucune copie)
+        model.load_state_dict(state, strict=True, assign=True)
+    except TypeError:
+        # torch < 2.1: copie dans les paramètres existants
+        model.load_state_dict(state, strict=True)
+    model.eval()
+    return model
+
+
+def load_bundle(directory: str):
+    """Construit le pipeline depuis un bundle, sans accès au hub"""
+    import yaml
+
+    with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"Format de bundle non supporté: {manifest.get('format')}")
+
+    with open(os.path.join(directory, 'config.yaml'), encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    models = {role: _load_model(directory, spec) for role, spec in manifest['models'].items()}
+
+    pipeline_class = _import_class(config['pipeline']['name'])
+    pipeline = pipeline_class(**{**config['pipeline'].get('params', {}), **models})
+    if 'params' in config:
+        pipeline.instantiate(config['params'])
+    return pipeline
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Choix adaptatif du modèle Whisper et des réglages de décodage selon la deadline
+
+La durée de l'audio est lue sans décodage (en-tête de la forme d'onde .16k.npy
+si elle existe, sinon ffprobe). Le facteur temps réel de chaque combinaison
+moteur / modèle / type de calcul / décodage est mesuré à chaque transcription
+sur cet hôte (moyenne glissante, ~/.cache/crm-ai/whisper_rtf.json), ainsi que
+le temps de chargement du modèle. Le plus grand modèle, puis le décodage le
+plus coûteux (beam search avant glouton), dont l'estimation tient dans le
+temps restant est retenu.
+
+Sans mesure, des facteurs par défaut prudents (CPU, fp32) sont utilisés: lancer
+benchmark.py sur l'hôte remplit la table.
+
+Configuration (variables d'environnement):
+    WHISPER_ADAPTIVE_MODELS     modèles candidats, du plus petit au plus grand (défaut: tiny,base,small,medium)
+    WHISPER_ADAPTIVE_MARGIN     marge de sécurité sur l'estimation (défaut: 1.3)
+"""
+
+import os
+import json
+import fcntl
+import subprocess
+
+from audio_io import SAMPLE_RATE, WAVEFORM_SUFFIX, waveform_cache_path
+
+RTF_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'crm-ai', 'whisper_rtf.json')
+CANDIDATE_MODELS = [m.strip() for m in os.getenv('WHISPER_ADAPTIVE_MODELS', 'tiny,base,small,medium').split(',')
+                    if m.strip()]
+SAFETY_MARGIN = float(os.getenv('WHISPER_ADAPTIVE_MARGIN', '1.3'))
+
+# Réglages de décodage, du plus coûteux au moins coûteux (beam_size=1 est explicite:
+# faster-whisper fait un beam search de 5 par défaut)
+DECODING_PRESETS = {
+    'beam': {'beam_size': 5, 'best_of': 5},
+    'greedy': {'beam_size': 1, 'best_of': 1}
+}
+
+# Facteurs temps réel par défaut (CPU, décodage glouton) et coût relatif du beam search
+DEFAULT_RTF = {'tiny': 0.08, 'base': 0.15, 'small': 0.5, 'medium': 1.5, 'large': 3.5, 'large-v2': 3.5,
+               'large-v3': 3.5}
+BEAM_COST = 1.8
+DEFAULT_LOAD_SECONDS = {'tiny': 1.0, 'base': 2.0, 'small': 5.0, 'medium': 12.0, 'large': 30.0,
+                        'large-v2': 30.0, 'large-v3': 30.0}
+
+# Poids de la dernière mesure dans la moyenne glissante
+SMOOTHING = 0.3
+
+
+def decoding_preset(decoding: dict, engine: str = None) -> str:
+    """Nom du réglage de décodage ('beam' ou 'greedy'), sans beam_size: celui par défaut du moteur"""
+    default_beam = 5 if engine == 'faster-whisper' else 1
+    return 'beam' if (decoding or {}).get('beam_size', default_beam) > 1 else 'greedy'
+
+
+def table_key(engine: str, model_size: str, compute_type: str, preset: str) -> str:
+    return f"{engine}:{model_size}:{compute_type}:{preset}"
+
+
+def probe_duration(audio_path: str) -> float:
+    """Durée de l'audio (s) sans le décoder, ou None si elle est inconnue"""
+    import numpy as np
+
+    path = waveform_cache_path(audio_path)
+    if os.path.exists(path) and (audio_path.endswith(WAVEFORM_SUFFIX)
+                                 or os.path.getmtime(path) >= os.path.getmtime(audio_path)):
+        try:
+            return len(np.load(path, mmap_mode='r')) / SAMPLE_RATE
+        except (OSError, ValueError):
+            pass
+
+    try:
+        output = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', audio_path],
+            capture_output=True, text=True, check=True, timeout=30
+        ).stdout
+        return float(output.strip())
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+
+def load_table() -> dict:
+    try:
+        with open(RTF_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def record(engine: str, model_size: str, compute_type: str, decoding: dict, rtf: float,
+           load_seconds: float = None) -> None:
+    """Ajoute une mesure (facteur temps réel, temps de chargement) à la table de l'hôte"""
+    key = table_key(engine, model_size, compute_type, decoding_preset(decoding, engine))
+    try:
+        os.makedirs(os.path.dirname(RTF_PATH), exist_ok=True)
+        with open(f"{RTF_PATH}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                table = load_table()
+                entry = table.setdefault(key, {'rtf': rtf, 'runs': 0})
+                entry['rtf'] += SMOOTHING * (rtf - entry['rtf'])
+                entry['runs'] += 1
+                if load_seconds:
+                    entry['load_seconds'] = load_seconds
+
+                tmp_path = f"{RTF_PATH}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(table, f, indent=2)
+                os.replace(tmp_path, RTF_PATH)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    except OSError:
+        pass
+
+
+def estimate(table: dict, engine: str, model_size: str, compute_type: str, preset: str,
+             duration: float, loaded: bool = False) -> dict:
+    """Durée estimée d'une transcription (chargement du modèle compris s'il n'est pas en mémoire)"""
+    entry = table.get(table_key(engine, model_size, compute_type, preset))
+    if entry is not None:
+        rtf, source = entry['rtf'], 'measured'
+    else:
+        rtf, source = DEFAULT_RTF.get(model_size, 1.0) * (BEAM_COST if preset == 'beam' else 1.0), 'default'
+
+    load_seconds = 0.0 if loaded else (entry or {}).get('load_seconds', DEFAULT_LOAD_SECONDS.get(model_size, 10.0))
+    return {
+        'rtf': round(rtf, 4),
+        'rtf_source': source,
+        'estimated_seconds': round((load_seconds + duration * rtf) * SAFETY_MARGIN, 2)
+    }
+
+
+def choose(duration: float, available_seconds: float, engine: str, compute_type: str,
+           loaded_models=()) -> dict:
+    """
+    Plus grand modèle et décodage le plus coûteux qui tiennent dans le temps disponible
+
+    Returns:
+        dict {model, decoding, preset, fits, estimated_seconds, available_seconds, rtf, rtf_source}
+        (à défaut, le plus petit modèle en décodage glouton, avec fits=False)
+    """
+    table = load_table()
+    candidates = [(model, preset) for model in reversed(CANDIDATE_MODELS) for preset in DECODING_PRESETS]
+
+    for model, preset in candidates:
+        estimation = estimate(table, engine, model, compute_type, preset, duration, model in loaded_models)
+        if estimation['estimated_seconds'] <= available_seconds:
+            break
+    else:
+        model, preset = CANDIDATE_MODELS[0], 'greedy'
+        estimation = estimate(table, engine, model, compute_type, preset, duration, model in loaded_models)
+
+    return {
+        'model': model,
+        'preset': preset,
+        'decoding': dict(DECODING_PRESETS[preset]),
+        'fits': estimation['estimated_seconds'] <= available_seconds,
+        'audio_duration': round(duration, 2),
+        'available_seconds': round(available_seconds, 2),
+        **estimation
+    }
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Profil par étape des scripts d'inférence (clé "profile" du JSON de sortie)
+
+Pour chaque étape (import, chargement du modèle, décodage audio, segmentation,
+embeddings, clustering, analyse des locuteurs, décodage Whisper, écriture),
+on mesure le temps réel, le temps CPU (tous threads confondus, processus
+enfants terminés inclus, ex: pool du mode --long) et le pic de RSS du
+processus à la fin de l'étape.
+
+Le pic de RSS est celui du job: un profileur est créé par job et remet à zéro
+le pic du noyau (VmHWM, /proc/self/clear_refs). Sans /proc (hors Linux), c'est
+le pic depuis le démarrage du processus ("peak_rss_scope": "process"), qui
+dans un worker ou un serveur couvre aussi les jobs précédents.
+
+Optionnellement, une trace détaillée est écrite:
+    - cprofile : fichier .prof (python -m pstats, snakeviz)
+    - torch    : trace Chrome JSON du profiler PyTorch (chrome://tracing, Perfetto)
+"""
+
+import time
+import resource
+from contextlib import contextmanager
+
+TRACE_KINDS = ["cprofile", "torch"]
+
+
+def reset_peak_rss() -> bool:
+    """Ramène le pic de RSS du noyau (VmHWM) à la RSS courante, False si impossible"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """Pic de mémoire résidente du processus depuis la dernière remise à zéro (Mo)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    # ru_maxrss n'est jamais remis à zéro: pic depuis le démarrage du processus
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def cpu_seconds() -> float:
+    """Temps CPU du processus et de ses enfants terminés"""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+class StageProfiler:
+    """
+    Chronomètre des étapes successives d'un traitement
+
+    Une seule étape est active à la fois: begin() termine l'étape en cours.
+    Une étape rencontrée plusieurs fois est cumulée.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._current = None
+        self._wall_started = time.perf_counter()
+        self._cpu_started = cpu_seconds()
+        self.peak_rss_scope = 'job' if reset_peak_rss() else 'process'
+
+    def begin(self, name: str) -> None:
+        if self._current and self._current[0] == name:
+            return
+        self.end()
+        self._current = (name, time.perf_counter(), cpu_seconds())
+
+    def end(self) -> None:
+        if self._current is None:
+            return
+        name, wall_started, cpu_started = self._current
+        self._current = None
+
+        stage = self.stages.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_mb': 0.0})
+        stage['wall_seconds'] += time.perf_counter() - wall_started
+        stage['cpu_seconds'] += cpu_seconds() - cpu_started
+        stage['peak_rss_mb'] = max(stage['peak_rss_mb'], peak_rss_mb())
+
+    @contextmanager
+    def stage(self, name: str):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def pyannote_hook(self, step_name, step_artifact, file=None, total=None, completed=None):
+        """
+        Hook du pipeline pyannote: découpe l'appel au pipeline en étapes
+
+        pyannote appelle le hook à la fin de chaque étape: segmentation (puis
+        comptage des locuteurs), embeddings (par lots), puis clustering et
+        reconstruction de l'annotation. La segmentation et les embeddings
+        appellent aussi le hook pendant l'étape (total / completed).
+        """
+        finished = total is None or completed == total
+        if step_name in ('segmentation', 'speaker_counting') and finished:
+            self.begin('embedding')
+        elif step_name == 'embeddings' and finished:
+            self.begin('clustering')
+
+    def report(self) -> dict:
+        self.end()
+        stages = [
+            {
+                'name': name,
+                'wall_seconds': round(stage['wall_seconds'], 3),
+                'cpu_seconds': round(stage['cpu_seconds'], 3),
+                'peak_rss_mb': stage['peak_rss_mb']
+            }
+            for name, stage in self.stages.items()
+        ]
+
+        return {
+            'stages': stages,
+            'bottleneck': max(stages, key=lambda s: s['wall_seconds'])['name'] if stages else None,
+            'total_wall_seconds': round(time.perf_counter() - self._wall_started, 3),
+            'total_cpu_seconds': round(cpu_seconds() - self._cpu_started, 3),
+            'peak_rss_mb': peak_rss_mb(),
+            'peak_rss_scope': self.peak_rss_scope
+        }
+
+
+@contextmanager
+def trace(path: str = None, kind: str = "cprofile"):
+    """Écrit une trace cProfile ou PyTorch du bloc dans `path` (aucune trace si path est vide)"""
+    if not path:
+        yield
+        return
+
+    if kind == "torch":
+        from torch.profiler import ProfilerActivity, profile
+
+        with profile(activities=[ProfilerActivity.CPU]) as profiler:
+            yield
+        profiler.export_chrome_trace(path)
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
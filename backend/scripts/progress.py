@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Progression et deadline d'une diarisation
+
+Le hook pyannote est appelé pendant la segmentation et le calcul des
+embeddings (par lots), puis à la fin de chaque étape. Il sert ici à:
+    - émettre des événements de progression NDJSON (une ligne JSON par événement)
+    - interrompre le pipeline à l'approche de la deadline (DeadlineExceeded),
+      en gardant la détection de parole déjà calculée pour un résultat partiel
+
+Avant le lancement, la durée est estimée depuis le temps réel mesuré sur les
+passes précédentes (facteur temps réel, moyenne glissante): si elle dépasse le
+temps restant, la segmentation passe sur des fenêtres plus espacées (pas plus
+grand: moins de fenêtres à segmenter et d'embeddings à calculer).
+
+Événements (champ "event"): start, degraded, progress, partial, done
+
+Configuration (variables d'environnement):
+    DIARIZATION_RTF_ESTIMATE        facteur temps réel initial sans historique (défaut: 0.3)
+    DIARIZATION_MAX_STEP            pas maximal de segmentation, en fraction de fenêtre (défaut: 0.5)
+    DIARIZATION_DEADLINE_RESERVE    secondes gardées pour écrire le résultat (défaut: 5)
+"""
+
+import os
+import json
+import time
+import fcntl
+from contextlib import contextmanager
+
+import numpy as np
+
+DEFAULT_RTF_ESTIMATE = float(os.getenv('DIARIZATION_RTF_ESTIMATE', '0.3'))
+MAX_STEP = float(os.getenv('DIARIZATION_MAX_STEP', '0.5'))
+DEADLINE_RESERVE_SECONDS = float(os.getenv('DIARIZATION_DEADLINE_RESERVE', '5'))
+RTF_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'crm-ai', 'diarization_rtf.json')
+
+# Poids de chaque étape dans le pourcentage global
+STAGE_RANGES = {
+    'segmentation': (0.0, 35.0),
+    'embeddings': (35.0, 95.0),
+    'clustering': (95.0, 100.0)
+}
+
+# Fin d'une étape pyannote (appel du hook sans total): étape du pourcentage et avancement
+STEP_ENDS = {
+    'segmentation': ('segmentation', 100.0),
+    'speaker_counting': ('embeddings', 0.0),
+    'embeddings': ('clustering', 0.0),
+    'discrete_diarization': ('clustering', 100.0)
+}
+
+# Intervalle minimal entre deux événements de progression d'une même étape
+EMIT_INTERVAL_SECONDS = 0.5
+
+# Poids de la dernière mesure dans la moyenne glissante du facteur temps réel
+RTF_SMOOTHING = 0.3
+
+
+class DeadlineExceeded(Exception):
+    """Deadline atteinte pendant le pipeline"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline atteinte pendant l'étape {stage}")
+        self.stage = stage
+
+
+def load_rtf() -> float:
+    """Facteur temps réel mesuré (secondes de calcul par seconde d'audio, au pas par défaut)"""
+    try:
+        with open(RTF_PATH, encoding='utf-8') as f:
+            return float(json.load(f)['rtf'])
+    except (OSError, ValueError, KeyError, json.JSONDecodeError):
+        return DEFAULT_RTF_ESTIMATE
+
+
+def record_rtf(rtf: float) -> None:
+    """Met à jour la moyenne glissante du facteur temps réel"""
+    try:
+        os.makedirs(os.path.dirname(RTF_PATH), exist_ok=True)
+        with open(f"{RTF_PATH}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                previous = load_rtf() if os.path.exists(RTF_PATH) else rtf
+                tmp_path = f"{RTF_PATH}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'rtf': previous + RTF_SMOOTHING * (rtf - previous)}, f)
+                os.replace(tmp_path, RTF_PATH)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    except OSError:
+        pass
+
+
+class ProgressTracker:
+    """
+    Hook pyannote: progression NDJSON, deadline et dernier comptage des locuteurs
+
+    Args:
+        deadline: horodatage (epoch) à ne pas dépasser, ou None
+        stream: fichier texte recevant les événements NDJSON, ou None
+        profiler: StageProfiler dont le hook est appelé aussi
+    """
+
+    def __init__(self, deadline: float = None, stream=None, profiler=None):
+        self.deadline = deadline
+        self.stream = stream
+        self.profiler = profiler
+        self.started = time.time()
+        self.stage = None
+        self.count = None
+        self._last_emit = 0.0
+
+    def remaining(self) -> float:
+        """Secondes restantes avant la deadline (réserve d'écriture déduite), ou None"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time() - DEADLINE_RESERVE_SECONDS
+
+    def emit(self, event: str, **fields) -> None:
+        if self.stream is None:
+            return
+        remaining = self.remaining()
+        record = {
+            'event': event,
+            'time': round(time.time(), 3),
+            'elapsed_seconds': round(time.time() - self.started, 2),
+            'remaining_seconds': round(remaining, 2) if remaining is not None else None,
+            **fields
+        }
+        self.stream.write(json.dumps(record) + '\n')
+        self.stream.flush()
+
+    def plan(self, pipeline, duration: float) -> dict:
+        """
+        Espace les fenêtres de segmentation si la durée estimée dépasse le temps restant
+
+        Returns:
+            dict décrivant la dégradation appliquée, ou None
+        """
+        remaining = self.remaining()
+        estimate = duration * load_rtf()
+        self.emit('start', audio_seconds=round(duration, 2), estimated_seconds=round(estimate, 2))
+        if remaining is None or estimate <= remaining:
+            return None
+
+        inference = pipeline._segmentation
+        default_step = pipeline.segmentation_step
+        # Le coût est à peu près proportionnel au nombre de fenêtres, donc inverse au pas
+        step = min(MAX_STEP, default_step * estimate / max(remaining, 1.0))
+        if step <= default_step:
+            return None
+
+        inference.step = step * inference.duration
+        degraded = {
+            'segmentation_step': round(step, 3),
+            'default_segmentation_step': default_step,
+            'estimated_seconds': round(estimate * default_step / step, 2),
+            'available_seconds': round(remaining, 2)
+        }
+        self.emit('degraded', **degraded)
+        return degraded
+
+    def hook(self, step_name, step_artifact, file=None, total=None, completed=None):
+        if self.profiler is not None:
+            self.profiler.pyannote_hook(step_name, step_artifact, file=file, total=total, completed=completed)
+
+        if step_name == 'speaker_counting':
+            self.count = step_artifact
+
+        if total is not None:
+            stage, stage_percent = step_name, (100.0 * completed / total if total else 100.0)
+        else:
+            stage, stage_percent = STEP_ENDS.get(step_name, (None, None))
+        if stage in STAGE_RANGES:
+            low, high = STAGE_RANGES[stage]
+            now = time.time()
+            if stage != self.stage or stage_percent == 100.0 or now - self._last_emit >= EMIT_INTERVAL_SECONDS:
+                self.stage = stage
+                self._last_emit = now
+                self.emit('progress', stage=stage, stage_percent=round(stage_percent, 1),
+                          percent=round(low + (high - low) * stage_percent / 100.0, 1))
+
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(self.stage or step_name)
+
+    def speech_segments(self) -> list:
+        """
+        Régions de parole (sans locuteur) d'après le comptage des locuteurs actifs
+
+        Disponible dès la fin de la segmentation: sert de résultat partiel.
+        """
+        if self.count is None:
+            return []
+
+        active = np.asarray(self.count.data).reshape(-1) > 0
+        window = self.count.sliding_window
+        changes = np.flatnonzero(np.diff(np.concatenate(([0], active.astype(np.int8), [0]))))
+        segments = []
+        for first, last in zip(changes[::2], changes[1::2]):
+            start = float(window.start + first * window.step)
+            end = float(window.start + last * window.step + window.duration - window.step)
+            segments.append({'start': start, 'end': end, 'duration': end - start, 'speaker': None})
+        return segments
+
+
+@contextmanager
+def progress_stream(path: str = None):
+    """Fichier NDJSON des événements de progression (ajout), ou None sans chemin"""
+    if not path:
+        yield None
+        return
+    with open(path, 'a', encoding='utf-8') as stream:
+        yield stream
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Précision réduite des modèles pyannote sur CPU (mode optionnel)
+
+Sans GPU, la segmentation et surtout les embeddings de locuteurs dominent la
+durée de diarisation des longs rendez-vous. Deux modes sont proposés:
+    - int8 : quantification dynamique (torch.ao) des couches LSTM et Linear du
+             modèle de segmentation (PyanNet): poids en int8, activations
+             quantifiées à la volée. Seule la segmentation est accélérée: le
+             modèle d'embedding (ResNet WeSpeaker) est fait de Conv2d, que la
+             quantification dynamique ne couvre pas, et reste en fp32
+    - bf16 : calcul en bfloat16 via autocast des deux modèles (gain sur les CPU
+             avec AVX512-BF16 / AMX, convolutions comprises)
+
+Les poids d'origine ne sont pas modifiés sur disque. La vérification de
+précision (diarize_audio.py --check-precision) compare l'attribution des
+locuteurs et la séparation courtier/client au pipeline en pleine précision
+sur le même audio.
+
+Configuration (variables d'environnement):
+    DIARIZATION_PRECISION       fp32 (défaut), int8 ou bf16
+"""
+
+import os
+
+import numpy as np
+
+from model_bundle import PIPELINE_MODELS
+
+PRECISIONS = ['fp32', 'int8', 'bf16']
+DEFAULT_PRECISION = os.getenv('DIARIZATION_PRECISION', 'fp32')
+
+# Résolution des étiquettes par trame pour la comparaison (secondes)
+FRAME_SECONDS = 0.02
+
+# Part minimale de la parole classée du même côté courtier/client pour accepter un mode réduit
+MIN_ROLE_AGREEMENT = 0.98
+
+# Modèles quantifiés en int8 (couches LSTM/Linear): l'embedding, convolutif, n'y gagnerait rien
+INT8_MODELS = ('segmentation',)
+
+
+def _autocast_forward(model, torch):
+    """Remplace forward par un appel sous autocast bfloat16 (sorties repassées en float32)"""
+    forward = model.forward
+
+    def autocast_forward(*args, **kwargs):
+        with torch.autocast('cpu', dtype=torch.bfloat16):
+            output = forward(*args, **kwargs)
+        return output.float() if isinstance(output, torch.Tensor) else output
+
+    model.forward = autocast_forward
+
+
+def apply_precision(pipeline, precision: str = None) -> str:
+    """
+    Applique le mode de précision au pipeline (sur place)
+
+    int8 ne quantifie que la segmentation (INT8_MODELS), bf16 s'applique aux deux modèles.
+
+    Returns:
+        Mode effectivement appliqué (fp32 si le pipeline n'est pas sur CPU)
+    """
+    precision = precision or DEFAULT_PRECISION
+    if precision not in PRECISIONS:
+        raise ValueError(f"Précision inconnue: {precision} (attendu: {', '.join(PRECISIONS)})")
+    if precision == 'fp32':
+        return precision
+
+    import torch
+
+    models = {role: accessor(pipeline) for role, accessor in PIPELINE_MODELS.items()}
+    models = {role: model for role, model in models.items() if isinstance(model, torch.nn.Module)}
+    # Les modules quantifiés ne s'exécutent que sur CPU
+    if any(next(model.parameters()).device.type != 'cpu' for model in models.values()):
+        return 'fp32'
+
+    for role, model in models.items():
+        if precision == 'bf16':
+            _autocast_forward(model, torch)
+        elif role in INT8_MODELS:
+            torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.LSTM, torch.nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+
+    return precision
+
+
+def frame_labels(table, num_frames: int) -> np.ndarray:
+    """Index du locuteur de chaque trame (-1: silence), depuis une SegmentTable"""
+    labels = np.full(num_frames, -1, dtype=np.int32)
+    first = np.clip((table.starts / FRAME_SECONDS).astype(np.int64), 0, num_frames)
+    last = np.clip(np.ceil(table.ends / FRAME_SECONDS).astype(np.int64), 0, num_frames)
+    for begin, end, speaker in zip(first, last, table.speakers):
+        labels[begin:end] = speaker
+    return labels
+
+
+def speaker_agreement(reference, candidate, duration: float) -> dict:
+    """
+    Part de la parole attribuée au même locuteur par les deux diarisations
+
+    Les étiquettes (SPEAKER_00...) étant arbitraires, chaque locuteur du
+    candidat est associé au locuteur de référence avec lequel il se recouvre le
+    plus (association gloutonne par recouvrement décroissant).
+    """
+    num_frames = int(np.ceil(duration / FRAME_SECONDS))
+    ref = frame_labels(reference, num_frames)
+    cand = frame_labels(candidate, num_frames)
+
+    speech = (ref >= 0) | (cand >= 0)
+    both = (ref >= 0) & (cand >= 0)
+    overlap = np.zeros((len(reference.labels), len(candidate.labels)), dtype=np.int64)
+    np.add.at(overlap, (ref[both], cand[both]), 1)
+
+    mapping = {}
+    remaining = overlap.copy()
+    while remaining.size and remaining.max() > 0:
+        r, c = np.unravel_index(np.argmax(remaining), remaining.shape)
+        mapping[candidate.labels[c]] = reference.labels[r]
+        remaining[r, :] = 0
+        remaining[:, c] = 0
+
+    matched = sum(int(overlap[reference.labels.index(ref_label), candidate.labels.index(cand_label)])
+                  for cand_label, ref_label in mapping.items())
+
+    return {
+        'speaker_agreement': round(matched / int(speech.sum()), 4) if speech.any() else 1.0,
+        'speaker_mapping': mapping,
+        'num_speakers': {'reference': len(reference.labels), 'candidate': len(candidate.labels)}
+    }
+
+
+def role_agreement(reference, reference_courtier: str, candidate, candidate_courtier: str,
+                   duration: float) -> float:
+    """Part de la parole classée du même côté (courtier / client) par les deux diarisations"""
+    num_frames = int(np.ceil(duration / FRAME_SECONDS))
+
+    def roles(table, courtier):
+        labels = frame_labels(table, num_frames)
+        index = table.labels.index(courtier) if courtier in table.labels else -2
+        # 0: silence, 1: courtier, 2: client
+        return np.where(labels < 0, 0, np.where(labels == index, 1, 2))
+
+    ref = roles(reference, reference_courtier)
+    cand = roles(candidate, candidate_courtier)
+    speech = (ref > 0) | (cand > 0)
+    return round(float((ref[speech] == cand[speech]).mean()), 4) if speech.any() else 1.0
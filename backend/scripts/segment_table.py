@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Table de segments de diarisation en colonnes (numpy)
+
+L'annotation pyannote est parcourue une seule fois pour remplir trois colonnes
+(début, fin, index du locuteur). Les tours consécutifs d'un même locuteur
+séparés par un court silence sont fusionnés et les micro-segments supprimés:
+une réunion longue et fragmentée donne quelques centaines de segments au lieu
+de plusieurs milliers, ce qui allège le filter_complex ffmpeg de
+DiarizationService::extractClientAudio.
+
+Configuration (variables d'environnement):
+    DIARIZATION_MERGE_GAP       silence max (s) entre deux tours fusionnés (défaut: 0.5)
+    DIARIZATION_MIN_SEGMENT     durée min (s) d'un segment conservé (défaut: 0.3)
+"""
+
+import os
+
+import numpy as np
+
+DEFAULT_MERGE_GAP = float(os.getenv('DIARIZATION_MERGE_GAP', '0.5'))
+DEFAULT_MIN_SEGMENT = float(os.getenv('DIARIZATION_MIN_SEGMENT', '0.3'))
+
+
+class SegmentTable:
+    """Segments triés par début: colonnes starts / ends / speakers (index dans labels)"""
+
+    def __init__(self, starts, ends, speakers, labels: list):
+        order = np.argsort(starts, kind='stable')
+        self.starts = np.asarray(starts, dtype=np.float64)[order]
+        self.ends = np.asarray(ends, dtype=np.float64)[order]
+        self.speakers = np.asarray(speakers, dtype=np.int32)[order]
+        self.labels = list(labels)
+
+    @classmethod
+    def from_turns(cls, turns) -> 'SegmentTable':
+        """Construit la table depuis des tours (start, end, speaker)"""
+        labels = {}
+        starts, ends, speakers = [], [], []
+        for start, end, speaker in turns:
+            starts.append(start)
+            ends.append(end)
+            speakers.append(labels.setdefault(speaker, len(labels)))
+        return cls(starts, ends, speakers, list(labels))
+
+    @classmethod
+    def from_annotation(cls, diarization) -> 'SegmentTable':
+        """Construit la table en un seul parcours de l'annotation pyannote"""
+        return cls.from_turns(
+            (turn.start, turn.end, speaker)
+            for turn, _, speaker in diarization.itertracks(yield_label=True)
+        )
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def durations(self):
+        return self.ends - self.starts
+
+    def coalesce(self, max_gap: float = None, min_duration: float = None) -> 'SegmentTable':
+        """
+        Fusionne les tours consécutifs d'un même locuteur séparés de moins de
+        `max_gap` secondes, puis supprime les segments plus courts que `min_duration`
+        """
+        max_gap = DEFAULT_MERGE_GAP if max_gap is None else max_gap
+        min_duration = DEFAULT_MIN_SEGMENT if min_duration is None else min_duration
+        if len(self) == 0:
+            return self
+
+        # Regrouper par locuteur, puis par début
+        order = np.lexsort((self.starts, self.speakers))
+        starts, ends, speakers = self.starts[order], self.ends[order], self.speakers[order]
+
+        # Fin maximale atteinte jusqu'ici par le locuteur (le décalage par locuteur
+        # empêche le cumul de déborder d'un locuteur sur le suivant)
+        shift = (speakers.astype(np.float64)) * (float(ends.max()) + max_gap + 1.0)
+        running_end = np.maximum.accumulate(ends + shift) - shift
+
+        new_run = np.ones(len(starts), dtype=bool)
+        new_run[1:] = (speakers[1:] != speakers[:-1]) | (starts[1:] - running_end[:-1] > max_gap)
+        run_starts = np.flatnonzero(new_run)
+
+        merged_starts = starts[run_starts]
+        merged_ends = np.maximum.reduceat(ends, run_starts)
+        merged_speakers = speakers[run_starts]
+
+        keep = (merged_ends - merged_starts) >= min_duration
+        return SegmentTable(merged_starts[keep], merged_ends[keep], merged_speakers[keep], self.labels)
+
+    def speaker_stats(self) -> dict:
+        """Durée totale, nombre de segments et durée moyenne par locuteur (vectorisé)"""
+        count = len(self.labels)
+        num_segments = np.bincount(self.speakers, minlength=count)
+        total_duration = np.bincount(self.speakers, weights=self.durations, minlength=count)
+
+        return {
+            label: {
+                'total_duration': float(total_duration[i]),
+                'num_segments': int(num_segments[i]),
+                'avg_segment_duration': float(total_duration[i] / num_segments[i])
+            }
+            for i, label in enumerate(self.labels)
+            if num_segments[i] > 0
+        }
+
+    def to_segments(self, exclude_speaker: str = None) -> list:
+        """Segments au format JSON, sans ceux de `exclude_speaker`"""
+        mask = np.ones(len(self), dtype=bool)
+        if exclude_speaker in self.labels:
+            mask = self.speakers != self.labels.index(exclude_speaker)
+
+        return [
+            {
+                'start': float(start),
+                'end': float(end),
+                'duration': float(end - start),
+                'speaker': self.labels[speaker]
+            }
+            for start, end, speaker in zip(self.starts[mask], self.ends[mask], self.speakers[mask])
+        ]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Attribution des segments Whisper aux locuteurs détectés par pyannote
+
+Les tours de parole sont indexés par date de début (recherche dichotomique),
+ce qui permet de trouver en O(log n) les tours qui chevauchent un segment.
+"""
+
+from bisect import bisect_left
+
+
+class SpeakerIntervalIndex:
+    """Index d'intervalles (start, end, speaker) triés par début"""
+
+    def __init__(self, turns):
+        turns = sorted(turns, key=lambda t: t[0])
+        self.starts = [float(t[0]) for t in turns]
+        self.ends = [float(t[1]) for t in turns]
+        self.speakers = [t[2] for t in turns]
+
+        # Fin maximale vue jusqu'à chaque position: borne d'arrêt du parcours
+        self.max_ends = []
+        current = float('-inf')
+        for end in self.ends:
+            current = max(current, end)
+            self.max_ends.append(current)
+
+    @classmethod
+    def from_diarization(cls, diarization):
+        return cls(
+            (turn.start, turn.end, speaker)
+            for turn, _, speaker in diarization.itertracks(yield_label=True)
+        )
+
+    @classmethod
+    def from_table(cls, table):
+        """Index des tours d'une SegmentTable (déjà triés par début)"""
+        return cls(zip(table.starts, table.ends, (table.labels[speaker] for speaker in table.speakers)))
+
+    def speaker_at(self, start: float, end: float):
+        """
+        Retourne le locuteur qui chevauche le plus l'intervalle [start, end]
+
+        Si aucun tour ne chevauche l'intervalle, le tour le plus proche est utilisé.
+        """
+        if not self.starts:
+            return None
+
+        overlaps = {}
+        i = bisect_left(self.starts, end) - 1
+        while i >= 0 and self.max_ends[i] > start:
+            overlap = min(end, self.ends[i]) - max(start, self.starts[i])
+            if overlap > 0:
+                speaker = self.speakers[i]
+                overlaps[speaker] = overlaps.get(speaker, 0.0) + overlap
+            i -= 1
+
+        if overlaps:
+            return max(overlaps, key=overlaps.get)
+
+        return self.speakers[self._nearest(start, end)]
+
+    def _nearest(self, start: float, end: float) -> int:
+        i = bisect_left(self.starts, start)
+        candidates = [c for c in (i - 1, i) if 0 <= c < len(self.starts)]
+        return min(
+            candidates,
+            key=lambda c: max(self.starts[c] - end, start - self.ends[c], 0.0)
+        )
+
+
+def assign_speakers(segments, index, roles):
+    """
+    Étiquette chaque segment Whisper avec son locuteur et son rôle
+
+    Les segments consécutifs du même locuteur sont fusionnés.
+
+    Args:
+        segments: segments Whisper [{"start", "end", "text"}]
+        index: SpeakerIntervalIndex des tours de parole
+        roles: {speaker: "courtier" | "client"}
+
+    Returns:
+        list: [{"start", "end", "speaker", "role", "text"}]
+    """
+    labelled = []
+
+    for segment in segments:
+        text = segment['text'].strip()
+        if not text:
+            continue
+
+        speaker = index.speaker_at(segment['start'], segment['end'])
+        role = roles.get(speaker, 'client')
+
+        if labelled and labelled[-1]['speaker'] == speaker:
+            labelled[-1]['end'] = float(segment['end'])
+            labelled[-1]['text'] += ' ' + text
+            continue
+
+        labelled.append({
+            'start': float(segment['start']),
+            'end': float(segment['end']),
+            'speaker': speaker,
+            'role': role,
+            'text': text
+        })
+
+    return labelled
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Pré-vérification rapide des enregistrements à un seul locuteur
+
+Une bonne partie des enregistrements sont des notes dictées par le courtier
+seul: la segmentation, les embeddings de tout le fichier et le clustering ne
+font que confirmer qu'il n'y a qu'une voix.
+
+Avant le pipeline complet:
+    - les régions de parole sont détectées par blocs (vad.py, Silero ou énergie)
+    - quelques fenêtres de parole réparties sur tout l'enregistrement sont
+      échantillonnées et passées en un lot au modèle d'embedding du pipeline
+    - si toutes les fenêtres se ressemblent deux à deux (similarité cosinus
+      minimale au-dessus du seuil), l'enregistrement est traité comme à
+      locuteur unique sans lancer le pipeline
+
+Le résultat indique le chemin suivi et la similarité minimale observée
+(clé "precheck").
+
+Configuration (variables d'environnement):
+    DIARIZATION_PRECHECK=0                  désactive la pré-vérification
+    DIARIZATION_PRECHECK_WINDOWS            fenêtres échantillonnées (défaut: 12)
+    DIARIZATION_PRECHECK_WINDOW_SECONDS     durée d'une fenêtre (défaut: 3)
+    DIARIZATION_PRECHECK_THRESHOLD          similarité cosinus minimale entre deux fenêtres (défaut: 0.7)
+"""
+
+import os
+import time
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE, read_samples
+from vad import speech_regions
+
+PRECHECK_WINDOWS = int(os.getenv('DIARIZATION_PRECHECK_WINDOWS', '12'))
+PRECHECK_WINDOW_SECONDS = float(os.getenv('DIARIZATION_PRECHECK_WINDOW_SECONDS', '3'))
+PRECHECK_THRESHOLD = float(os.getenv('DIARIZATION_PRECHECK_THRESHOLD', '0.7'))
+
+# Durée des blocs passés à la VAD: la mémoire ne dépend pas de la durée de l'enregistrement
+VAD_BLOCK_SECONDS = 600
+
+# En dessous, l'échantillon ne couvre pas assez l'enregistrement pour conclure
+MIN_WINDOWS = 4
+
+SINGLE_SPEAKER_LABEL = 'SPEAKER_00'
+
+
+def precheck_enabled() -> bool:
+    return os.getenv('DIARIZATION_PRECHECK', '1') != '0'
+
+
+def precheck_params() -> dict:
+    """Paramètres de la pré-vérification (clé du cache de diarisation)"""
+    return {
+        'enabled': precheck_enabled(),
+        'windows': PRECHECK_WINDOWS,
+        'window_seconds': PRECHECK_WINDOW_SECONDS,
+        'threshold': PRECHECK_THRESHOLD
+    }
+
+
+def sample_windows(regions: list, count: int, window: float) -> list:
+    """
+    Débuts (s) de `count` fenêtres de `window` secondes entièrement dans la parole
+
+    Les fenêtres sont réparties à intervalles réguliers sur la parole mise bout
+    à bout: début, milieu et fin de l'enregistrement sont représentés.
+    """
+    usable = [(start, end - window) for start, end in regions if end - start >= window]
+    lengths = np.array([last - first for first, last in usable])
+    if not usable:
+        return []
+
+    total = float(lengths.sum())
+    offsets = np.cumsum(lengths) - lengths
+    positions = (np.arange(count) + 0.5) * total / count
+    starts = []
+    for position in positions:
+        index = min(int(np.searchsorted(offsets, position, side='right')) - 1, len(usable) - 1)
+        starts.append(usable[index][0] + min(position - offsets[index], lengths[index]))
+
+    # Parole trop courte: plusieurs positions tombent dans la même fenêtre
+    distinct = [starts[0]]
+    for start in starts[1:]:
+        if start - distinct[-1] >= window:
+            distinct.append(start)
+    return distinct
+
+
+def blockwise_speech_regions(waveform, block_seconds: float = VAD_BLOCK_SECONDS) -> tuple:
+    """
+    Régions de parole détectées bloc par bloc (audio_io.read_samples)
+
+    Une région coupée par la frontière de deux blocs est recollée.
+
+    Returns:
+        tuple: (régions [(start, end)], méthode utilisée)
+    """
+    block = int(block_seconds * SAMPLE_RATE)
+    regions, method = [], None
+    for first in range(0, len(waveform), block):
+        found, method = speech_regions(read_samples(waveform, first, first + block), 'auto')
+        offset = first / SAMPLE_RATE
+        for start, end in found:
+            start, end = start + offset, end + offset
+            if regions and start - regions[-1][1] < 1e-3:
+                regions[-1] = (regions[-1][0], end)
+            else:
+                regions.append((start, end))
+    return regions, method
+
+
+def single_speaker_precheck(pipeline, waveform, speakers=None) -> tuple:
+    """
+    Décide si l'enregistrement ne contient qu'une voix
+
+    Args:
+        pipeline: pipeline pyannote chargé (son modèle d'embedding est réutilisé)
+        waveform: forme d'onde 16 kHz mono (np.ndarray ou np.memmap)
+        speakers: bornes explicites du nombre de locuteurs (au moins 2: pas de pré-vérification)
+
+    Returns:
+        tuple: (rapport {path, confidence, threshold, windows, vad, speech_seconds, reason, seconds},
+                régions de parole [(start, end)])
+        path vaut "single_speaker" (pipeline inutile) ou "full"
+    """
+    started = time.time()
+    report = {'path': 'full', 'confidence': None, 'threshold': PRECHECK_THRESHOLD, 'windows': 0}
+    regions = []
+
+    def done(reason=None, **fields):
+        report.update(fields)
+        report['reason'] = reason
+        report['seconds'] = round(time.time() - started, 3)
+        return report, regions
+
+    speakers = speakers or {}
+    if max(speakers.get('num_speakers') or 0, speakers.get('min_speakers') or 0) >= 2:
+        return done('speakers_hint')
+
+    regions, method = blockwise_speech_regions(waveform)
+    speech_seconds = sum(end - start for start, end in regions)
+    report.update({'vad': method, 'speech_seconds': round(speech_seconds, 2)})
+    if not regions:
+        return done('no_speech')
+
+    window = int(PRECHECK_WINDOW_SECONDS * SAMPLE_RATE)
+    starts = sample_windows(regions, PRECHECK_WINDOWS, PRECHECK_WINDOW_SECONDS)
+    if len(starts) < MIN_WINDOWS:
+        return done('not_enough_speech', windows=len(starts))
+
+    import torch
+
+    batch = np.stack([read_samples(waveform, int(start * SAMPLE_RATE), int(start * SAMPLE_RATE) + window)
+                      for start in starts])
+    embeddings = np.asarray(pipeline._embedding(torch.from_numpy(batch[:, None, :])), dtype=np.float32)
+    embeddings = embeddings[np.all(np.isfinite(embeddings), axis=1)]
+    if len(embeddings) < MIN_WINDOWS:
+        return done('not_enough_speech', windows=len(embeddings))
+
+    normalized = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    similarity = float(np.min(normalized @ normalized.T))
+    single = similarity >= PRECHECK_THRESHOLD
+    return done(
+        None if single else 'several_voices',
+        path='single_speaker' if single else 'full',
+        confidence=round(similarity, 4),
+        windows=len(embeddings)
+    )
+
+
+def single_speaker_turns(regions: list) -> list:
+    """Tours (start, end, speaker) du locuteur unique: les régions de parole détectées"""
+    return [(float(start), float(end), SINGLE_SPEAKER_LABEL) for start, end in regions]
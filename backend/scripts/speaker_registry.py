@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Registre de locuteurs persistant entre plusieurs passes de diarisation
+
+Chaque passe pyannote (chunk d'enregistrement, fenêtre d'un long fichier)
+numérote ses locuteurs indépendamment. Le registre garde un centroïde
+d'embedding par locuteur global et rattache les locuteurs locaux d'une
+nouvelle passe aux locuteurs déjà connus par similarité cosinus.
+"""
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.5
+
+
+class SpeakerRegistry:
+    """Locuteurs globaux: {label: {"centroid": [...], "weight": secondes}}"""
+
+    def __init__(self, speakers=None, threshold: float = DEFAULT_THRESHOLD):
+        self.speakers = speakers or {}
+        self.threshold = threshold
+
+    def _new_label(self) -> str:
+        return f"SPEAKER_{len(self.speakers):02d}"
+
+    def match(self, labels, embeddings, weights) -> dict:
+        """
+        Rattache les locuteurs locaux aux locuteurs globaux
+
+        Args:
+            labels: labels locaux, dans l'ordre des lignes de `embeddings`
+            embeddings: np.ndarray (n_locuteurs, dim), lignes NaN si trop peu de parole
+            weights: durée de parole de chaque locuteur local (pondère les centroïdes)
+
+        Returns:
+            dict: {label_local: label_global}
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        mapping = {}
+
+        # Paires (similarité, local, global) appariées de la plus proche à la plus lointaine
+        pairs = []
+        for i, label in enumerate(labels):
+            if not np.all(np.isfinite(embeddings[i])):
+                continue
+            for global_label, info in self.speakers.items():
+                if info.get('centroid') is None:
+                    continue
+                pairs.append((_cosine(embeddings[i], np.asarray(info['centroid'])), label, global_label))
+
+        used = set()
+        for similarity, label, global_label in sorted(pairs, key=lambda p: p[0], reverse=True):
+            if similarity < self.threshold:
+                break
+            if label in mapping or global_label in used:
+                continue
+            mapping[label] = global_label
+            used.add(global_label)
+
+        for i, label in enumerate(labels):
+            embedding = embeddings[i]
+            has_embedding = bool(np.all(np.isfinite(embedding)))
+
+            if label not in mapping:
+                mapping[label] = self._new_label()
+                self.speakers[mapping[label]] = {'centroid': None, 'weight': 0.0}
+
+            if has_embedding:
+                self._update(mapping[label], embedding, float(weights[i]))
+
+        return mapping
+
+    def _update(self, global_label: str, embedding, weight: float) -> None:
+        info = self.speakers[global_label]
+        embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+
+        if info['centroid'] is None or info['weight'] <= 0:
+            centroid = embedding
+        else:
+            total = info['weight'] + weight
+            centroid = (np.asarray(info['centroid']) * info['weight'] + embedding * weight) / max(total, 1e-6)
+
+        info['centroid'] = [float(x) for x in centroid / (np.linalg.norm(centroid) or 1.0)]
+        info['weight'] = info['weight'] + weight
+
+    def to_dict(self) -> dict:
+        return self.speakers
+
+
+def _cosine(a, b) -> float:
+    norm = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(np.dot(a, b) / norm) if norm > 0 else 0.0
+
+
+def speaker_durations(diarization, labels) -> list:
+    """Durée de parole de chaque label (même ordre que `labels`)"""
+    return [diarization.label_duration(label) for label in labels]
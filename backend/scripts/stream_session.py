@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Transcription et diarisation incrémentales d'un enregistrement en chunks
+
+Chaque chunk reçu par RecordingService::storeChunk est traité dès son arrivée:
+diarisation pyannote, rattachement de ses locuteurs aux locuteurs déjà vus
+(registre d'embeddings) et transcription Whisper avec en contexte la fin du
+texte du chunk précédent. L'état de la session est conservé dans le dossier
+des chunks (stream_state.json).
+
+À la finalisation, seul le dernier chunk reste à traiter: le temps entre la fin
+du rendez-vous et la transcription ne dépend plus de la durée totale.
+
+Les modèles ne sont pas rechargés à chaque chunk: la diarisation est demandée
+au serveur pyannote (diarize_audio.py --serve) et la transcription au worker
+Whisper (whisper_transcribe.py --serve) s'ils écoutent, sinon les modèles sont
+chargés dans ce processus.
+
+Avec WHISPER_MODEL=auto, le modèle Whisper et son décodage sont choisis au
+premier chunk puis gardés pour toute la session: le plus grand qui transcrit un
+chunk en moins de STREAM_REALTIME_SHARE fois sa durée (le reste pour la
+diarisation), pour suivre le rythme de l'enregistrement.
+
+Un seul processus fait avancer une session (les chunks dépendent du précédent):
+un `advance` lancé pendant qu'un autre tourne rend la main immédiatement, le
+processus en cours traite aussi les chunks arrivés entre-temps.
+
+Configuration (variables d'environnement):
+    PYANNOTE_SERVER_SOCKET      socket du serveur de diarisation (défaut: /tmp/pyannote_server.sock)
+    WHISPER_WORKER_SOCKET       socket du worker Whisper (défaut: /tmp/whisper_worker.sock)
+    STREAM_CHUNK_TIMEOUT        attente maximale d'une réponse du serveur ou du worker (défaut: 300)
+    STREAM_REALTIME_SHARE       part de la durée d'un chunk allouée à Whisper, modèle auto (défaut: 0.5)
+
+Usage:
+    python3 stream_session.py advance <session_dir>
+    python3 stream_session.py finalize <session_dir> <output_json> [--total-chunks N]
+"""
+
+import sys
+import os
+import re
+import json
+import socket
+import time
+import argparse
+import fcntl
+from contextlib import contextmanager
+
+from speaker_alignment import SpeakerIntervalIndex, assign_speakers
+from speaker_registry import SpeakerRegistry
+
+STATE_FILE = 'stream_state.json'
+LOCK_FILE = '.stream.lock'
+CHUNK_PATTERN = re.compile(r'_part_(\d+)\.webm$')
+
+# Nombre de caractères du chunk précédent passés en contexte à Whisper
+PROMPT_CONTEXT_CHARS = 200
+
+PYANNOTE_SOCKET = os.getenv('PYANNOTE_SERVER_SOCKET', '/tmp/pyannote_server.sock')
+WHISPER_SOCKET = os.getenv('WHISPER_WORKER_SOCKET', '/tmp/whisper_worker.sock')
+CHUNK_TIMEOUT = float(os.getenv('STREAM_CHUNK_TIMEOUT', '300'))
+REALTIME_SHARE = float(os.getenv('STREAM_REALTIME_SHARE', '0.5'))
+
+
+@contextmanager
+def session_lock(session_dir: str, wait: bool = True):
+    """
+    Verrou exclusif: un seul processus fait avancer une session à la fois
+
+    Sans `wait`, rend False sans attendre si un autre processus tient le verrou.
+    """
+    with open(os.path.join(session_dir, LOCK_FILE), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def load_state(session_dir: str) -> dict:
+    path = os.path.join(session_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {'next_index': 0, 'offset': 0.0, 'prompt': '', 'speakers': {}, 'turns': [], 'segments': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(session_dir: str, state: dict) -> None:
+    """Écriture atomique (fichier temporaire puis rename)"""
+    path = os.path.join(session_dir, STATE_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def list_chunks(session_dir: str) -> dict:
+    """{index: chemin} des chunks présents dans le dossier de session"""
+    chunks = {}
+    for name in os.listdir(session_dir):
+        match = CHUNK_PATTERN.search(name)
+        if match:
+            chunks[int(match.group(1))] = os.path.join(session_dir, name)
+    return chunks
+
+
+def resident_request(socket_path: str, request: dict, timeout: float = None):
+    """
+    Envoie une requête (une ligne JSON) au serveur de diarisation ou au worker Whisper
+
+    Returns:
+        dict de la réponse, ou None si personne n'écoute, ne répond pas à temps
+        ou ferme la connexion sans réponse
+    """
+    if not socket_path or not os.path.exists(socket_path):
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout or CHUNK_TIMEOUT)
+            sock.connect(socket_path)
+            with sock.makefile('rwb') as stream:
+                stream.write((json.dumps(request, ensure_ascii=False) + '\n').encode('utf-8'))
+                stream.flush()
+                line = stream.readline()
+        return json.loads(line) if line else None
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+class StreamModels:
+    """
+    Diarisation et transcription d'un chunk
+
+    Par le serveur pyannote et le worker Whisper s'ils répondent, sinon par des
+    modèles chargés dans ce processus à la première utilisation (aucun
+    chargement si rien à traiter).
+    """
+
+    def __init__(self, model_size: str, pyannote_socket: str = PYANNOTE_SOCKET,
+                 whisper_socket: str = WHISPER_SOCKET):
+        self.model_size = model_size
+        self.pyannote_socket = pyannote_socket
+        self.whisper_socket = whisper_socket
+        self.session_model = None
+        self.decoding = None
+        self._pipeline = None
+
+    @property
+    def pipeline(self):
+        if self._pipeline is None:
+            from diarize_audio import load_pipeline
+            self._pipeline = load_pipeline()
+        return self._pipeline
+
+    def use_session_model(self, state: dict, chunk_path: str) -> None:
+        """Modèle Whisper de la session: `auto` est résolu au premier chunk puis gardé dans l'état"""
+        if 'model' not in state:
+            state['model'], state['decoding'] = self.model_size, None
+            if self.model_size == 'auto':
+                from model_selection import probe_duration
+                from whisper_transcribe import DEFAULT_ENGINE, select_model, worker_models
+
+                duration = probe_duration(chunk_path)
+                loaded = {key.split(':')[1] for key in worker_models(self.whisper_socket)
+                          if key.startswith(f"{DEFAULT_ENGINE}:")}
+                adaptive = select_model(chunk_path, time.time() + duration * REALTIME_SHARE if duration else None,
+                                        loaded_models=loaded, duration=duration)
+                print(f"🧠 Modèle auto pour la session: {adaptive['model']} ({adaptive['preset']})", file=sys.stderr)
+                state.update({'model': adaptive['model'], 'decoding': adaptive['decoding'], 'adaptive': adaptive})
+        self.session_model, self.decoding = state['model'], state['decoding']
+
+    def diarize(self, chunk_path: str) -> dict:
+        """Tours et embeddings des locuteurs du chunk (format de diarize_audio.diarize_chunk)"""
+        response = resident_request(self.pyannote_socket,
+                                    {'cmd': 'diarize_chunk', 'audio_file': os.path.abspath(chunk_path)})
+        if response is not None and response.get('success'):
+            return response
+
+        from diarize_audio import diarize_chunk
+        return diarize_chunk(self.pipeline, chunk_path)
+
+    def transcribe(self, chunk_path: str, prompt: str = None) -> dict:
+        """Texte et segments Whisper du chunk, avec `prompt` en contexte"""
+        model_size = self.session_model or self.model_size
+        request = {'cmd': 'stream_chunk', 'audio_path': os.path.abspath(chunk_path), 'model': model_size,
+                   'initial_prompt': prompt, 'decoding': self.decoding}
+        response = resident_request(self.whisper_socket, request)
+        if response is not None and 'error' not in response:
+            return response
+
+        from whisper_transcribe import transcribe_stream_chunk
+        result = transcribe_stream_chunk(chunk_path, model_size, prompt, decoding=self.decoding)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        return result
+
+
+def process_chunk(models: StreamModels, state: dict, chunk_path: str) -> None:
+    """Diarise et transcrit un chunk puis met à jour l'état de la session"""
+    offset = state['offset']
+
+    # Diarisation du chunk + rattachement aux locuteurs des chunks précédents
+    chunk = models.diarize(chunk_path)
+    registry = SpeakerRegistry(state['speakers'])
+    mapping = registry.match(chunk['labels'], chunk['embeddings'], chunk['durations'])
+    turns = [(start, end, mapping[speaker]) for start, end, speaker in chunk['turns']]
+
+    # Transcription avec la fin du chunk précédent comme contexte
+    models.use_session_model(state, chunk_path)
+    whisper_result = models.transcribe(chunk_path, state['prompt'] or None)
+    segments = assign_speakers(whisper_result['segments'], SpeakerIntervalIndex(turns), {})
+
+    state['turns'].extend([start + offset, end + offset, speaker] for start, end, speaker in turns)
+    state['segments'].extend(
+        {**segment, 'start': segment['start'] + offset, 'end': segment['end'] + offset}
+        for segment in segments
+    )
+    state['speakers'] = registry.to_dict()
+    state['prompt'] = whisper_result['text'].strip()[-PROMPT_CONTEXT_CHARS:] or state['prompt']
+    state['offset'] = offset + chunk['duration']
+    state['next_index'] += 1
+
+
+def next_chunk(session_dir: str, state: dict, total_chunks=None):
+    """Chemin du prochain chunk à traiter, ou None s'il n'est pas encore arrivé"""
+    if total_chunks is not None and state['next_index'] >= total_chunks:
+        return None
+    return list_chunks(session_dir).get(state['next_index'])
+
+
+def advance(session_dir: str, models: StreamModels, total_chunks=None, wait: bool = True):
+    """
+    Traite, dans l'ordre, les chunks disponibles non encore traités
+
+    S'arrête au premier chunk manquant: les chunks arrivés dans le désordre
+    sont traités quand le trou est comblé. Le dossier est relu après chaque
+    chunk: ceux arrivés pendant le traitement sont pris au passage.
+
+    Returns:
+        dict: état de la session, ou None si un autre processus la fait avancer (sans `wait`)
+    """
+    while True:
+        with session_lock(session_dir, wait) as locked:
+            if not locked:
+                return None
+            state = load_state(session_dir)
+            chunk_path = next_chunk(session_dir, state, total_chunks)
+            while chunk_path is not None:
+                print(f"🎧 Chunk #{state['next_index']}...", file=sys.stderr)
+                process_chunk(models, state, chunk_path)
+                save_state(session_dir, state)
+                chunk_path = next_chunk(session_dir, state, total_chunks)
+
+        # Un chunk arrivé juste avant la libération du verrou: l'appel qui l'a signalé a pu renoncer
+        if next_chunk(session_dir, state, total_chunks) is None:
+            return state
+
+
+def stitch(state: dict) -> dict:
+    """Assemble les chunks traités en résultat final (même format que transcribe_speakers.py)"""
+    from diarize_audio import build_table_result
+    from segment_table import SegmentTable
+    from transcribe_speakers import speaker_roles
+
+    diarization_result = build_table_result(SegmentTable.from_turns(state['turns']))
+    roles = speaker_roles(diarization_result)
+    segments = [{**segment, 'role': roles.get(segment['speaker'], 'client')} for segment in state['segments']]
+
+    return {
+        **diarization_result,
+        'segments': segments,
+        'client_text': ' '.join(s['text'] for s in segments if s['role'] == 'client'),
+        'courtier_text': ' '.join(s['text'] for s in segments if s['role'] == 'courtier'),
+        'text': ' '.join(s['text'] for s in segments),
+        'chunks_processed': state['next_index'],
+        'audio_duration': state['offset'],
+        **({'adaptive': state['adaptive']} if state.get('adaptive') else {})
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Traitement incrémental des chunks d'enregistrement")
+    parser.add_argument('command', choices=['advance', 'finalize'])
+    parser.add_argument('session_dir')
+    parser.add_argument('output_json', nargs='?')
+    parser.add_argument('--total-chunks', type=int)
+    parser.add_argument('--model', default=os.getenv('WHISPER_MODEL', 'base'))
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.session_dir):
+        print(f"Erreur: Dossier de session introuvable: {args.session_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    models = StreamModels(args.model)
+
+    if args.command == 'advance':
+        state = advance(args.session_dir, models, wait=False)
+        if state is None:
+            print("⏳ Session déjà en cours de traitement par un autre processus", file=sys.stderr)
+            print(json.dumps({'success': True, 'busy': True}))
+            return
+        print(json.dumps({'success': True, 'chunks_processed': state['next_index']}))
+        return
+
+    if not args.output_json:
+        print("Usage: python3 stream_session.py finalize <session_dir> <output_json>", file=sys.stderr)
+        sys.exit(1)
+
+    from diarize_audio import write_result, error_result
+
+    try:
+        state = advance(args.session_dir, models, args.total_chunks)
+
+        if args.total_chunks is not None and state['next_index'] < args.total_chunks:
+            raise RuntimeError(
+                f"Chunk #{state['next_index']} manquant ({state['next_index']}/{args.total_chunks} traités)"
+            )
+
+        write_result(args.output_json, stitch(state))
+        print(f"✅ Résultats sauvegardés dans: {args.output_json}", file=sys.stderr)
+    except Exception as e:
+        print(f"❌ Erreur: {str(e)}", file=sys.stderr)
+        write_result(args.output_json, error_result(e))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
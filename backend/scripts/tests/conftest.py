@@ -0,0 +1,14 @@
+"""
+Tests unitaires des modules de calcul des scripts d'inférence (numpy seul)
+
+Les modèles (pyannote, Whisper, torch) ne sont pas nécessaires: seuls les
+modules qui ne les importent pas au chargement sont testés.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Les tests n'écrivent pas dans les métriques de l'hôte
+os.environ.setdefault('METRICS', '0')
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from audio_chunks import SEARCH_WINDOW_SECONDS, drop_repeated_words, plan_chunks, stitch_chunks
+
+SAMPLE_RATE = 16000
+
+
+def speech_with_pauses(seconds: int, pauses: list) -> np.ndarray:
+    """Bruit continu avec des pauses silencieuses d'une seconde commençant aux instants `pauses`"""
+    waveform = np.random.default_rng(0).normal(0, 0.2, seconds * SAMPLE_RATE).astype(np.float32)
+    for pause in pauses:
+        waveform[int(pause * SAMPLE_RATE):int((pause + 1) * SAMPLE_RATE)] = 0.0
+    return waveform
+
+
+def test_short_audio_is_one_chunk():
+    waveform = np.zeros(40 * SAMPLE_RATE, dtype=np.float32)
+    assert plan_chunks(waveform, 30) == [(0, len(waveform))]
+
+
+def test_chunks_are_contiguous_and_cover_the_audio():
+    waveform = speech_with_pauses(600, [55, 118, 190, 245, 301, 362, 418, 480, 540])
+    bounds = plan_chunks(waveform, 60)
+
+    assert bounds[0][0] == 0
+    assert bounds[-1][1] == len(waveform)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(bounds, bounds[1:]))
+    assert all(end > start for start, end in bounds)
+    # Chaque coupure reste dans la fenêtre de recherche autour de la cible
+    for start, end in bounds[:-1]:
+        assert abs((end - start) / SAMPLE_RATE - 60) <= SEARCH_WINDOW_SECONDS + 0.1
+
+
+def test_cuts_fall_in_pauses():
+    pauses = [55, 118, 182]
+    waveform = speech_with_pauses(240, pauses)
+    cuts = [end / SAMPLE_RATE for _, end in plan_chunks(waveform, 60)[:-1]]
+
+    assert len(cuts) == len(pauses)
+    for cut, pause in zip(cuts, pauses):
+        assert pause <= cut <= pause + 1
+
+
+def test_repeated_words_are_dropped():
+    assert drop_repeated_words("on signe le contrat demain", " le contrat demain matin") == " matin"
+    assert drop_repeated_words("on signe le contrat.", " Le contrat, c'est bon") == " c'est bon"
+
+
+def test_single_word_repetition_is_kept():
+    assert drop_repeated_words("vous êtes d'accord oui", " oui je suis d'accord") == " oui je suis d'accord"
+
+
+def test_stitch_shifts_timestamps_and_removes_boundary_repeats():
+    chunks = [
+        {'start': 0, 'segments': [
+            {'start': 0.0, 'end': 4.0, 'text': ' Bonjour, on regarde le contrat'},
+            {'start': 4.0, 'end': 59.5, 'text': ' de prévoyance'}
+        ]},
+        {'start': 60 * SAMPLE_RATE, 'segments': [
+            {'start': 0.0, 'end': 2.0, 'text': ' de prévoyance ensemble',
+             'words': [{'start': 0.0, 'end': 0.4, 'word': ' de'}, {'start': 0.4, 'end': 1.2, 'word': ' prévoyance'},
+                       {'start': 1.2, 'end': 2.0, 'word': ' ensemble'}]},
+            {'start': 2.0, 'end': 3.0, 'text': ' aujourd\'hui'}
+        ]}
+    ]
+    stitched = stitch_chunks(chunks)
+
+    assert stitched['text'] == " Bonjour, on regarde le contrat de prévoyance ensemble aujourd'hui"
+    second = stitched['segments'][2]
+    assert (second['start'], second['end']) == (60.0, 62.0)
+    assert [word['word'] for word in second['words']] == [' ensemble']
+    assert second['words'][0]['start'] == pytest.approx(61.2)
+    starts = [segment['start'] for segment in stitched['segments']]
+    assert starts == sorted(starts)
+
+
+def test_stitch_keeps_timestamps_monotonic():
+    chunks = [
+        {'start': 0, 'segments': [{'start': 0.0, 'end': 31.0, 'text': ' un'}]},
+        {'start': 30 * SAMPLE_RATE, 'segments': [{'start': 0.0, 'end': 2.0, 'text': ' deux'}]}
+    ]
+    segments = stitch_chunks(chunks)['segments']
+    assert segments[1]['start'] == 31.0
+    assert segments[1]['end'] == 32.0
@@ -0,0 +1,191 @@
+import gc
+import os
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+import pytest
+
+import audio_io
+from audio_io import SAMPLE_RATE, decode_audio, decode_to_file, load_audio, read_samples
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Faux ffmpeg: "<nom>-<secondes>.webm" → s16le de la durée indiquée (5 s de son, 5 s de silence);
+# un nom contenant "broken" échoue après quelques échantillons
+FAKE_FFMPEG = textwrap.dedent('''\
+    #!{python}
+    import sys
+    import numpy as np
+
+    source = sys.argv[sys.argv.index('-i') + 1]
+    if 'broken' in source:
+        sys.stdout.buffer.write(b'\\0' * 1000)
+        sys.stderr.write('Invalid data found when processing input')
+        sys.exit(1)
+
+    total = int(float(source.rsplit('-', 1)[1].split('.')[0]) * 16000)
+    block = 16000 * 10
+    t = np.arange(block) / 16000
+    pattern = np.where(t < 5, 8000 * np.sin(2 * np.pi * 220 * t), 3).astype('<i2')
+    for first in range(0, total, block):
+        sys.stdout.buffer.write(pattern[:min(block, total - first)].tobytes())
+''')
+
+
+def expected_samples(seconds: float) -> np.ndarray:
+    t = np.arange(SAMPLE_RATE * 10) / SAMPLE_RATE
+    pattern = np.where(t < 5, 8000 * np.sin(2 * np.pi * 220 * t), 3).astype('<i2')
+    total = int(seconds * SAMPLE_RATE)
+    return np.tile(pattern, total // len(pattern) + 1)[:total].astype(np.float32) / 32768.0
+
+
+@pytest.fixture
+def ffmpeg(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'ffmpeg'
+    script.write_text(FAKE_FFMPEG.format(python=sys.executable))
+    script.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return bin_dir
+
+
+def recording(directory, seconds, name='meeting'):
+    path = directory / f"{name}-{seconds}.webm"
+    path.write_bytes(b'')
+    return str(path)
+
+
+def test_decode_to_file_matches_in_memory_decode(tmp_path, ffmpeg, monkeypatch):
+    # Blocs plus petits que la sortie et longueur non multiple d'un bloc
+    monkeypatch.setattr(audio_io, 'DECODE_BLOCK_SAMPLES', 12345)
+    audio = recording(tmp_path, 23)
+
+    waveform = decode_to_file(audio, str(tmp_path / 'out.npy'))
+    assert isinstance(waveform, np.memmap)
+    assert waveform.dtype == np.float32 and waveform.shape == (23 * SAMPLE_RATE,)
+    np.testing.assert_array_equal(waveform, expected_samples(23))
+    np.testing.assert_array_equal(decode_audio(audio), expected_samples(23))
+
+
+def test_decode_failure_leaves_no_file(tmp_path, ffmpeg):
+    audio = recording(tmp_path, 5, name='broken')
+    with pytest.raises(RuntimeError, match='Invalid data'):
+        decode_to_file(audio, str(tmp_path / 'out.npy'))
+    assert sorted(os.listdir(tmp_path)) == ['bin', 'broken-5.webm']
+
+
+def test_cache_written_next_to_recording(tmp_path, ffmpeg):
+    audio = recording(tmp_path, 12)
+    waveform = load_audio(audio)
+    assert waveform.filename == audio + '.16k.npy'
+
+    # Relu depuis le cache, sans ffmpeg
+    os.unlink(ffmpeg / 'ffmpeg')
+    np.testing.assert_array_equal(load_audio(audio), expected_samples(12))
+
+
+def test_stale_cache_is_decoded_again(tmp_path, ffmpeg):
+    audio = recording(tmp_path, 12)
+    cache = audio + '.16k.npy'
+    np.save(cache, np.zeros(5, dtype=np.float32))
+
+    # Enregistrement remplacé après le décodage: le cache n'est plus valable
+    os.utime(cache, (1000, 1000))
+    np.testing.assert_array_equal(load_audio(audio), expected_samples(12))
+    assert np.load(cache).shape == (12 * SAMPLE_RATE,)
+
+
+def test_cached_waveform_is_copy_on_write(tmp_path, ffmpeg):
+    audio = recording(tmp_path, 12)
+    load_audio(audio)[:] = 0.5
+    np.testing.assert_array_equal(load_audio(audio), expected_samples(12))
+    # Une forme d'onde .npy passée directement est relue de la même façon
+    np.testing.assert_array_equal(load_audio(audio + '.16k.npy'), expected_samples(12))
+
+
+def test_unwritable_cache_falls_back_to_scratch(tmp_path, ffmpeg, monkeypatch):
+    decode = audio_io.decode_to_file
+
+    def read_only(audio_path, path, sample_rate=SAMPLE_RATE):
+        if path == audio_path + '.16k.npy':
+            raise PermissionError(13, 'Permission denied', path)
+        return decode(audio_path, path, sample_rate)
+
+    monkeypatch.setattr(audio_io, 'decode_to_file', read_only)
+    monkeypatch.setattr(audio_io.tempfile, 'tempdir', str(tmp_path))
+    audio = recording(tmp_path, 12)
+
+    waveform = load_audio(audio)
+    assert os.path.basename(waveform.filename).startswith(audio_io.SCRATCH_PREFIX)
+    np.testing.assert_array_equal(waveform, expected_samples(12))
+
+
+def test_scratch_file_without_cache(tmp_path, ffmpeg, monkeypatch):
+    monkeypatch.setenv('WAVEFORM_CACHE', '0')
+    monkeypatch.setattr(audio_io.tempfile, 'tempdir', str(tmp_path))
+    audio = recording(tmp_path, 12)
+
+    waveform = load_audio(audio)
+    path = waveform.filename
+    assert os.path.basename(path).startswith(audio_io.SCRATCH_PREFIX)
+    assert not os.path.exists(audio + '.16k.npy')
+
+    # Une vue garde le fichier, qui disparaît avec la dernière référence
+    view = waveform[SAMPLE_RATE:]
+    del waveform
+    gc.collect()
+    np.testing.assert_array_equal(read_samples(view, 0, 10), expected_samples(12)[SAMPLE_RATE:SAMPLE_RATE + 10])
+    del view
+    gc.collect()
+    assert not os.path.exists(path)
+
+
+def test_read_samples(tmp_path):
+    data = np.arange(1000, dtype=np.float32)
+    path = tmp_path / 'waveform.npy'
+    np.save(path, data)
+    waveform = np.load(path, mmap_mode='c')
+
+    np.testing.assert_array_equal(read_samples(waveform, 100, 250), data[100:250])
+    np.testing.assert_array_equal(read_samples(waveform, 900, 1200), data[900:])
+    assert not isinstance(read_samples(waveform, 0, 10), np.memmap)
+    np.testing.assert_array_equal(read_samples(data, 10, 20), data[10:20])
+
+
+PEAK_RSS_SCRIPT = textwrap.dedent('''\
+    import sys
+    sys.path.insert(0, {scripts!r})
+    from audio_io import SAMPLE_RATE, load_audio, read_samples
+    from speaker_precheck import blockwise_speech_regions
+    from windowed_diarization import plan_windows
+
+    waveform = load_audio(sys.argv[1])
+    regions, _ = blockwise_speech_regions(waveform)
+    for start, end, _, _ in plan_windows(len(waveform) / SAMPLE_RATE, 600, 30):
+        read_samples(waveform, int(start * SAMPLE_RATE), int(end * SAMPLE_RATE))
+
+    with open('/proc/self/status') as f:
+        peak = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+    print(peak // 1024, len(regions))
+''')
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason='VmHWM (Linux) requis')
+@pytest.mark.parametrize('cache', ['1', '0'])
+def test_peak_rss_does_not_grow_with_duration(tmp_path, ffmpeg, cache):
+    """Décodage, VAD de la pré-vérification et lecture des fenêtres: mémoire bornée"""
+    def peak_rss_mb(seconds):
+        env = {**os.environ, 'WAVEFORM_CACHE': cache, 'TMPDIR': str(tmp_path)}
+        output = subprocess.run(
+            [sys.executable, '-c', PEAK_RSS_SCRIPT.format(scripts=SCRIPTS_DIR), recording(tmp_path, seconds)],
+            capture_output=True, text=True, check=True, env=env
+        ).stdout.split()
+        assert int(output[1]) == seconds // 10
+        return int(output[0])
+
+    short, long = peak_rss_mb(10 * 60), peak_rss_mb(60 * 60)
+    # 50 minutes de plus: 190 Mo en float32 si la forme d'onde était chargée en mémoire
+    assert long - short < 40
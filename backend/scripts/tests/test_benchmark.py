@@ -0,0 +1,66 @@
+import sys
+import wave
+
+import pytest
+
+from benchmark import compare, generate_recording, run_process, _parse_json, _segment_count
+
+
+def test_synthetic_recording_is_deterministic(tmp_path):
+    first, second = tmp_path / 'a.wav', tmp_path / 'b.wav'
+    turns = generate_recording(str(first), 0.5, 3, seed=1)
+
+    assert generate_recording(str(second), 0.5, 3, seed=1) == turns
+    assert first.read_bytes() == second.read_bytes()
+
+    with wave.open(str(first)) as audio:
+        assert (audio.getframerate(), audio.getnchannels()) == (16000, 1)
+        assert audio.getnframes() == pytest.approx(30 * 16000, abs=16)
+
+    # Tours de référence: dans l'enregistrement, dans l'ordre, jamais deux fois le même locuteur à la suite
+    assert all(turn['start'] < turn['end'] <= 30.0 for turn in turns)
+    assert all(a['end'] < b['start'] for a, b in zip(turns, turns[1:]))
+    assert all(a['speaker'] != b['speaker'] for a, b in zip(turns, turns[1:]))
+    assert {turn['speaker'] for turn in turns} == {'SPK_0', 'SPK_1', 'SPK_2'}
+
+
+def test_other_seed_other_recording(tmp_path):
+    assert generate_recording(str(tmp_path / 'a.wav'), 0.25, 2, seed=0) != \
+        generate_recording(str(tmp_path / 'b.wav'), 0.25, 2, seed=1)
+
+
+def test_run_process_reports_the_child_peak_rss():
+    run = run_process([sys.executable, '-c', 'b = bytearray(200 * 1024 * 1024); print("{\\"ok\\": 1}")'], {})
+
+    assert run['returncode'] == 0
+    assert run['peak_rss_mb'] >= 200
+    assert _parse_json(run['stdout']) == {'ok': 1}
+    assert _parse_json('') == {'error': 'Sortie JSON illisible'}
+
+
+BASE = {'script': 'whisper', 'model': 'base', 'engine': 'openai-whisper', 'minutes': 1, 'speakers': 2,
+        'threads': 4, 'error': None}
+
+
+@pytest.mark.parametrize('current, regressed', [
+    ({'warm_real_time_factor': 0.109, 'peak_rss_mb': 800}, []),
+    ({'warm_real_time_factor': 0.2, 'peak_rss_mb': 800}, ['warm_real_time_factor']),
+    ({'warm_real_time_factor': 0.1, 'peak_rss_mb': 1200}, ['peak_rss_mb']),
+    # Un cas en erreur n'est pas comparé
+    ({'warm_real_time_factor': 0.5, 'peak_rss_mb': 800, 'error': 'code retour 1'}, []),
+])
+def test_compare_flags_regressions_beyond_tolerance(current, regressed):
+    baseline = {'results': [{**BASE, 'warm_real_time_factor': 0.1, 'peak_rss_mb': 800}]}
+    regressions = compare([{**BASE, **current}], baseline, tolerance=0.1)
+    assert [r['metric'] for r in regressions] == regressed
+
+
+def test_new_case_without_baseline_is_ignored():
+    baseline = {'results': [{**BASE, 'warm_real_time_factor': 0.1}]}
+    assert compare([{**BASE, 'threads': 1, 'warm_real_time_factor': 9.0}], baseline, 0.1) == []
+
+
+def test_segment_count_per_script():
+    assert _segment_count('diarization', {'stats': {'merged_num_segments': 12}}) == 12
+    assert _segment_count('whisper', {'segments': [{}, {}]}) == 2
+    assert _segment_count('whisper', {'text': 'trois mots ici'}) == 3
@@ -0,0 +1,142 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import check_pyannote
+from check_pyannote import check_inference, check_model, fingerprint
+
+CONFIG = """pipeline:
+  name: pyannote.audio.pipelines.SpeakerDiarization
+  params:
+    segmentation: pyannote/segmentation-3.0
+    embedding: pyannote/wespeaker-voxceleb-resnet34-LM
+"""
+
+
+def cache_repo(hub, repo_id, files, revision='abc123'):
+    """Dépôt au format du cache huggingface_hub: refs/main -> snapshots/<révision>/"""
+    repo = hub / ('models--' + repo_id.replace('/', '--'))
+    snapshot = repo / 'snapshots' / revision
+    snapshot.mkdir(parents=True)
+    (repo / 'refs').mkdir()
+    (repo / 'refs' / 'main').write_text(revision)
+    for name, content in files.items():
+        (snapshot / name).write_text(content)
+    return snapshot
+
+
+@pytest.fixture
+def hub(tmp_path, monkeypatch):
+    hub = tmp_path / 'hub'
+    hub.mkdir()
+    monkeypatch.setenv('HF_HUB_CACHE', str(hub))
+    monkeypatch.setenv('PYANNOTE_BUNDLE', '0')
+    monkeypatch.setenv('PYANNOTE_HEALTH_CACHE', str(tmp_path / 'health.json'))
+    return hub
+
+
+def empty_result():
+    return {'checks': {}, 'errors': [], 'warnings': [], 'versions': {'torch': '2.1.0', 'pyannote.audio': '3.1.1'}}
+
+
+class TestModelCheck:
+    def test_missing_pipeline_is_an_error_without_token(self, hub):
+        result = empty_result()
+        assert check_model(result, None) == []
+        assert result['checks']['model']['status'] == 'error'
+        assert result['errors']
+
+    def test_missing_dependency(self, hub):
+        cache_repo(hub, 'pyannote/speaker-diarization-3.1', {'config.yaml': CONFIG})
+        cache_repo(hub, 'pyannote/segmentation-3.0', {'pytorch_model.bin': 'w'})
+        # Un dépôt qui ne contient que le README ne compte pas comme téléchargé
+        cache_repo(hub, 'pyannote/wespeaker-voxceleb-resnet34-LM', {'README.md': '#'})
+
+        result = empty_result()
+        check_model(result, 'hf_token')
+        assert result['checks']['model']['status'] == 'warning'
+        assert 'pyannote/wespeaker-voxceleb-resnet34-LM' in result['checks']['model']['message']
+
+    def test_complete_cache(self, hub):
+        pipeline = cache_repo(hub, 'pyannote/speaker-diarization-3.1', {'config.yaml': CONFIG})
+        segmentation = cache_repo(hub, 'pyannote/segmentation-3.0', {'pytorch_model.bin': 'w'})
+        embedding = cache_repo(hub, 'pyannote/wespeaker-voxceleb-resnet34-LM', {'pytorch_model.bin': 'w'})
+
+        result = empty_result()
+        snapshots = check_model(result, None)
+        assert result['checks']['model']['status'] == 'ok'
+        assert result['checks']['model']['dependencies'] == [
+            'pyannote/segmentation-3.0', 'pyannote/wespeaker-voxceleb-resnet34-LM'
+        ]
+        assert sorted(snapshots) == sorted([str(pipeline), str(segmentation), str(embedding)])
+
+
+class TestDeepTierCache:
+    @pytest.fixture
+    def probes(self, hub, monkeypatch):
+        calls = []
+
+        def probe():
+            calls.append(time.time())
+            return {'status': 'ok', 'message': 'probe', 'inference_ms': 12.0}
+
+        monkeypatch.setattr(check_pyannote, 'run_inference_probe', probe)
+        self.snapshot = cache_repo(hub, 'pyannote/segmentation-3.0', {'pytorch_model.bin': 'w'})
+        return calls
+
+    def check(self, force=False):
+        result = empty_result()
+        check_inference(result, [str(self.snapshot)], force)
+        return result['checks']['inference']
+
+    def test_result_reused_until_the_models_change(self, probes):
+        assert self.check()['cached'] is False
+        second = self.check()
+        assert second['cached'] is True and second['inference_ms'] == 12.0
+        assert len(probes) == 1
+
+        # Nouveau fichier de poids: l'empreinte change, le pipeline est rechargé
+        weights = self.snapshot / 'pytorch_model.bin'
+        weights.write_text('nouveaux poids')
+        os.utime(weights, ns=(1, 1))
+        assert self.check()['cached'] is False
+        assert len(probes) == 2
+
+    def test_force_bypasses_the_cache(self, probes):
+        self.check()
+        assert self.check(force=True)['cached'] is False
+        assert len(probes) == 2
+
+    def test_failures_are_not_cached(self, probes, monkeypatch):
+        def broken():
+            raise MemoryError('plus de mémoire')
+
+        monkeypatch.setattr(check_pyannote, 'run_inference_probe', broken)
+        assert self.check()['status'] == 'error'
+        assert not os.path.exists(os.environ['PYANNOTE_HEALTH_CACHE'])
+        assert self.check()['message'] == 'Pipeline inference failed: plus de mémoire'
+
+
+def test_fingerprint_tracks_package_versions(hub):
+    snapshot = cache_repo(hub, 'pyannote/segmentation-3.0', {'pytorch_model.bin': 'w'})
+    assert fingerprint([str(snapshot)], {'torch': '2.1.0'}) != fingerprint([str(snapshot)], {'torch': '2.2.0'})
+
+
+def test_fast_tier_never_imports_torch(hub):
+    # Paquets supposés installés: le niveau rapide va jusqu'à la vérification du cache des modèles
+    code = (
+        "import sys, json, check_pyannote\n"
+        "check_pyannote.check_packages = lambda result: result.update(versions={}) or True\n"
+        "assert check_pyannote.check_health()['checks']['model']['status'] == 'error'\n"
+        "print(json.dumps(sorted(m for m in ('torch', 'pyannote.audio', 'numpy') if m in sys.modules)))"
+    )
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(check_pyannote.__file__),
+                            capture_output=True, text=True, timeout=30, check=True).stdout
+
+    assert json.loads(output) == []
+    assert time.perf_counter() - started < 5
@@ -0,0 +1,193 @@
+import contextlib
+import dataclasses
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import decode_guard
+from decode_guard import DecodeStats, RunawayFilter, fallback_temperatures, guarded_decode, repeated_tail
+
+EOT = 100
+TIMESTAMP = 150   # les timestamps suivent le token de fin dans le vocabulaire
+VOCAB = 200
+
+
+class Tokenizer:
+    """Tokenizer factice: chaque token de texte est un mot distinct"""
+    eot = EOT
+
+    def decode(self, tokens):
+        return ' '.join(f"mot{token}" for token in tokens)
+
+
+def test_fallback_temperatures_are_bounded():
+    assert fallback_temperatures(0) == (0.0,)
+    assert fallback_temperatures(2) == (0.0, 0.2, 0.4)
+    # Au-delà de la dernière température de Whisper, rien à ajouter
+    assert fallback_temperatures(10) == (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+    assert fallback_temperatures() == fallback_temperatures(decode_guard.MAX_FALLBACKS)
+
+
+@pytest.mark.parametrize('tokens, runaway', [
+    ([7] * 11, False),                          # un token répété, moins de MIN_REPEAT_TOKENS
+    ([7] * 12, True),
+    ([1, 2, 3] * 3, False),                     # interjection répétée: texte normal
+    ([9, 9] + [1, 2, 3] * 4, True),
+    (list(range(5)) * 4, True),                 # bloc de 5 tokens, REPEAT_LIMIT fois
+    (list(range(17)) * 4, False),               # bloc plus long que MAX_REPEAT_PERIOD
+    ([1, 2, 3] * 4 + [4], False),               # la répétition doit finir le texte
+])
+def test_repeated_tail(tokens, runaway):
+    assert repeated_tail(tokens) is runaway
+
+
+def apply(guard, sequences, prompt=(EOT + 1,)):
+    tokens = np.array([list(prompt) + sequence for sequence in sequences])
+    logits = np.zeros((len(sequences), VOCAB), dtype=np.float32)
+    guard.apply(logits, tokens)
+    return logits
+
+
+def forced_end(logits, row):
+    return logits[row, EOT] == 0.0 and np.isneginf(np.delete(logits[row], EOT)).all()
+
+
+class TestRunawayFilter:
+    def test_repetition_forces_the_end_token(self):
+        guard = RunawayFilter(Tokenizer(), sample_begin=1, n_group=1)
+        logits = apply(guard, [[1, 2, 3] * 4, [1, 2, 3, 4] * 2 + [5] * 4])
+
+        assert forced_end(logits, 0)
+        assert not np.isinf(logits[1]).any()
+        assert guard.aborted == {0}
+
+    def test_timestamps_do_not_hide_a_loop(self):
+        # Même phrase à chaque répétition, timestamps différents
+        sequence = []
+        for repeat in range(4):
+            sequence += [TIMESTAMP + 2 * repeat, 1, 2, 3, TIMESTAMP + 2 * repeat + 1]
+        guard = RunawayFilter(Tokenizer(), sample_begin=1, n_group=1)
+        assert forced_end(apply(guard, [sequence]), 0)
+
+    def test_prompt_is_not_part_of_the_pass(self):
+        # Le prompt (texte précédent) répète déjà un bloc: la passe elle-même est saine
+        guard = RunawayFilter(Tokenizer(), sample_begin=13, n_group=1)
+        logits = apply(guard, [[1, 2, 3] * 2], prompt=[EOT + 1] + [4, 5, 6] * 4)
+        assert not np.isinf(logits).any() and not guard.aborted
+
+    def test_finished_candidates_are_left_alone(self):
+        guard = RunawayFilter(Tokenizer(), sample_begin=1, n_group=1)
+        logits = apply(guard, [[7] * 12 + [EOT]])
+        assert not np.isinf(logits).any() and not guard.aborted
+
+    def test_aborted_windows_group_beam_candidates(self):
+        # 2 fenêtres x 3 candidats: seul le 5e candidat (fenêtre 1) s'emballe
+        guard = RunawayFilter(Tokenizer(), sample_begin=1, n_group=3)
+        sequences = [[row * 12 + step for step in range(12)] for row in range(6)]
+        sequences[4] = [8] * 12
+        apply(guard, sequences)
+        assert guard.aborted == {1}
+
+    def test_compressible_text_is_stopped_at_the_check_interval(self):
+        class Repetitive(Tokenizer):
+            def decode(self, tokens):
+                return 'le client le client ' * len(tokens)
+
+        guard = RunawayFilter(Repetitive(), sample_begin=1, n_group=1)
+        # Tokens tous distincts: seule la compression du texte décodé est en cause
+        sequences = [list(range(decode_guard.COMPRESSION_CHECK_TOKENS - 1)),
+                     list(range(decode_guard.COMPRESSION_CHECK_TOKENS))]
+        apply(guard, [sequences[0]])
+        assert not guard.aborted
+        logits = apply(guard, [sequences[1]])
+        assert forced_end(logits, 0) and guard.aborted == {0}
+
+
+def test_stats_merge_and_report():
+    stats = DecodeStats()
+    stats.add_pass(0.0, [types.SimpleNamespace(tokens=[1, 2, 3])] * 2, aborted=1)
+    stats.add_pass(0.2, [types.SimpleNamespace(tokens=[1])])
+    stats.merge({'windows': 3, 'fallbacks': 1, 'windows_aborted': 0, 'tokens_decoded': 40})
+    stats.merge(None)
+
+    assert stats.report() == {'windows': 5, 'fallbacks': 2, 'windows_aborted': 1, 'tokens_decoded': 47,
+                              'max_fallbacks': decode_guard.MAX_FALLBACKS}
+
+    # Un rapport faster-whisper ne compte pas les passes interrompues
+    stats.merge({'windows': 1, 'fallbacks': 0, 'windows_aborted': None, 'tokens_decoded': 5})
+    assert stats.report()['windows_aborted'] is None
+
+
+@dataclasses.dataclass(frozen=True)
+class Options:
+    temperature: float = 0.0
+    beam_size: int = None
+    sample_len: int = None
+
+
+@dataclasses.dataclass(frozen=True)
+class Result:
+    tokens: list
+    compression_ratio: float
+
+
+class DecodingTask:
+    """Boucle de décodage minimale: chaque fenêtre suit son script de tokens, les filtres peuvent la terminer"""
+    sample_begin = 1
+    n_group = 1
+
+    def __init__(self, model, options):
+        self.scripts = model
+        self.options = options
+        self.tokenizer = Tokenizer()
+        self.logit_filters = []
+
+    def run(self, mel):
+        limit = self.options.sample_len or 224
+        sequences = [[EOT + 1] for _ in range(len(mel))]
+        for step in range(limit):
+            tokens = np.array(sequences)
+            logits = np.zeros((len(sequences), VOCAB), dtype=np.float32)
+            for logit_filter in self.logit_filters:
+                logit_filter.apply(logits, tokens)
+            for row, sequence in enumerate(sequences):
+                script = self.scripts[row]
+                ended = sequence[-1] == EOT or np.isneginf(logits[row, 0]) or step >= len(script)
+                sequence.append(EOT if ended else script[step])
+        return [Result(tokens=[t for t in sequence[1:] if t != EOT], compression_ratio=1.5) for sequence in sequences]
+
+
+@pytest.fixture
+def whisper_decoding(monkeypatch):
+    decoding = types.ModuleType('whisper.decoding')
+    decoding.DecodingTask = DecodingTask
+    monkeypatch.setitem(sys.modules, 'whisper', types.ModuleType('whisper'))
+    monkeypatch.setitem(sys.modules, 'whisper.decoding', decoding)
+    monkeypatch.setitem(sys.modules, 'torch', types.SimpleNamespace(no_grad=contextlib.nullcontext))
+
+
+def test_guarded_decode_cuts_the_loop_and_triggers_the_fallback(whisper_decoding):
+    scripts = [[1, 2, 3] * 30, list(range(20))]
+    stats = DecodeStats()
+
+    results = guarded_decode(scripts, np.zeros((2, 80, 3000)), Options(), stats, retry_aborted=True)
+
+    # La boucle s'arrête à la 4e répétition au lieu d'aller jusqu'à la limite de tokens
+    assert results[0].tokens == [1, 2, 3] * 4
+    assert results[0].compression_ratio > decode_guard.COMPRESSION_RATIO_THRESHOLD
+    assert results[1] == Result(tokens=list(range(20)), compression_ratio=1.5)
+    assert stats.report()['windows_aborted'] == 1 and stats.report()['tokens_decoded'] == 32
+
+
+def test_guarded_decode_applies_the_window_token_limit(whisper_decoding, monkeypatch):
+    monkeypatch.setattr(decode_guard, 'MAX_WINDOW_TOKENS', 8)
+    stats = DecodeStats()
+
+    results = guarded_decode([list(range(20))], np.zeros((1, 80, 3000)), Options(temperature=0.4), stats)
+
+    assert results[0].tokens == list(range(8))
+    # Passe de repli: comptée comme telle, sans relever le ratio
+    assert results[0].compression_ratio == 1.5
+    assert stats.report()['fallbacks'] == 1 and stats.report()['windows'] == 0
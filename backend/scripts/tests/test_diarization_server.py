@@ -0,0 +1,122 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import diarize_audio
+from diarize_audio import DiarizationServer
+
+
+class Connection:
+    """Client du protocole ligne-JSON, servi par _handle_connection sur une paire de sockets"""
+
+    def __init__(self, server):
+        self.client, served = socket.socketpair()
+        threading.Thread(target=server._handle_connection, args=(served,), daemon=True).start()
+        self.stream = self.client.makefile('rwb')
+
+    def send(self, line):
+        self.stream.write(line.encode('utf-8') + b'\n')
+        self.stream.flush()
+        return json.loads(self.stream.readline())
+
+    def request(self, **payload):
+        return self.send(json.dumps(payload))
+
+    def close(self):
+        self.stream.close()
+        self.client.close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setenv('INFERENCE_CACHE', '0')
+    loaded = threading.Event()
+    calls = []
+
+    def load_pipeline():
+        loaded.wait(5)
+        return 'pipeline'
+
+    def diarize_file(pipeline, audio_file, profiler, advisor_id=None, speakers=None, tracker=None):
+        calls.append((pipeline, audio_file, advisor_id))
+        return {'success': True, 'client_segments': [{'start': 0.0, 'end': 1.0}]}
+
+    monkeypatch.setattr(diarize_audio, 'load_pipeline', load_pipeline)
+    monkeypatch.setattr(diarize_audio, 'diarize_file', diarize_file)
+
+    instance = DiarizationServer(str(tmp_path / 'server.sock'))
+    threading.Thread(target=instance._run_jobs, daemon=True).start()
+    instance.loaded, instance.calls = loaded, calls
+    connection = Connection(instance)
+    yield instance, connection
+    connection.close()
+
+
+def test_status_answers_while_the_model_loads(server):
+    instance, connection = server
+    assert connection.request(cmd='status')['ready'] is False
+
+    instance.loaded.set()
+    deadline = time.time() + 5
+    while not connection.request(cmd='status')['ready']:
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_pipeline_stays_resident_across_requests(server, tmp_path):
+    instance, connection = server
+    instance.loaded.set()
+    audio = tmp_path / 'rdv.webm'
+    audio.write_bytes(b'audio')
+
+    for number in range(2):
+        output = tmp_path / f"out{number}.json"
+        response = connection.request(cmd='diarize', audio_file=str(audio), output_json=str(output), advisor_id=7)
+        assert response == {'success': True, 'output_json': str(output), 'error': None}
+        assert json.loads(output.read_text())['client_segments'] == [{'start': 0.0, 'end': 1.0}]
+
+    # Un seul chargement: les deux jobs ont reçu le même pipeline
+    assert instance.calls == [('pipeline', str(audio), 7)] * 2
+    status = connection.request(cmd='status')
+    assert (status['processed'], status['failed'], status['queue_depth']) == (2, 0, 0)
+
+
+def test_rejected_requests(server, tmp_path):
+    instance, connection = server
+    instance.loaded.set()
+    output = tmp_path / 'out.json'
+
+    assert connection.send('{pas du json')['error'].startswith('JSON invalide')
+    assert connection.request(cmd='diarize', audio_file='x.webm')['error'].startswith('Requête invalide')
+
+    expired = connection.request(cmd='diarize', audio_file='x.webm', output_json=str(output),
+                                 deadline=time.time() - 1)
+    assert expired == {'success': False, 'error': 'Deadline dépassée avant le traitement'}
+
+    missing = connection.request(cmd='diarize', audio_file=str(tmp_path / 'absent.webm'), output_json=str(output))
+    assert missing['success'] is False
+    # Le fichier de sortie porte l'erreur, comme en mode CLI
+    assert json.loads(output.read_text())['error'] == missing['error']
+
+    assert instance.calls == []
+    assert connection.request(cmd='status')['failed'] == 2
+
+
+def test_load_failure_is_reported(tmp_path, monkeypatch):
+    def broken():
+        raise RuntimeError('token Hugging Face manquant')
+
+    monkeypatch.setattr(diarize_audio, 'load_pipeline', broken)
+    instance = DiarizationServer(str(tmp_path / 'server.sock'))
+    threading.Thread(target=instance._run_jobs, daemon=True).start()
+    connection = Connection(instance)
+    audio = tmp_path / 'rdv.webm'
+    audio.write_bytes(b'audio')
+
+    response = connection.request(cmd='diarize', audio_file=str(audio), output_json=str(tmp_path / 'out.json'))
+    assert response['error'] == 'Pipeline non chargé: token Hugging Face manquant'
+    assert connection.request(cmd='status')['error'] == 'token Hugging Face manquant'
+    connection.close()
@@ -0,0 +1,107 @@
+import os
+import json
+import multiprocessing
+
+import pytest
+
+import inference_cache
+from inference_cache import InferenceCache, cache_key, cached_inference
+
+
+@pytest.fixture
+def audio(tmp_path):
+    path = tmp_path / 'audio.wav'
+    path.write_bytes(b'RIFF' + bytes(1000))
+    return str(path)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    directory = str(tmp_path / 'cache')
+    monkeypatch.setenv('INFERENCE_CACHE_DIR', directory)
+    monkeypatch.setenv('INFERENCE_CACHE', '1')
+    return directory
+
+
+def entry_size(value: dict) -> int:
+    return len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+
+def test_key_depends_on_content_and_params(audio, tmp_path):
+    copy = tmp_path / 'copy.wav'
+    copy.write_bytes(open(audio, 'rb').read())
+
+    assert cache_key('whisper', audio, {'model': 'base'}) == cache_key('whisper', str(copy), {'model': 'base'})
+    assert cache_key('whisper', audio, {'model': 'base'}) != cache_key('whisper', audio, {'model': 'small'})
+    assert cache_key('whisper', audio, {'model': 'base'}) != cache_key('diarization', audio, {'model': 'base'})
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    value = {'text': 'x' * 100}
+    cache = InferenceCache(str(tmp_path), max_bytes=3 * entry_size(value))
+
+    for number, key in enumerate(('aa1', 'bb2', 'cc3')):
+        cache.put(key, value)
+        os.utime(cache._path(key), (1000 + number, 1000 + number))
+    # Lecture de la plus ancienne: elle redevient la plus récente
+    assert cache.get('aa1') == value
+
+    cache.put('dd4', value)
+    assert cache.get('bb2') is None
+    assert cache.get('aa1') == value
+    assert cache.get('dd4') == value
+
+
+def test_eviction_goes_below_target_ratio(tmp_path):
+    value = {'text': 'x' * 100}
+    size = entry_size(value)
+    cache = InferenceCache(str(tmp_path), max_bytes=10 * size)
+    for number in range(11):
+        cache.put(f"{number:02d}key", value)
+        os.utime(cache._path(f"{number:02d}key"), (1000 + number, 1000 + number))
+
+    remaining = [number for number in range(11) if os.path.exists(cache._path(f"{number:02d}key"))]
+    assert len(remaining) * size <= 10 * size * inference_cache.EVICTION_TARGET_RATIO
+    assert remaining == list(range(11 - len(remaining), 11))
+
+
+def test_cached_inference_hit_and_uncached_results(audio, cache_dir):
+    calls = []
+
+    def compute(result):
+        def run():
+            calls.append(result)
+            return result
+        return run
+
+    first = cached_inference('whisper', audio, {'model': 'base'}, compute({'text': 'bonjour'}))
+    second = cached_inference('whisper', audio, {'model': 'base'}, compute({'text': 'autre'}))
+    assert first['cache']['hit'] is False
+    assert second['cache']['hit'] is True
+    assert second['text'] == 'bonjour'
+    assert len(calls) == 1
+
+    # Erreurs, résultats partiels ou dégradés: recalculés à chaque appel
+    for result in ({'error': 'x'}, {'text': '', 'partial': True}, {'text': '', 'degraded': {'step': 1}}):
+        cached_inference('whisper', audio, {'kind': str(result)}, compute(result))
+        again = cached_inference('whisper', audio, {'kind': str(result)}, compute(result))
+        assert again['cache']['hit'] is False
+
+
+def _count_hits(directory, count):
+    cache = InferenceCache(directory)
+    for _ in range(count):
+        cache._count('hits')
+
+
+def test_counters_are_not_lost_between_processes(tmp_path):
+    directory = str(tmp_path)
+    InferenceCache(directory)
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_count_hits, args=(directory, 50)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert InferenceCache(directory).stats()['hits'] == 200
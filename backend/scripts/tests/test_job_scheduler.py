@@ -0,0 +1,154 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import job_scheduler
+from job_scheduler import Budget, Scheduler
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    monkeypatch.setenv('SCHEDULER_CORES', '8')
+    monkeypatch.setenv('SCHEDULER_MEMORY_MB', '10000')
+    monkeypatch.setenv('SCHEDULER_THREADS_PER_JOB', '4')
+    monkeypatch.setenv('SCHEDULER_MAX_PER_MODEL', '2')
+    monkeypatch.setattr(job_scheduler, 'POLL_SECONDS', 0.01)
+    return Scheduler(str(tmp_path), Budget())
+
+
+@pytest.fixture
+def other_pid():
+    """PID vivant d'un autre processus (job concurrent)"""
+    process = subprocess.Popen(['sleep', '30'])
+    yield process.pid
+    process.kill()
+    process.wait()
+
+
+def job(pid, kind='whisper:base', threads=2, memory_mb=1000, waited=0.0):
+    return {'pid': pid, 'kind': kind, 'threads': threads, 'memory_mb': memory_mb,
+            'enqueued_at': time.time() - waited}
+
+
+def test_starts_when_nothing_runs(scheduler):
+    # Même hors budget: un job seul démarre toujours
+    candidate = job(1, threads=64, memory_mb=10 ** 6)
+    assert scheduler._fits({'running': [], 'waiting': [candidate]}, candidate)
+
+
+def test_budget_limits(scheduler):
+    running = [job(1, threads=4, memory_mb=4000)]
+    assert scheduler._fits({'running': running, 'waiting': [job(2)]}, job(2))
+
+    too_many_threads = job(2, threads=5)
+    assert not scheduler._fits({'running': running, 'waiting': [too_many_threads]}, too_many_threads)
+
+    too_much_memory = job(2, memory_mb=6001)
+    assert not scheduler._fits({'running': running, 'waiting': [too_much_memory]}, too_much_memory)
+
+    exact = job(2, threads=4, memory_mb=6000)
+    assert scheduler._fits({'running': running, 'waiting': [exact]}, exact)
+
+
+def test_max_per_model(scheduler):
+    running = [job(1, threads=1), job(2, threads=1)]
+    assert not scheduler._fits({'running': running, 'waiting': [job(3, threads=1)]}, job(3, threads=1))
+
+    # Un autre type/modèle n'est pas concerné par la limite
+    other = job(3, kind='diarization', threads=1)
+    assert scheduler._fits({'running': running, 'waiting': [other]}, other)
+
+
+def test_fifo_per_kind(scheduler):
+    running = [job(1, threads=1)]
+    first, second = job(2, threads=1), job(3, threads=1)
+    other_kind = job(4, kind='diarization', threads=1)
+    waiting = [first, other_kind, second]
+    state = {'running': running, 'waiting': waiting}
+
+    assert scheduler._fits(state, first)
+    # second attend derrière first même si le budget le permettrait
+    assert not scheduler._fits(state, second)
+    # La file est par type: other_kind n'attend pas first
+    assert scheduler._fits(state, other_kind)
+
+
+def test_head_of_line_starts_first_when_idle(scheduler):
+    head, small = job(1, kind='diarization', threads=8), job(2, threads=1)
+    state = {'running': [], 'waiting': [head, small]}
+
+    # Un job plus récent ne prend pas la place libre avant la tête de file
+    assert not scheduler._fits(state, small)
+    assert scheduler._fits(state, head)
+
+
+def test_aged_head_reserves_the_budget(scheduler, monkeypatch):
+    monkeypatch.setattr(scheduler.budget, 'aging_seconds', 60)
+    running = [job(10, threads=4)]
+    small = job(2, kind='whisper:tiny', threads=1, memory_mb=100)
+
+    # La tête (8 threads) ne tient pas: un petit job d'un autre type passe devant tant qu'elle est récente
+    fresh_head = job(1, kind='diarization', threads=8, waited=5)
+    assert not scheduler._fits({'running': running, 'waiting': [fresh_head, small]}, fresh_head)
+    assert scheduler._fits({'running': running, 'waiting': [fresh_head, small]}, small)
+
+    # Passé le délai, plus aucun dépassement: la tête démarre dès que les jobs en cours finissent
+    aged_head = job(1, kind='diarization', threads=8, waited=61)
+    assert not scheduler._fits({'running': running, 'waiting': [aged_head, small]}, small)
+    assert scheduler._fits({'running': [], 'waiting': [aged_head, small]}, aged_head)
+
+
+def test_acquire_records_stats(scheduler):
+    acquired = scheduler.acquire('whisper:base', threads=100)
+    assert acquired['threads'] == 8
+    assert acquired['memory_mb'] == job_scheduler.estimate_memory_mb('whisper:base')
+
+    status = scheduler.status()
+    assert [j['kind'] for j in status['running']] == ['whisper:base']
+    assert status['waiting'] == []
+    assert status['stats']['whisper:base']['started'] == 1
+
+
+def test_dead_jobs_release_their_slot(scheduler, other_pid):
+    process = subprocess.Popen(['true'])
+    process.wait()
+    with scheduler._state() as state:
+        state['running'].append({**job(process.pid, threads=8, memory_mb=10000), 'started_at': 0.0})
+        state['running'].append({**job(other_pid, threads=1, memory_mb=1000), 'started_at': 0.0})
+
+    acquired = scheduler.acquire('whisper:base', threads=4, max_wait=1)
+    assert acquired['pid'] != process.pid
+    assert [j['pid'] for j in scheduler.status()['running']] == [other_pid, acquired['pid']]
+
+
+def test_acquire_times_out_and_leaves_queue(scheduler, other_pid):
+    with scheduler._state() as state:
+        state['running'].append({**job(other_pid, threads=8), 'started_at': 0.0})
+
+    with pytest.raises(TimeoutError):
+        scheduler.acquire('whisper:base', max_wait=0.05)
+
+    status = scheduler.status()
+    assert status['waiting'] == []
+    assert status['stats']['whisper:base']['timeouts'] == 1
+    assert status['stats']['whisper:base']['started'] == 0
+
+
+def test_cli_max_wait_overrides_environment(tmp_path, other_pid):
+    state = {'running': [{**job(other_pid, threads=64, memory_mb=1), 'started_at': 0.0}], 'waiting': [], 'stats': {}}
+    (tmp_path / 'state.json').write_text(json.dumps(state))
+    env = {**os.environ, 'SCHEDULER_DIR': str(tmp_path), 'SCHEDULER_CORES': '8', 'SCHEDULER_MAX_WAIT': '3600'}
+
+    started = time.monotonic()
+    result = subprocess.run(
+        [sys.executable, job_scheduler.__file__, 'run', '--max-wait', '0.2', 'whisper:base', '--', 'true'],
+        env=env, capture_output=True, text=True, timeout=30
+    )
+
+    assert result.returncode == 75
+    assert json.loads(result.stdout)['success'] is False
+    assert time.monotonic() - started < 10
@@ -0,0 +1,127 @@
+import json
+import re
+import subprocess
+import sys
+import time
+from contextlib import closing
+
+import pytest
+
+import metrics_store
+from metrics_store import job_metrics, load_window, prometheus_text, record_job, summarize
+
+# Ligne d'échantillon du format texte Prometheus: nom{labels} valeur
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{((?:[a-zA-Z_]\w*="(?:[^"\\]|\\.)*",?)*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_]\w*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_exposition(text):
+    """Échantillons {(nom, labels triés): valeur} et types déclarés, en validant chaque ligne"""
+    samples, types = {}, {}
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            continue
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            types[name] = kind
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"ligne Prometheus invalide: {line!r}"
+        name, labels, value = match.groups()
+        samples[(name, tuple(sorted(LABEL.findall(labels or ''))))] = float(value)
+    return samples, types
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv('METRICS', '1')
+    monkeypatch.setenv('METRICS_DB', str(tmp_path / 'metrics.sqlite3'))
+    monkeypatch.setenv('METRICS_PROM_PATH', str(tmp_path / 'metrics.prom'))
+    return tmp_path
+
+
+def whisper_result(rtf, **extra):
+    return {'model': 'base', 'audio_duration': 60.0, 'processing_seconds': 60.0 * rtf, 'real_time_factor': rtf,
+            'peak_rss_mb': 900.0, **extra}
+
+
+def test_prometheus_export_after_each_job(store):
+    for rtf in (0.1, 0.2, 0.3, 0.4, 1.0):
+        record_job('whisper', whisper_result(rtf))
+    record_job('whisper', {'success': False, 'error': 'boom', 'model': 'base'})
+
+    samples, types = parse_exposition((store / 'metrics.prom').read_text())
+
+    assert types['crm_ai_inference_real_time_factor'] == 'summary'
+    assert types['crm_ai_inference_jobs'] == 'gauge'
+    labels = (('model', 'base'), ('script', 'whisper'))
+    assert samples[('crm_ai_inference_real_time_factor', tuple(sorted(labels + (('quantile', '0.5'),))))] == 0.3
+    assert samples[('crm_ai_inference_real_time_factor', tuple(sorted(labels + (('quantile', '0.99'),))))] == \
+        pytest.approx(0.976)
+    assert samples[('crm_ai_inference_real_time_factor_count', labels)] == 5
+    assert samples[('crm_ai_inference_real_time_factor_sum', labels)] == pytest.approx(2.0)
+    assert samples[('crm_ai_inference_jobs', labels)] == 6
+    assert samples[('crm_ai_inference_failures', labels)] == 1
+
+
+def test_label_values_are_escaped():
+    summary = summarize([{**job_metrics('whisper', whisper_result(0.5), 'cli', model='mo"del\\x'), 'success': 1}])
+    samples, _ = parse_exposition(prometheus_text(summary, hours=1))
+    assert ('crm_ai_inference_jobs', (('model', 'mo\\"del\\\\x'), ('script', 'whisper'))) in samples
+
+
+def test_cache_hits_do_not_report_timings():
+    row = job_metrics('whisper', whisper_result(0.5, cache={'hit': True}), 'cli')
+    assert row['cache_hit'] == 1
+    assert row['processing_seconds'] is None and row['real_time_factor'] is None
+
+
+def test_diarization_timings_come_from_the_profile():
+    profile = {'total_wall_seconds': 40.0, 'peak_rss_mb': 1500.0, 'stages': [
+        {'name': 'import', 'wall_seconds': 3.0}, {'name': 'model_load', 'wall_seconds': 7.0},
+        {'name': 'pipeline', 'wall_seconds': 30.0}]}
+    row = job_metrics('diarization', {'success': True, 'audio_duration': 300.0, 'profile': profile}, 'cli')
+    assert (row['processing_seconds'], row['real_time_factor'], row['model_load_seconds']) == (30.0, 0.1, 7.0)
+    assert row['peak_rss_mb'] == 1500.0
+
+
+@pytest.mark.parametrize('mode, scope, recorded', [
+    ('cli', 'process', True),
+    ('server', 'job', True),
+    # Pic de toute la vie du serveur: il ne décrit pas ce job
+    ('server', 'process', False),
+    ('worker', 'process', False),
+])
+def test_peak_rss_only_when_it_describes_the_job(mode, scope, recorded):
+    profile = {'peak_rss_mb': 2000.0, 'peak_rss_scope': scope, 'stages': []}
+    row = job_metrics('diarization', {'success': True, 'profile': profile}, mode)
+    assert (row['peak_rss_mb'] == 2000.0) is recorded
+
+
+def test_retention_and_window(store):
+    for rtf in (0.1, 0.2):
+        record_job('whisper', whisper_result(rtf))
+    now = time.time()
+    with closing(metrics_store.connect()) as connection, connection:
+        connection.execute('UPDATE jobs SET created_at = ? WHERE real_time_factor = 0.1', (now - 40 * 86400,))
+        connection.execute('UPDATE jobs SET created_at = ? WHERE real_time_factor = 0.2', (now - 2 * 86400,))
+
+    # Le job suivant purge les lignes de plus de METRICS_RETENTION_DAYS
+    record_job('whisper', whisper_result(0.3))
+    assert [job['real_time_factor'] for job in load_window(hours=24 * 60)] == [0.2, 0.3]
+    assert [job['real_time_factor'] for job in load_window(hours=24)] == [0.3]
+
+
+def test_disabled_writes_nothing(store, monkeypatch):
+    monkeypatch.setenv('METRICS', '0')
+    record_job('whisper', whisper_result(0.1))
+    assert not (store / 'metrics.sqlite3').exists()
+
+
+def test_summary_cli(store):
+    record_job('whisper', whisper_result(0.25))
+    output = subprocess.run([sys.executable, metrics_store.__file__, 'summary', '--hours', '1'],
+                            capture_output=True, text=True, check=True).stdout
+    summary = json.loads(output)
+    assert summary['window_hours'] == 1
+    assert summary['models'][0]['metrics']['real_time_factor']['p95'] == 0.25
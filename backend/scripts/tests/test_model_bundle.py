@@ -0,0 +1,161 @@
+import json
+import os
+import struct
+from types import SimpleNamespace
+
+import pytest
+
+import model_bundle
+from model_bundle import current_bundle
+
+
+def test_current_bundle_follows_the_link(tmp_path, monkeypatch):
+    monkeypatch.setenv('PYANNOTE_BUNDLE_DIR', str(tmp_path))
+    monkeypatch.delenv('PYANNOTE_BUNDLE', raising=False)
+    assert current_bundle() is None
+
+    revision = tmp_path / 'abc123'
+    revision.mkdir()
+    os.symlink('abc123', tmp_path / 'current')
+    # Lien présent mais export inachevé (pas de manifeste): pas de bundle
+    assert current_bundle() is None
+
+    (revision / 'manifest.json').write_text('{}')
+    assert current_bundle() == str(revision)
+
+    monkeypatch.setenv('PYANNOTE_BUNDLE', '0')
+    assert current_bundle() is None
+
+
+def test_health_check_accepts_only_complete_bundles(tmp_path, monkeypatch):
+    from check_pyannote import check_model
+
+    monkeypatch.setenv('PYANNOTE_BUNDLE_DIR', str(tmp_path / 'bundles'))
+    monkeypatch.setenv('HF_HUB_CACHE', str(tmp_path / 'hub'))
+    revision = tmp_path / 'bundles' / 'abc123def4567890'
+    revision.mkdir(parents=True)
+    os.symlink(revision.name, tmp_path / 'bundles' / 'current')
+    (revision / 'manifest.json').write_text(json.dumps({
+        'revision': revision.name,
+        'models': {role: {'file': f'{role}.safetensors'} for role in model_bundle.PIPELINE_MODELS}
+    }))
+    (revision / 'segmentation.safetensors').write_bytes(b'')
+
+    result = {'checks': {}, 'errors': [], 'warnings': []}
+    check_model(result, 'hf_token')
+    # Poids d'embedding absents: le hub reprend la main
+    assert result['warnings'][0].endswith('embedding.safetensors')
+    assert result['checks']['model']['status'] == 'warning'
+
+    (revision / 'embedding.safetensors').write_bytes(b'')
+    result = {'checks': {}, 'errors': [], 'warnings': []}
+    assert check_model(result, None) == [str(revision)]
+    assert result['checks']['model'] == {'status': 'ok', 'message': 'Model bundle abc123def456 (offline)',
+                                         'bundle': str(revision)}
+
+
+@pytest.fixture
+def torch():
+    return pytest.importorskip('torch')
+
+
+class TestSafetensors:
+    @pytest.fixture
+    def tensors(self, torch):
+        generator = torch.Generator().manual_seed(0)
+        return {
+            'conv.weight': torch.randn(4, 1, 3, generator=generator),
+            'lstm.bias': torch.randn(7, generator=generator).double(),
+            'num_batches_tracked': torch.tensor(12, dtype=torch.int64),
+            'mask': torch.tensor([True, False, True]),
+            'half': torch.randn(5, generator=generator).half(),
+        }
+
+    def test_round_trip(self, tmp_path, torch, tensors):
+        path = str(tmp_path / 'model.safetensors')
+        model_bundle.save_safetensors(tensors, path, {'role': 'segmentation', 'revision': 42})
+
+        loaded = model_bundle.load_safetensors(path)
+        assert set(loaded) == set(tensors)
+        for name, tensor in tensors.items():
+            assert loaded[name].dtype == tensor.dtype
+            assert torch.equal(loaded[name], tensor)
+
+    def test_layout_is_aligned(self, tmp_path, tensors):
+        path = tmp_path / 'model.safetensors'
+        model_bundle.save_safetensors(tensors, str(path), {'revision': 42})
+
+        raw = path.read_bytes()
+        header_size = struct.unpack('<Q', raw[:8])[0]
+        header = json.loads(raw[8:8 + header_size])
+        assert (8 + header_size) % 8 == 0
+        assert header.pop('__metadata__') == {'revision': '42'}
+        # Chaque tenseur commence sur un multiple de sa taille d'élément (lecture directe dans le mmap)
+        for name, info in header.items():
+            assert info['data_offsets'][0] % tensors[name].element_size() == 0
+        assert max(info['data_offsets'][1] for info in header.values()) == len(raw) - 8 - header_size
+
+    def test_loaded_tensors_are_copy_on_write(self, tmp_path, torch, tensors):
+        path = tmp_path / 'model.safetensors'
+        model_bundle.save_safetensors(tensors, str(path))
+        before = path.read_bytes()
+
+        loaded = model_bundle.load_safetensors(str(path))
+        loaded['conv.weight'].zero_()
+
+        assert path.read_bytes() == before
+        assert torch.equal(model_bundle.load_safetensors(str(path))['conv.weight'], tensors['conv.weight'])
+
+    def test_readable_by_the_reference_implementation(self, tmp_path, torch, tensors):
+        safetensors_torch = pytest.importorskip('safetensors.torch')
+        path = str(tmp_path / 'model.safetensors')
+        model_bundle.save_safetensors(tensors, path)
+
+        loaded = safetensors_torch.load_file(path)
+        assert all(torch.equal(loaded[name], tensor) for name, tensor in tensors.items())
+
+
+class Pipeline:
+    """Pipeline minimal: reçoit les modèles comme SpeakerDiarization et garde ses hyperparamètres"""
+
+    def __init__(self, segmentation, embedding, embedding_batch_size=32):
+        self._segmentation = SimpleNamespace(model=segmentation)
+        self._embedding = SimpleNamespace(model_=embedding)
+        self.embedding_batch_size = embedding_batch_size
+        self.params = None
+
+    def instantiate(self, params):
+        self.params = params
+
+
+def test_bundle_reload(tmp_path, torch):
+    pytest.importorskip('pyannote.audio')
+    from pyannote.audio.core.task import Problem, Resolution, Specifications
+    from pyannote.audio.models.segmentation import PyanNet
+
+    def model(classes):
+        network = PyanNet(sincnet={'stride': 10})
+        network.specifications = Specifications(problem=Problem.MULTI_LABEL_CLASSIFICATION,
+                                                 resolution=Resolution.FRAME, duration=5.0, classes=classes)
+        network.setup()
+        return network.eval()
+
+    original = Pipeline(model(['a', 'b']), model(['c', 'd', 'e']), embedding_batch_size=8)
+    config = tmp_path / 'config.yaml'
+    config.write_text(
+        f"pipeline:\n  name: {__name__}.Pipeline\n  params:\n    embedding_batch_size: 8\n"
+        "params:\n  clustering:\n    threshold: 0.7\n"
+    )
+
+    directory = model_bundle.export_bundle(original, str(config), 'rev1', root=str(tmp_path / 'bundles'))
+    assert os.path.realpath(tmp_path / 'bundles' / 'current') == directory
+
+    reloaded = model_bundle.load_bundle(directory)
+    assert reloaded.embedding_batch_size == 8
+    assert reloaded.params == {'clustering': {'threshold': 0.7}}
+
+    waveform = torch.randn(1, 1, 16000 * 5, generator=torch.Generator().manual_seed(0))
+    with torch.no_grad():
+        for accessor in model_bundle.PIPELINE_MODELS.values():
+            assert accessor(reloaded).specifications.classes == accessor(original).specifications.classes
+            assert torch.allclose(accessor(reloaded)(waveform), accessor(original)(waveform))
@@ -0,0 +1,116 @@
+import pytest
+
+import model_selection
+from model_selection import choose, decoding_preset, record
+
+
+@pytest.fixture(autouse=True)
+def rtf_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_selection, 'RTF_PATH', str(tmp_path / 'whisper_rtf.json'))
+    monkeypatch.setattr(model_selection, 'CANDIDATE_MODELS', ['tiny', 'base', 'small', 'medium'])
+    monkeypatch.setattr(model_selection, 'SAFETY_MARGIN', 1.3)
+
+
+def pick(available, **kwargs):
+    choice = choose(60.0, available, 'openai-whisper', 'float32', **kwargs)
+    return choice['model'], choice['preset'], choice['fits']
+
+
+def test_largest_model_and_preset_that_fit():
+    # 60 s d'audio, RTF par défaut: medium greedy ≈ 132.6 s, small beam ≈ 76.7 s
+    assert pick(1000) == ('medium', 'beam', True)
+    assert pick(150) == ('medium', 'greedy', True)
+    assert pick(100) == ('small', 'beam', True)
+    assert pick(14.3) == ('base', 'greedy', True)
+
+
+def test_fallback_to_smallest_greedy():
+    choice = choose(60.0, 5.0, 'openai-whisper', 'float32')
+    assert (choice['model'], choice['preset'], choice['fits']) == ('tiny', 'greedy', False)
+    assert choice['decoding'] == {'beam_size': 1, 'best_of': 1}
+    assert choice['estimated_seconds'] > 5.0
+
+
+def test_loaded_model_skips_load_time():
+    assert pick(120) == ('small', 'beam', True)
+    assert pick(120, loaded_models=('medium',)) == ('medium', 'greedy', True)
+
+
+def test_measured_rtf_replaces_defaults():
+    record('openai-whisper', 'medium', 'float32', {'beam_size': 1}, 0.5)
+    record('openai-whisper', 'medium', 'float32', {'beam_size': 1}, 1.0, load_seconds=3.0)
+
+    entry = model_selection.load_table()['openai-whisper:medium:float32:greedy']
+    assert entry['rtf'] == pytest.approx(0.65)
+    assert entry['runs'] == 2
+
+    choice = choose(60.0, 60.0, 'openai-whisper', 'float32')
+    assert (choice['model'], choice['preset'], choice['rtf_source']) == ('medium', 'greedy', 'measured')
+    assert choice['estimated_seconds'] == pytest.approx((3.0 + 60 * 0.65) * 1.3)
+
+
+def test_decoding_preset_uses_engine_default():
+    assert decoding_preset(None, 'faster-whisper') == 'beam'
+    assert decoding_preset(None, 'openai-whisper') == 'greedy'
+    assert decoding_preset({'beam_size': 5}) == 'beam'
+    assert decoding_preset({'beam_size': 1}, 'faster-whisper') == 'greedy'
+
+
+class FakeEngine:
+    """Moteur Whisper factice: ~0.05 s de calcul par appel"""
+    name = 'openai-whisper'
+    compute_type = 'float32'
+    batched = True
+
+    def transcribe(self, audio, **options):
+        import time
+        from decode_guard import DecodeStats
+
+        time.sleep(0.05)
+        return {'text': 'bonjour', 'segments': [{'start': 0.0, 'end': 1.0, 'text': 'bonjour'}], 'language': 'fr',
+                'language_probability': 1.0, 'duration': len(audio) / 16000, 'decode_stats': DecodeStats().report()}
+
+    def decode_segments(self, pieces, batch_size, stats=None, decoding=None):
+        import time
+
+        time.sleep(0.05)
+        return [{'text': 'oui', 'avg_logprob': -0.2, 'no_speech_prob': 0.01} for _ in pieces]
+
+
+@pytest.fixture
+def fake_engine(tmp_path, monkeypatch):
+    import numpy as np
+    import whisper_transcribe
+
+    monkeypatch.setattr(whisper_transcribe, '_models', {('openai-whisper', 'base', 'float32'): FakeEngine()})
+    path = str(tmp_path / 'audio.16k.npy')
+    np.save(path, np.random.default_rng(0).normal(0, 0.1, 40 * 16000).astype(np.float32))
+    return whisper_transcribe, path
+
+
+def measured(model_size='base', preset='greedy'):
+    return model_selection.load_table()[f"openai-whisper:{model_size}:float32:{preset}"]
+
+
+def test_segments_path_records_rtf_over_transcribed_duration(fake_engine):
+    whisper_transcribe, audio = fake_engine
+    segments = [{'start': 0.0, 'end': 2.0, 'speaker': 'A'}, {'start': 10.0, 'end': 12.0, 'speaker': 'B'}]
+    result = whisper_transcribe._run_segments(audio, segments, 'base', 'openai-whisper',
+                                              decoding={'beam_size': 5})
+
+    entry = measured(preset='beam')
+    assert entry['runs'] == 1
+    # 4 s transcrites (et non 40 s de fichier); real_time_factor n'est arrondi qu'à 1e-4 près
+    assert result['audio_duration'] == 4.0
+    assert entry['rtf'] == pytest.approx(result['real_time_factor'], abs=1e-4)
+
+
+def test_long_path_records_rtf_over_audio_duration(fake_engine):
+    whisper_transcribe, audio = fake_engine
+    result = whisper_transcribe._run_chunked(audio, 'base', 1, 10.0, 'openai-whisper')
+
+    entry = measured()
+    assert entry['runs'] == 1
+    assert result['audio_duration'] == 40.0
+    assert entry['rtf'] == pytest.approx(result['real_time_factor'], abs=1e-4)
+    assert 'load_seconds' not in entry
@@ -0,0 +1,26 @@
+import json
+
+import pytest
+
+from diarize_audio import write_profiled_result
+from profiling import StageProfiler
+
+
+@pytest.mark.parametrize('result', [
+    {'success': True, 'segments': [{'start': 0.0, 'end': 1.5, 'speaker': 'SPEAKER_00'}], 'note': 'éàü "x"'},
+    {'success': False, 'error': 'Erreur', 'profile': {'stale': True}},
+    {}
+])
+def test_document_written_once_with_profile_last(tmp_path, result):
+    output = tmp_path / 'result.json'
+    profiler = StageProfiler()
+    write_profiled_result(str(output), result, profiler)
+
+    text = output.read_text(encoding='utf-8')
+    document = json.loads(text)
+    assert list(document)[-1] == 'profile'
+    assert [stage['name'] for stage in document['profile']['stages']] == ['output_write']
+    assert {key: value for key, value in document.items() if key != 'profile'} == \
+        {key: value for key, value in result.items() if key != 'profile'}
+    # Même texte qu'une sérialisation directe du document complet
+    assert text == json.dumps(document, indent=2, ensure_ascii=False)
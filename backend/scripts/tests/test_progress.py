@@ -0,0 +1,128 @@
+import io
+import json
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import progress
+from diarize_audio import partial_result
+from progress import DeadlineExceeded, ProgressTracker
+
+
+@pytest.fixture(autouse=True)
+def rtf_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(progress, 'RTF_PATH', str(tmp_path / 'diarization_rtf.json'))
+    monkeypatch.setattr(progress, 'DEADLINE_RESERVE_SECONDS', 5.0)
+
+
+def events(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def speaker_count(active, step=0.5):
+    """SlidingWindowFeature du comptage des locuteurs (trames de `step` secondes)"""
+    window = SimpleNamespace(start=0.0, step=step, duration=step)
+    return SimpleNamespace(data=np.array(active, dtype=np.int8).reshape(-1, 1), sliding_window=window)
+
+
+def test_progress_maps_pyannote_steps_to_a_global_percentage():
+    stream = io.StringIO()
+    tracker = ProgressTracker(stream=stream)
+
+    tracker.hook('segmentation', None, total=4, completed=1)
+    tracker.hook('segmentation', None, total=4, completed=2)   # même étape, moins de 0.5 s: ignoré
+    tracker.hook('segmentation', None, total=4, completed=4)   # fin d'étape: toujours émis
+    tracker.hook('speaker_counting', speaker_count([0, 1]))
+    tracker.hook('embeddings', None, total=10, completed=5)   # ignoré aussi
+    tracker.hook('discrete_diarization', None)
+
+    progress_events = [(e['stage'], e['stage_percent'], e['percent']) for e in events(stream)]
+    assert progress_events == [
+        ('segmentation', 25.0, 8.8),
+        ('segmentation', 100.0, 35.0),
+        ('embeddings', 0.0, 35.0),
+        ('clustering', 100.0, 100.0),
+    ]
+    assert all(e['remaining_seconds'] is None for e in events(stream))
+
+
+def test_progress_within_a_stage_is_throttled(monkeypatch):
+    stream = io.StringIO()
+    tracker = ProgressTracker(stream=stream)
+    now = [100.0]
+    monkeypatch.setattr(progress.time, 'time', lambda: now[0])
+
+    # 0.2 s puis 0.7 s après le premier événement: seul le troisième lot est émis
+    for completed, at in ((1, 100.0), (2, 100.2), (3, 100.7)):
+        now[0] = at
+        tracker.hook('embeddings', None, total=10, completed=completed)
+
+    assert [e['stage_percent'] for e in events(stream) if e['event'] == 'progress'] == [10.0, 30.0]
+
+
+def test_deadline_interrupts_with_the_current_stage():
+    tracker = ProgressTracker(deadline=time.time() + 60)
+    tracker.hook('segmentation', None, total=10, completed=3)
+
+    # La réserve d'écriture du résultat compte: à 4 s de la deadline, le pipeline s'arrête
+    tracker.deadline = time.time() + 4
+    with pytest.raises(DeadlineExceeded) as raised:
+        tracker.hook('segmentation', None, total=10, completed=4)
+    assert raised.value.stage == 'segmentation'
+
+
+class TestPlan:
+    @staticmethod
+    def pipeline():
+        return SimpleNamespace(_segmentation=SimpleNamespace(step=1.0, duration=10.0), segmentation_step=0.1)
+
+    def test_enough_time_keeps_the_default_step(self):
+        pipeline = self.pipeline()
+        tracker = ProgressTracker(deadline=time.time() + 3600)
+        assert tracker.plan(pipeline, 600.0) is None
+        assert pipeline._segmentation.step == 1.0
+
+    def test_short_deadline_spaces_the_windows(self):
+        pipeline = self.pipeline()
+        stream = io.StringIO()
+        # RTF par défaut 0.3: 600 s d'audio ≈ 180 s de calcul pour 60 s disponibles
+        tracker = ProgressTracker(deadline=time.time() + 65, stream=stream)
+
+        degraded = tracker.plan(pipeline, 600.0)
+
+        assert degraded['segmentation_step'] == pytest.approx(0.3, abs=0.01)
+        assert pipeline._segmentation.step == pytest.approx(3.0, abs=0.1)
+        assert [e['event'] for e in events(stream)] == ['start', 'degraded']
+
+    def test_step_is_capped(self):
+        pipeline = self.pipeline()
+        degraded = ProgressTracker(deadline=time.time() + 7).plan(pipeline, 36000.0)
+        assert degraded['segmentation_step'] == progress.MAX_STEP
+
+    def test_measured_rtf_drives_the_estimate(self):
+        progress.record_rtf(0.01)
+        progress.record_rtf(0.11)
+        assert progress.load_rtf() == pytest.approx(0.01 + progress.RTF_SMOOTHING * 0.1)
+        # 600 s x 0.04 = 24 s: tient dans 60 s, pas de dégradation
+        assert ProgressTracker(deadline=time.time() + 65).plan(self.pipeline(), 600.0) is None
+
+
+def test_partial_result_keeps_detected_speech():
+    tracker = ProgressTracker()
+    tracker.hook('speaker_counting', speaker_count([0, 1, 1, 0, 0, 2, 1, 0]))
+
+    result = partial_result(tracker, 'embeddings', degraded={'segmentation_step': 0.3})
+
+    assert result['success'] and result['partial'] and result['single_speaker_mode']
+    assert [(s['start'], s['end']) for s in result['client_segments']] == [(0.5, 1.5), (2.5, 3.5)]
+    assert result['stats']['client_duration'] == 2.0
+    assert result['degraded'] == {'segmentation_step': 0.3}
+
+
+def test_partial_result_without_segmentation_is_a_failure():
+    result = partial_result(ProgressTracker(), 'segmentation')
+    assert result['success'] is False
+    assert result['partial'] and result['partial_stage'] == 'segmentation'
+    assert result['client_segments'] == []
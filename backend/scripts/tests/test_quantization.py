@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+
+from quantization import apply_precision
+
+torch = pytest.importorskip('torch')
+nn = torch.nn
+
+
+class Segmentation(nn.Module):
+    """Forme de PyanNet: LSTM puis couches linéaires"""
+
+    def __init__(self):
+        super().__init__()
+        self.lstm = nn.LSTM(8, 16, batch_first=True)
+        self.linear = nn.Linear(16, 4)
+
+    def forward(self, x):
+        return self.linear(self.lstm(x)[0])
+
+
+class Embedding(nn.Module):
+    """Forme du ResNet WeSpeaker: convolutions puis projection linéaire"""
+
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(1, 4, 3)
+        self.head = nn.Linear(4, 8)
+
+    def forward(self, x):
+        return self.head(self.conv(x).mean(dim=(2, 3)))
+
+
+def fake_pipeline():
+    return SimpleNamespace(_segmentation=SimpleNamespace(model=Segmentation()),
+                           _embedding=SimpleNamespace(model_=Embedding()))
+
+
+def test_int8_quantizes_segmentation_only():
+    pipeline = fake_pipeline()
+    assert apply_precision(pipeline, 'int8') == 'int8'
+
+    segmentation = pipeline._segmentation.model
+    assert isinstance(segmentation.lstm, torch.ao.nn.quantized.dynamic.LSTM)
+    assert isinstance(segmentation.linear, torch.ao.nn.quantized.dynamic.Linear)
+    assert segmentation(torch.randn(1, 5, 8)).shape == (1, 5, 4)
+
+    # L'embedding reste en fp32, projection comprise
+    embedding = pipeline._embedding.model_
+    assert type(embedding.conv) is nn.Conv2d
+    assert type(embedding.head) is nn.Linear
+
+
+def test_bf16_wraps_both_models_and_returns_float32():
+    pipeline = fake_pipeline()
+    assert apply_precision(pipeline, 'bf16') == 'bf16'
+
+    output = pipeline._embedding.model_(torch.randn(1, 1, 6, 6))
+    assert output.dtype == torch.float32
+    assert type(pipeline._segmentation.model.lstm) is nn.LSTM
+
+
+def test_fp32_and_unknown_modes():
+    pipeline = fake_pipeline()
+    assert apply_precision(pipeline, 'fp32') == 'fp32'
+    assert type(pipeline._segmentation.model.linear) is nn.Linear
+
+    with pytest.raises(ValueError):
+        apply_precision(pipeline, 'int4')
@@ -0,0 +1,126 @@
+import sys
+import types
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import model_selection
+import whisper_engines
+import whisper_transcribe
+from decode_guard import DecodeStats
+from whisper_engines import OpenAIWhisperEngine
+
+SECOND = 16000
+
+
+class PieceEngine:
+    """Moteur factice: le texte de chaque morceau est sa durée en secondes"""
+    name = 'openai-whisper'
+    compute_type = 'float32'
+    batched = True
+
+    def __init__(self):
+        self.calls = []
+
+    def decode_segments(self, pieces, batch_size, stats=None, decoding=None):
+        self.calls.append((len(pieces), batch_size, decoding))
+        return [{'text': f" {len(piece) / SECOND:g}s", 'avg_logprob': -0.1 * (number + 1), 'no_speech_prob': 0.1}
+                for number, piece in enumerate(pieces)]
+
+
+@pytest.fixture
+def run_segments(tmp_path, monkeypatch):
+    engine = PieceEngine()
+    # Les mesures de ces runs factices ne vont pas dans la table RTF de l'hôte
+    monkeypatch.setattr(model_selection, 'RTF_PATH', str(tmp_path / 'whisper_rtf.json'))
+    monkeypatch.setattr(whisper_transcribe, '_models', {('openai-whisper', 'base', 'float32'): engine})
+    audio = str(tmp_path / 'rdv.16k.npy')
+    np.save(audio, np.zeros(100 * SECOND, dtype=np.float32))
+
+    def run(segments, **kwargs):
+        return whisper_transcribe._run_segments(audio, segments, 'base', 'openai-whisper', **kwargs), engine.calls
+
+    return run
+
+
+def test_long_segments_are_split_and_reassembled(run_segments):
+    segments = [
+        {'start': 0.0, 'end': 5.0, 'speaker': 'A'},
+        {'start': 10.0, 'end': 75.0, 'speaker': 'B'},       # 30 + 30 + 5 s
+        {'start': 90.0, 'end': 130.0, 'speaker': 'A'},      # tronqué à la fin de l'audio
+    ]
+    result, calls = run_segments(segments, batch_size=4, decoding={'beam_size': 5})
+
+    # Tous les morceaux partent dans un seul appel: le moteur fait ses lots
+    assert calls == [(5, 4, {'beam_size': 5})]
+    assert [s['text'] for s in result['segments']] == ['5s', '30s 30s 5s', '10s']
+    assert [(s['start'], s['end'], s['speaker']) for s in result['segments']] == \
+        [(s['start'], s['end'], s['speaker']) for s in segments]
+    # Moyenne des morceaux du segment
+    assert result['segments'][1]['avg_logprob'] == pytest.approx(-0.3)
+
+
+def test_no_pieces_no_decode(run_segments):
+    result, calls = run_segments([{'start': 120.0, 'end': 125.0, 'speaker': 'A'}])
+    assert calls == []
+    assert result['segments'][0]['text'] == '' and result['segments'][0]['avg_logprob'] is None
+
+
+class FakeMel(list):
+    def to(self, device):
+        return self
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """OpenAIWhisperEngine sur des doubles de torch/whisper: le spectrogramme est la longueur du segment"""
+    whisper = types.SimpleNamespace(
+        DecodingOptions=lambda **options: options,
+        pad_or_trim=lambda audio: audio,
+        log_mel_spectrogram=lambda audio, n_mels: len(audio),
+    )
+    monkeypatch.setitem(sys.modules, 'whisper', whisper)
+    monkeypatch.setitem(sys.modules, 'torch', types.SimpleNamespace(stack=FakeMel))
+
+    batches = []
+
+    def guarded_decode(model, mel, options, stats):
+        batches.append(list(mel))
+        stats.merge({'windows': 1, 'fallbacks': 0, 'windows_aborted': 0, 'tokens_decoded': len(mel)})
+        # Les segments de 1 s sont du silence (no_speech élevé, logprob faible)
+        return [SimpleNamespace(text=f"{length}", avg_logprob=-2.0 if length == 1 else -0.2,
+                                no_speech_prob=0.9 if length == 1 else 0.1, compression_ratio=1.2, temperature=0.0)
+                for length in mel]
+
+    monkeypatch.setattr(whisper_engines, 'guarded_decode', guarded_decode)
+    instance = object.__new__(OpenAIWhisperEngine)
+    instance.model = SimpleNamespace(dims=SimpleNamespace(n_mels=80), device='cpu')
+    return instance, batches
+
+
+def test_batches_group_similar_lengths(engine):
+    instance, batches = engine
+    lengths = [7, 2, 9, 1, 4]
+    stats = DecodeStats()
+
+    results = instance.decode_segments([np.zeros(n, dtype=np.float32) for n in lengths], batch_size=2, stats=stats)
+
+    assert batches == [[1, 2], [4, 7], [9]]
+    # Résultats dans l'ordre des entrées; le silence est vidé
+    assert [r['text'] for r in results] == ['7', '2', '9', '', '4']
+    assert stats.report()['windows'] == 3 and stats.report()['tokens_decoded'] == 5
+
+
+def test_greedy_unless_beam_requested(engine, monkeypatch):
+    instance, _ = engine
+    seen = []
+    decode = whisper_engines.guarded_decode
+    monkeypatch.setattr(whisper_engines, 'guarded_decode',
+                        lambda model, mel, options, stats: seen.append(options) or decode(model, mel, options, stats))
+
+    instance.decode_segments([np.zeros(3, dtype=np.float32)])
+    instance.decode_segments([np.zeros(3, dtype=np.float32)], decoding={'beam_size': 5, 'best_of': 5})
+
+    assert [options['beam_size'] for options in seen] == [None, 5]
+    assert all(options['without_timestamps'] and options['language'] == 'fr' for options in seen)
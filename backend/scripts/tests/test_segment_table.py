@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from segment_table import SegmentTable
+
+
+def naive_coalesce(turns, max_gap, min_duration):
+    """Référence: fusion tour par tour, locuteur par locuteur"""
+    merged = []
+    for speaker in sorted({speaker for _, _, speaker in turns}):
+        current = None
+        for start, end, _ in sorted(t for t in turns if t[2] == speaker):
+            if current is not None and start - current[1] <= max_gap:
+                current[1] = max(current[1], end)
+            else:
+                if current is not None:
+                    merged.append(tuple(current))
+                current = [start, end, speaker]
+        merged.append(tuple(current))
+    return sorted(t for t in merged if t[1] - t[0] >= min_duration)
+
+
+def rows(table):
+    return sorted((float(s), float(e), table.labels[k]) for s, e, k in zip(table.starts, table.ends, table.speakers))
+
+
+def test_merges_close_turns_of_same_speaker():
+    table = SegmentTable.from_turns([(0.0, 1.0, 'A'), (1.3, 2.0, 'A'), (2.1, 3.0, 'B'), (5.0, 5.2, 'A')])
+    assert rows(table.coalesce(max_gap=0.5, min_duration=0.3)) == [(0.0, 2.0, 'A'), (2.1, 3.0, 'B')]
+
+
+def test_contained_turn_does_not_shorten_run():
+    # Le second tour est inclus dans le premier: la fin du segment reste celle du premier
+    table = SegmentTable.from_turns([(0.0, 10.0, 'A'), (2.0, 3.0, 'A'), (10.4, 11.0, 'A')])
+    assert rows(table.coalesce(max_gap=0.5, min_duration=0.0)) == [(0.0, 11.0, 'A')]
+
+
+def test_runs_do_not_leak_between_speakers():
+    # Le dernier tour de A finit tard: le premier tour de B ne doit pas être rattaché à A
+    table = SegmentTable.from_turns([(0.0, 50.0, 'A'), (1.0, 2.0, 'B'), (10.0, 11.0, 'B')])
+    assert rows(table.coalesce(max_gap=0.5, min_duration=0.0)) == [
+        (0.0, 50.0, 'A'), (1.0, 2.0, 'B'), (10.0, 11.0, 'B')
+    ]
+
+
+def test_empty_table():
+    table = SegmentTable.from_turns([])
+    assert len(table.coalesce()) == 0
+    assert table.speaker_stats() == {}
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_naive_coalesce(seed):
+    rng = random.Random(seed)
+    turns = []
+    for _ in range(rng.randint(1, 200)):
+        start = round(rng.uniform(0, 300), 2)
+        turns.append((start, round(start + rng.uniform(0.05, 8), 2), rng.choice(['A', 'B', 'C', 'D'])))
+    max_gap, min_duration = rng.choice([0.0, 0.5, 2.0]), rng.choice([0.0, 0.3, 1.0])
+
+    table = SegmentTable.from_turns(turns).coalesce(max_gap, min_duration)
+    assert rows(table) == pytest.approx(naive_coalesce(turns, max_gap, min_duration))
+
+
+def test_speaker_stats_and_segments():
+    table = SegmentTable.from_turns([(0.0, 2.0, 'A'), (2.0, 3.0, 'B'), (3.0, 7.0, 'A')])
+    stats = table.speaker_stats()
+    assert stats['A'] == {'total_duration': 6.0, 'num_segments': 2, 'avg_segment_duration': 3.0}
+    assert stats['B']['num_segments'] == 1
+
+    segments = table.to_segments(exclude_speaker='A')
+    assert segments == [{'start': 2.0, 'end': 3.0, 'duration': 1.0, 'speaker': 'B'}]
+    assert len(table.to_segments()) == 3
@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from segment_table import SegmentTable
+from speaker_alignment import SpeakerIntervalIndex, assign_speakers
+
+
+def naive_overlaps(turns, start, end):
+    """Référence: chevauchement par locuteur, en parcourant tous les tours"""
+    overlaps = {}
+    for turn_start, turn_end, speaker in turns:
+        overlap = min(end, turn_end) - max(start, turn_start)
+        if overlap > 0:
+            overlaps[speaker] = overlaps.get(speaker, 0.0) + overlap
+    return overlaps
+
+
+def test_largest_overlap_wins():
+    index = SpeakerIntervalIndex([(0.0, 2.0, 'A'), (1.5, 5.0, 'B')])
+    assert index.speaker_at(1.0, 2.0) == 'A'
+    assert index.speaker_at(1.0, 4.0) == 'B'
+
+
+def test_overlaps_of_one_speaker_are_summed():
+    index = SpeakerIntervalIndex([(0.0, 1.0, 'A'), (1.0, 2.5, 'B'), (2.5, 3.5, 'A')])
+    assert index.speaker_at(0.0, 3.5) == 'A'
+
+
+def test_long_turn_started_earlier_is_found():
+    # Le tour de A commence bien avant le segment: la fin maximale arrête le parcours au bon endroit
+    index = SpeakerIntervalIndex([(0.0, 100.0, 'A'), (10.0, 11.0, 'B'), (20.0, 21.0, 'B')])
+    assert index.speaker_at(50.0, 60.0) == 'A'
+
+
+def test_gap_uses_nearest_turn():
+    index = SpeakerIntervalIndex([(0.0, 1.0, 'A'), (10.0, 11.0, 'B')])
+    assert index.speaker_at(2.0, 3.0) == 'A'
+    assert index.speaker_at(8.0, 9.5) == 'B'
+
+
+def test_empty_index():
+    assert SpeakerIntervalIndex([]).speaker_at(0.0, 1.0) is None
+
+
+def test_matches_naive_search():
+    rng = random.Random(3)
+    turns = []
+    for _ in range(300):
+        start = rng.uniform(0, 600)
+        turns.append((start, start + rng.uniform(0.2, 20), rng.choice('ABC')))
+    index = SpeakerIntervalIndex(turns)
+
+    for _ in range(500):
+        start = rng.uniform(0, 620)
+        end = start + rng.uniform(0.1, 15)
+        overlaps = naive_overlaps(turns, start, end)
+        if overlaps:
+            # Égalités possibles: le locuteur retenu a le plus grand chevauchement
+            assert overlaps[index.speaker_at(start, end)] == pytest.approx(max(overlaps.values()))
+
+
+def test_from_table_keeps_labels():
+    table = SegmentTable.from_turns([(5.0, 6.0, 'B'), (0.0, 2.0, 'A')])
+    index = SpeakerIntervalIndex.from_table(table)
+    assert index.speakers == ['A', 'B']
+    assert index.speaker_at(5.2, 5.8) == 'B'
+
+
+def test_assign_speakers_merges_consecutive_segments():
+    index = SpeakerIntervalIndex([(0.0, 4.0, 'A'), (4.0, 8.0, 'B')])
+    segments = [
+        {'start': 0.0, 'end': 2.0, 'text': ' Bonjour'},
+        {'start': 2.0, 'end': 4.0, 'text': ' madame.'},
+        {'start': 4.0, 'end': 5.0, 'text': '  '},
+        {'start': 5.0, 'end': 8.0, 'text': ' Bonjour.'}
+    ]
+    labelled = assign_speakers(segments, index, {'A': 'courtier'})
+
+    assert [(s['speaker'], s['role'], s['text']) for s in labelled] == [
+        ('A', 'courtier', 'Bonjour madame.'),
+        ('B', 'client', 'Bonjour.')
+    ]
+    assert (labelled[0]['start'], labelled[0]['end']) == (0.0, 4.0)
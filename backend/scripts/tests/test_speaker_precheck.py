@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from speaker_precheck import sample_windows, single_speaker_precheck, single_speaker_turns
+
+
+def inside(start, window, regions):
+    return any(first <= start and start + window <= last for first, last in regions)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_windows_inside_speech_and_distinct(seed):
+    rng = np.random.default_rng(seed)
+    bounds = np.sort(rng.uniform(0, 600, size=40))
+    regions = [(float(a), float(b)) for a, b in zip(bounds[::2], bounds[1::2])]
+
+    starts = sample_windows(regions, 12, 3.0)
+    assert starts == sorted(starts)
+    for start in starts:
+        assert inside(start, 3.0, regions)
+    assert all(b - a >= 3.0 for a, b in zip(starts, starts[1:]))
+
+
+def test_windows_spread_over_recording():
+    # Parole continue: 4 fenêtres aux quarts de la zone utilisable
+    starts = sample_windows([(0.0, 403.0)], 4, 3.0)
+    assert starts == pytest.approx([50.0, 150.0, 250.0, 350.0])
+
+    # Parole découpée: chaque région reçoit sa part
+    starts = sample_windows([(0.0, 103.0), (500.0, 603.0)], 4, 3.0)
+    assert starts == pytest.approx([25.0, 75.0, 525.0, 575.0])
+
+
+def test_short_speech():
+    # Régions plus courtes qu'une fenêtre: ignorées
+    assert sample_windows([(0.0, 2.0), (10.0, 12.5)], 12, 3.0) == []
+    # Parole juste assez longue pour une seule fenêtre
+    assert sample_windows([(5.0, 8.0)], 12, 3.0) == [5.0]
+    # Positions plus proches qu'une fenêtre: une seule est gardée
+    assert len(sample_windows([(0.0, 10.0)], 12, 3.0)) == 2
+
+
+def test_speaker_hint_skips_precheck():
+    report, regions = single_speaker_precheck(None, np.zeros(16000, dtype=np.float32), {'num_speakers': 2})
+    assert (report['path'], report['reason'], regions) == ('full', 'speakers_hint', [])
+
+    report, _ = single_speaker_precheck(None, np.zeros(16000, dtype=np.float32), {'min_speakers': 3})
+    assert report['reason'] == 'speakers_hint'
+
+
+def test_single_speaker_turns():
+    assert single_speaker_turns([(0, 1.5), (2, 3)]) == [(0.0, 1.5, 'SPEAKER_00'), (2.0, 3.0, 'SPEAKER_00')]
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+
+import stream_session
+from speaker_registry import SpeakerRegistry
+
+
+def test_registry_matches_known_speakers():
+    registry = SpeakerRegistry()
+    first = registry.match(['A', 'B'], np.array([[1.0, 0.0], [0.0, 1.0]]), [10.0, 5.0])
+    assert first == {'A': 'SPEAKER_00', 'B': 'SPEAKER_01'}
+
+    # Chunk suivant: labels locaux permutés, un nouveau locuteur
+    second = registry.match(['X', 'Y', 'Z'], np.array([[0.1, 0.9], [0.95, 0.05], [-1.0, 0.0]]), [3.0, 3.0, 3.0])
+    assert second == {'X': 'SPEAKER_01', 'Y': 'SPEAKER_00', 'Z': 'SPEAKER_02'}
+
+
+def test_registry_pairs_each_global_speaker_once():
+    registry = SpeakerRegistry()
+    registry.match(['A'], np.array([[1.0, 0.0]]), [10.0])
+    # Deux locuteurs proches du même centroïde: seul le plus proche le reprend
+    mapping = registry.match(['X', 'Y'], np.array([[0.9, 0.1], [1.0, 0.0]]), [1.0, 1.0])
+    assert mapping['Y'] == 'SPEAKER_00'
+    assert mapping['X'] == 'SPEAKER_01'
+
+
+def test_registry_keeps_speakers_without_embedding():
+    registry = SpeakerRegistry()
+    mapping = registry.match(['A'], np.array([[np.nan, np.nan]]), [0.2])
+    assert mapping == {'A': 'SPEAKER_00'}
+    assert registry.speakers['SPEAKER_00']['centroid'] is None
+
+
+class FakeModels:
+    """Un locuteur par chunk, toujours le même: 2 s de parole, texte = numéro du chunk"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def use_session_model(self, state, chunk_path):
+        state.setdefault('model', 'base')
+
+    def diarize(self, chunk_path):
+        return {'success': True, 'duration': 2.0, 'turns': [[0.0, 2.0, 'S0']], 'labels': ['S0'],
+                'embeddings': [[1.0, 0.0]], 'durations': [2.0]}
+
+    def transcribe(self, chunk_path, prompt=None):
+        self.prompts.append(prompt)
+        number = stream_session.CHUNK_PATTERN.search(chunk_path).group(1)
+        return {'text': f" chunk {number}", 'language': 'fr',
+                'segments': [{'start': 0.0, 'end': 2.0, 'text': f" chunk {number}"}]}
+
+
+def add_chunk(session_dir, index):
+    open(os.path.join(session_dir, f"rec_part_{index}.webm"), 'wb').close()
+
+
+def test_advance_processes_chunks_in_order_and_stops_at_gap(tmp_path):
+    session_dir = str(tmp_path)
+    for index in (0, 1, 3):
+        add_chunk(session_dir, index)
+    models = FakeModels()
+
+    state = stream_session.advance(session_dir, models)
+    assert state['next_index'] == 2
+    assert state['offset'] == 4.0
+    assert [segment['text'] for segment in state['segments']] == ['chunk 0', 'chunk 1']
+    assert models.prompts == [None, 'chunk 0']
+
+    # Le trou est comblé: les chunks 2 et 3 sont traités, l'état est relu depuis le disque
+    add_chunk(session_dir, 2)
+    state = stream_session.advance(session_dir, models)
+    assert state['next_index'] == 4
+    assert [(s['start'], s['end']) for s in state['segments']][-1] == (6.0, 8.0)
+    assert {segment['speaker'] for segment in state['segments']} == {'SPEAKER_00'}
+
+
+def test_advance_respects_total_chunks(tmp_path):
+    session_dir = str(tmp_path)
+    for index in range(3):
+        add_chunk(session_dir, index)
+    state = stream_session.advance(session_dir, FakeModels(), total_chunks=2)
+    assert state['next_index'] == 2
+
+
+def test_busy_session_returns_immediately(tmp_path):
+    session_dir = str(tmp_path)
+    add_chunk(session_dir, 0)
+    with stream_session.session_lock(session_dir) as locked:
+        assert locked
+        assert stream_session.advance(session_dir, FakeModels(), wait=False) is None
+    assert not os.path.exists(os.path.join(session_dir, stream_session.STATE_FILE))
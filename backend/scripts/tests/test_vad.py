@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from vad import JOIN_GAP_SECONDS, SpeechTimeline, _finalize_regions, energy_speech_regions
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds: float, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.full(int(seconds * SAMPLE_RATE), 1e-4, dtype=np.float32)
+
+
+def test_timeline_maps_concatenated_time_back_to_original():
+    waveform = np.zeros(20 * SAMPLE_RATE, dtype=np.float32)
+    timeline = SpeechTimeline(waveform, [(2.0, 5.0), (10.0, 12.0)])
+
+    assert len(timeline.waveform) == pytest.approx((3.0 + 2.0 + 2 * JOIN_GAP_SECONDS) * SAMPLE_RATE)
+    assert timeline.to_original(0.0) == 2.0
+    assert timeline.to_original(1.5) == pytest.approx(3.5)
+    # Début de la deuxième région: après la première et le silence de jonction
+    assert timeline.to_original(3.0 + JOIN_GAP_SECONDS) == pytest.approx(10.0)
+    assert timeline.to_original(3.0 + JOIN_GAP_SECONDS + 1.0) == pytest.approx(11.0)
+    # Dans le silence de jonction: borné à la fin de la région précédente
+    assert timeline.to_original(3.0 + JOIN_GAP_SECONDS / 2) == 5.0
+
+
+def test_timeline_remaps_segments_and_words():
+    timeline = SpeechTimeline(np.zeros(10 * SAMPLE_RATE, dtype=np.float32), [(4.0, 6.0)])
+    segments = timeline.remap_segments([
+        {'start': 0.5, 'end': 1.5, 'text': 'oui', 'words': [{'start': 0.5, 'end': 1.0, 'word': 'oui'}]}
+    ])
+    assert (segments[0]['start'], segments[0]['end']) == (4.5, 5.5)
+    assert (segments[0]['words'][0]['start'], segments[0]['words'][0]['end']) == (4.5, 5.0)
+    assert segments[0]['text'] == 'oui'
+
+
+def test_timeline_report():
+    timeline = SpeechTimeline(np.zeros(10 * SAMPLE_RATE, dtype=np.float32), [(1.0, 3.0), (5.0, 6.0)])
+    report = timeline.report('energy')
+    assert report['speech_duration'] == 3.0
+    assert report['skipped_duration'] == 7.0
+    assert report['skipped_ratio'] == 0.7
+
+
+def test_timeline_without_speech():
+    timeline = SpeechTimeline(np.zeros(SAMPLE_RATE, dtype=np.float32), [])
+    assert len(timeline.waveform) == 0
+    assert timeline.report('energy')['skipped_ratio'] == 1.0
+
+
+def test_finalize_merges_short_silences_and_drops_short_speech():
+    regions = _finalize_regions([(1.0, 2.0), (2.3, 3.0), (5.0, 5.1), (8.0, 9.0)], 10.0,
+                                min_speech=0.25, min_silence=0.6, padding=0.2)
+    assert regions == [(0.8, 3.2), (7.8, 9.2)]
+
+
+def test_finalize_padding_stays_inside_audio():
+    assert _finalize_regions([(0.05, 1.0), (9.5, 9.98)], 10.0, 0.0, 0.0, 0.2) == [(0.0, 1.2), (9.3, 10.0)]
+
+
+def test_energy_regions_find_speech():
+    waveform = np.concatenate([silence(2.0), tone(3.0), silence(4.0), tone(1.0), silence(2.0)])
+    regions = energy_speech_regions(waveform)
+
+    assert len(regions) == 2
+    assert regions[0][0] == pytest.approx(2.0, abs=0.25)
+    assert regions[0][1] == pytest.approx(5.0, abs=0.25)
+    assert regions[1][0] == pytest.approx(9.0, abs=0.25)
+    assert regions[1][1] == pytest.approx(10.0, abs=0.25)
+
+
+def test_energy_regions_of_short_audio():
+    assert energy_speech_regions(np.zeros(10, dtype=np.float32)) == []
@@ -0,0 +1,75 @@
+import json
+
+import numpy as np
+import pytest
+
+import voiceprints
+from voiceprints import VoiceprintStore, speaker_hints, store_version
+
+
+@pytest.fixture
+def store(tmp_path):
+    return VoiceprintStore(str(tmp_path / 'voiceprints.json'), threshold=0.6, min_recordings=3)
+
+
+def confirm(store, user_id, embedding):
+    for _ in range(store.min_recordings):
+        store.propose(user_id, embedding, 60.0)
+
+
+def test_provisional_until_enough_recordings(store):
+    store.propose(42, [1.0, 0.0, 0.0], 60.0)
+    store.propose(42, [0.9, 0.1, 0.0], 60.0)
+    assert not store.has(42)
+    assert store.identify(['A'], [[1.0, 0.0, 0.0]], advisor_id=42) is None
+
+    store.propose(42, [1.0, 0.05, 0.0], 60.0)
+    assert store.has(42)
+    match = store.identify(['A', 'B'], [[0.0, 1.0, 0.0], [1.0, 0.0, 0.0]], advisor_id=42)
+    assert (match['label'], match['advisor_id']) == ('B', '42')
+
+
+def test_disagreeing_recording_restarts_provisional_print(store):
+    store.propose(42, [1.0, 0.0, 0.0], 60.0)
+    store.propose(42, [1.0, 0.0, 0.0], 60.0)
+    store.propose(42, [0.0, 1.0, 0.0], 60.0)
+    assert store.speakers['42']['recordings'] == 1
+    assert store.speakers['42']['centroid'] == pytest.approx([0.0, 1.0, 0.0])
+
+
+def test_identify_nearest_advisor_without_id(store):
+    confirm(store, 1, [1.0, 0.0, 0.0])
+    confirm(store, 2, [0.0, 0.0, 1.0])
+    match = store.identify(['A', 'B'], [[np.nan] * 3, [0.1, 0.0, 1.0]])
+    assert (match['label'], match['advisor_id']) == ('B', '2')
+    assert store.identify(['A'], [[0.0, 1.0, 0.0]]) is None
+
+
+def test_save_forget_and_version(store, tmp_path):
+    assert store_version(store.path) is None
+    confirm(store, 42, [1.0, 0.0, 0.0])
+    store.save()
+    version = store_version(store.path)
+    assert version is not None
+    assert json.loads(open(store.path).read())['42']['recordings'] == 3
+
+    assert VoiceprintStore(store.path).forget(42)
+    assert store_version(store.path) != version
+    assert not VoiceprintStore(store.path).has(42)
+
+
+def test_speaker_hints(store, monkeypatch):
+    monkeypatch.setattr(voiceprints, 'DEFAULT_MAX_SPEAKERS', 4)
+    confirm(store, 42, [1.0, 0.0, 0.0])
+
+    # Courtier connu: au moins lui et un client
+    assert speaker_hints(store, 42) == {'min_speakers': 2, 'max_speakers': 4}
+    assert speaker_hints(store, 42, {'max_speakers': 3, 'num_speakers': None}) == {'min_speakers': 2, 'max_speakers': 3}
+    assert speaker_hints(store, 42, {'min_speakers': 3}) == {'min_speakers': 3, 'max_speakers': 4}
+    # Nombre imposé: passé tel quel
+    assert speaker_hints(store, 42, {'num_speakers': 3, 'max_speakers': 5}) == {'num_speakers': 3}
+    assert speaker_hints(None, None, {'num_speakers': 2}) == {'num_speakers': 2}
+    # Courtier inconnu: seulement les bornes de l'appelant
+    assert speaker_hints(store, 7) == {}
+    assert speaker_hints(store, 7, {'max_speakers': 3}) == {'max_speakers': 3}
+    assert speaker_hints(None, 42) == {}
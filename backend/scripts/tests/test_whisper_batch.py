@@ -0,0 +1,125 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import whisper_transcribe
+from inference_cache import InferenceCache, cache_key
+from whisper_transcribe import list_batch_files, pool_processes, resolve_model_name, transcription_params
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'whisper_transcribe.py')
+
+
+@pytest.fixture
+def batch_env(tmp_path):
+    """Environnement des processus du lot: cache et table RTF isolés, modèle adaptatif reproductible"""
+    return {
+        **os.environ,
+        'HOME': str(tmp_path / 'home'),
+        'INFERENCE_CACHE': '1',
+        'INFERENCE_CACHE_DIR': str(tmp_path / 'cache'),
+        'WHISPER_ENGINE': 'openai-whisper',
+        'WHISPER_VAD': '',
+        'WHISPER_ADAPTIVE_MODELS': 'tiny,base,small,medium',
+        'WHISPER_ADAPTIVE_MARGIN': '1.3',
+        'WHISPER_ADAPTIVE_BUDGET': '100',
+        'METRICS': '0'
+    }
+
+
+def recording(tmp_path, name, seconds=None):
+    """Enregistrement factice; avec une durée, sa forme d'onde décodée (.16k.npy) la donne sans ffprobe"""
+    path = tmp_path / name
+    path.write_bytes(name.encode() * 100)
+    if seconds is not None:
+        np.save(str(path) + '.16k.npy', np.zeros(int(seconds * 16000), dtype=np.float32))
+    return str(path)
+
+
+def cache_result(env, audio_path, model_size, text, decoding=None):
+    """Résultat déjà en cache: le processus du lot le retourne sans charger de modèle"""
+    params = transcription_params(model_size, 'openai-whisper', None, None, decoding)
+    InferenceCache(env['INFERENCE_CACHE_DIR']).put(
+        cache_key('whisper', audio_path, params), {'text': text, 'model': model_size}
+    )
+
+
+def run_batch_cli(env, manifest, *args):
+    completed = subprocess.run([sys.executable, SCRIPT, '--batch', str(manifest), *args],
+                               capture_output=True, text=True, env=env, timeout=120)
+    lines = [json.loads(line) for line in completed.stdout.splitlines() if line.strip()]
+    return completed.returncode, {os.path.basename(line['audio_path']): line for line in lines}
+
+
+def test_batch_streams_lines_and_reports_failures(tmp_path, batch_env):
+    batch_env['WHISPER_MODEL'] = 'tiny'
+    first, second = recording(tmp_path, 'a.webm'), recording(tmp_path, 'b.webm')
+    uncached = recording(tmp_path, 'c.webm')
+    cache_result(batch_env, first, 'tiny', 'bonjour')
+    cache_result(batch_env, second, 'tiny', 'au revoir')
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text(f"# lot de test\n{first}\n{second}\n\n{uncached}\n{tmp_path / 'absent.webm'}\n")
+
+    returncode, lines = run_batch_cli(batch_env, manifest, '--processes', '2')
+
+    # Le modèle vient de WHISPER_MODEL (les résultats en cache sont ceux de tiny)
+    assert returncode == 1
+    assert sorted(lines) == ['a.webm', 'absent.webm', 'b.webm', 'c.webm']
+    assert (lines['a.webm']['text'], lines['b.webm']['text']) == ('bonjour', 'au revoir')
+    assert lines['a.webm']['cache']['hit'] and 'elapsed_seconds' in lines['a.webm']
+    # Un fichier en échec n'arrête pas le lot
+    assert 'Fichier non trouvé' in lines['absent.webm']['error']
+    assert 'error' in lines['c.webm']
+
+
+def test_batch_positional_model_and_success_exit(tmp_path, batch_env):
+    batch_env['WHISPER_MODEL'] = 'tiny'
+    audio = recording(tmp_path, 'a.webm')
+    cache_result(batch_env, audio, 'small', 'bonjour')
+
+    returncode, lines = run_batch_cli(batch_env, tmp_path, 'small', '--processes', '1')
+    assert returncode == 0
+    assert lines['a.webm']['text'] == 'bonjour'
+
+
+def test_batch_adaptive_model_per_file(tmp_path, batch_env):
+    batch_env['WHISPER_MODEL'] = 'auto'
+    # Budget de 100 s: small en beam search pour 60 s d'audio, tiny glouton pour 10 min
+    short, long = recording(tmp_path, 'short.webm', 60), recording(tmp_path, 'long.webm', 600)
+    cache_result(batch_env, short, 'small', 'court', {'beam_size': 5, 'best_of': 5})
+    cache_result(batch_env, long, 'tiny', 'long', {'beam_size': 1, 'best_of': 1})
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text(f"{short}\n{long}\n")
+
+    returncode, lines = run_batch_cli(batch_env, manifest, '--processes', '1')
+    assert returncode == 0
+    assert (lines['short.webm']['adaptive']['model'], lines['short.webm']['text']) == ('small', 'court')
+    assert (lines['long.webm']['adaptive']['model'], lines['long.webm']['text']) == ('tiny', 'long')
+
+
+def test_list_batch_files(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    for name in ('b.webm', 'a.MP3', 'notes.txt', 'sub/c.wav'):
+        (tmp_path / name).write_bytes(b'')
+    assert [os.path.relpath(p, tmp_path) for p in list_batch_files(str(tmp_path))] == ['a.MP3', 'b.webm', 'sub/c.wav']
+
+
+def test_pool_processes_bounded_by_memory(monkeypatch):
+    monkeypatch.setattr(whisper_transcribe, 'CPU_BUDGET', 16)
+    monkeypatch.setenv('SCHEDULER_MEMORY_MB', '8000')
+
+    assert pool_processes('tiny') == 16
+    assert pool_processes('base') == 8000 // 600
+    assert pool_processes('large-v3') == 1
+    assert pool_processes('auto') == 8000 // whisper_transcribe.WHISPER_MEMORY_MB['auto']
+    # Nombre explicite: respecté
+    assert pool_processes('large-v3', 3) == 3
+
+
+def test_resolve_model_name(monkeypatch):
+    assert resolve_model_name('small') == 'small'
+    assert resolve_model_name('auto') == 'auto'
+    assert resolve_model_name('huge') == 'base'
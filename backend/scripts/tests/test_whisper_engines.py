@@ -0,0 +1,97 @@
+import sys
+import types
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+import whisper_engines
+from decode_guard import DecodeStats, fallback_temperatures
+from whisper_engines import CTranslate2Engine, load_engine
+from whisper_transcribe import transcription_params
+
+Segment = namedtuple('Segment', 'start end text temperature avg_logprob compression_ratio no_speech_prob tokens words')
+Word = namedtuple('Word', 'word start end')
+Info = namedtuple('Info', 'language language_probability duration')
+
+
+class WhisperModel:
+    """Double de faster_whisper.WhisperModel: rejoue des segments préparés"""
+
+    instances = []
+
+    def __init__(self, model_size, device, compute_type, cpu_threads):
+        self.init = {'model_size': model_size, 'device': device, 'compute_type': compute_type,
+                     'cpu_threads': cpu_threads}
+        self.calls = []
+        self.segments = [
+            Segment(0.0, 1.5, ' Bonjour', 0.0, -0.2, 1.1, 0.01, [1, 2, 3], [Word(' Bonjour', 0.0, 1.5)]),
+            Segment(1.5, 3.0, ' madame.', 0.4, -0.6, 1.9, 0.05, [4, 5], None),
+        ]
+        WhisperModel.instances.append(self)
+
+    def transcribe(self, audio, **options):
+        self.calls.append(options)
+        # Générateur, comme la vraie bibliothèque: rien n'est décodé avant l'itération
+        return (segment for segment in self.segments), Info('fr', 0.97, len(audio) / 16000)
+
+
+@pytest.fixture
+def faster_whisper(monkeypatch):
+    WhisperModel.instances = []
+    monkeypatch.setitem(sys.modules, 'faster_whisper', types.SimpleNamespace(WhisperModel=WhisperModel))
+    monkeypatch.setenv('OMP_NUM_THREADS', '3')
+    return WhisperModel.instances
+
+
+def test_load_engine_dispatch(faster_whisper):
+    engine = load_engine('faster-whisper', 'small', 'int8_float32')
+    assert isinstance(engine, CTranslate2Engine)
+    assert faster_whisper[0].init == {'model_size': 'small', 'device': 'cpu', 'compute_type': 'int8_float32',
+                                      'cpu_threads': 3}
+
+    # Type de calcul par défaut: WHISPER_COMPUTE_TYPE
+    assert load_engine('faster-whisper', 'base').compute_type == whisper_engines.DEFAULT_COMPUTE_TYPE
+
+
+def test_transcribe_follows_the_shared_contract(faster_whisper):
+    engine = load_engine('faster-whisper', 'base', 'int8')
+    audio = np.zeros(3 * 16000, dtype=np.float32)
+
+    result = engine.transcribe(audio, language='fr', fp16=False, verbose=False, logprob_threshold=-1.0)
+
+    options = faster_whisper[0].calls[0]
+    # Options openai-whisper traduites ou retirées, repli en température borné par défaut
+    assert 'fp16' not in options and 'verbose' not in options
+    assert options['log_prob_threshold'] == -1.0
+    assert options['temperature'] == fallback_temperatures()
+
+    assert result['text'] == ' Bonjour madame.'
+    assert (result['language'], result['language_probability'], result['duration']) == ('fr', 0.97, 3.0)
+    assert result['segments'][0]['words'] == [{'word': ' Bonjour', 'start': 0.0, 'end': 1.5}]
+    assert result['segments'][1]['words'] == []
+    assert set(result['decode_stats']) >= set(DecodeStats().report())
+    assert result['decode_stats']['fallbacks'] == 1
+    assert result['decode_stats']['tokens_decoded'] == 5
+
+
+def test_decode_segments_aggregates_per_input(faster_whisper):
+    engine = load_engine('faster-whisper', 'base', 'int8')
+    stats = DecodeStats()
+    pieces = [np.zeros(16000, dtype=np.float32), np.zeros(8000, dtype=np.float32)]
+
+    results = engine.decode_segments(pieces, stats=stats, decoding={'beam_size': 1})
+
+    assert len(results) == 2
+    assert results[0]['avg_logprob'] == pytest.approx(-0.4)
+    assert (results[0]['no_speech_prob'], results[0]['compression_ratio'], results[0]['temperature']) == \
+        (0.01, 1.9, 0.4)
+    assert all(call['without_timestamps'] and call['beam_size'] == 1 for call in faster_whisper[0].calls)
+    assert stats.report()['windows'] == 4
+
+
+def test_compute_type_only_keys_faster_whisper():
+    assert transcription_params('base', 'faster-whisper', 'int8')['compute_type'] == 'int8'
+    assert transcription_params('base', 'faster-whisper', 'float32')['compute_type'] == 'float32'
+    # openai-whisper calcule toujours en float32 sur CPU: le type demandé ne change pas la clé de cache
+    assert transcription_params('base', 'openai-whisper', 'int8') == transcription_params('base', 'openai-whisper')
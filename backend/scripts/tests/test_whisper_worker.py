@@ -0,0 +1,150 @@
+import os
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from whisper_transcribe import transcribe_via_worker
+
+
+@pytest.fixture
+def worker_socket(tmp_path):
+    """Faux worker sur un socket Unix: `behaviour` reçoit la connexion acceptée"""
+    path = str(tmp_path / 'worker.sock')
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    connections = []
+
+    def start(behaviour):
+        def run():
+            connection, _ = server.accept()
+            connections.append(connection)
+            behaviour(connection)
+        threading.Thread(target=run, daemon=True).start()
+        return path
+
+    yield start
+    for connection in connections:
+        connection.close()
+    server.close()
+
+
+def test_no_socket_returns_none(tmp_path):
+    assert transcribe_via_worker(str(tmp_path / 'absent.sock'), 'audio.wav', 'base') is None
+
+
+def test_answer_is_returned(worker_socket):
+    def answer(connection):
+        with connection.makefile('rwb') as stream:
+            request = json.loads(stream.readline())
+            stream.write((json.dumps({'text': 'bonjour', 'model': request['model']}) + '\n').encode())
+            stream.flush()
+
+    path = worker_socket(answer)
+    assert transcribe_via_worker(path, 'audio.wav', 'small') == {'text': 'bonjour', 'model': 'small'}
+
+
+def test_closed_connection_falls_back(worker_socket):
+    path = worker_socket(lambda connection: connection.close())
+    assert transcribe_via_worker(path, 'audio.wav', 'base') is None
+
+
+def test_hung_worker_times_out_at_deadline(worker_socket):
+    path = worker_socket(lambda connection: time.sleep(10))
+
+    started = time.time()
+    assert transcribe_via_worker(path, 'audio.wav', 'base', deadline=time.time() + 1) is None
+    assert time.time() - started < 5
+
+
+def test_request_carries_decoding_and_segments(worker_socket):
+    received = {}
+
+    def answer(connection):
+        with connection.makefile('rwb') as stream:
+            received.update(json.loads(stream.readline()))
+            stream.write(b'{"text": ""}\n')
+            stream.flush()
+
+    path = worker_socket(answer)
+    transcribe_via_worker(path, 'audio.wav', 'base', segments=[{'start': 0.0, 'end': 1.0}], batch_size=4,
+                          decoding={'beam_size': 5})
+    assert received['audio_path'] == os.path.abspath('audio.wav')
+    assert received['segments'] == [{'start': 0.0, 'end': 1.0}]
+    assert received['batch_size'] == 4
+    assert received['decoding'] == {'beam_size': 5}
+
+
+@pytest.fixture
+def real_worker(tmp_path):
+    """Boucle d'un worker forké (_worker_loop) sur un socket Unix, sans modèle chargé"""
+    import multiprocessing
+    from whisper_transcribe import _worker_loop
+
+    path = str(tmp_path / 'real.sock')
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    process = multiprocessing.get_context('fork').Process(target=_worker_loop, args=(server,), daemon=True)
+    process.start()
+    server.close()
+    yield path
+    process.terminate()
+    process.join()
+
+
+def exchange(path, lines):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(10)
+        sock.connect(path)
+        with sock.makefile('rwb') as stream:
+            responses = []
+            for line in lines:
+                stream.write(line.encode() + b'\n')
+                stream.flush()
+                responses.append(json.loads(stream.readline()))
+            return responses
+
+
+def test_malformed_requests_get_error_responses(real_worker, tmp_path):
+    audio = tmp_path / 'audio.wav'
+    audio.write_bytes(b'')
+    requests = [
+        json.dumps({'audio_path': str(audio), 'decoding': {'beam_size': 'x'}}),
+        json.dumps({'audio_path': str(audio), 'decoding': {'best_of': -1}}),
+        json.dumps({'audio_path': str(audio), 'decoding': {'beam_size': True}}),
+        json.dumps({'audio_path': str(audio), 'decoding': [5]}),
+        json.dumps({'audio_path': 5}),
+        json.dumps({'model': 'base'}),
+        json.dumps(['audio.wav']),
+        '{"audio_path": ',
+        json.dumps({'audio_path': str(tmp_path / 'absent.wav'), 'segments': [{'start': 0, 'end': 1}]}),
+        json.dumps({'audio_path': str(audio), 'segments': 'x'}),
+        json.dumps({'cmd': 'ping'})
+    ]
+    responses = exchange(real_worker, requests)
+
+    # Chaque requête reçoit une réponse sur la même connexion: le worker survit
+    for response in responses[:4]:
+        assert response['error'].startswith('Requête invalide: decoding')
+    assert responses[4]['error'] == responses[5]['error'] == 'Requête invalide: audio_path manquant'
+    assert responses[6]['error'] == 'Requête invalide: objet JSON attendu'
+    assert responses[7]['error'].startswith('JSON invalide')
+    assert responses[8]['error'].startswith('Fichier non trouvé')
+    assert 'error' in responses[9]
+    assert responses[10]['ready'] is True and responses[10]['models'] == []
+
+
+def test_parse_decoding():
+    from whisper_transcribe import parse_decoding
+
+    assert parse_decoding(None) == {}
+    assert parse_decoding({'beam_size': 5, 'best_of': 5, 'temperature': 0.2}) == {'beam_size': 5, 'best_of': 5}
+    assert parse_decoding({'beam_size': None}) == {}
+    with pytest.raises(ValueError):
+        parse_decoding({'beam_size': 0})
+    with pytest.raises(ValueError):
+        parse_decoding({'beam_size': 2.5})
@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from windowed_diarization import WindowedDiarization, plan_windows, window_hints
+
+
+class FakeDiarization:
+    """Annotation minimale: tours (start, end, label) relatifs à la fenêtre"""
+
+    def __init__(self, turns):
+        self.turns = turns
+
+    def labels(self):
+        return sorted({label for _, _, label in self.turns})
+
+    def itertracks(self, yield_label=False):
+        for start, end, label in self.turns:
+            yield SimpleNamespace(start=start, end=end), None, label
+
+    def label_duration(self, label):
+        return sum(end - start for start, end, speaker in self.turns if speaker == label)
+
+
+@pytest.mark.parametrize('duration,window,overlap', [
+    (601.0, 600.0, 30.0), (1800.0, 600.0, 30.0), (3725.5, 600.0, 30.0), (5000.0, 900.0, 0.0), (2400.0, 600.0, 120.0)
+])
+def test_plan_windows_cover_recording(duration, window, overlap):
+    windows = plan_windows(duration, window, overlap)
+
+    assert windows[0][0] == 0.0 and windows[0][2] == 0.0
+    assert windows[-1][1] == pytest.approx(duration) and windows[-1][3] == duration
+    for start, end, own_start, own_end in windows:
+        assert end - start == pytest.approx(window)
+        assert start <= own_start < own_end <= end
+    for previous, following in zip(windows, windows[1:]):
+        # Zones propres contiguës, recouvrement au moins égal à celui demandé
+        assert previous[3] == following[2]
+        assert previous[1] - following[0] >= overlap - 1e-9
+
+
+def test_plan_windows_short_recording():
+    assert plan_windows(120.0, 600.0, 30.0) == [(0.0, 120.0, 0.0, 120.0)]
+
+
+def test_window_hints_only_keep_maximum():
+    assert window_hints({'num_speakers': 2}) == {'max_speakers': 2}
+    assert window_hints({'min_speakers': 2, 'max_speakers': 4}) == {'max_speakers': 4}
+    assert window_hints({'min_speakers': 2}) == {}
+
+
+def test_turns_clipped_to_own_region_and_matched_across_windows():
+    accumulator = WindowedDiarization(threshold=0.5)
+    first, second = (0.0, 600.0, 0.0, 585.0), (570.0, 1170.0, 585.0, 1170.0)
+    accumulator.add(FakeDiarization([(0.0, 10.0, 'A'), (580.0, 600.0, 'B')]), [[1, 0], [0, 1]], first)
+    accumulator.add(FakeDiarization([(0.0, 30.0, 'X'), (40.0, 60.0, 'Y')]), [[0, 1], [1, 0.1]], second)
+
+    # X (fenêtre 2) est le B de la fenêtre 1, Y est A
+    assert sorted(accumulator.turns) == [
+        (0.0, 10.0, 'SPEAKER_00'), (580.0, 585.0, 'SPEAKER_01'),
+        (585.0, 600.0, 'SPEAKER_01'), (610.0, 630.0, 'SPEAKER_00')
+    ]
+    report = accumulator.report([first, second])
+    assert report['local_speakers'] == 4 and report['global_speakers'] == 2
+
+
+def test_limit_speakers_merges_into_nearest_kept():
+    accumulator = WindowedDiarization(threshold=0.99)
+    diarization = FakeDiarization([(0.0, 100.0, 'A'), (100.0, 180.0, 'B'), (180.0, 190.0, 'C')])
+    accumulator.add(diarization, [[1, 0, 0], [0, 1, 0], [0.2, 0.9, 0.1]], (0.0, 190.0, 0.0, 190.0))
+    assert len(accumulator.registry.speakers) == 3
+
+    accumulator.limit_speakers(2)
+    assert [label for _, _, label in accumulator.turns] == ['SPEAKER_00', 'SPEAKER_01', 'SPEAKER_01']
+    assert set(accumulator.registry.speakers) == {'SPEAKER_00', 'SPEAKER_01'}
+    assert accumulator.registry.speakers['SPEAKER_01']['weight'] == pytest.approx(90.0)
+    assert accumulator.report([None])['merged_speakers'] == 1
+
+    # Déjà sous la limite: rien ne change
+    accumulator.limit_speakers(2)
+    assert accumulator.report([None])['merged_speakers'] == 1
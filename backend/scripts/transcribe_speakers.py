@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Transcription attribuée aux locuteurs en une seule passe
+
+Remplace la chaîne diarisation → extraction ffmpeg de l'audio client →
+transcription : l'audio est décodé une seule fois, diarisé par pyannote puis
+transcrit par Whisper sur la forme d'onde complète. La diarisation suit le
+même chemin que diarize_audio.py (pré-vérification locuteur unique, fenêtres
+glissantes au-delà de DIARIZATION_WINDOW_THRESHOLD). Chaque segment Whisper
+(ou chaque mot avec --word-level) est ensuite attribué au locuteur qui le
+chevauche le plus. Aucun fichier audio intermédiaire n'est créé.
+
+Avec le modèle `auto`, le modèle Whisper et son décodage sont choisis après la
+diarisation, selon le temps restant avant --deadline (voir model_selection.py).
+
+Usage:
+    python3 transcribe_speakers.py <audio_file> <output_json> [modele|auto] [--word-level] [--advisor-id ID]
+                                   [--deadline EPOCH]
+"""
+
+import sys
+import os
+import argparse
+
+from audio_io import SAMPLE_RATE, load_audio
+from diarize_audio import diarize_waveform, load_pipeline, write_profiled_result, write_result, error_result
+from profiling import StageProfiler
+from speaker_alignment import SpeakerIntervalIndex, assign_speakers
+from whisper_transcribe import ADAPTIVE_MODEL, VALID_MODELS, load_model, select_model
+
+
+def speaker_roles(diarization_result: dict) -> dict:
+    """Associe chaque locuteur à son rôle (courtier / client)"""
+    roles = {speaker: 'client' for speaker in diarization_result['client_speakers']}
+    if diarization_result['courtier_speaker'] is not None:
+        roles[diarization_result['courtier_speaker']] = 'courtier'
+    return roles
+
+
+def whisper_units(whisper_result: dict, word_level: bool) -> list:
+    """Segments (ou mots) Whisper avec leurs timestamps"""
+    if not word_level:
+        return whisper_result['segments']
+
+    return [
+        {'start': word['start'], 'end': word['end'], 'text': word['word']}
+        for segment in whisper_result['segments']
+        for word in segment.get('words', [])
+    ]
+
+
+def transcribe_speakers(audio_file: str, model_size: str, word_level: bool = False,
+                        profiler: StageProfiler = None, advisor_id: str = None, deadline: float = None) -> dict:
+    """Diarise et transcrit l'audio, puis attribue le texte aux locuteurs"""
+    profiler = profiler or StageProfiler()
+
+    print("🎧 Décodage de l'audio...", file=sys.stderr)
+    with profiler.stage('audio_decode'):
+        waveform = load_audio(audio_file)
+
+    print("📦 Chargement du modèle pyannote...", file=sys.stderr)
+    pipeline = load_pipeline(profiler)
+
+    print("🔍 Analyse des locuteurs...", file=sys.stderr)
+    table, diarization_result = diarize_waveform(pipeline, waveform, profiler, advisor_id)
+
+    # Modèle adaptatif: choisi sur le temps restant, une fois la diarisation terminée
+    adaptive, decoding = None, {}
+    if model_size == ADAPTIVE_MODEL:
+        adaptive = select_model(audio_file, deadline, duration=len(waveform) / SAMPLE_RATE)
+        model_size, decoding = adaptive["model"], adaptive["decoding"]
+
+    print(f"🧠 Transcription Whisper ({model_size})...", file=sys.stderr)
+    model = load_model(model_size, profiler=profiler)
+    with profiler.stage('whisper_decode'):
+        whisper_result = model.transcribe(
+            waveform,
+            language="fr",
+            fp16=False,
+            word_timestamps=word_level,
+            **decoding
+        )
+
+    with profiler.stage('speaker_alignment'):
+        # Résultat partiel (aucun tour de parole): tout le texte est attribué au client
+        index = SpeakerIntervalIndex.from_table(table) if table is not None else SpeakerIntervalIndex([])
+        segments = assign_speakers(
+            whisper_units(whisper_result, word_level),
+            index,
+            speaker_roles(diarization_result)
+        )
+
+    return {
+        **diarization_result,
+        'language': whisper_result['language'],
+        'segments': segments,
+        'client_text': ' '.join(s['text'] for s in segments if s['role'] == 'client'),
+        'courtier_text': ' '.join(s['text'] for s in segments if s['role'] == 'courtier'),
+        'text': whisper_result['text'].strip(),
+        **({'adaptive': adaptive} if adaptive is not None else {})
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcription attribuée aux locuteurs")
+    parser.add_argument('audio_file')
+    parser.add_argument('output_json')
+    parser.add_argument('model', nargs='?', default=os.getenv('WHISPER_MODEL', 'base'))
+    parser.add_argument('--word-level', action='store_true',
+                        help='Attribuer chaque mot (et non chaque segment) à un locuteur')
+    parser.add_argument('--advisor-id',
+                        help="Utilisateur (courtier) attendu: son empreinte vocale identifie le courtier")
+    parser.add_argument('--deadline', type=float, metavar='EPOCH',
+                        help="Horodatage avant lequel le modèle auto doit avoir terminé")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.audio_file):
+        print(f"Erreur: Fichier audio introuvable: {args.audio_file}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.model in VALID_MODELS or args.model == ADAPTIVE_MODEL:
+        model_size = args.model
+    else:
+        print(f"⚠️ Modèle Whisper inconnu '{args.model}', utilisation de base", file=sys.stderr)
+        model_size = "base"
+
+    try:
+        profiler = StageProfiler()
+        result = transcribe_speakers(args.audio_file, model_size, args.word_level, profiler, args.advisor_id,
+                                     args.deadline)
+        write_profiled_result(args.output_json, result, profiler)
+        print(f"✅ Résultats sauvegardés dans: {args.output_json}", file=sys.stderr)
+    except Exception as e:
+        print(f"❌ Erreur: {str(e)}", file=sys.stderr)
+        write_result(args.output_json, error_result(e))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Détection d'activité vocale (VAD) avant le décodage Whisper
+
+Les rendez-vous contiennent de longs passages sans parole (musique d'attente,
+papiers, pauses) que Whisper décode quand même par fenêtres de 30 s, parfois
+en y hallucinant du texte. Les régions de parole sont détectées d'abord, puis
+seules celles-ci sont concaténées et passées au décodeur. Les timestamps sont
+ensuite ramenés sur l'audio d'origine.
+
+Méthodes:
+    - silero : modèle Silero VAD embarqué par faster-whisper (ONNX, si installé)
+    - energy : seuil d'énergie adaptatif par trames (numpy uniquement)
+"""
+
+from bisect import bisect_right
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+
+# Silence inséré entre deux régions concaténées (évite de coller les mots)
+JOIN_GAP_SECONDS = 0.2
+
+
+def energy_speech_regions(waveform, sample_rate: int = SAMPLE_RATE, frame_seconds: float = 0.03,
+                          min_speech: float = 0.25, min_silence: float = 0.6, padding: float = 0.2) -> list:
+    """
+    Régions de parole par seuil d'énergie
+
+    Le seuil est placé entre le plancher de bruit (10e percentile) et le niveau
+    de parole (90e percentile) des trames, en dB.
+    """
+    frame = int(frame_seconds * sample_rate)
+    num_frames = len(waveform) // frame
+    if num_frames == 0:
+        return []
+
+    frames = np.asarray(waveform[:num_frames * frame], dtype=np.float32).reshape(num_frames, frame)
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+
+    noise_floor, speech_level = np.percentile(energy_db, [10, 90])
+    threshold = max(noise_floor + 0.3 * (speech_level - noise_floor), -60.0)
+    voiced = energy_db > threshold
+
+    # Bords des zones voisées
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1) * frame_seconds
+    ends = np.flatnonzero(edges == -1) * frame_seconds
+
+    return _finalize_regions(list(zip(starts, ends)), len(waveform) / sample_rate,
+                             min_speech, min_silence, padding)
+
+
+def silero_speech_regions(waveform, sample_rate: int = SAMPLE_RATE) -> list:
+    """Régions de parole détectées par Silero VAD (via faster-whisper)"""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    timestamps = get_speech_timestamps(np.asarray(waveform, dtype=np.float32), VadOptions())
+    regions = [(t['start'] / sample_rate, t['end'] / sample_rate) for t in timestamps]
+    return _finalize_regions(regions, len(waveform) / sample_rate, 0.0, 0.0, 0.0)
+
+
+def _finalize_regions(regions, duration: float, min_speech: float, min_silence: float, padding: float) -> list:
+    """Fusionne les régions proches, supprime les trop courtes et ajoute une marge"""
+    merged = []
+    for start, end in regions:
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    result = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start, end = max(0.0, start - padding), min(duration, end + padding)
+        if result and start <= result[-1][1]:
+            result[-1] = (result[-1][0], end)
+        else:
+            result.append((float(start), float(end)))
+    return result
+
+
+def speech_regions(waveform, method: str = "auto", sample_rate: int = SAMPLE_RATE):
+    """
+    Détecte les régions de parole
+
+    Returns:
+        tuple: (régions [(start, end)], méthode utilisée)
+    """
+    if method in ("auto", "silero"):
+        try:
+            return silero_speech_regions(waveform, sample_rate), "silero"
+        except ImportError:
+            if method == "silero":
+                raise
+    return energy_speech_regions(waveform, sample_rate), "energy"
+
+
+class SpeechTimeline:
+    """
+    Forme d'onde réduite aux régions de parole, avec la correspondance
+    temps concaténé → temps d'origine
+    """
+
+    def __init__(self, waveform, regions, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.regions = regions
+        self.original_duration = len(waveform) / sample_rate
+
+        gap = np.zeros(int(JOIN_GAP_SECONDS * sample_rate), dtype=np.float32)
+        pieces = []
+        self._concat_starts = []
+        self._original_starts = []
+        position = 0.0
+
+        for start, end in regions:
+            piece = np.asarray(waveform[int(start * sample_rate):int(end * sample_rate)], dtype=np.float32)
+            self._concat_starts.append(position)
+            self._original_starts.append(start)
+            pieces.extend([piece, gap])
+            position += len(piece) / sample_rate + JOIN_GAP_SECONDS
+
+        self.waveform = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+
+    @property
+    def speech_duration(self) -> float:
+        return sum(end - start for start, end in self.regions)
+
+    def to_original(self, t: float) -> float:
+        """Convertit un temps de l'audio concaténé en temps de l'audio d'origine"""
+        i = bisect_right(self._concat_starts, t) - 1
+        if i < 0:
+            return self._original_starts[0] if self._original_starts else t
+        start, end = self.regions[i]
+        return min(self._original_starts[i] + (t - self._concat_starts[i]), end)
+
+    def remap_segments(self, segments: list) -> list:
+        """Ramène les timestamps des segments (et des mots) sur l'audio d'origine"""
+        remapped = []
+        for segment in segments:
+            segment = {**segment, 'start': self.to_original(segment['start']), 'end': self.to_original(segment['end'])}
+            if segment.get('words'):
+                segment['words'] = [
+                    {**word, 'start': self.to_original(word['start']), 'end': self.to_original(word['end'])}
+                    for word in segment['words']
+                ]
+            remapped.append(segment)
+        return remapped
+
+    def report(self, method: str) -> dict:
+        skipped = max(self.original_duration - self.speech_duration, 0.0)
+        return {
+            'method': method,
+            'regions': len(self.regions),
+            'audio_duration': round(self.original_duration, 2),
+            'speech_duration': round(self.speech_duration, 2),
+            'skipped_duration': round(skipped, 2),
+            'skipped_ratio': round(skipped / self.original_duration, 4) if self.original_duration else 0.0
+        }
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Empreintes vocales des courtiers (une par utilisateur du CRM)
+
+Les mêmes courtiers apparaissent dans des milliers d'enregistrements. Leur
+embedding de locuteur (centroïde pondéré par la durée de parole) est conservé
+localement: quand le courtier attendu est connu, le pipeline reçoit des bornes
+du nombre de locuteurs (au moins 2, au plus DIARIZATION_MAX_SPEAKERS) et le cluster du courtier est reconnu par similarité
+cosinus, au lieu d'être deviné (plus grand nombre de tours de parole).
+
+Sans identifiant de courtier, l'empreinte la plus proche parmi tous les
+courtiers connus est recherchée (produit matriciel sur les empreintes
+normalisées).
+
+Une empreinte créée à partir de l'heuristique reste provisoire: l'heuristique
+n'est retenue que si le courtier domine nettement les tours de parole, et
+l'empreinte n'est utilisée pour l'identification qu'après plusieurs
+enregistrements concordants. Un enregistrement dont le cluster ne ressemble pas
+à l'empreinte provisoire la remplace (mauvaise devinette initiale).
+
+Les empreintes sont des données biométriques: elles restent sur le serveur et
+peuvent être supprimées par utilisateur (droit à l'effacement):
+
+    python3 voiceprints.py list
+    python3 voiceprints.py forget <user_id>
+
+Configuration (variables d'environnement):
+    VOICEPRINTS=0                   désactive les empreintes vocales
+    VOICEPRINT_PATH                 fichier des empreintes (défaut: ~/.cache/crm-ai/voiceprints.json)
+    VOICEPRINT_THRESHOLD            similarité cosinus minimale (défaut: 0.6)
+    VOICEPRINT_ENROLL_MARGIN        avance minimale de l'heuristique, en part des tours de parole (défaut: 0.2)
+    VOICEPRINT_MIN_RECORDINGS       enregistrements concordants avant utilisation (défaut: 3)
+    DIARIZATION_MAX_SPEAKERS        locuteurs max quand le courtier est connu (défaut: 4)
+"""
+
+import sys
+import os
+import json
+import time
+import fcntl
+import argparse
+from contextlib import contextmanager
+
+import numpy as np
+
+from speaker_registry import SpeakerRegistry, _cosine
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'crm-ai', 'voiceprints.json')
+DEFAULT_THRESHOLD = float(os.getenv('VOICEPRINT_THRESHOLD', '0.6'))
+DEFAULT_MAX_SPEAKERS = int(os.getenv('DIARIZATION_MAX_SPEAKERS', '4'))
+ENROLL_MARGIN = float(os.getenv('VOICEPRINT_ENROLL_MARGIN', '0.2'))
+MIN_RECORDINGS = int(os.getenv('VOICEPRINT_MIN_RECORDINGS', '3'))
+
+# Poids maximal d'une empreinte (secondes de parole): les enregistrements récents
+# continuent de la faire évoluer (micro, voix)
+MAX_WEIGHT_SECONDS = 3600.0
+
+
+def voiceprints_enabled() -> bool:
+    return os.getenv('VOICEPRINTS', '1') != '0'
+
+
+class VoiceprintStore(SpeakerRegistry):
+    """Empreintes {user_id: {"centroid": [...], "weight": secondes, "recordings": n}} sur disque"""
+
+    def __init__(self, path: str = None, threshold: float = DEFAULT_THRESHOLD,
+                 min_recordings: int = MIN_RECORDINGS):
+        self.path = path or os.getenv('VOICEPRINT_PATH') or DEFAULT_PATH
+        super().__init__(self._read(), threshold)
+        self.min_recordings = min_recordings
+        self._dirty = set()
+        self._index = None
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _confirmed(self, info: dict) -> bool:
+        return info.get('centroid') is not None and info.get('recordings', 0) >= self.min_recordings
+
+    def has(self, user_id) -> bool:
+        """Empreinte confirmée (utilisée pour l'identification)"""
+        return self._confirmed(self.speakers.get(str(user_id), {}))
+
+    def _matrix(self):
+        """Identifiants et empreintes confirmées normalisées, en une matrice (n_courtiers, dim)"""
+        if self._index is None:
+            ids = [user_id for user_id, info in self.speakers.items() if self._confirmed(info)]
+            matrix = np.asarray([self.speakers[user_id]['centroid'] for user_id in ids], dtype=np.float32)
+            if len(ids):
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            self._index = (ids, matrix)
+        return self._index
+
+    def identify(self, labels, embeddings, advisor_id=None):
+        """
+        Trouve le cluster du courtier
+
+        Args:
+            labels: labels des clusters, dans l'ordre des lignes de `embeddings`
+            embeddings: np.ndarray (n_clusters, dim), lignes NaN si trop peu de parole
+            advisor_id: courtier attendu (sinon: courtier connu le plus proche)
+
+        Returns:
+            dict {label, advisor_id, similarity} ou None si aucune empreinte assez proche
+        """
+        ids, matrix = self._matrix()
+        if advisor_id is not None:
+            if not self.has(advisor_id):
+                return None
+            position = ids.index(str(advisor_id))
+            ids, matrix = [ids[position]], matrix[position:position + 1]
+        if not ids or not len(labels):
+            return None
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        valid = np.all(np.isfinite(embeddings), axis=1)
+        if not valid.any():
+            return None
+
+        normalized = embeddings[valid] / np.maximum(np.linalg.norm(embeddings[valid], axis=1, keepdims=True), 1e-12)
+        similarities = normalized @ matrix.T
+        row, column = np.unravel_index(np.argmax(similarities), similarities.shape)
+        similarity = float(similarities[row, column])
+        if similarity < self.threshold:
+            return None
+
+        return {
+            'label': [label for label, ok in zip(labels, valid) if ok][row],
+            'advisor_id': ids[column],
+            'similarity': round(similarity, 4)
+        }
+
+    def enroll(self, user_id, embedding, weight: float) -> bool:
+        """Ajoute un enregistrement du courtier à son empreinte"""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if not np.all(np.isfinite(embedding)) or weight <= 0:
+            return False
+
+        key = str(user_id)
+        info = self.speakers.setdefault(key, {'centroid': None, 'weight': 0.0, 'recordings': 0})
+        self._update(key, embedding, weight)
+        info['weight'] = min(info['weight'], MAX_WEIGHT_SECONDS)
+        info['recordings'] = info.get('recordings', 0) + 1
+        info['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        self._dirty.add(key)
+        self._index = None
+        return True
+
+    def propose(self, user_id, embedding, weight: float) -> bool:
+        """
+        Ajoute un enregistrement désigné par l'heuristique à l'empreinte provisoire
+
+        Si le cluster ne ressemble pas à l'empreinte provisoire, celle-ci est
+        remplacée: seuls des enregistrements concordants la confirment.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if not np.all(np.isfinite(embedding)) or weight <= 0:
+            return False
+
+        key = str(user_id)
+        info = self.speakers.get(key)
+        if info is not None and info.get('centroid') is not None \
+                and _cosine(embedding, np.asarray(info['centroid'])) < self.threshold:
+            print(f"⚠️ Empreinte provisoire du courtier {key} non concordante: recommencée")
+            del self.speakers[key]
+
+        return self.enroll(user_id, embedding, weight)
+
+    @contextmanager
+    def _locked_file(self):
+        """Relecture-modification-écriture du fichier sous verrou (plusieurs workers écrivent)"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(f"{self.path}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                speakers = self._read()
+                yield speakers
+
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(speakers, f)
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def save(self) -> None:
+        """Écrit les empreintes modifiées par ce processus"""
+        if not self._dirty:
+            return
+        with self._locked_file() as speakers:
+            speakers.update({key: self.speakers[key] for key in self._dirty})
+        self._dirty.clear()
+
+    def forget(self, user_id) -> bool:
+        """Supprime l'empreinte d'un utilisateur"""
+        key = str(user_id)
+        with self._locked_file() as speakers:
+            found = speakers.pop(key, None) is not None
+        self.speakers.pop(key, None)
+        self._dirty.discard(key)
+        self._index = None
+        return found
+
+
+def speaker_hints(store, advisor_id=None, speakers=None) -> dict:
+    """
+    Bornes du nombre de locuteurs passées au pipeline
+
+    Un nombre imposé par l'appelant est passé tel quel (num_speakers). Quand le
+    courtier attendu a une empreinte confirmée, l'enregistrement contient au
+    moins le courtier et un client (min_speakers=2) et au plus
+    DIARIZATION_MAX_SPEAKERS locuteurs, sauf bornes plus précises de l'appelant.
+    Les enregistrements à une seule voix sont écartés avant, par la
+    pré-vérification (speaker_precheck.py).
+    """
+    speakers = {key: value for key, value in (speakers or {}).items() if value}
+    if speakers.get('num_speakers'):
+        return {'num_speakers': speakers['num_speakers']}
+    if store is None or advisor_id is None or not store.has(advisor_id):
+        return speakers
+
+    max_speakers = speakers.get('max_speakers', DEFAULT_MAX_SPEAKERS)
+    min_speakers = min(max(speakers.get('min_speakers', 2), 2), max_speakers)
+    return {'min_speakers': min_speakers, 'max_speakers': max_speakers}
+
+
+def store_version(path: str = None):
+    """Version du fichier des empreintes (clé du cache de diarisation), None s'il n'existe pas"""
+    try:
+        return os.stat(path or os.getenv('VOICEPRINT_PATH') or DEFAULT_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Empreintes vocales des courtiers")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='Lister les empreintes (JSON, sans les embeddings)')
+    forget_parser = subparsers.add_parser('forget', help="Supprimer l'empreinte d'un utilisateur")
+    forget_parser.add_argument('user_id')
+    args = parser.parse_args()
+
+    store = VoiceprintStore()
+    if args.command == 'list':
+        print(json.dumps({
+            user_id: {**{key: value for key, value in info.items() if key != 'centroid'},
+                      'confirmed': store._confirmed(info)}
+            for user_id, info in store.speakers.items()
+        }, indent=2))
+        return
+
+    found = store.forget(args.user_id)
+    print(json.dumps({'success': True, 'user_id': args.user_id, 'deleted': found}))
+    sys.exit(0 if found else 1)
+
+
+if __name__ == '__main__':
+    main()
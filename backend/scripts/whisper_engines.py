@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Moteurs d'inférence Whisper interchangeables
+
+Deux moteurs exposent le même contrat de sortie:
+    - openai-whisper : implémentation PyTorch de référence (fp32 sur CPU)
+    - faster-whisper : CTranslate2, quantifié int8 / int8_float32 sur CPU
+
+Le moteur est choisi par argument (--engine) ou par WHISPER_ENGINE, le type de
+calcul CTranslate2 par --compute-type ou WHISPER_COMPUTE_TYPE.
+
+Contrat de `transcribe()`:
+    {
+        "text": str,
+        "language": str,
+        "language_probability": float,
+        "duration": float,                      # durée de l'audio (s)
+        "segments": [{"start", "end", "text", "words": [{"word", "start", "end"}]}],
+        "decode_stats": {"windows", "fallbacks", "windows_aborted", "tokens_decoded", "max_fallbacks"}
+    }
+
+Contrat de `decode_segments()` (segments courts, ≤ 30 s chacun):
+    [{"text", "avg_logprob", "no_speech_prob", "compression_ratio", "temperature"}]   # dans l'ordre des entrées
+    (compteurs de décodage ajoutés au DecodeStats passé en argument)
+
+Le repli en température et les passes qui s'emballent sont bornés (decode_guard.py).
+
+openai-whisper décode les segments par lots (un tenseur mel par lot, un seul
+appel au décodeur); faster-whisper les transcrit l'un après l'autre.
+"""
+
+import os
+
+from decode_guard import MAX_WINDOW_TOKENS, DecodeStats, fallback_temperatures, guarded_decode
+
+ENGINES = ["openai-whisper", "faster-whisper"]
+COMPUTE_TYPES = ["int8", "int8_float32", "float32"]
+
+DEFAULT_ENGINE = os.getenv('WHISPER_ENGINE', 'openai-whisper')
+DEFAULT_COMPUTE_TYPE = os.getenv('WHISPER_COMPUTE_TYPE', 'int8')
+DEFAULT_BATCH_SIZE = int(os.getenv('WHISPER_BATCH_SIZE', '8'))
+
+SAMPLE_RATE = 16000
+
+# Seuils de transcribe() d'openai-whisper: segment considéré comme silence
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+
+
+class OpenAIWhisperEngine:
+    """Moteur openai-whisper (PyTorch)"""
+
+    name = "openai-whisper"
+    batched = True
+
+    def __init__(self, model_size: str, compute_type: str = None):
+        import whisper
+
+        self.model_size = model_size
+        self.compute_type = "float32"
+        self.model = whisper.load_model(model_size)
+
+    def transcribe(self, audio, **options) -> dict:
+        # Décoder une fois (ou relire la forme d'onde décodée) pour connaître la durée
+        if isinstance(audio, str):
+            from audio_io import load_audio
+            audio = load_audio(audio)
+
+        options.setdefault("fp16", False)
+        options.setdefault("temperature", fallback_temperatures())
+
+        # transcribe() appelle model.decode pour chaque fenêtre et chaque température du repli
+        stats = DecodeStats()
+        self.model.decode = lambda mel, decoding_options: guarded_decode(
+            self.model, mel, decoding_options, stats, retry_aborted=True
+        )
+        try:
+            result = self.model.transcribe(audio, **options)
+        finally:
+            del self.model.decode
+
+        return {
+            "text": result["text"],
+            "language": result["language"],
+            "language_probability": 1.0,  # Whisper ne retourne pas cette info
+            "duration": len(audio) / SAMPLE_RATE,
+            "segments": result["segments"],
+            "decode_stats": stats.report()
+        }
+
+
+    def decode_segments(self, waveforms: list, batch_size: int = DEFAULT_BATCH_SIZE, language: str = "fr",
+                        stats: DecodeStats = None, decoding: dict = None) -> list:
+        """
+        Décode des segments courts par lots
+
+        Chaque segment est complété à 30 s (fenêtre de l'encodeur) et les
+        spectrogrammes d'un lot sont empilés en un tenseur (lot, n_mels, 3000):
+        encodeur et décodeur traitent le lot en une passe. Décodage glouton (ou
+        beam search si `decoding` a un beam_size) à température 0, sans
+        timestamps (ceux du segment sont connus).
+        """
+        import numpy as np
+        import torch
+        import whisper
+
+        # best_of ne concerne que l'échantillonnage (température > 0): seul beam_size s'applique
+        beam_size = (decoding or {}).get("beam_size", 1)
+        options = whisper.DecodingOptions(language=language, fp16=False, without_timestamps=True,
+                                          beam_size=beam_size if beam_size > 1 else None)
+        stats = stats if stats is not None else DecodeStats()
+        results = [None] * len(waveforms)
+
+        # Segments de durées voisines dans un même lot: le lot décode jusqu'au texte le plus long
+        order = sorted(range(len(waveforms)), key=lambda index: len(waveforms[index]))
+        for first in range(0, len(order), max(1, batch_size)):
+            indices = order[first:first + max(1, batch_size)]
+            mel = torch.stack([
+                whisper.log_mel_spectrogram(
+                    whisper.pad_or_trim(np.asarray(waveforms[index], dtype=np.float32)),
+                    self.model.dims.n_mels
+                )
+                for index in indices
+            ]).to(self.model.device)
+
+            decoded = guarded_decode(self.model, mel, options, stats)
+
+            for index, result in zip(indices, decoded):
+                silent = result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD
+                results[index] = {
+                    "text": "" if silent else result.text,
+                    "avg_logprob": result.avg_logprob,
+                    "no_speech_prob": result.no_speech_prob,
+                    "compression_ratio": result.compression_ratio,
+                    "temperature": result.temperature
+                }
+
+        return results
+
+
+class CTranslate2Engine:
+    """Moteur faster-whisper (CTranslate2, quantification int8 sur CPU)"""
+
+    name = "faster-whisper"
+    batched = False
+
+    # Options openai-whisper renommées ou absentes dans faster-whisper
+    RENAMED_OPTIONS = {"logprob_threshold": "log_prob_threshold"}
+    IGNORED_OPTIONS = {"fp16", "verbose"}
+
+    def __init__(self, model_size: str, compute_type: str = None):
+        from faster_whisper import WhisperModel
+
+        self.model_size = model_size
+        self.compute_type = compute_type or DEFAULT_COMPUTE_TYPE
+        self.model = WhisperModel(
+            model_size,
+            device="cpu",
+            compute_type=self.compute_type,
+            cpu_threads=int(os.getenv('OMP_NUM_THREADS', '0'))
+        )
+
+    def transcribe(self, audio, **options) -> dict:
+        options = {
+            self.RENAMED_OPTIONS.get(key, key): value
+            for key, value in options.items()
+            if key not in self.IGNORED_OPTIONS
+        }
+
+        if isinstance(audio, str):
+            from audio_io import load_audio
+            audio = load_audio(audio)
+
+        options.setdefault("temperature", fallback_temperatures())
+        if MAX_WINDOW_TOKENS:
+            options.setdefault("max_new_tokens", MAX_WINDOW_TOKENS)
+
+        # faster-whisper retourne un générateur: la transcription a lieu ici
+        segments, info = self.model.transcribe(audio, **options)
+        segments = [
+            {
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "temperature": segment.temperature,
+                "avg_logprob": segment.avg_logprob,
+                "compression_ratio": segment.compression_ratio,
+                "no_speech_prob": segment.no_speech_prob,
+                "tokens": list(segment.tokens),
+                "words": [
+                    {"word": word.word, "start": word.start, "end": word.end}
+                    for word in (segment.words or [])
+                ]
+            }
+            for segment in segments
+        ]
+
+        # Pas d'accès aux passes: un segment issu d'une température > 0 compte comme un repli
+        stats = DecodeStats()
+        stats.merge({
+            "windows": len(segments),
+            "fallbacks": sum(1 for segment in segments if segment["temperature"] > 0),
+            "windows_aborted": None,
+            "tokens_decoded": sum(len(segment["tokens"]) for segment in segments)
+        })
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "language": info.language,
+            "language_probability": info.language_probability,
+            "duration": info.duration,
+            "segments": segments,
+            "decode_stats": stats.report()
+        }
+
+
+    def decode_segments(self, waveforms: list, batch_size: int = DEFAULT_BATCH_SIZE, language: str = "fr",
+                        stats: DecodeStats = None, decoding: dict = None) -> list:
+        """Transcrit les segments un par un (pas de décodage par lots exposé par faster-whisper)"""
+        results = []
+        for waveform in waveforms:
+            result = self.transcribe(waveform, language=language, without_timestamps=True, **(decoding or {}))
+            if stats is not None:
+                stats.merge(result["decode_stats"])
+            segments = result["segments"]
+            results.append({
+                "text": result["text"],
+                "avg_logprob": sum(s["avg_logprob"] for s in segments) / len(segments) if segments else None,
+                "no_speech_prob": min((s["no_speech_prob"] for s in segments), default=None),
+                "compression_ratio": max((s["compression_ratio"] for s in segments), default=None),
+                "temperature": max((s["temperature"] for s in segments), default=None)
+            })
+        return results
+
+
+def import_engine(engine: str):
+    """Importe la bibliothèque du moteur (étape mesurée séparément du chargement du modèle)"""
+    import importlib
+
+    return importlib.import_module("faster_whisper" if engine == CTranslate2Engine.name else "whisper")
+
+
+def load_engine(engine: str, model_size: str, compute_type: str = None):
+    """Instancie le moteur demandé avec le modèle chargé"""
+    if engine == CTranslate2Engine.name:
+        return CTranslate2Engine(model_size, compute_type)
+    return OpenAIWhisperEngine(model_size)
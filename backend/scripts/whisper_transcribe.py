@@ -1,63 +1,1071 @@
 #!/usr/bin/env python3
 """
 Script de transcription audio locale avec OpenAI Whisper
-Utilisation: python whisper_transcribe.py <chemin_fichier_audio>
+
+Utilisation:
+    python whisper_transcribe.py <chemin_fichier_audio> [modele] [--vad [auto|silero|energy]]
+    python whisper_transcribe.py --serve [--models base,small] [--workers N] [--socket chemin]
+    python whisper_transcribe.py --batch <manifeste|dossier> [modele] [--processes N]
+    python whisper_transcribe.py <chemin_fichier_audio> [modele] --long [--processes N] [--chunk-seconds S]
+    python whisper_transcribe.py <chemin_fichier_audio> [modele] --segments <diarisation.json> [--batch-size N]
+    python whisper_transcribe.py <chemin_fichier_audio> auto [--deadline EPOCH]
+
+Mode worker (--serve):
+    Les modèles sont chargés une seule fois dans le processus parent, puis
+    N workers sont forkés et se partagent les poids en copy-on-write.
+    Les requêtes arrivent sur un socket Unix au format JSON lines.
+
+Mode batch (--batch):
+    Retraitement de nombreux fichiers en une invocation. Les fichiers (un chemin
+    par ligne dans le manifeste, ou les fichiers audio d'un dossier) sont
+    répartis sur N processus qui chargent chacun le modèle une seule fois
+    (défaut: un par cœur, dans la limite de la RAM estimée d'un modèle).
+    Le modèle est résolu comme pour un fichier seul (WHISPER_MODEL, auto
+    choisi fichier par fichier). Une ligne JSON est écrite dès qu'un fichier
+    est terminé.
+
+Enregistrements longs (--long, WHISPER_LONG_AUDIO=1):
+    L'audio est coupé sur les silences en chunks d'environ --chunk-seconds,
+    transcrits en parallèle par N processus puis recollés dans l'ordre.
+
+Liste de segments (--segments):
+    Transcrit uniquement les segments listés (client_segments du JSON écrit
+    par diarize_audio.py, ou liste de {start, end}). Les segments sont décodés
+    par lots de --batch-size (WHISPER_BATCH_SIZE) avec openai-whisper, un par un
+    avec faster-whisper. Chaque segment du résultat garde ses timestamps.
+
+Modèle adaptatif (modèle "auto", WHISPER_MODEL=auto):
+    La durée de l'audio est lue sans décodage, puis le plus grand modèle et le
+    décodage (beam search ou glouton) dont la durée estimée tient avant
+    --deadline sont choisis d'après les facteurs temps réel mesurés sur cet
+    hôte (model_selection.py). Le choix est décrit dans la clé "adaptive".
+
+Détection de parole (--vad, WHISPER_VAD):
+    Seules les régions de parole sont décodées (vad.py). Les timestamps restent
+    ceux de l'audio d'origine et la clé "vad" indique la durée ignorée.
+
+Mode client (par défaut):
+    Si un worker écoute sur le socket (WHISPER_WORKER_SOCKET), la transcription
+    lui est déléguée. Sinon, le modèle est chargé dans le processus courant.
 """
 
 import sys
 import os
 import json
-import whisper
+import hashlib
+import argparse
+import socket
+import signal
+import time
+import multiprocessing
+
+import model_selection
+from decode_guard import DecodeStats, guard_params
+from inference_cache import cached_inference
+from job_scheduler import WHISPER_MEMORY_MB, Budget
+from metrics_store import record_job
+from profiling import TRACE_KINDS, StageProfiler, peak_rss_mb, trace
+from whisper_engines import (
+    ENGINES, COMPUTE_TYPES, DEFAULT_BATCH_SIZE, DEFAULT_ENGINE, DEFAULT_COMPUTE_TYPE, import_engine, load_engine
+)
+
+VALID_MODELS = ["tiny", "base", "small", "medium", "large", "large-v2", "large-v3"]
+ADAPTIVE_MODEL = "auto"
+DEFAULT_MODEL = os.getenv('WHISPER_MODEL', 'base')
+
+# Modèle adaptatif sans --deadline: temps accordé à la transcription (secondes)
+DEFAULT_ADAPTIVE_BUDGET = float(os.getenv('WHISPER_ADAPTIVE_BUDGET', '300'))
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".ogg", ".webm", ".flac", ".mp4", ".mpeg", ".mpga"}
+DEFAULT_SOCKET = os.getenv('WHISPER_WORKER_SOCKET', '/tmp/whisper_worker.sock')
+
+# Attente maximale de la réponse du worker sans --deadline (secondes, timeout côté Laravel)
+WORKER_TIMEOUT = float(os.getenv('WHISPER_TIMEOUT', '300'))
+
+# Détection d'activité vocale avant décodage (vad.py): auto, silero, energy
+VAD_METHODS = ["auto", "silero", "energy"]
+# WHISPER_VAD=1 équivaut à "auto", toute autre valeur inconnue désactive la VAD
+DEFAULT_VAD = {"1": "auto", **{method: method for method in VAD_METHODS}}.get(os.getenv('WHISPER_VAD', ''))
+
+# Cœurs alloués à ce processus (fixé par job_scheduler.py, sinon toute la machine)
+CPU_BUDGET = int(os.getenv('SCHEDULER_JOB_THREADS') or os.cpu_count() or 1)
+
+# Mode enregistrements longs: chunks coupés sur les silences, transcrits en parallèle
+DEFAULT_LONG_AUDIO = os.getenv('WHISPER_LONG_AUDIO', '0') == '1'
+DEFAULT_CHUNK_SECONDS = float(os.getenv('WHISPER_CHUNK_SECONDS', '120'))
 
-def transcribe_audio(audio_path: str, model_size: str = "base") -> dict:
+# Mode liste de segments: durée maximale d'un morceau décodé (fenêtre de l'encodeur Whisper)
+MAX_PIECE_SECONDS = 30.0
+
+# Moteurs chargés dans ce processus (partagés avec les workers forkés)
+# Clé: (moteur, modèle, type de calcul)
+_models = {}
+
+# Moteur utilisé par les processus du mode batch
+_batch_engine_options = {}
+
+# Mode d'exécution enregistré avec les métriques de chaque job (cli, worker, batch)
+_metrics_mode = "cli"
+
+
+def _recorded(result: dict, model_size: str) -> dict:
+    """Enregistre les métriques du job (metrics_store.py) et retourne son résultat"""
+    record_job("whisper", result, _metrics_mode, model_size)
+    return result
+
+
+def load_model(model_size: str, engine: str = None, compute_type: str = None, profiler: StageProfiler = None):
+    """
+    Charge un moteur Whisper une seule fois par processus
+
+    Returns:
+        Moteur (whisper_engines) dont transcribe() retourne le contrat commun
+    """
+    engine = engine or DEFAULT_ENGINE
+    compute_type = compute_type or DEFAULT_COMPUTE_TYPE
+    key = (engine, model_size, compute_type if engine == "faster-whisper" else "float32")
+
+    if key not in _models:
+        profiler = profiler or StageProfiler()
+        with profiler.stage("import"):
+            import_engine(engine)
+        with profiler.stage("model_load"):
+            _models[key] = load_engine(engine, model_size, compute_type)
+    return _models[key]
+
+
+def transcription_params(model_size: str, engine: str = None, compute_type: str = None,
+                         vad: str = None, decoding: dict = None) -> dict:
+    """Paramètres d'inférence qui influencent le résultat (clé du cache)"""
+    engine = engine or DEFAULT_ENGINE
+    params = {
+        "model": model_size,
+        "engine": engine,
+        "compute_type": (compute_type or DEFAULT_COMPUTE_TYPE) if engine == "faster-whisper" else "float32",
+        "language": "fr",
+        "fp16": False,
+        "vad": vad,
+        "decode_guard": guard_params()
+    }
+    # Décodage par défaut du moteur: clé absente (les entrées de cache existantes restent valides)
+    if decoding:
+        params["decoding"] = decoding
+    return params
+
+
+def resolve_model_name(name: str) -> str:
+    """Modèle demandé (argument ou WHISPER_MODEL): taille connue, auto, sinon base"""
+    if name in VALID_MODELS or name == ADAPTIVE_MODEL:
+        return name
+    print(f"⚠️ Modèle Whisper inconnu '{name}', utilisation de base", file=sys.stderr)
+    return "base"
+
+
+def pool_processes(model_size: str, requested: int = None) -> int:
+    """
+    Processus du pool (batch, --long), qui chargent chacun un modèle complet
+
+    Sans nombre demandé: un par cœur du budget, dans la limite de la RAM allouée
+    aux jobs (SCHEDULER_MEMORY_MB) divisée par la RAM estimée d'un modèle
+    (job_scheduler.py; modèle adaptatif: le plus grand candidat).
+    """
+    if requested:
+        return max(1, requested)
+    per_model = WHISPER_MEMORY_MB.get(model_size) or WHISPER_MEMORY_MB[ADAPTIVE_MODEL] or 1
+    return max(1, min(CPU_BUDGET, Budget().memory_mb // per_model))
+
+
+def select_model(audio_path: str, deadline: float = None, engine: str = None, compute_type: str = None,
+                 loaded_models=(), duration: float = None) -> dict:
+    """
+    Modèle et décodage adaptatifs pour transcrire `audio_path` avant `deadline`
+
+    Args:
+        duration: durée à transcrire (somme des segments en mode --segments), sinon celle du fichier
+
+    Returns:
+        dict décrivant le choix (clé "adaptive" du résultat), voir model_selection.choose()
+    """
+    engine = engine or DEFAULT_ENGINE
+    compute_type = transcription_params("base", engine, compute_type)["compute_type"]
+    available = deadline - time.time() if deadline is not None else DEFAULT_ADAPTIVE_BUDGET
+
+    if duration is None:
+        duration = model_selection.probe_duration(audio_path)
+    if duration is None:
+        # Durée inconnue: le plus petit modèle candidat, sans estimation
+        return {
+            "model": model_selection.CANDIDATE_MODELS[0],
+            "preset": "greedy",
+            "decoding": dict(model_selection.DECODING_PRESETS["greedy"]),
+            "fits": None,
+            "audio_duration": None,
+            "available_seconds": round(available, 2)
+        }
+    return model_selection.choose(duration, available, engine, compute_type, loaded_models)
+
+
+def transcribe_audio(audio_path: str, model_size: str = "base", engine: str = None,
+                     compute_type: str = None, vad: str = None, decoding: dict = None) -> dict:
     """
     Transcrit un fichier audio avec OpenAI Whisper
 
+    Le résultat est mis en cache (contenu audio + paramètres): un fichier déjà
+    transcrit est retourné sans charger le modèle ni importer torch.
+
     Args:
         audio_path: Chemin vers le fichier audio
         model_size: Taille du modèle (tiny, base, small, medium, large)
+        engine: Moteur (openai-whisper, faster-whisper), défaut WHISPER_ENGINE
+        compute_type: Type de calcul CTranslate2 (int8, int8_float32, float32)
+        vad: Méthode de détection de parole (auto, silero, energy), None pour décoder tout l'audio
+        decoding: Options de décodage (beam_size, best_of), None pour celles du moteur
 
     Returns:
-        dict: {"text": transcription, "language": langue_detectee}
+        dict: {"text": transcription, "language": langue_detectee, "real_time_factor": ..., "profile": ...}
     """
     try:
         if not os.path.exists(audio_path):
             return {"error": f"Fichier non trouvé: {audio_path}"}
 
-        # Charger le modèle Whisper
-        model = whisper.load_model(model_size)
-
-        # Transcription avec détection automatique de la langue
-        result = model.transcribe(
+        # Le profil décrit cette exécution: il n'est pas mis en cache
+        profiler = StageProfiler()
+        result = cached_inference(
+            "whisper",
             audio_path,
-            language="fr",  # Forcer le français
-            fp16=False  # Désactiver FP16 pour CPU
+            transcription_params(model_size, engine, compute_type, vad, decoding),
+            lambda: _run_whisper(audio_path, model_size, engine, compute_type, vad, profiler, decoding)
         )
+        return _recorded({**result, "profile": profiler.report()}, model_size)
+
+    except Exception as e:
+        return _recorded({"error": str(e)}, model_size)
+
+
+def _run_whisper(audio_path: str, model_size: str, engine: str = None, compute_type: str = None,
+                 vad: str = None, profiler: StageProfiler = None, decoding: dict = None) -> dict:
+    from audio_io import load_audio
+
+    profiler = profiler or StageProfiler()
+    decoding = decoding or {}
 
+    # Charger le modèle Whisper (réutilisé s'il est déjà en mémoire)
+    loaded = len(_models)
+    load_started = time.time()
+    model = load_model(model_size, engine, compute_type, profiler)
+    load_seconds = time.time() - load_started if len(_models) > loaded else None
+
+    started = time.time()
+    timeline, vad_method = None, None
+
+    with profiler.stage("audio_decode"):
+        audio = load_audio(audio_path)
+
+    # Ne passer au décodeur que les régions de parole
+    if vad:
+        from vad import SpeechTimeline, speech_regions
+
+        with profiler.stage("vad"):
+            regions, vad_method = speech_regions(audio, vad)
+            timeline = SpeechTimeline(audio, regions)
+            audio = timeline.waveform
+
+    if timeline is not None and not timeline.regions:
+        # Aucune parole détectée: rien à décoder
+        result = {"text": "", "language": "fr", "language_probability": 0.0, "segments": [],
+                  "decode_stats": DecodeStats().report()}
+    else:
+        # Transcription avec détection automatique de la langue
+        with profiler.stage("whisper_decode"):
+            result = model.transcribe(
+                audio,
+                language="fr",  # Forcer le français
+                fp16=False,  # Désactiver FP16 pour CPU
+                **decoding
+            )
+    processing_seconds = time.time() - started
+
+    # Les timestamps se réfèrent toujours à l'audio d'origine
+    if timeline is not None:
+        result["segments"] = timeline.remap_segments(result["segments"])
+        result["duration"] = timeline.original_duration
+
+    output = {
+        "text": result["text"].strip(),
+        "language": result["language"],
+        "language_probability": result["language_probability"],
+        "engine": model.name,
+        "model": model_size,
+        "compute_type": model.compute_type,
+        "audio_duration": round(result["duration"], 2),
+        "processing_seconds": round(processing_seconds, 2),
+        "real_time_factor": round(processing_seconds / max(result["duration"], 1e-6), 4),
+        "decoding": model_selection.decoding_preset(decoding, model.name),
+        "decode_stats": result["decode_stats"],
+        "peak_rss_mb": peak_rss_mb()
+    }
+    if timeline is not None:
+        output["segments"] = result["segments"]
+        output["vad"] = timeline.report(vad_method)
+
+    _record_rtf(model.name, model_size, model.compute_type, decoding, processing_seconds, result["duration"],
+                load_seconds)
+    return output
+
+
+def _record_rtf(engine: str, model_size: str, compute_type: str, decoding: dict, processing_seconds: float,
+                duration: float, load_seconds: float = None) -> None:
+    """Ajoute la mesure à la table des facteurs temps réel de l'hôte (choix du modèle adaptatif)"""
+    if duration > 0:
+        model_selection.record(engine, model_size, compute_type, decoding, processing_seconds / duration,
+                               load_seconds)
+
+
+def parse_decoding(options) -> dict:
+    """
+    Options de décodage d'une requête (beam_size, best_of)
+
+    Raises:
+        ValueError: options qui ne sont pas des entiers positifs
+    """
+    if not options:
+        return {}
+    if not isinstance(options, dict):
+        raise ValueError("decoding doit être un objet")
+
+    decoding = {}
+    for key in ("beam_size", "best_of"):
+        value = options.get(key)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f"decoding.{key} doit être un entier positif")
+        decoding[key] = value
+    return decoding
+
+
+def handle_request(request: dict) -> dict:
+    """Traite une requête reçue par un worker"""
+    if request.get("cmd") == "ping":
         return {
-            "text": result["text"].strip(),
-            "language": result["language"],
-            "language_probability": 1.0  # Whisper ne retourne pas cette info
+            "ready": True,
+            "pid": os.getpid(),
+            "models": sorted(f"{engine}:{model}:{compute}" for engine, model, compute in _models)
         }
 
+    audio_path = request.get("audio_path")
+    if not audio_path or not isinstance(audio_path, str):
+        return {"error": "Requête invalide: audio_path manquant"}
+
+    model_size = request.get("model", "base")
+    if model_size not in VALID_MODELS:
+        print(f"⚠️ Modèle Whisper inconnu '{model_size}', utilisation de base", file=sys.stderr)
+        model_size = "base"
+
+    engine = request.get("engine") if request.get("engine") in ENGINES else None
+    compute_type = request.get("compute_type") if request.get("compute_type") in COMPUTE_TYPES else None
+    vad = request.get("vad") if request.get("vad") in VAD_METHODS else None
+
+    try:
+        decoding = parse_decoding(request.get("decoding"))
+    except ValueError as e:
+        return {"error": f"Requête invalide: {e}"}
+
+    if request.get("cmd") == "stream_chunk":
+        return transcribe_stream_chunk(audio_path, model_size, request.get("initial_prompt"), engine, compute_type,
+                                       decoding)
+
+    if request.get("segments") is not None:
+        return transcribe_segments(audio_path, request["segments"], model_size, engine, compute_type,
+                                   request.get("batch_size"), decoding)
+
+    return transcribe_audio(audio_path, model_size, engine, compute_type, vad, decoding)
+
+
+def transcribe_stream_chunk(audio_path: str, model_size: str = "base", initial_prompt: str = None,
+                            engine: str = None, compute_type: str = None, decoding: dict = None) -> dict:
+    """
+    Transcrit un chunk d'une session incrémentale (stream_session.py)
+
+    La fin du texte du chunk précédent est passée en contexte (initial_prompt):
+    le résultat dépend de la session et n'est pas mis en cache.
+
+    Returns:
+        dict: {"text", "language", "segments"} ou {"error"}
+    """
+    from audio_io import load_audio
+
+    try:
+        model = load_model(model_size, engine, compute_type)
+        result = model.transcribe(load_audio(audio_path), language="fr", fp16=False,
+                                  initial_prompt=initial_prompt or None, **(decoding or {}))
+        return {"text": result["text"], "language": result["language"], "segments": result["segments"]}
     except Exception as e:
         return {"error": str(e)}
 
+
+def _worker_loop(server: socket.socket) -> None:
+    """Boucle d'un worker forké: accepte les connexions sur le socket partagé"""
+    global _metrics_mode
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _metrics_mode = "worker"
+
+    while True:
+        conn, _ = server.accept()
+        with conn, conn.makefile('rwb') as stream:
+            for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    response = handle_request(request) if isinstance(request, dict) \
+                        else {"error": "Requête invalide: objet JSON attendu"}
+                except json.JSONDecodeError as e:
+                    response = {"error": f"JSON invalide: {e}"}
+                stream.write((json.dumps(response, ensure_ascii=False) + "\n").encode('utf-8'))
+                stream.flush()
+
+
+def serve(socket_path: str, model_sizes: list, num_workers: int, engine: str = None,
+          compute_type: str = None) -> None:
+    """
+    Lance le pool de workers Whisper
+
+    Les modèles sont chargés AVANT le fork: les pages contenant les poids sont
+    partagées en copy-on-write entre tous les workers au lieu d'être dupliquées.
+    """
+    import gc
+
+    # Répartir les cœurs entre les workers pour éviter la sur-souscription
+    # (OMP_NUM_THREADS est lu par CTranslate2 au chargement du modèle)
+    threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+    os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+
+    for model_size in model_sizes:
+        print(f"📦 Chargement du modèle Whisper {model_size}...", file=sys.stderr)
+        load_model(model_size, engine, compute_type)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o660)
+    server.listen(64)
+
+    # Geler les objets existants: le GC ne les touche plus, ce qui évite
+    # de dupliquer leurs pages mémoire dans chaque worker
+    gc.freeze()
+
+    def spawn_worker() -> int:
+        pid = os.fork()
+        if pid == 0:
+            if "torch" in sys.modules:
+                sys.modules["torch"].set_num_threads(threads_per_worker)
+            try:
+                _worker_loop(server)
+            finally:
+                os._exit(0)
+        return pid
+
+    workers = {spawn_worker() for _ in range(num_workers)}
+    print(
+        f"✅ {num_workers} workers Whisper prêts sur {socket_path} "
+        f"(modèles: {', '.join(model_sizes)}, {threads_per_worker} threads/worker)",
+        file=sys.stderr
+    )
+
+    def shutdown(signum, frame):
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # Relancer les workers qui meurent (OOM, crash...)
+    while True:
+        pid, _ = os.wait()
+        if pid in workers:
+            workers.discard(pid)
+            print(f"⚠️ Worker {pid} arrêté, redémarrage...", file=sys.stderr)
+            workers.add(spawn_worker())
+
+
+def list_batch_files(source: str) -> list:
+    """Liste les fichiers d'un manifeste (un chemin par ligne) ou d'un dossier"""
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names
+            if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+        )
+
+    with open(source, encoding='utf-8') as f:
+        return [
+            line.strip() for line in f
+            if line.strip() and not line.lstrip().startswith('#')
+        ]
+
+
+def _init_batch_worker(engine_options: dict, vad: str, threads: int) -> None:
+    """Initialise un processus du pool (batch, --long): threads et modèle chargé une fois"""
+    global _batch_engine_options, _metrics_mode
+
+    # Lu par CTranslate2 (cpu_threads) et par les bibliothèques OpenMP
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    _batch_engine_options = {**engine_options, "vad": vad}
+    _metrics_mode = "batch"
+
+    # Une erreur de chargement est remontée fichier par fichier par transcribe_audio
+    try:
+        if (engine_options.get("engine") or DEFAULT_ENGINE) == "openai-whisper":
+            import torch
+            torch.set_num_threads(threads)
+        # Modèle adaptatif: choisi et chargé au premier fichier
+        if engine_options["model_size"] != ADAPTIVE_MODEL:
+            load_model(**engine_options)
+    except Exception:
+        pass
+
+
+def _batch_transcribe(audio_path: str) -> dict:
+    started = time.time()
+    options = dict(_batch_engine_options)
+
+    adaptive = None
+    if options["model_size"] == ADAPTIVE_MODEL:
+        engine = options.get("engine") or DEFAULT_ENGINE
+        loaded = {model for key_engine, model, _ in _models if key_engine == engine}
+        adaptive = select_model(audio_path, None, options.get("engine"), options.get("compute_type"), loaded)
+        # Un seul modèle par processus: la RAM du pool reste celle estimée par pool_processes()
+        for key in [key for key in _models if key[1] != adaptive["model"]]:
+            del _models[key]
+        options.update(model_size=adaptive["model"], decoding=adaptive["decoding"])
+
+    result = transcribe_audio(audio_path, **options)
+    if adaptive is not None:
+        result["adaptive"] = adaptive
+    return {"audio_path": audio_path, **result, "elapsed_seconds": round(time.time() - started, 2)}
+
+
+def run_batch(source: str, model_size: str, processes: int = None, engine: str = None,
+              compute_type: str = None, vad: str = None) -> int:
+    """
+    Transcrit tous les fichiers du lot et écrit une ligne JSON par fichier
+
+    Args:
+        model_size: taille du modèle, ou auto (choisi fichier par fichier, clé "adaptive")
+        processes: taille du pool, défaut pool_processes() (cœurs et RAM)
+
+    Returns:
+        int: nombre de fichiers en erreur
+    """
+    audio_paths = list_batch_files(source)
+    processes = max(1, min(pool_processes(model_size, processes), len(audio_paths) or 1))
+    threads = max(1, CPU_BUDGET // processes)
+
+    print(
+        f"📂 {len(audio_paths)} fichiers, {processes} processus x {threads} threads (modèle {model_size})",
+        file=sys.stderr
+    )
+
+    failures = 0
+    started = time.time()
+
+    # spawn: pas de fork d'un processus dont les pools de threads torch tournent déjà
+    context = multiprocessing.get_context("spawn")
+    engine_options = {"model_size": model_size, "engine": engine, "compute_type": compute_type}
+    with context.Pool(processes, initializer=_init_batch_worker, initargs=(engine_options, vad, threads)) as pool:
+        # chunksize=1: un fichier long n'en bloque pas d'autres derrière lui
+        for result in pool.imap_unordered(_batch_transcribe, audio_paths, chunksize=1):
+            if "error" in result:
+                failures += 1
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    elapsed = time.time() - started
+    print(
+        f"✅ {len(audio_paths) - failures}/{len(audio_paths)} fichiers en {elapsed:.1f}s "
+        f"({len(audio_paths) / max(elapsed, 1e-6) * 3600:.0f} fichiers/heure)",
+        file=sys.stderr
+    )
+    return failures
+
+
+def transcribe_long_audio(audio_path: str, model_size: str = "base", processes: int = None,
+                          chunk_seconds: float = DEFAULT_CHUNK_SECONDS, engine: str = None,
+                          compute_type: str = None, vad: str = None, decoding: dict = None) -> dict:
+    """
+    Transcrit un enregistrement long en parallèle
+
+    L'audio est découpé sur les silences en chunks d'environ `chunk_seconds`
+    (audio_chunks.py), transcrits par un pool de processus puis recollés dans
+    l'ordre. Le temps de traitement diminue avec le nombre de cœurs.
+
+    Returns:
+        dict: même format que transcribe_audio, avec "segments" et "chunks"
+    """
+    try:
+        if not os.path.exists(audio_path):
+            return {"error": f"Fichier non trouvé: {audio_path}"}
+
+        profiler = StageProfiler()
+        params = {**transcription_params(model_size, engine, compute_type, vad, decoding),
+                  "chunk_seconds": chunk_seconds}
+        result = cached_inference(
+            "whisper",
+            audio_path,
+            params,
+            lambda: _run_chunked(audio_path, model_size, processes, chunk_seconds, engine, compute_type, vad,
+                                 profiler, decoding)
+        )
+        return _recorded({**result, "profile": profiler.report()}, model_size)
+
+    except Exception as e:
+        return _recorded({"error": str(e)}, model_size)
+
+
+def _transcribe_chunk(job: tuple) -> dict:
+    """Transcrit un chunk (processus du pool, ou processus courant s'il est seul)"""
+    import numpy as np
+
+    waveform_path, start, end, options = job
+    model = load_model(options["model_size"], options.get("engine"), options.get("compute_type"))
+
+    # Le fichier .npy est projeté en mémoire: seul le chunk est lu
+    waveform = np.load(waveform_path, mmap_mode='r')
+    result = model.transcribe(np.array(waveform[start:end]), language="fr", fp16=False,
+                              **(options.get("decoding") or {}))
+
+    return {
+        "start": start,
+        "text": result["text"],
+        "segments": result["segments"],
+        "language": result["language"],
+        "language_probability": result["language_probability"],
+        "decode_stats": result["decode_stats"]
+    }
+
+
+def _run_chunked(audio_path: str, model_size: str, processes: int, chunk_seconds: float,
+                 engine: str = None, compute_type: str = None, vad: str = None,
+                 profiler: StageProfiler = None, decoding: dict = None) -> dict:
+    import tempfile
+    import numpy as np
+    from audio_io import SAMPLE_RATE, load_audio
+    from audio_chunks import plan_chunks, stitch_chunks
+
+    profiler = profiler or StageProfiler()
+    started = time.time()
+    with profiler.stage("audio_decode"):
+        waveform = load_audio(audio_path)
+    duration = len(waveform) / SAMPLE_RATE
+
+    timeline, vad_method = None, None
+    if vad:
+        from vad import SpeechTimeline, speech_regions
+
+        with profiler.stage("vad"):
+            regions, vad_method = speech_regions(waveform, vad)
+            timeline = SpeechTimeline(waveform, regions)
+            waveform = timeline.waveform
+
+    bounds = plan_chunks(waveform, chunk_seconds) if len(waveform) else []
+    processes = max(1, min(pool_processes(model_size, processes), len(bounds) or 1))
+    threads = max(1, CPU_BUDGET // processes)
+    engine_options = {"model_size": model_size, "engine": engine, "compute_type": compute_type}
+    chunk_options = {**engine_options, "decoding": decoding}
+
+    # Les processus du pool importent et chargent le modèle: inclus dans whisper_decode
+    profiler.begin("whisper_decode")
+    with tempfile.TemporaryDirectory(prefix="whisper_chunks_") as tmp:
+        # Sans VAD, les chunks sont lus directement dans la forme d'onde décodée (.16k.npy)
+        if isinstance(waveform, np.memmap):
+            waveform_path = waveform.filename
+        else:
+            waveform_path = os.path.join(tmp, "waveform.npy")
+            np.save(waveform_path, waveform)
+        jobs = [(waveform_path, start, end, chunk_options) for start, end in bounds]
+
+        load_seconds = None
+        if processes == 1:
+            # Processus courant: son mode de métriques et ses threads restent ceux du CLI,
+            # une erreur de chargement du modèle fait échouer le job
+            loaded = len(_models)
+            load_started = time.time()
+            load_model(model_size, engine, compute_type)
+            load_seconds = time.time() - load_started if len(_models) > loaded else None
+            chunk_results = [_transcribe_chunk(job) for job in jobs]
+        else:
+            # spawn: pas de fork d'un processus dont les pools de threads torch tournent déjà
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(processes, initializer=_init_batch_worker,
+                              initargs=(engine_options, None, threads)) as pool:
+                # map conserve l'ordre des chunks, chunksize=1 équilibre la charge
+                chunk_results = pool.map(_transcribe_chunk, jobs, chunksize=1)
+
+    with profiler.stage("stitch"):
+        stitched = stitch_chunks(chunk_results)
+        segments = stitched["segments"]
+        if timeline is not None:
+            segments = timeline.remap_segments(segments)
+
+    first = chunk_results[0] if chunk_results else {"language": "fr", "language_probability": 0.0}
+    processing_seconds = time.time() - started
+    if load_seconds:
+        processing_seconds -= load_seconds
+    stats = DecodeStats()
+    for chunk in chunk_results:
+        stats.merge(chunk["decode_stats"])
+
+    output = {
+        "text": stitched["text"].strip(),
+        "language": first["language"],
+        "language_probability": first["language_probability"],
+        "engine": engine or DEFAULT_ENGINE,
+        "model": model_size,
+        "compute_type": transcription_params(model_size, engine, compute_type)["compute_type"],
+        "audio_duration": round(duration, 2),
+        "processing_seconds": round(processing_seconds, 2),
+        "real_time_factor": round(processing_seconds / max(duration, 1e-6), 4),
+        "decoding": model_selection.decoding_preset(decoding, engine or DEFAULT_ENGINE),
+        "peak_rss_mb": peak_rss_mb(),
+        "decode_stats": stats.report(),
+        "segments": segments,
+        "chunks": {
+            "count": len(bounds),
+            "processes": processes,
+            "threads_per_process": threads,
+            "chunk_seconds": chunk_seconds
+        }
+    }
+    if timeline is not None:
+        output["vad"] = timeline.report(vad_method)
+
+    # Temps total du mode --long (pool compris) rapporté à la durée de l'audio d'origine
+    _record_rtf(output["engine"], model_size, output["compute_type"], decoding, processing_seconds, duration,
+                load_seconds)
+    return output
+
+
+def load_segments(segments_path: str) -> list:
+    """Segments à transcrire: résultat de diarize_audio.py (client_segments) ou liste JSON de {start, end}"""
+    with open(segments_path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    segments = data.get("client_segments", []) if isinstance(data, dict) else data
+    return [
+        {"start": float(segment["start"]), "end": float(segment["end"]), "speaker": segment.get("speaker")}
+        for segment in segments
+        if float(segment["end"]) > float(segment["start"])
+    ]
+
+
+def transcribe_segments(audio_path: str, segments: list, model_size: str = "base", engine: str = None,
+                        compute_type: str = None, batch_size: int = None, decoding: dict = None) -> dict:
+    """
+    Transcrit une liste de segments d'un enregistrement
+
+    Returns:
+        dict: même format que transcribe_audio, avec "segments" (un par segment
+        d'entrée: start, end, speaker, text) et "batch"
+    """
+    try:
+        if not os.path.exists(audio_path):
+            return {"error": f"Fichier non trouvé: {audio_path}"}
+
+        profiler = StageProfiler()
+        # La taille des lots ne change pas le texte: seuls les bornes des segments entrent dans la clé
+        bounds = json.dumps([[round(s["start"], 3), round(s["end"], 3)] for s in segments])
+        params = {**transcription_params(model_size, engine, compute_type, decoding=decoding),
+                  "segments": hashlib.sha256(bounds.encode("utf-8")).hexdigest()}
+        result = cached_inference(
+            "whisper",
+            audio_path,
+            params,
+            lambda: _run_segments(audio_path, segments, model_size, engine, compute_type, batch_size, profiler,
+                                  decoding)
+        )
+        return _recorded({**result, "profile": profiler.report()}, model_size)
+
+    except Exception as e:
+        return _recorded({"error": str(e)}, model_size)
+
+
+def _run_segments(audio_path: str, segments: list, model_size: str, engine: str = None,
+                  compute_type: str = None, batch_size: int = None, profiler: StageProfiler = None,
+                  decoding: dict = None) -> dict:
+    from audio_io import SAMPLE_RATE, load_audio
+
+    profiler = profiler or StageProfiler()
+    loaded = len(_models)
+    load_started = time.time()
+    model = load_model(model_size, engine, compute_type, profiler)
+    load_seconds = time.time() - load_started if len(_models) > loaded else None
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+
+    started = time.time()
+    with profiler.stage("audio_decode"):
+        waveform = load_audio(audio_path)
+
+    # Morceaux de 30 s au plus (les segments plus longs sont découpés): (segment, début, fin) en échantillons
+    piece_samples = int(MAX_PIECE_SECONDS * SAMPLE_RATE)
+    pieces = []
+    for index, segment in enumerate(segments):
+        start = int(segment["start"] * SAMPLE_RATE)
+        end = min(int(segment["end"] * SAMPLE_RATE), len(waveform))
+        pieces.extend((index, first, min(first + piece_samples, end)) for first in range(start, end, piece_samples))
+
+    stats = DecodeStats()
+    with profiler.stage("whisper_decode"):
+        decoded = model.decode_segments([waveform[first:last] for _, first, last in pieces], batch_size,
+                                        stats=stats, decoding=decoding) if pieces else []
+
+    parts = [[] for _ in segments]
+    for (index, _, _), result in zip(pieces, decoded):
+        parts[index].append(result)
+
+    output_segments = []
+    for segment, results in zip(segments, parts):
+        logprobs = [r["avg_logprob"] for r in results if r["avg_logprob"] is not None]
+        output_segments.append({
+            "start": segment["start"],
+            "end": segment["end"],
+            "speaker": segment["speaker"],
+            "text": " ".join(r["text"].strip() for r in results if r["text"].strip()),
+            "avg_logprob": round(sum(logprobs) / len(logprobs), 4) if logprobs else None,
+            "no_speech_prob": min((r["no_speech_prob"] for r in results if r["no_speech_prob"] is not None),
+                                  default=None)
+        })
+
+    processing_seconds = time.time() - started
+    duration = sum(segment["end"] - segment["start"] for segment in segments)
+    # Normalisé par la durée transcrite: celle que le modèle adaptatif estime en mode --segments
+    _record_rtf(model.name, model_size, model.compute_type, decoding, processing_seconds, duration, load_seconds)
+
+    return {
+        "text": " ".join(segment["text"] for segment in output_segments if segment["text"]),
+        "language": "fr",
+        "language_probability": 1.0,
+        "engine": model.name,
+        "model": model_size,
+        "compute_type": model.compute_type,
+        "audio_duration": round(duration, 2),
+        "processing_seconds": round(processing_seconds, 2),
+        "real_time_factor": round(processing_seconds / max(duration, 1e-6), 4),
+        "decoding": model_selection.decoding_preset(decoding, model.name),
+        "peak_rss_mb": peak_rss_mb(),
+        "decode_stats": stats.report(),
+        "segments": output_segments,
+        "batch": {
+            "mode": "batched" if model.batched else "sequential",
+            "size": batch_size if model.batched else 1,
+            "pieces": len(pieces)
+        }
+    }
+
+
+def worker_models(socket_path: str) -> list:
+    """Modèles préchargés par le worker ("moteur:modèle:type de calcul"), liste vide sans worker"""
+    if not os.path.exists(socket_path):
+        return []
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(2)
+            sock.connect(socket_path)
+            with sock.makefile('rwb') as stream:
+                stream.write(b'{"cmd": "ping"}\n')
+                stream.flush()
+                return json.loads(stream.readline() or b'{}').get("models", [])
+    except (OSError, json.JSONDecodeError):
+        return []
+
+
+def transcribe_via_worker(socket_path: str, audio_path: str, model_size: str, engine: str = None,
+                          compute_type: str = None, vad: str = None, segments: list = None, batch_size: int = None,
+                          decoding: dict = None, deadline: float = None):
+    """
+    Délègue la transcription au worker
+
+    La réponse est attendue jusqu'à `deadline` (sinon WHISPER_TIMEOUT secondes).
+
+    Returns:
+        dict du worker, ou None si aucun worker n'a répondu (socket absent,
+        connexion refusée ou fermée sans réponse, délai dépassé)
+    """
+    if not os.path.exists(socket_path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(max(1.0, deadline - time.time()) if deadline is not None else WORKER_TIMEOUT)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+
+    request = {
+        "audio_path": os.path.abspath(audio_path),
+        "model": model_size,
+        "engine": engine,
+        "compute_type": compute_type,
+        "vad": vad
+    }
+    if decoding:
+        request["decoding"] = decoding
+    if segments is not None:
+        request.update({"segments": segments, "batch_size": batch_size})
+    try:
+        with sock, sock.makefile('rwb') as stream:
+            stream.write((json.dumps(request, ensure_ascii=False) + "\n").encode('utf-8'))
+            stream.flush()
+            line = stream.readline()
+    except socket.timeout:
+        print("⚠️ Worker Whisper sans réponse dans le délai, transcription locale", file=sys.stderr)
+        return None
+    except OSError:
+        print("⚠️ Connexion au worker Whisper interrompue, transcription locale", file=sys.stderr)
+        return None
+
+    if not line:
+        print("⚠️ Le worker Whisper a fermé la connexion sans réponse, transcription locale", file=sys.stderr)
+        return None
+    return json.loads(line)
+
+
 def main():
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Transcription audio locale avec Whisper")
+    parser.add_argument("audio_path", nargs="?", help="Fichier audio à transcrire")
+    parser.add_argument("model", nargs="?", default=DEFAULT_MODEL,
+                        help="Taille du modèle Whisper, ou auto (défaut: WHISPER_MODEL)")
+    parser.add_argument("--serve", action="store_true", help="Lancer le pool de workers")
+    parser.add_argument("--models", default=os.getenv('WHISPER_WORKER_MODELS', os.getenv('WHISPER_MODEL', 'base')),
+                        help="Modèles préchargés par le worker (séparés par des virgules)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv('WHISPER_WORKER_PROCESSES', '2')),
+                        help="Nombre de workers forkés")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Chemin du socket Unix")
+    parser.add_argument("--no-worker", action="store_true", help="Ne pas utiliser le worker même s'il tourne")
+    parser.add_argument("--engine", choices=ENGINES, default=DEFAULT_ENGINE,
+                        help="Moteur d'inférence (défaut: WHISPER_ENGINE)")
+    parser.add_argument("--compute-type", choices=COMPUTE_TYPES, default=DEFAULT_COMPUTE_TYPE,
+                        help="Type de calcul du moteur faster-whisper (défaut: WHISPER_COMPUTE_TYPE)")
+    parser.add_argument("--vad", nargs="?", const="auto", choices=VAD_METHODS, default=DEFAULT_VAD,
+                        help="Ne décoder que les régions de parole (défaut: WHISPER_VAD)")
+    parser.add_argument("--no-vad", dest="vad", action="store_const", const=None,
+                        help="Décoder tout l'audio même si WHISPER_VAD est défini")
+    parser.add_argument("--long", dest="long_audio", action="store_true", default=DEFAULT_LONG_AUDIO,
+                        help="Découper sur les silences et transcrire les chunks en parallèle (défaut: WHISPER_LONG_AUDIO)")
+    parser.add_argument("--chunk-seconds", type=float, default=DEFAULT_CHUNK_SECONDS,
+                        help="Durée cible des chunks du mode --long (défaut: WHISPER_CHUNK_SECONDS)")
+    parser.add_argument("--profile-trace", metavar="FICHIER",
+                        help="Écrire une trace détaillée (cProfile .prof ou trace Chrome torch), sans worker")
+    parser.add_argument("--profile-trace-kind", choices=TRACE_KINDS, default="cprofile",
+                        help="Type de trace écrite par --profile-trace")
+    parser.add_argument("--segments", metavar="JSON",
+                        help="Transcrire les segments listés (JSON de diarize_audio.py ou liste de {start, end})")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Segments décodés par lot en mode --segments (défaut: WHISPER_BATCH_SIZE)")
+    parser.add_argument("--deadline", type=float, metavar="EPOCH",
+                        help="Horodatage avant lequel le modèle auto doit avoir terminé")
+    parser.add_argument("--batch", metavar="SOURCE", help="Manifeste (un chemin par ligne) ou dossier à transcrire")
+    parser.add_argument("--processes", type=int,
+                        help="Nombre de processus des modes batch et --long (défaut: cœurs, borné par la RAM)")
+    args = parser.parse_args()
+
+    if args.serve:
+        model_sizes = [m.strip() for m in args.models.split(",") if m.strip() in VALID_MODELS] or ["base"]
+        serve(args.socket, model_sizes, max(1, args.workers), args.engine, args.compute_type)
+        return
+
+    if args.batch:
+        # En mode batch, le premier argument positionnel est le modèle (défaut: WHISPER_MODEL)
+        model_size = resolve_model_name(args.audio_path or DEFAULT_MODEL)
+        failures = run_batch(args.batch, model_size, args.processes, args.engine, args.compute_type, args.vad)
+        sys.exit(1 if failures else 0)
+
+    if not args.audio_path:
         print(json.dumps({"error": "Usage: python whisper_transcribe.py <audio_file>"}))
         sys.exit(1)
 
-    audio_path = sys.argv[1]
-    model_size = sys.argv[2] if len(sys.argv) > 2 else "base"
+    segments = None
+    if args.segments:
+        try:
+            segments = load_segments(args.segments)
+        except (OSError, ValueError, KeyError, TypeError, json.JSONDecodeError) as e:
+            print(json.dumps({"error": f"Segments illisibles: {e}"}, ensure_ascii=False))
+            sys.exit(1)
 
-    # Vérifier les modèles valides
-    valid_models = ["tiny", "base", "small", "medium", "large", "large-v2", "large-v3"]
-    if model_size not in valid_models:
-        model_size = "base"
+    # Modèle adaptatif: plus grand modèle qui tient avant la deadline
+    adaptive, decoding = None, None
+    model_size = resolve_model_name(args.model)
+    if model_size == ADAPTIVE_MODEL:
+        loaded = [] if args.no_worker else worker_models(args.socket)
+        adaptive = select_model(
+            args.audio_path, args.deadline, args.engine, args.compute_type,
+            {key.split(":")[1] for key in loaded if key.startswith(f"{args.engine}:")},
+            sum(s["end"] - s["start"] for s in segments) if segments is not None else None
+        )
+        model_size, decoding = adaptive["model"], adaptive["decoding"]
+
+    if segments is not None:
+        result = None
+        if not args.no_worker and not args.profile_trace:
+            try:
+                result = transcribe_via_worker(args.socket, args.audio_path, model_size, args.engine,
+                                               args.compute_type, segments=segments, batch_size=args.batch_size,
+                                               decoding=decoding, deadline=args.deadline)
+            except (OSError, json.JSONDecodeError):
+                result = None
+
+        if result is None:
+            with trace(args.profile_trace, args.profile_trace_kind):
+                result = transcribe_segments(args.audio_path, segments, model_size, args.engine,
+                                             args.compute_type, args.batch_size, decoding)
+        if adaptive is not None:
+            result["adaptive"] = adaptive
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    if args.long_audio:
+        with trace(args.profile_trace, args.profile_trace_kind):
+            result = transcribe_long_audio(
+                args.audio_path, model_size, args.processes, args.chunk_seconds,
+                args.engine, args.compute_type, args.vad, decoding
+            )
+        if adaptive is not None:
+            result["adaptive"] = adaptive
+        print(json.dumps(result, ensure_ascii=False))
+        return
 
-    result = transcribe_audio(audio_path, model_size)
+    result = None
+    # Une trace ne peut être prise que dans ce processus: pas de délégation au worker
+    if not args.no_worker and not args.profile_trace:
+        try:
+            result = transcribe_via_worker(
+                args.socket, args.audio_path, model_size, args.engine, args.compute_type, args.vad,
+                decoding=decoding, deadline=args.deadline
+            )
+        except (OSError, json.JSONDecodeError):
+            result = None
+
+    # Aucun worker disponible: transcription dans ce processus
+    if result is None:
+        with trace(args.profile_trace, args.profile_trace_kind):
+            result = transcribe_audio(args.audio_path, model_size, args.engine, args.compute_type, args.vad,
+                                      decoding)
+
+    if adaptive is not None:
+        result["adaptive"] = adaptive
     print(json.dumps(result, ensure_ascii=False))
 
+
 if __name__ == "__main__":
     main()
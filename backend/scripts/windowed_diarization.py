@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Diarisation par fenêtres glissantes des enregistrements longs (mémoire bornée)
+
+Sur un fichier entier, pyannote garde en mémoire la segmentation et les
+embeddings de tout l'enregistrement, et le clustering compare tous les
+embeddings entre eux: mémoire et durée croissent avec la durée du rendez-vous.
+
+Au-delà de DIARIZATION_WINDOW_THRESHOLD, l'audio est diarisé par fenêtres de
+durée fixe qui se chevauchent:
+    - chaque fenêtre est lue dans la forme d'onde décodée (.16k.npy, voir
+      audio_io.py) sans projeter le reste du fichier en mémoire
+    - ses locuteurs sont rattachés aux locuteurs globaux par similarité des
+      embeddings (SpeakerRegistry)
+    - seuls ses tours de parole situés dans sa zone propre sont conservés: la
+      frontière entre deux fenêtres est au milieu de leur chevauchement
+
+Le pic mémoire dépend de la taille des fenêtres, pas de la durée totale.
+
+Un nombre de locuteurs imposé (--num-speakers, empreinte vocale connue) vaut
+pour tout l'enregistrement, pas pour chaque fenêtre: une fenêtre ne reçoit
+qu'un maximum, et le nombre exact est appliqué aux locuteurs globaux après
+rattachement (les locuteurs en surnombre sont fusionnés dans le plus proche).
+
+Configuration (variables d'environnement):
+    DIARIZATION_WINDOW_THRESHOLD    durée (s) à partir de laquelle le mode fenêtré est utilisé (défaut: 1800, 0: jamais)
+    DIARIZATION_WINDOW_SECONDS      durée d'une fenêtre (défaut: 600)
+    DIARIZATION_WINDOW_OVERLAP      chevauchement minimal entre deux fenêtres (défaut: 30)
+    DIARIZATION_WINDOW_MATCH        similarité cosinus minimale pour rattacher un locuteur (défaut: 0.5)
+"""
+
+import os
+import math
+
+import numpy as np
+
+from segment_table import SegmentTable
+from speaker_registry import SpeakerRegistry, speaker_durations
+
+WINDOW_THRESHOLD = float(os.getenv('DIARIZATION_WINDOW_THRESHOLD', '1800'))
+WINDOW_SECONDS = float(os.getenv('DIARIZATION_WINDOW_SECONDS', '600'))
+WINDOW_OVERLAP = float(os.getenv('DIARIZATION_WINDOW_OVERLAP', '30'))
+WINDOW_MATCH = float(os.getenv('DIARIZATION_WINDOW_MATCH', '0.5'))
+
+
+def windowed_params() -> dict:
+    """Paramètres du mode fenêtré (clé du cache de diarisation)"""
+    return {'threshold': WINDOW_THRESHOLD, 'seconds': WINDOW_SECONDS, 'overlap': WINDOW_OVERLAP,
+            'match': WINDOW_MATCH}
+
+
+def use_windows(duration: float) -> bool:
+    return 0 < WINDOW_THRESHOLD <= duration and duration > WINDOW_SECONDS
+
+
+def plan_windows(duration: float, window: float = None, overlap: float = None) -> list:
+    """
+    Fenêtres de même durée couvrant l'enregistrement
+
+    Returns:
+        list de (début, fin, début propre, fin propre) en secondes: les zones
+        propres se suivent sans trou ni recouvrement
+    """
+    window = window or WINDOW_SECONDS
+    overlap = WINDOW_OVERLAP if overlap is None else overlap
+    if duration <= window:
+        return [(0.0, duration, 0.0, duration)]
+
+    # Nombre minimal de fenêtres, puis pas réparti pour que la dernière finisse à la fin du fichier
+    count = math.ceil((duration - overlap) / (window - overlap))
+    step = (duration - window) / (count - 1)
+    starts = [index * step for index in range(count)]
+    ends = [start + window for start in starts[:-1]] + [duration]
+
+    bounds = [0.0] + [(starts[index + 1] + ends[index]) / 2 for index in range(count - 1)] + [duration]
+    return [(starts[index], ends[index], bounds[index], bounds[index + 1]) for index in range(count)]
+
+
+def window_hints(hints: dict) -> dict:
+    """Bornes passées au pipeline pour une fenêtre: seulement un maximum"""
+    limit = hints.get('num_speakers') or hints.get('max_speakers')
+    return {'max_speakers': limit} if limit else {}
+
+
+class WindowedDiarization:
+    """Tours de parole de toutes les fenêtres, sous des labels de locuteurs globaux"""
+
+    def __init__(self, threshold: float = WINDOW_MATCH):
+        self.registry = SpeakerRegistry(threshold=threshold)
+        self.turns = []
+        self.windows = 0
+        self.local_speakers = 0
+        self.merged_speakers = 0
+
+    def add(self, diarization, embeddings, window: tuple) -> None:
+        """Rattache les locuteurs d'une fenêtre et garde ses tours dans sa zone propre"""
+        start, _, own_start, own_end = window
+        labels = diarization.labels()
+        mapping = self.registry.match(labels, embeddings, speaker_durations(diarization, labels))
+
+        for turn, _, speaker in diarization.itertracks(yield_label=True):
+            turn_start = max(float(turn.start) + start, own_start)
+            turn_end = min(float(turn.end) + start, own_end)
+            if turn_end > turn_start:
+                self.turns.append((turn_start, turn_end, mapping[speaker]))
+
+        self.windows += 1
+        self.local_speakers += len(labels)
+
+    def limit_speakers(self, max_speakers: int) -> None:
+        """
+        Ramène les locuteurs globaux à `max_speakers`
+
+        Les locuteurs qui parlent le plus sont gardés; chaque locuteur en
+        surnombre est fusionné dans le locuteur gardé le plus proche (centroïde).
+        """
+        durations = {}
+        for start, end, label in self.turns:
+            durations[label] = durations.get(label, 0.0) + (end - start)
+        if len(durations) <= max_speakers:
+            return
+
+        ranked = sorted(durations, key=durations.get, reverse=True)
+        kept, extra = ranked[:max_speakers], ranked[max_speakers:]
+        speakers = self.registry.speakers
+        mapping = {}
+        for label in extra:
+            centroid = speakers.get(label, {}).get('centroid')
+            candidates = [k for k in kept if speakers.get(k, {}).get('centroid') is not None]
+            if centroid is None or not candidates:
+                mapping[label] = kept[0]
+            else:
+                mapping[label] = max(candidates, key=lambda k: float(np.dot(centroid, speakers[k]['centroid'])))
+                self.registry._update(mapping[label], np.asarray(centroid), speakers[label]['weight'])
+            speakers.pop(label, None)
+
+        self.turns = [(start, end, mapping.get(label, label)) for start, end, label in self.turns]
+        self.merged_speakers += len(extra)
+
+    def table(self) -> SegmentTable:
+        return SegmentTable.from_turns(self.turns)
+
+    def embeddings(self, labels: list) -> np.ndarray:
+        """Centroïde de chaque locuteur global (lignes NaN sans embedding), dans l'ordre de `labels`"""
+        rows = [self.registry.speakers.get(label, {}).get('centroid') for label in labels]
+        dim = next((len(row) for row in rows if row is not None), 1)
+        return np.asarray([row if row is not None else [np.nan] * dim for row in rows], dtype=np.float32)
+
+    def report(self, windows: list) -> dict:
+        return {
+            'count': len(windows),
+            'processed': self.windows,
+            'window_seconds': WINDOW_SECONDS,
+            'overlap_seconds': WINDOW_OVERLAP,
+            'local_speakers': self.local_speakers,
+            'global_speakers': len(self.registry.speakers),
+            'merged_speakers': self.merged_speakers
+        }
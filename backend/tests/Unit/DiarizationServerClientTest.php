@@ -0,0 +1,112 @@
+<?php
+
+namespace Tests\Unit;
+
+use App\Services\DiarizationService;
+use App\Services\InferenceSchedulerService;
+use Tests\TestCase;
+
+/**
+ * Client PHP du serveur pyannote résident (diarize_audio.py --serve)
+ *
+ * Le serveur est remplacé par un petit serveur Python qui répond une ligne
+ * JSON fixe sur le socket Unix et enregistre la requête reçue.
+ */
+class DiarizationServerClientTest extends TestCase
+{
+    private string $directory;
+
+    /** @var resource|null */
+    private $server = null;
+
+    protected function setUp(): void
+    {
+        parent::setUp();
+        $this->directory = sys_get_temp_dir() . '/diarization-server-' . bin2hex(random_bytes(4));
+        mkdir($this->directory);
+    }
+
+    protected function tearDown(): void
+    {
+        if (is_resource($this->server)) {
+            proc_terminate($this->server);
+            proc_close($this->server);
+        }
+        array_map('unlink', glob($this->directory . '/*') ?: []);
+        rmdir($this->directory);
+
+        parent::tearDown();
+    }
+
+    public function test_status_is_null_without_server(): void
+    {
+        config(['services.pyannote.server_socket' => $this->directory . '/absent.sock']);
+
+        $this->assertNull($this->service()->serverStatus());
+    }
+
+    public function test_status_is_read_from_the_socket(): void
+    {
+        $this->startServer(['ready' => true, 'queue_depth' => 3, 'busy' => true]);
+
+        $status = $this->service()->serverStatus();
+
+        $this->assertSame(['ready' => true, 'queue_depth' => 3, 'busy' => true], $status);
+        $this->assertSame(['cmd' => 'status'], $this->receivedRequest());
+    }
+
+    public function test_silent_server_times_out(): void
+    {
+        $this->startServer(['ready' => true], delay: 4);
+
+        $started = microtime(true);
+        $status = $this->service()->serverStatus();
+
+        $this->assertSame(['success' => false, 'timed_out' => true], $status);
+        $this->assertLessThan(4, microtime(true) - $started);
+    }
+
+    private function service(): DiarizationService
+    {
+        return new DiarizationService(null, new InferenceSchedulerService());
+    }
+
+    /**
+     * Lance le faux serveur et attend que son socket existe
+     */
+    private function startServer(array $response, int $delay = 0): void
+    {
+        $socket = $this->directory . '/server.sock';
+        $script = <<<'PY'
+import json, socket, sys, time
+server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+server.bind(sys.argv[1])
+server.listen(1)
+conn, _ = server.accept()
+stream = conn.makefile('rwb')
+with open(sys.argv[2], 'wb') as f:
+    f.write(stream.readline())
+time.sleep(float(sys.argv[4]))
+stream.write(sys.argv[3].encode() + b'\n')
+stream.flush()
+PY;
+        file_put_contents($this->directory . '/server.py', $script);
+
+        $this->server = proc_open([
+            'python3', $this->directory . '/server.py', $socket,
+            $this->directory . '/request.json', json_encode($response), (string) $delay,
+        ], [], $pipes);
+
+        for ($attempt = 0; $attempt < 100 && !file_exists($socket); $attempt++) {
+            usleep(50000);
+        }
+        $this->assertFileExists($socket);
+
+        config(['services.pyannote.server_socket' => $socket]);
+    }
+
+    private function receivedRequest(): array
+    {
+        return json_decode(file_get_contents($this->directory . '/request.json'), true);
+    }
+}
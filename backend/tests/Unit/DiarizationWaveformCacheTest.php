@@ -0,0 +1,107 @@
+<?php
+
+namespace Tests\Unit;
+
+use App\Services\DiarizationService;
+use App\Services\InferenceSchedulerService;
+use ReflectionMethod;
+use Tests\TestCase;
+
+/**
+ * Relecture par ffmpeg de la forme d'onde décodée (<audio>.16k.npy, scripts/audio_io.py)
+ */
+class DiarizationWaveformCacheTest extends TestCase
+{
+    private string $directory;
+
+    private DiarizationService $service;
+
+    protected function setUp(): void
+    {
+        parent::setUp();
+        $this->directory = sys_get_temp_dir() . '/waveform-cache-' . bin2hex(random_bytes(4)) . '/temp';
+        mkdir($this->directory, 0755, true);
+        $this->service = new DiarizationService(null, new InferenceSchedulerService());
+    }
+
+    protected function tearDown(): void
+    {
+        array_map('unlink', glob($this->directory . '/*') ?: []);
+        rmdir($this->directory);
+        rmdir(dirname($this->directory));
+
+        parent::tearDown();
+    }
+
+    public function test_fresh_waveform_is_read_raw(): void
+    {
+        $audio = $this->recording();
+        $this->waveform($audio, 128);
+
+        $input = $this->ffmpegInput($audio);
+
+        $this->assertStringContainsString('-f f32le -ar 16000 -ac 1 -skip_initial_bytes 128 -i', $input);
+        $this->assertStringContainsString(escapeshellarg($audio . '.16k.npy'), $input);
+    }
+
+    public function test_numpy_default_header_length_is_honoured(): void
+    {
+        // np.save aligne l'en-tête sur 64 octets (audio_io.py sur 128)
+        $audio = $this->recording();
+        $this->waveform($audio, 64);
+
+        $this->assertStringContainsString('-skip_initial_bytes 64 ', $this->ffmpegInput($audio));
+    }
+
+    public function test_stale_or_foreign_waveform_falls_back_to_the_recording(): void
+    {
+        $audio = $this->recording();
+
+        $this->waveform($audio, 128, "'<f8'");
+        $this->assertSame('-i ' . escapeshellarg($audio), $this->ffmpegInput($audio));
+
+        $this->waveform($audio, 128);
+        touch($audio . '.16k.npy', time() - 60);
+        $this->assertSame('-i ' . escapeshellarg($audio), $this->ffmpegInput($audio));
+    }
+
+    public function test_cleanup_removes_the_waveform_with_the_recording(): void
+    {
+        $audio = $this->recording();
+        $this->waveform($audio, 128);
+
+        $this->service->cleanup($audio);
+
+        $this->assertFileDoesNotExist($audio);
+        $this->assertFileDoesNotExist($audio . '.16k.npy');
+    }
+
+    private function recording(): string
+    {
+        $path = $this->directory . '/rdv.webm';
+        file_put_contents($path, 'webm');
+        touch($path, time() - 10);
+
+        return $path;
+    }
+
+    /**
+     * Écrit un .npy version 1.0 (en-tête de $headerLength octets) suivi d'une seconde de silence
+     */
+    private function waveform(string $audio, int $headerLength, string $descr = "'<f4'"): void
+    {
+        $dictionary = "{'descr': {$descr}, 'fortran_order': False, 'shape': (16000,), }";
+        $size = $headerLength - 10;
+        $header = "\x93NUMPY\x01\x00" . pack('v', $size) . str_pad($dictionary, $size - 1) . "\n";
+
+        file_put_contents($audio . '.16k.npy', $header . str_repeat("\0", 16000 * 4));
+    }
+
+    private function ffmpegInput(string $audio): string
+    {
+        $method = new ReflectionMethod(DiarizationService::class, 'ffmpegInput');
+        $method->setAccessible(true);
+
+        return $method->invoke($this->service, $audio);
+    }
+}
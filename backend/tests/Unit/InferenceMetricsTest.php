@@ -0,0 +1,52 @@
+<?php
+
+namespace Tests\Unit;
+
+use App\Services\DiarizationMonitoringService;
+use Tests\TestCase;
+
+/**
+ * Lecture des métriques d'inférence (scripts/metrics_store.py summary)
+ */
+class InferenceMetricsTest extends TestCase
+{
+    private string $database;
+
+    protected function setUp(): void
+    {
+        parent::setUp();
+        $this->database = sys_get_temp_dir() . '/metrics-' . bin2hex(random_bytes(4)) . '.sqlite3';
+        putenv('METRICS_DB=' . $this->database);
+        putenv('METRICS_PROM_PATH=' . $this->database . '.prom');
+    }
+
+    protected function tearDown(): void
+    {
+        putenv('METRICS_DB');
+        putenv('METRICS_PROM_PATH');
+        array_map('unlink', glob($this->database . '*') ?: []);
+
+        parent::tearDown();
+    }
+
+    public function test_empty_store_has_no_models(): void
+    {
+        $this->assertSame([], (new DiarizationMonitoringService())->getInferenceMetrics(1));
+    }
+
+    public function test_recorded_jobs_are_summarized_per_model(): void
+    {
+        $script = 'import sys; sys.path.insert(0, sys.argv[1]); from metrics_store import record_job; '
+            . "[record_job('whisper', {'model': 'base', 'audio_duration': 60.0, 'processing_seconds': 60.0 * r, "
+            . "'real_time_factor': r}) for r in (0.2, 0.4)]";
+        exec(sprintf('python3 -c %s %s', escapeshellarg($script), escapeshellarg(base_path('scripts'))), $output, $code);
+        $this->assertSame(0, $code);
+
+        $models = (new DiarizationMonitoringService())->getInferenceMetrics(1);
+
+        $this->assertCount(1, $models);
+        $this->assertSame(['whisper', 'base'], [$models[0]['script'], $models[0]['model']]);
+        $this->assertSame(2, $models[0]['jobs']);
+        $this->assertEqualsWithDelta(0.4, $models[0]['metrics']['real_time_factor']['p95'], 0.05);
+    }
+}
@@ -0,0 +1,49 @@
+<?php
+
+namespace Tests\Unit;
+
+use App\Services\PyannoteHealthService;
+use Illuminate\Support\Facades\Cache;
+use Tests\TestCase;
+
+class PyannoteHealthServiceTest extends TestCase
+{
+    private PyannoteHealthService $service;
+
+    protected function setUp(): void
+    {
+        parent::setUp();
+        Cache::flush();
+        $this->service = new PyannoteHealthService();
+    }
+
+    public function test_cached_status_is_returned_without_running_the_script(): void
+    {
+        Cache::put('pyannote_health_status', ['available' => true, 'tier' => 'fast', 'checks' => []], 3600);
+
+        $this->assertSame('fast', $this->service->check()['tier']);
+        $this->assertTrue($this->service->isAvailable());
+    }
+
+    public function test_fast_and_deep_tiers_are_cached_separately(): void
+    {
+        Cache::put('pyannote_health_status', ['available' => true, 'tier' => 'fast', 'checks' => []], 3600);
+        Cache::put('pyannote_health_status_deep', ['available' => false, 'tier' => 'deep', 'checks' => []], 3600);
+
+        $this->assertTrue($this->service->check()['available']);
+        $this->assertFalse($this->service->deepCheck()['available']);
+    }
+
+    public function test_refresh_runs_the_fast_tier(): void
+    {
+        $started = microtime(true);
+        $status = $this->service->refresh();
+
+        // Statut du niveau rapide, bien formé que pyannote soit installé ou non
+        $this->assertSame('fast', $status['tier']);
+        $this->assertArrayHasKey('model', $status['checks']);
+        $this->assertArrayHasKey('checked_at', $status);
+        $this->assertLessThan(10, microtime(true) - $started);
+        $this->assertSame($status, Cache::get('pyannote_health_status'));
+    }
+}